@@ -0,0 +1,104 @@
+from typing import List, Dict, Any
+import os
+import sys
+import json
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from transform import CoordinateTransformer, helmert_matrix
+from fgb import FgbWriter, read_header
+from logic import gauss_area
+from shp_writer import make_objects
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# параметры преобразований для проверки: аффинное (a, b, c, d, e, f) и Гельмерта (dX, dY, dZ, wx, wy, wz, m)
+AFFINE = (1.0000021, 0.0000135, -1250.37, -0.0000135, 1.0000021, 430.12)
+HELMERT = (23.57, -140.95, -79.8, 0.0, 0.35, 0.79, -0.22)
+
+WKT = 'LOCAL_CS["MSK-40 zone 1",LOCAL_DATUM["Pulkovo 1942",0],UNIT["metre",1],AXIS["Y",EAST],AXIS["X",NORTH]]'
+
+
+def stepwise(geometry: Dict[str, List[List[List[float]]]]) -> Dict[str, List[List[List[float]]]]:
+    """
+    преобразует контуры по этапам, отдельным проходом на каждый этап (перестановка осей, аффинное преобразование,
+    Гельмерта), без объединения матриц
+    """
+    result = {}
+    for key, polys in geometry.items():
+        rings = []
+        for ring in polys:
+            points = [[y, x] for x, y in ring]
+            a, b, c, d, e, f = AFFINE
+            points = [[a * x + b * y + c, d * x + e * y + f] for x, y in points]
+            a, b, c, d, e, f = helmert_matrix(HELMERT)
+            points = [[a * x + b * y + c, d * x + e * y + f] for x, y in points]
+            rings.append(points[::-1])
+        result[key] = rings
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Преобразование координат: перестановка осей, аффинное '
+                                                 'преобразование и преобразование Гельмерта одной матрицей и по '
+                                                 'этапам - время, совпадение результатов, ориентация колец и запись '
+                                                 'системы координат в заголовок FlatGeobuf')
+    parser.add_argument('--objects', type=int, default=20000, help='количество объектов недвижимости')
+    parser.add_argument('--contours', type=int, default=2, help='количество контуров объекта')
+    parser.add_argument('--points', type=int, default=60, help='количество точек контура')
+    parser.add_argument('--json', action='store_true', help='вывести результат в формате JSON')
+    args = parser.parse_args()
+    objects = make_objects(args.objects, args.contours, args.points)
+    transformer = CoordinateTransformer(True, AFFINE, HELMERT)
+    start = time.perf_counter()
+    transformed = [transformer(geometry) for _, geometry in objects]
+    composed_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = [stepwise(geometry) for _, geometry in objects]
+    stepwise_seconds = time.perf_counter() - start
+    errors = []
+    deviation = 0.0
+    for (record, geometry), result, other in zip(objects, transformed, expected):
+        for key, polys in geometry.items():
+            for ring, new_ring, other_ring in zip(polys, result[key], other[key]):
+                deviation = max(deviation, max(max(abs(x1 - x2), abs(y1 - y2))
+                                               for (x1, y1), (x2, y2) in zip(new_ring, other_ring)))
+                if (gauss_area(ring) > 0) != (gauss_area(new_ring) > 0):
+                    errors.append(record['parent_cad_number'] + ' ' + key + ': изменилась ориентация кольца')
+    if deviation > 1e-6:
+        errors.append('расхождение с поэтапным преобразованием ' + str(deviation) + ' м')
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'crs.fgb')
+        FgbWriter(path, [], crs_wkt=WKT).close()
+        with open(path, 'rb') as f:
+            if read_header(f)['crs_wkt'] != WKT:
+                errors.append('система координат не записана в заголовок FlatGeobuf')
+    points = transformer.stats['points']
+    report = {'objects': len(objects), 'points': points,
+              'composed_s': round(composed_seconds, 2), 'stepwise_s': round(stepwise_seconds, 2),
+              'composed_s_per_1m_points': round(composed_seconds / points * 1000000, 2),
+              'max_deviation_m': deviation, 'errors': errors}
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        print(f"объектов {report['objects']}, точек {report['points']}")
+        print(f"одной матрицей {report['composed_s']} с ({report['composed_s_per_1m_points']} с на 1 млн точек), "
+              f"по этапам {report['stepwise_s']} с")
+        print(f"наибольшее расхождение {report['max_deviation_m']} м")
+        for error in errors[:20]:
+            print('    ' + error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+from typing import List, Tuple, Dict, Any
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from writers import FlatGeobufWriter
+from fgb import read_header, iter_features, decode_properties, search_fgb
+from shp_writer import make_objects
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+
+def write(path: str, objects: List[Tuple[Dict[str, Any], Dict]], sort_memory_mb: float) -> float:
+    """
+    записывает объекты в файл FlatGeobuf, возвращает время записи, с
+    """
+    start = time.perf_counter()
+    writer = FlatGeobufWriter(path, sort_memory_mb=sort_memory_mb)
+    for record, geometry in objects:
+        writer.write(record, geometry)
+    writer.close()
+    return time.perf_counter() - start
+
+
+def check(path: str, expected_count: int, queries: int, rnd: random.Random) -> Tuple[List[str], float, float]:
+    """
+    проверяет файл: количество объектов, чтение атрибутов каждого объекта и совпадение поиска по R-дереву с полным
+    перебором охватов. Возвращает список расхождений, среднее время запроса по дереву и перебором, с
+    """
+    errors = []
+    with open(path, 'rb') as f:
+        header = read_header(f)
+    features = list(iter_features(path))
+    if header['features_count'] != expected_count or len(features) != expected_count:
+        errors.append('в файле ' + str(len(features)) + ' объектов вместо ' + str(expected_count))
+    if any('CadNumber' not in decode_properties(feature, header['columns']) for _, feature in features):
+        errors.append('не у всех объектов читается кадастровый номер')
+    boxes = [bbox for bbox, _ in features]
+    minx, miny, maxx, maxy = header['envelope']
+    index_time = brute_time = 0.0
+    for _ in range(queries):
+        width, height = (maxx - minx) * rnd.uniform(0.001, 0.2), (maxy - miny) * rnd.uniform(0.001, 0.2)
+        x, y = rnd.uniform(minx - width, maxx), rnd.uniform(miny - height, maxy)
+        rect = (x, y, x + width, y + height)
+        start = time.perf_counter()
+        found = search_fgb(path, rect)
+        index_time += time.perf_counter() - start
+        start = time.perf_counter()
+        expected = [i for i, box in enumerate(boxes)
+                    if box[0] <= rect[2] and box[2] >= rect[0] and box[1] <= rect[3] and box[3] >= rect[1]]
+        brute_time += time.perf_counter() - start
+        if found != expected:
+            errors.append('запрос ' + str(rect) + ': по дереву ' + str(len(found)) + ' объектов, перебором ' +
+                          str(len(expected)))
+    return errors, index_time / queries, brute_time / queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка записи FlatGeobuf: сортировка в памяти и внешняя сортировка '
+                                                 'дают одинаковый файл, поиск по R-дереву совпадает с полным '
+                                                 'перебором охватов объектов')
+    parser.add_argument('--objects', type=int, default=20000, help='количество объектов недвижимости')
+    parser.add_argument('--contours', type=int, default=2, help='количество контуров объекта')
+    parser.add_argument('--external-mb', type=float, default=1,
+                        help='объём сортировки в памяти для проверки внешней сортировки, МБ')
+    parser.add_argument('--queries', type=int, default=200, help='количество случайных запросов')
+    parser.add_argument('--json', action='store_true', help='вывести результат в формате JSON')
+    args = parser.parse_args()
+    rnd = random.Random(2)
+    objects = make_objects(args.objects, args.contours, 12)
+    report = {}
+    with tempfile.TemporaryDirectory() as folder:
+        paths = {}
+        for name, sort_memory_mb in (('в памяти', 1024), ('внешняя', args.external_mb)):
+            paths[name] = os.path.join(folder, 'objects.fgb' if name == 'в памяти' else 'external.fgb')
+            write_time = write(paths[name], objects, sort_memory_mb)
+            errors, index_time, brute_time = check(paths[name], args.objects * args.contours, args.queries, rnd)
+            report[name] = {'write_s': round(write_time, 2),
+                            'features_per_s': round(args.objects * args.contours / write_time),
+                            'fgb_bytes': os.path.getsize(paths[name]), 'query_ms': round(index_time * 1000, 3),
+                            'brute_force_ms': round(brute_time * 1000, 3), 'errors': errors}
+        with open(paths['в памяти'], 'rb') as a, open(paths['внешняя'], 'rb') as b:
+            # название слоя - имя файла, поэтому сравниваются объекты и дерево (всё после заголовка)
+            a_header, b_header = read_header(a), read_header(b)
+            a.seek(a_header['index_offset'])
+            b.seek(b_header['index_offset'])
+            if a.read() != b.read():
+                report['внешняя']['errors'].append('результат отличается от сортировки в памяти')
+    failed = any(data['errors'] for data in report.values())
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        for name, data in report.items():
+            print(f"сортировка {name}: запись {data['write_s']} с ({data['features_per_s']} объектов/с), файл "
+                  f"{data['fgb_bytes']} байт, запрос {data['query_ms']} мс (перебор {data['brute_force_ms']} мс)")
+            for error in data['errors']:
+                print('    ' + error)
+        print('файлы совпадают, дерево соответствует перебору' if not failed else 'найдены расхождения')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+from typing import Dict, List, Any, Optional
+import os
+import sys
+import json
+import argparse
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from shared_geometry import BlockPool, pack_geometry
+from shp_native import flatten_polygon
+from shp_writer import make_objects
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+
+def make_geometry(seed: int, contours: int, points: int) -> Dict[str, List[List[List[float]]]]:
+    """
+    строит контуры объекта (как процесс разбора выписки); seed - номер объекта, координаты зависят от него
+    """
+    _, geometry = make_objects(1, contours, points)[0]
+    return {key: [[[x + seed, y - seed] for x, y in ring] for ring in polys] for key, polys in geometry.items()}
+
+
+def by_pickle(seed: int, contours: int, points: int, block_name: Optional[str]) -> Dict[str, Any]:
+    return {'geometry': make_geometry(seed, contours, points)}
+
+
+def by_shared_memory(seed: int, contours: int, points: int, block_name: str) -> Dict[str, Any]:
+    geometry = make_geometry(seed, contours, points)
+    descriptor = pack_geometry(geometry, block_name)
+    return {'descriptor': descriptor, 'geometry': None if descriptor is not None else geometry}
+
+
+def run(worker, objects: int, contours: int, points: int, workers: int, blocks: Optional[BlockPool]) \
+        -> Dict[str, Any]:
+    """
+    получает контуры объектов из процессов с упреждением 2 * workers в исходном порядке и готовит их к записи так же,
+    как writers (shp_native.flatten_polygon); возвращает время, процессорное время основного процесса (вместе
+    с потоком, принимающим результаты из процессов) и контрольную сумму координат. Блок общей памяти выделяется
+    по размеру выписки с такими контурами (не меньше 24 байт текста xml на точку)
+    """
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    checksum = 0.0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        submitted = 0
+        while submitted < objects or pending:
+            while submitted < objects and len(pending) < 2 * workers:
+                block_name = blocks.acquire(24 * contours * points) if blocks is not None else None
+                pending.append((block_name, executor.submit(worker, submitted, contours, points, block_name)))
+                submitted += 1
+            block_name, future = pending.popleft()
+            result = future.result()
+            geometry = result['geometry']
+            if geometry is None:
+                geometry = blocks.unpack(result['descriptor'])
+            if block_name is not None:
+                blocks.release(block_name)
+            checksum += sum(sum(flatten_polygon(polys)[0][::2]) for polys in geometry.values())
+    return {'seconds': time.perf_counter() - start, 'cpu_seconds': time.process_time() - cpu_start,
+            'checksum': checksum}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Передача контуров объектов из процессов разбора: сериализация '
+                                                 'списков точек (pickle) и общая память (shared_geometry) - время, '
+                                                 'количество блоков общей памяти и совпадение координат')
+    parser.add_argument('--objects', type=int, default=5000, help='количество объектов недвижимости')
+    parser.add_argument('--contours', type=int, default=4, help='количество контуров объекта')
+    parser.add_argument('--points', type=int, default=2000, help='количество точек контура')
+    parser.add_argument('--workers', type=int, default=4, help='количество процессов')
+    parser.add_argument('--json', action='store_true', help='вывести результат в формате JSON')
+    args = parser.parse_args()
+    errors = []
+    geometry = make_geometry(7, args.contours, args.points)
+    blocks = BlockPool()
+    try:
+        block_name = blocks.acquire(24 * args.contours * args.points)
+        descriptor = pack_geometry(geometry, block_name)
+        expected = {key: [[tuple(point) for point in ring] for ring in polys] for key, polys in geometry.items()}
+        unpacked = blocks.unpack(descriptor) if descriptor is not None else None
+        if unpacked != expected:
+            errors.append('контуры, прочитанные из общей памяти, не совпадают с исходными')
+        elif any(flatten_polygon(unpacked[key]) != flatten_polygon(polys) for key, polys in geometry.items()):
+            errors.append('массивы координат для записи не совпадают с исходными')
+        blocks.release(block_name)
+        small = BlockPool(16)
+        try:
+            if pack_geometry(geometry, small.acquire()) is not None:
+                errors.append('контуры, не помещающиеся в блок, не переданы списками')
+        finally:
+            small.close()
+        pickled = run(by_pickle, args.objects, args.contours, args.points, args.workers, None)
+        shared = run(by_shared_memory, args.objects, args.contours, args.points, args.workers, blocks)
+        block_count = len(blocks)
+    finally:
+        blocks.close()
+    if abs(pickled['checksum'] - shared['checksum']) > 1e-6 * abs(pickled['checksum']):
+        errors.append('контрольные суммы координат не совпадают')
+    points = args.objects * args.contours * args.points
+    report = {'objects': args.objects, 'points': points, 'workers': args.workers,
+              'pickle_s': round(pickled['seconds'], 2), 'pickle_cpu_s': round(pickled['cpu_seconds'], 2),
+              'shared_s': round(shared['seconds'], 2), 'shared_cpu_s': round(shared['cpu_seconds'], 2),
+              'blocks': block_count, 'errors': errors}
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        print(f"объектов {report['objects']}, точек {report['points']}, процессов {report['workers']}")
+        print(f"pickle: {report['pickle_s']} с (процессорное время основного процесса {report['pickle_cpu_s']} с)")
+        print(f"общая память: {report['shared_s']} с (процессорное время основного процесса "
+              f"{report['shared_cpu_s']} с), блоков {report['blocks']}")
+        for error in errors[:20]:
+            print('    ' + error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
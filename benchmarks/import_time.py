@@ -0,0 +1,87 @@
+from typing import Dict, List, Tuple
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# папка с модулями программы
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# точки входа программы и тяжёлые библиотеки, которые не должны загружаться при их импорте
+ENTRY_POINTS = {'cli': ('openpyxl', 'shapefile', 'PyQt5', 'zipfile', 'parse_pool', 'ledger'),
+                'converter': ('openpyxl', 'shapefile', 'PyQt5', 'zipfile', 'parse_pool'),
+                'service': ('openpyxl', 'shapefile', 'PyQt5', 'zipfile', 'parse_pool'),
+                'main': ('openpyxl', 'shapefile', 'zipfile', 'parse_pool')}
+
+
+def measure(module: str) -> Tuple[int, Dict[str, int]]:
+    """
+    импортирует модуль в новом процессе интерпретатора с ключом -X importtime и возвращает общее время импорта модуля
+    (мкс) и время импорта каждого загруженного при этом модуля верхнего уровня (мкс, с учётом вложенных импортов)
+    :param module: str
+    :return: tuple
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module], cwd=PACKAGE_DIR,
+                            env={**os.environ, 'QT_QPA_PLATFORM': 'offscreen'}, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    total = 0
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = max(modules.get(name.strip(), 0), int(cumulative))
+        if name.rstrip() == ' ' + module:
+            total = int(cumulative)
+    return total, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Время запуска (импорта) точек входа программы по данным '
+                                                 'python -X importtime')
+    parser.add_argument('modules', nargs='*', default=list(ENTRY_POINTS), help='модули для измерения')
+    parser.add_argument('--repeat', type=int, default=7, help='количество запусков каждого модуля')
+    parser.add_argument('--top', type=int, default=5, help='сколько самых долгих импортов показать')
+    parser.add_argument('--json', action='store_true', help='вывести результат в формате JSON')
+    args = parser.parse_args()
+    report = {}
+    failed = False
+    for module in args.modules:
+        runs: List[int] = []
+        modules = {}
+        for _ in range(args.repeat):
+            total, modules = measure(module)
+            runs.append(total)
+        loaded_heavy = [name for name in ENTRY_POINTS.get(module, ()) if name in modules]
+        failed = failed or bool(loaded_heavy)
+        slowest = sorted(((time, name) for name, time in modules.items() if name != module), reverse=True)
+        report[module] = {'median_ms': round(statistics.median(runs) / 1000, 1),
+                          'min_ms': round(min(runs) / 1000, 1),
+                          'slowest': [[name, round(time / 1000, 1)] for time, name in slowest[:args.top]],
+                          'unexpected_heavy_imports': loaded_heavy}
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        for module, data in report.items():
+            print(f"{module}: медиана {data['median_ms']} мс, минимум {data['min_ms']} мс")
+            for name, time in data['slowest']:
+                print(f'    {name}: {time} мс')
+            if data['unexpected_heavy_imports']:
+                print('    загружены лишние библиотеки: ' + ', '.join(data['unexpected_heavy_imports']))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
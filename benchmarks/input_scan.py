@@ -0,0 +1,147 @@
+from typing import List
+import os
+import sys
+import json
+import heapq
+import random
+import argparse
+import tempfile
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from scanner import scan_inputs, schedule, size_batches, SCHEDULES
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+
+def make_tree(folder: str, files: int, folders: int) -> int:
+    """
+    создаёт папку с выписками во вложенных папках (folders папок в два уровня) и посторонними файлами; возвращает
+    количество выписок
+    """
+    count = 0
+    for i in range(files):
+        sub = os.path.join(folder, 'region_' + str(i % folders), 'part_' + str(i % 3)) if i % 4 else folder
+        os.makedirs(sub, exist_ok=True)
+        name = 'extract_%06d' % i + ('.xml' if i % 10 else '.xml.sig')
+        with open(os.path.join(sub, name), 'wb') as f:
+            f.write(b'<' * (i % 97))
+        count += name.endswith('.xml')
+    return count
+
+
+def listdir_scan(folder: str) -> List:
+    """
+    прежний способ: os.listdir по папкам и отдельный запрос размера каждого файла
+    """
+    result = []
+    for root, _, names in os.walk(folder):
+        for name in names:
+            if name.endswith('.xml'):
+                path = os.path.join(root, name)
+                result.append((os.path.relpath(path, folder), os.path.getsize(path)))
+    return result
+
+
+def simulate(sizes: List[int], workers: int, parse_mb_s: float, write_share: float) -> float:
+    """
+    моделирует разбор выписок в workers процессах (см. parse_pool.ParsePool): выписки передаются процессам
+    с упреждением не более 2 * workers, результаты забираются основным процессом в исходном порядке и записываются
+    (время записи - write_share от времени разбора). Возвращает время конвертирования, с
+    """
+    free = [0.0] * workers
+    pending = deque()
+    now = 0.0
+    files = iter(sizes)
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < 2 * workers:
+            size = next(files, None)
+            if size is None:
+                exhausted = True
+                break
+            finish = max(heapq.heappop(free), now) + size / parse_mb_s / 1024 / 1024
+            heapq.heappush(free, finish)
+            pending.append((finish, size))
+        if not pending:
+            return now
+        finish, size = pending.popleft()
+        now = max(now, finish) + write_share * size / parse_mb_s / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Поиск выписок во вложенных папках одним проходом os.scandir '
+                                                 'и порядок обработки по размерам файлов (моделирование разбора '
+                                                 'в нескольких процессах)')
+    parser.add_argument('--files', type=int, default=20000, help='количество файлов в папке для проверки поиска')
+    parser.add_argument('--folders', type=int, default=40, help='количество вложенных папок')
+    parser.add_argument('--extracts', type=int, default=5000, help='количество выписок в модели разбора')
+    parser.add_argument('--workers', type=int, default=8, help='количество процессов разбора в модели')
+    parser.add_argument('--parse-mb-s', type=float, default=20, help='скорость разбора, МБ/с')
+    parser.add_argument('--write-share', type=float, default=0.1,
+                        help='время записи объекта в основном процессе относительно времени разбора')
+    parser.add_argument('--json', action='store_true', help='вывести результат в формате JSON')
+    args = parser.parse_args()
+    errors = []
+    with tempfile.TemporaryDirectory() as folder:
+        expected = make_tree(folder, args.files, args.folders)
+        start = time.perf_counter()
+        old = listdir_scan(folder)
+        listdir_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        new = scan_inputs(folder, recursive=True)
+        scandir_seconds = time.perf_counter() - start
+        if len(new) != expected or sorted(new) != sorted(old):
+            errors.append('найдено выписок ' + str(len(new)) + ' из ' + str(expected))
+        if len(scan_inputs(folder)) != sum(1 for name in os.listdir(folder) if name.endswith('.xml')):
+            errors.append('без просмотра вложенных папок найдены не только выписки верхней папки')
+        excluded = scan_inputs(folder, recursive=True, exclude='region_0')
+        if any(path.startswith('region_0' + os.sep) for path, _ in excluded):
+            errors.append('не исключена папка region_0')
+        if scan_inputs(folder, recursive=True, include='region_1/*/*.xml') != \
+                [item for item in new if item[0].startswith(os.path.join('region_1', ''))]:
+            errors.append('маска с путём отбирает не те выписки')
+    # размеры выписок: в основном небольшие, несколько процентов - крупные (земельные участки с тысячами контуров)
+    rnd = random.Random(1)
+    files = [('extract_%06d.xml' % i, int(rnd.lognormvariate(11, 1)) if rnd.random() > 0.02
+              else int(rnd.uniform(20, 80) * 1024 * 1024)) for i in range(args.extracts)]
+    rnd.shuffle(files)
+    sizes = [size for _, size in files]
+    lower_bound = max(sum(sizes) / args.workers, max(sizes)) / args.parse_mb_s / 1024 / 1024
+    makespan = {}
+    for order in SCHEDULES:
+        ordered = schedule(files, order, args.workers)
+        if sorted(ordered) != sorted(files) or ordered != schedule(files, order, args.workers):
+            errors.append('порядок ' + repr(order) + ' теряет выписки или не повторяется')
+        makespan[order or 'folder'] = round(simulate([size for _, size in ordered], args.workers,
+                                                     args.parse_mb_s, args.write_share), 1)
+    batches = size_batches(files, 10)
+    loads = [sum(size for _, size in batch) for batch in batches]
+    report = {'files': args.files, 'extracts_found': len(new), 'listdir_getsize_s': round(listdir_seconds, 3),
+              'scandir_s': round(scandir_seconds, 3), 'workers': args.workers,
+              'lower_bound_s': round(lower_bound, 1), 'makespan_s': makespan,
+              'size_batches_spread': round(max(loads) / min(loads), 3), 'errors': errors}
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        print(f"файлов {report['files']}, найдено выписок {report['extracts_found']}: listdir + getsize "
+              f"{report['listdir_getsize_s']} с, scandir {report['scandir_s']} с")
+        print(f"модель разбора в {args.workers} процессах (нижняя граница {report['lower_bound_s']} с): " +
+              ', '.join(f'{key} - {value} с' for key, value in makespan.items()))
+        print(f"отношение наибольшего пакета к наименьшему при делении по размеру: {report['size_batches_spread']}")
+        for error in errors:
+            print('    ' + error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+from typing import Dict, List, Any
+import os
+import sys
+import json
+import argparse
+import tempfile
+import time
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from logic import DEFAULT_SETTINGS
+from converter import Converter
+from ledger import run_node, merge_partials, WorkLedger
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+
+def node(settings: Dict[str, Any], crash_after: int) -> None:
+    """
+    процесс-узел; при crash_after > 0 узел аварийно завершается после обработки crash_after выписок первого пакета
+    """
+    def progress(done: int, total: int) -> None:
+        if crash_after and done == crash_after:
+            os._exit(1)
+    run_node(settings, None, progress)
+
+
+def read_xlsx(paths: List[str]) -> List[List[Any]]:
+    from openpyxl import load_workbook
+    rows = []
+    for path in paths:
+        wb = load_workbook(path, read_only=True)
+        for ws in wb.worksheets:
+            rows.extend([ws.title, *values] for values in ws.iter_rows(values_only=True))
+        wb.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Распределённое конвертирование: несколько процессов-узлов с общей '
+                                                 'папкой учёта работ, аварийное завершение одного узла, объединение '
+                                                 'частичных результатов и сравнение с конвертированием одним процессом')
+    parser.add_argument('--in', dest='folder_in', required=True, help='папка с выписками из ЕГРН')
+    parser.add_argument('--nodes', type=int, default=3, help='количество узлов')
+    parser.add_argument('--batch-size', type=int, default=4, help='количество выписок в пакете')
+    parser.add_argument('--lease-seconds', type=float, default=2, help='срок аренды пакета, сек.')
+    parser.add_argument('--crash-after', type=int, default=2,
+                        help='первый узел завершается аварийно после обработки указанного количества выписок '
+                             '(0 - без сбоя)')
+    parser.add_argument('--json', action='store_true', help='вывести результат в формате JSON')
+    args = parser.parse_args()
+    folder_in = os.path.realpath(args.folder_in)
+    os.chdir(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))  # классификаторы *.csv
+    errors = []
+    with tempfile.TemporaryDirectory() as folder:
+        settings = {**DEFAULT_SETTINGS, 'folder_in_xml': folder_in, 'create_esri_shape': True, 'create_xlsx': True,
+                    'create_csv': True, 'checkpoint_minutes': 0, 'ledger_folder': os.path.join(folder, 'ledger'),
+                    'ledger_batch_size': args.batch_size, 'ledger_lease_seconds': args.lease_seconds}
+        os.makedirs(os.path.join(folder, 'reference'))
+        names = sorted(name for name in os.listdir(folder_in) if name.endswith('.xml'))
+        start = time.perf_counter()
+        reference = Converter({**settings, 'folder_out_xml': os.path.join(folder, 'reference')}).convert(names)
+        single_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        processes = [multiprocessing.Process(target=node, args=({**settings, 'ledger_node_id': 'node-' + str(i)},
+                                                                args.crash_after if i == 0 else 0))
+                     for i in range(args.nodes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        nodes_seconds = time.perf_counter() - start
+        os.makedirs(os.path.join(folder, 'merged'))
+        merged = merge_partials({**settings, 'folder_out_xml': os.path.join(folder, 'merged')})
+        ledger = WorkLedger(settings['ledger_folder'])
+        records = [ledger.done_record(ledger.batch_name(index)) for index in range(len(ledger.load_plan()))]
+        reclaimed = [record for record in records if record['generation'] > 1]
+        if args.crash_after and processes[0].exitcode != 1:
+            errors.append('узел node-0 не завершился аварийно: код ' + str(processes[0].exitcode))
+        if args.crash_after and not reclaimed:
+            errors.append('пакет аварийно завершившегося узла не захвачен другим узлом')
+        if merged['successful'] != reference['successful']:
+            errors.append('обработано выписок ' + str(merged['successful']) + ', одним процессом ' +
+                          str(reference['successful']))
+        for ext in ('.shp', '.shx', '.dbf', '.csv'):
+            source_ext = '.csv' if ext == '.csv' else '.shp'
+            expected, actual = [os.path.splitext(next(path for path in outputs if path.endswith(source_ext)))[0] + ext
+                                for outputs in (reference['outputs'], merged['outputs'])]
+            with open(expected, 'rb') as f1, open(actual, 'rb') as f2:
+                # при дописывании в .dbf добавляется необязательный признак конца файла 0x1A
+                if f1.read().rstrip(b'\x1a') != f2.read().rstrip(b'\x1a'):
+                    errors.append('файл ' + ext + ' не совпадает с результатом конвертирования одним процессом')
+        if read_xlsx([p for p in reference['outputs'] if p.endswith('.xlsx')]) != \
+                read_xlsx([p for p in merged['outputs'] if p.endswith('.xlsx')]):
+            errors.append('таблица xlsx не совпадает с результатом конвертирования одним процессом')
+    report = {'files': len(names), 'nodes': args.nodes, 'batches': len(records),
+              'batches_by_node': {node_id: sum(1 for record in records if record['node_id'] == node_id)
+                                  for node_id in sorted(set(record['node_id'] for record in records))},
+              'reclaimed_batches': len(reclaimed), 'single_process_s': round(single_seconds, 2),
+              'nodes_s': round(nodes_seconds, 2), 'errors': errors}
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        print(f"выписок {report['files']}, узлов {report['nodes']}, пакетов {report['batches']}, "
+              f"захвачено после сбоя {report['reclaimed_batches']}")
+        print('пакетов по узлам: ' + ', '.join(f'{key} - {value}' for key, value in report['batches_by_node'].items()))
+        print(f"одним процессом {report['single_process_s']} с, узлами {report['nodes_s']} с (включая ожидание "
+              f"истечения аренды)")
+        for error in errors:
+            print('    ' + error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+from typing import List, Tuple
+import os
+import sys
+import json
+import random
+import argparse
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from links import RelationIndex, split_cad_numbers
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+
+def make_extracts(parcels: int, buildings: int, rooms: int) -> List[Tuple[str, str, str]]:
+    """
+    возвращает данные выписок набора: кадастровый номер, вид объекта и кадастровые номера расположенных в его пределах
+    объектов через запятую (как AbstractRealEstateObject.estate_objects). На каждом участке - buildings зданий,
+    в каждом здании - rooms помещений; выписки есть на все участки и здания, но не на помещения
+    """
+    extracts = []
+    for i in range(parcels):
+        parcel = '40:01:' + str(i // 1000).zfill(6) + ':' + str(i)
+        building_numbers = ['40:01:' + str(i // 1000).zfill(6) + ':' + str(parcels + i * buildings + j)
+                            for j in range(buildings)]
+        extracts.append((parcel, 'Земельные участки', ', '.join(building_numbers)))
+        for building in building_numbers:
+            extracts.append((building, 'Здания', ', '.join(building + ':' + str(k) for k in range(rooms))))
+    return extracts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Индекс связей объектов недвижимости: время построения, время поиска '
+                                                 'участка здания по индексу и перебором строк estate_objects')
+    parser.add_argument('--parcels', type=int, default=20000, help='количество земельных участков')
+    parser.add_argument('--buildings', type=int, default=3, help='количество зданий на участке')
+    parser.add_argument('--rooms', type=int, default=5, help='количество помещений в здании')
+    parser.add_argument('--queries', type=int, default=200, help='количество запросов')
+    parser.add_argument('--json', action='store_true', help='вывести результат в формате JSON')
+    args = parser.parse_args()
+    rnd = random.Random(3)
+    extracts = make_extracts(args.parcels, args.buildings, args.rooms)
+    start = time.perf_counter()
+    index = RelationIndex()
+    for cad_number, kind, estate_objects in extracts:
+        index.add(cad_number, kind, estate_objects, [])
+    build_seconds = time.perf_counter() - start
+    buildings = [cad_number for cad_number, kind, _ in extracts if kind == 'Здания']
+    queries = [rnd.choice(buildings) for _ in range(args.queries)]
+    errors = []
+    start = time.perf_counter()
+    found = [index.containers(building) for building in queries]
+    index_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = [[cad_number for cad_number, _, estate_objects in extracts
+                 if building in split_cad_numbers(estate_objects)] for building in queries]
+    scan_seconds = time.perf_counter() - start
+    if found != expected:
+        errors.append('поиск по индексу не совпадает с перебором')
+    missing = index.missing()
+    if len(missing) != len(buildings) * args.rooms:
+        errors.append('объектов без выписок ' + str(len(missing)) + ' вместо ' + str(len(buildings) * args.rooms))
+    report = {'extracts': len(extracts), 'links': sum(1 for _ in index.links()), 'build_s': round(build_seconds, 2),
+              'index_query_us': round(index_seconds / args.queries * 1e6, 2),
+              'scan_query_ms': round(scan_seconds / args.queries * 1000, 2), 'missing': len(missing),
+              'errors': errors}
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        print(f"выписок {report['extracts']}, связей {report['links']}, построение индекса {report['build_s']} с")
+        print(f"участок здания: по индексу {report['index_query_us']} мкс, перебором {report['scan_query_ms']} мс")
+        print(f"объектов без выписок в наборе: {report['missing']}")
+        for error in errors:
+            print('    ' + error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
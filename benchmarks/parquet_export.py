@@ -0,0 +1,93 @@
+from typing import List, Tuple, Dict, Any
+import os
+import sys
+import json
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from writers import ParquetWriter, XlsxWriter
+from shp_writer import make_objects
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+
+def write(writer: Any, objects: List[Tuple[Dict[str, Any], Dict]], xlsx: bool = False) -> Tuple[float, float]:
+    """
+    записывает объекты, возвращает время записи, с, и наибольший объём памяти, выделенной при записи, МБ
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    for record, geometry in objects:
+        if xlsx:
+            writer.write(record)
+        else:
+            writer.write(record, geometry)
+    writer.close()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Запись объектов в файл Parquet и таблицу xlsx: скорость записи, '
+                                                 'память, время загрузки в pandas и типы столбцов')
+    parser.add_argument('--objects', type=int, default=20000, help='количество объектов недвижимости')
+    parser.add_argument('--row-group-rows', type=int, default=10000, help='количество строк в группе строк Parquet')
+    parser.add_argument('--no-xlsx', action='store_true', help='не сравнивать с таблицей xlsx')
+    parser.add_argument('--json', action='store_true', help='вывести результат в формате JSON')
+    args = parser.parse_args()
+    try:
+        import pandas
+    except ImportError:
+        print('Для сравнения необходимы библиотеки pandas и pyarrow', file=sys.stderr)
+        sys.exit(2)
+    objects = make_objects(args.objects, 2, 12)
+    report = {}
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'objects.parquet')
+        seconds, peak = write(ParquetWriter(path, row_group_rows=args.row_group_rows), objects)
+        start = time.perf_counter()
+        frame = pandas.read_parquet(path)
+        load_seconds = time.perf_counter() - start
+        report['parquet'] = {'write_s': round(seconds, 2), 'write_peak_mb': round(peak, 1),
+                             'file_mb': round(os.path.getsize(path) / 1024 / 1024, 1),
+                             'pandas_load_s': round(load_seconds, 3),
+                             'dtypes': {key: str(frame[key].dtype) for key in
+                                        ('area', 'cadastral_cost', 'date_of_cadastral_reg', 'extract_date')}}
+        if not args.no_xlsx:
+            path = os.path.join(folder, 'objects.xlsx')
+            seconds, peak = write(XlsxWriter(path), objects, xlsx=True)
+            start = time.perf_counter()
+            frame = pandas.read_excel(path)
+            load_seconds = time.perf_counter() - start
+            report['xlsx'] = {'write_s': round(seconds, 2), 'write_peak_mb': round(peak, 1),
+                              'file_mb': round(os.path.getsize(path) / 1024 / 1024, 1),
+                              'pandas_load_s': round(load_seconds, 3),
+                              'dtypes': {title: str(frame[title].dtype) for title in
+                                         ('Площадь, м2', 'Кадастровая стоимость, руб.')}}
+    # площадь и кадастровая стоимость - числа, даты - даты (в pandas даты из Parquet - объекты datetime.date)
+    failed = any(report['parquet']['dtypes'][key] != 'float64' for key in ('area', 'cadastral_cost'))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        for name, data in report.items():
+            print(f"{name}: запись {data['write_s']} с (пик памяти {data['write_peak_mb']} МБ), файл "
+                  f"{data['file_mb']} МБ, загрузка в pandas {data['pandas_load_s']} с, типы: {data['dtypes']}")
+        print('числовые столбцы Parquet записаны числами' if not failed else 'числовые столбцы записаны не числами')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
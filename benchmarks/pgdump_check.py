@@ -0,0 +1,116 @@
+from typing import List, Tuple, Dict, Any
+import os
+import sys
+import json
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from writers import PostgisDumpWriter, number_from_string, date_from_string
+from pgdump import read_dump, column_types, parse_value, decode_ewkb
+from shp_native import flatten_polygon
+from shp_writer import make_objects
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# значения с символами, которые экранируются в текстовом формате COPY и в массивах text[]
+SPECIAL_TEXT = 'Табуляция\tперевод строки\nвозврат каретки\rобратная косая черта \\N "кавычки" {скобки}, запятая'
+
+
+def write(path: str, objects: List[Tuple[Dict[str, Any], Dict]], srid: int, append: bool = False) -> float:
+    """
+    записывает объекты в дамп, возвращает время записи, с
+    """
+    start = time.perf_counter()
+    writer = PostgisDumpWriter(path, append, srid=srid)
+    for record, geometry in objects:
+        writer.write(record, geometry)
+    writer.close()
+    return time.perf_counter() - start
+
+
+def expected_value(key: str, value: Any) -> Any:
+    if key in ('area', 'cadastral_cost'):
+        return number_from_string(value)
+    if key in ('date_of_cadastral_reg', 'extract_date'):
+        return date_from_string(value).isoformat() if value else None
+    if key == 'entry_parcels':
+        return list(value)
+    return value
+
+
+def check(path: str, objects: List[Tuple[Dict[str, Any], Dict]], srid: int) -> List[str]:
+    """
+    читает дамп обратно и сравнивает значения столбцов и контуры с исходными объектами, возвращает список расхождений
+    """
+    errors = []
+    types = column_types(path)
+    columns, rows = read_dump(path)
+    count = 0
+    for row, (record, geometry) in zip(rows, objects):
+        count += 1
+        values = {name: parse_value(value, types[name]) for name, value in zip(columns, row)}
+        for key in columns[:-1]:
+            if values[key] != expected_value(key, record[key]):
+                errors.append(record['parent_cad_number'] + ': не совпадает значение ' + key)
+        row_srid, polygons = decode_ewkb(bytes.fromhex(values['geom']))
+        expected = []
+        for polys in geometry.values():
+            coords, starts = flatten_polygon(polys)
+            expected.append([list(zip(coords[2 * start:2 * end:2], coords[2 * start + 1:2 * end:2]))
+                             for start, end in zip(starts, starts[1:] + [len(coords) // 2])])
+        if row_srid != srid or polygons != expected:
+            errors.append(record['parent_cad_number'] + ': не совпадает геометрия')
+    for _ in rows:
+        count += 1
+    if count != len(objects):
+        errors.append('в дампе ' + str(count) + ' строк вместо ' + str(len(objects)))
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка дампа для PostGIS без базы данных: строки COPY читаются '
+                                                 'обратно и сравниваются с исходными объектами, дозапись после '
+                                                 'сохранения состояния даёт тот же дамп, что и запись за один раз')
+    parser.add_argument('--objects', type=int, default=20000, help='количество объектов недвижимости')
+    parser.add_argument('--srid', type=int, default=0, help='код системы координат геометрии')
+    parser.add_argument('--json', action='store_true', help='вывести результат в формате JSON')
+    args = parser.parse_args()
+    objects = make_objects(args.objects, 2, 12)
+    objects[0][0].update({'address': SPECIAL_TEXT, 'entry_parcels': [SPECIAL_TEXT, '40:01:000001:1'],
+                          'special_notes': '', 'cadastral_cost': ''})
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'objects.sql')
+        seconds = write(path, objects, args.srid)
+        errors = check(path, objects, args.srid)
+        # запись двумя частями, как при продолжении конвертирования после сохранения состояния
+        appended_path = os.path.join(folder, 'appended.sql')
+        half = len(objects) // 2
+        write(appended_path, objects[:half], args.srid)
+        write(appended_path, objects[half:], args.srid, append=True)
+        with open(path, 'rb') as a, open(appended_path, 'rb') as b:
+            if a.read() != b.read():
+                errors.append('дозапись в дамп даёт другой результат')
+        report = {'write_s': round(seconds, 2), 'objects_per_s': round(args.objects / seconds),
+                  'dump_mb': round(os.path.getsize(path) / 1024 / 1024, 1), 'errors': errors}
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        print(f"запись {report['write_s']} с ({report['objects_per_s']} объектов/с), дамп {report['dump_mb']} МБ")
+        for error in errors[:20]:
+            print('    ' + error)
+        print('дамп читается без расхождений' if not errors else 'найдены расхождения: ' + str(len(errors)))
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+from typing import Dict, List, Any
+import os
+import re
+import sys
+import json
+import random
+import argparse
+import tempfile
+import time
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from logic import DEFAULT_SETTINGS
+from real_estate import AbstractRealEstateObject, RECORD_FIELDS
+from scanner import scan_inputs
+from validation import validate_extract, add_to_summary, format_summary, RULES
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# разделы, которые удаляются из выписок: последние элементы путей обязательных разделов всех схем
+SECTIONS = sorted({rule[2].rsplit('/', 1)[-1] for rules in RULES.values() for rule in rules})
+
+
+def make_variants(data: bytes, rnd: random.Random, count: int) -> List[bytes]:
+    """
+    возвращает исходную выписку и count её повреждённых вариантов: файл, обрезанный в случайном месте, выписку
+    без одного из обязательных разделов, с пустым элементом, с неизвестным корневым элементом
+    """
+    text = data.decode('utf-8')
+    variants = [data]
+    present = [tag for tag in SECTIONS if re.search(r'<(?:\w+:)?' + tag + r'[\s/>]', text)]
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            variants.append(data[:rnd.randrange(1, len(data))])
+        elif kind == 1 and present:
+            tag = rnd.choice(present)
+            pattern = r'<((?:\w+:)?' + tag + r')(\s[^>]*)?(/>|>.*?</\1>)'
+            variants.append(re.sub(pattern, '', text, count=1, flags=re.S).encode('utf-8'))
+        elif kind == 2 and present:
+            tag = rnd.choice(present)
+            pattern = r'<((?:\w+:)?' + tag + r')(\s[^>]*)?>[^<]*</\1>'
+            variants.append(re.sub(pattern, r'<\1\2/>', text, count=1).encode('utf-8'))
+        else:
+            root_tag = re.search(r'<([\w:]+)[\s>]', text).group(1)
+            variants.append(text.replace('<' + root_tag, '<unknown_' + root_tag, 1)
+                            .replace('</' + root_tag + '>', '</unknown_' + root_tag + '>').encode('utf-8'))
+    return variants
+
+
+def full_parse(path: str, settings: Dict[str, Any]) -> str:
+    """
+    результат полного разбора выписки (все поля и контуры, как при записи шейп-файла): 'ok', 'unknown' (схема
+    не определена) или 'fail' (ошибка разбора)
+    """
+    try:
+        real_estate_object = AbstractRealEstateObject.create_a_real_estate_object(path, settings)
+        if real_estate_object is None:
+            return 'unknown'
+        real_estate_object.get_record(list(RECORD_FIELDS))
+        real_estate_object.geometry
+    except Exception:
+        return 'fail'
+    return 'ok'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Предварительная проверка структуры выписок: выписки с повреждениями '
+                                                 '(обрезанный файл, нет обязательного раздела, пустой элемент, '
+                                                 'неизвестная схема) проверяются без разбора в дерево и полным '
+                                                 'разбором')
+    parser.add_argument('--in', dest='folder_in', required=True, help='папка с выписками из ЕГРН')
+    parser.add_argument('--variants', type=int, default=8, help='количество повреждённых вариантов каждой выписки')
+    parser.add_argument('--workers', type=int, default=4, help='количество процессов проверки')
+    parser.add_argument('--json', action='store_true', help='вывести результат в формате JSON')
+    args = parser.parse_args()
+    folder_in = os.path.realpath(args.folder_in)
+    os.chdir(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))  # классификаторы *.csv
+    settings = dict(DEFAULT_SETTINGS)
+    rnd = random.Random(1)
+    errors = []
+    with tempfile.TemporaryDirectory() as folder:
+        paths = []
+        for name, _ in scan_inputs(folder_in):
+            with open(os.path.join(folder_in, name), 'rb') as f:
+                data = f.read()
+            for i, variant in enumerate(make_variants(data, rnd, args.variants)):
+                paths.append(os.path.join(folder, '%d_' % i + os.path.basename(name)))
+                with open(paths[-1], 'wb') as f:
+                    f.write(variant)
+        start = time.perf_counter()
+        verdicts = [full_parse(path, settings) for path in paths]
+        full_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        results = [validate_extract(path, RECORD_FIELDS) for path in paths]
+        validate_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            parallel = list(executor.map(partial(validate_extract, fields=RECORD_FIELDS), paths,
+                                         chunksize=max(1, len(paths) // (args.workers * 4))))
+        parallel_seconds = time.perf_counter() - start
+    if parallel != results:
+        errors.append('результаты проверки в процессах не совпадают с проверкой в основном процессе')
+    summary = {}
+    for path, verdict, (schema, root_tag, problem, error) in zip(paths, verdicts, results):
+        add_to_summary(summary, schema, root_tag, problem)
+        if problem and verdict == 'ok':
+            errors.append(os.path.basename(path) + ': выписка разбирается, но отклонена проверкой (' + error + ')')
+        if (problem == 'unknown_schema') != (verdict == 'unknown'):
+            errors.append(os.path.basename(path) + ': схема выписки определена не так, как при полном разборе')
+    failing = sum(1 for verdict in verdicts if verdict != 'ok')
+    rejected = sum(1 for verdict, result in zip(verdicts, results) if verdict != 'ok' and result[2])
+    report = {'files': len(paths), 'failing_full_parse': failing, 'rejected': rejected,
+              'detected_share': round(rejected / max(1, failing), 3), 'full_parse_s': round(full_seconds, 3),
+              'validate_s': round(validate_seconds, 3), 'validate_parallel_s': round(parallel_seconds, 3),
+              'workers': args.workers, 'summary': summary, 'errors': errors}
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        print(f"файлов {report['files']}, полный разбор завершается ошибкой для {failing}, из них отклонено проверкой "
+              f"{rejected} ({round(report['detected_share'] * 100, 1)} %)")
+        print(f"полный разбор {report['full_parse_s']} с, проверка {report['validate_s']} с, проверка "
+              f"в {args.workers} процессах {report['validate_parallel_s']} с")
+        for line in format_summary(summary):
+            print(line)
+        for error in errors:
+            print('    ' + error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+from typing import List, Tuple
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from writers import ShapeWriter, SHP_BACKENDS
+from qix import QIX_EXT, search_qix, read_shape_bboxes
+from shp_writer import make_objects
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+
+def check(path: str, queries: int, rnd: random.Random) -> Tuple[List[str], float, float]:
+    """
+    сравнивает результаты поиска по индексу .qix с полным перебором охватов объектов шейп-файла. Возвращает
+    список расхождений, среднее время запроса по индексу и перебором, с
+    """
+    bboxes, nulls = read_shape_bboxes(path + '.shp')
+    skipped = set(nulls)
+    boxes = [tuple(bboxes[4 * i:4 * i + 4]) for i in range(len(bboxes) // 4)]
+    valid = [i for i in range(len(boxes)) if i not in skipped]
+    errors = []
+    everything = search_qix(path + QIX_EXT, (-1e300, -1e300, 1e300, 1e300))
+    if everything != valid:
+        errors.append('в индексе не ровно один раз каждый непустой объект шейп-файла')
+    minx, miny = min(boxes[i][0] for i in valid), min(boxes[i][1] for i in valid)
+    maxx, maxy = max(boxes[i][2] for i in valid), max(boxes[i][3] for i in valid)
+    index_time = brute_time = 0.0
+    for _ in range(queries):
+        width, height = (maxx - minx) * rnd.uniform(0.001, 0.2), (maxy - miny) * rnd.uniform(0.001, 0.2)
+        x, y = rnd.uniform(minx - width, maxx), rnd.uniform(miny - height, maxy)
+        rect = (x, y, x + width, y + height)
+        start = time.perf_counter()
+        found = [i for i in search_qix(path + QIX_EXT, rect)
+                 if boxes[i][0] <= rect[2] and boxes[i][2] >= rect[0] and boxes[i][1] <= rect[3]
+                 and boxes[i][3] >= rect[1]]
+        index_time += time.perf_counter() - start
+        start = time.perf_counter()
+        expected = [i for i in valid
+                    if boxes[i][0] <= rect[2] and boxes[i][2] >= rect[0] and boxes[i][1] <= rect[3]
+                    and boxes[i][3] >= rect[1]]
+        brute_time += time.perf_counter() - start
+        if found != expected:
+            errors.append('запрос ' + str(rect) + ': по индексу ' + str(len(found)) + ' объектов, перебором ' +
+                          str(len(expected)))
+    return errors, index_time / queries, brute_time / queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка пространственного индекса .qix шейп-файла: поиск по '
+                                                 'индексу сравнивается с полным перебором охватов объектов')
+    parser.add_argument('--objects', type=int, default=20000, help='количество объектов недвижимости')
+    parser.add_argument('--contours', type=int, default=2, help='количество контуров объекта')
+    parser.add_argument('--queries', type=int, default=200, help='количество случайных запросов')
+    parser.add_argument('--json', action='store_true', help='вывести результат в формате JSON')
+    args = parser.parse_args()
+    rnd = random.Random(2)
+    objects = make_objects(args.objects, args.contours, 12)
+    report = {}
+    with tempfile.TemporaryDirectory() as folder:
+        cases = {backend: [(False, objects)] for backend in SHP_BACKENDS}
+        # добавление с заменой: половина объектов записывается повторно, прежние записи помечаются удалёнными
+        cases['native append'] = [(False, objects), (True, objects[::2])]
+        for name, runs in cases.items():
+            path = os.path.join(folder, name.replace(' ', '_'))
+            start = time.perf_counter()
+            for append, part in runs:
+                writer = ShapeWriter(path, append, replace_existing=append, backend=name.split()[0],
+                                     spatial_index=True)
+                for record, geometry in part:
+                    writer.write(record, {key: [[list(point) for point in ring] for ring in polys]
+                                          for key, polys in geometry.items()})
+                writer.close()
+            write_time = time.perf_counter() - start
+            errors, index_time, brute_time = check(path, args.queries, rnd)
+            report[name] = {'write_s': round(write_time, 2), 'qix_bytes': os.path.getsize(path + QIX_EXT),
+                            'query_ms': round(index_time * 1000, 3), 'brute_force_ms': round(brute_time * 1000, 3),
+                            'errors': errors}
+    failed = any(data['errors'] for data in report.values())
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        for name, data in report.items():
+            print(f"{name}: запись {data['write_s']} с, индекс {data['qix_bytes']} байт, запрос {data['query_ms']} мс "
+                  f"(перебор {data['brute_force_ms']} мс)")
+            for error in data['errors']:
+                print('    ' + error)
+        print('индекс соответствует перебору' if not failed else 'найдены расхождения')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+from typing import Dict, List, Any, Tuple
+import os
+import sys
+import json
+import math
+import random
+import argparse
+import filecmp
+import tempfile
+import statistics
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from real_estate import RECORD_FIELDS
+from writers import ShapeWriter, SHP_BACKENDS
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+
+def make_objects(count: int, contours: int, points: int, seed: int = 1) -> List[Tuple[Dict[str, Any], Dict]]:
+    """
+    создаёт синтетические объекты недвижимости: запись с атрибутами (см. AbstractRealEstateObject.get_record)
+    и геометрию из contours контуров по points точек. Часть контуров оставлена незамкнутой
+    :return: list
+    """
+    rnd = random.Random(seed)
+    objects = []
+    for i in range(count):
+        cad_number = '40:01:%06d:%d' % (i // 100, i)
+        record = {key: '' for key in RECORD_FIELDS}
+        record.update({'parent_cad_number': cad_number, 'area': str(rnd.randint(100, 100000)),
+                       'address': 'Калужская область, р-н Боровский, д. Тестовая, участок ' + str(i),
+                       'status': 'Учтенный', 'category': 'Земли населенных пунктов',
+                       'permitted_use_by_doc': 'для ведения личного подсобного хозяйства',
+                       'owner': 'Российская Федерация' * 3, 'date_of_cadastral_reg': '01.02.2015',
+                       'extract_date': '03.04.2023', 'cadastral_cost': '123456.78', 'type': 'Земельный участок'})
+        geometry = {}
+        for c in range(contours):
+            x0, y0 = rnd.uniform(400000, 500000), rnd.uniform(1200000, 1300000)
+            ring = [[round(x0 + 50 * math.cos(2 * math.pi * k / points), 2),
+                     round(y0 + 50 * math.sin(2 * math.pi * k / points), 2)] for k in range(points)]
+            if c % 2 == 0:
+                ring.append(list(ring[0]))
+            geometry[cad_number if contours == 1 else '(' + str(c + 1) + ')'] = [ring]
+        objects.append((record, geometry))
+    return objects
+
+
+def run(backend: str, objects: List[Tuple[Dict[str, Any], Dict]], path: str) -> float:
+    """
+    записывает объекты в шейп-файл и возвращает время записи, с
+    """
+    # pyshp замыкает контуры, изменяя переданные списки, поэтому каждому запуску передаётся своя копия геометрии
+    objects = [(record, {key: [[list(point) for point in ring] for ring in polys] for key, polys in geometry.items()})
+               for record, geometry in objects]
+    start = time.perf_counter()
+    writer = ShapeWriter(path, fields=None, backend=backend)
+    for record, geometry in objects:
+        writer.write(record, geometry)
+    writer.close()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Скорость записи шейп-файла собственным модулем shp_native и '
+                                                 'библиотекой pyshp, проверка совпадения результатов')
+    parser.add_argument('--objects', type=int, default=20000, help='количество объектов недвижимости')
+    parser.add_argument('--contours', type=int, default=3, help='количество контуров объекта')
+    parser.add_argument('--points', type=int, default=40, help='количество точек контура')
+    parser.add_argument('--repeat', type=int, default=3, help='количество запусков каждого способа записи')
+    parser.add_argument('--json', action='store_true', help='вывести результат в формате JSON')
+    args = parser.parse_args()
+    objects = make_objects(args.objects, args.contours, args.points)
+    polygons = args.objects * args.contours
+    report = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for backend in SHP_BACKENDS:
+            times = [run(backend, objects, os.path.join(folder, backend)) for _ in range(args.repeat)]
+            report[backend] = {'median_s': round(statistics.median(times), 3),
+                               'polygons_per_s': round(polygons / statistics.median(times))}
+        mismatched = [ext for ext in ('.shp', '.shx', '.dbf')
+                      if not filecmp.cmp(os.path.join(folder, SHP_BACKENDS[0] + ext),
+                                         os.path.join(folder, SHP_BACKENDS[1] + ext), shallow=False)]
+    report['identical_output'] = not mismatched
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        for backend in SHP_BACKENDS:
+            print(f"{backend}: {report[backend]['polygons_per_s']} полигонов/с ({report[backend]['median_s']} с на "
+                  f"{polygons} полигонов)")
+        print('результаты совпадают' if not mismatched else 'результаты различаются: ' + ', '.join(mismatched))
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+from typing import List, Tuple, Dict, Any
+import os
+import sys
+import json
+import math
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from writers import ShapeWriter
+from simplify import GeometrySimplifier, rings_valid
+from shp_writer import make_objects
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+
+def write_shp(path: str, objects: List[Tuple[Dict[str, Any], Dict]]) -> int:
+    """
+    записывает объекты в шейп-файл, возвращает размер файла .shp, байт
+    """
+    writer = ShapeWriter(path, fields=[])
+    for record, geometry in objects:
+        writer.write(record, geometry)
+    writer.close()
+    return os.path.getsize(path + '.shp')
+
+
+def deviation(ring: List[List[float]], simplified: List[List[float]]) -> float:
+    """
+    возвращает наибольшее расстояние от точек исходного кольца до границы упрощённого кольца
+    """
+    edges = list(zip(simplified, simplified[1:] + simplified[:1]))
+    worst = 0.0
+    for x, y in (point[:2] for point in ring):
+        best = math.inf
+        for (x1, y1), (x2, y2) in edges:
+            dx, dy = x2 - x1, y2 - y1
+            length2 = dx * dx + dy * dy
+            t = 0.0 if length2 == 0 else max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / length2))
+            best = min(best, math.hypot(x1 + t * dx - x, y1 + t * dy - y))
+        worst = max(worst, best)
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Облегчение геометрии: привязка к сетке, удаление лишних точек и '
+                                                 'упрощение Дугласа - Пекера - сокращение количества точек и размера '
+                                                 'шейп-файла, время на 100 тыс. контуров, проверка корректности')
+    parser.add_argument('--objects', type=int, default=50000, help='количество объектов недвижимости')
+    parser.add_argument('--contours', type=int, default=2, help='количество контуров объекта')
+    parser.add_argument('--points', type=int, default=60, help='количество точек контура')
+    parser.add_argument('--grid', type=float, default=0.1, help='шаг сетки, м')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='допуск упрощения, м')
+    parser.add_argument('--check-objects', type=int, default=2000,
+                        help='количество объектов, для которых проверяется отклонение от исходных границ')
+    parser.add_argument('--json', action='store_true', help='вывести результат в формате JSON')
+    args = parser.parse_args()
+    objects = make_objects(args.objects, args.contours, args.points)
+    simplifier = GeometrySimplifier(args.grid, args.tolerance)
+    start = time.perf_counter()
+    simplified = [(record, simplifier(geometry)) for record, geometry in objects]
+    seconds = time.perf_counter() - start
+    errors = []
+    limit = args.tolerance + args.grid * math.sqrt(2) / 2 + 1e-9
+    for (record, geometry), (_, result) in zip(objects[:args.check_objects], simplified[:args.check_objects]):
+        for key, polys in geometry.items():
+            if not rings_valid(result[key]):
+                errors.append(record['parent_cad_number'] + ' ' + key + ': упрощённый контур некорректен')
+            for ring, simplified_ring in zip(polys, result[key]):
+                if deviation(ring, simplified_ring) > limit:
+                    errors.append(record['parent_cad_number'] + ' ' + key + ': отклонение больше допуска')
+    with tempfile.TemporaryDirectory() as folder:
+        size_in = write_shp(os.path.join(folder, 'source'), objects)
+        size_out = write_shp(os.path.join(folder, 'simplified'), simplified)
+    stats = simplifier.stats
+    report = {'polygons': stats['polygons'], 'points_in': stats['points_in'], 'points_out': stats['points_out'],
+              'points_reduction_pct': round(100 - stats['points_out'] / stats['points_in'] * 100, 1),
+              'shp_mb_in': round(size_in / 1024 / 1024, 1), 'shp_mb_out': round(size_out / 1024 / 1024, 1),
+              'seconds': round(seconds, 2), 'seconds_per_100k': round(seconds / stats['polygons'] * 100000, 2),
+              'errors': errors}
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        print(f"контуров {report['polygons']}: точек {report['points_in']} -> {report['points_out']} "
+              f"(-{report['points_reduction_pct']} %)")
+        print(f"шейп-файл {report['shp_mb_in']} МБ -> {report['shp_mb_out']} МБ")
+        print(f"облегчение {report['seconds']} с ({report['seconds_per_100k']} с на 100 тыс. контуров)")
+        for error in errors[:20]:
+            print('    ' + error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
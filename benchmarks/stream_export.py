@@ -0,0 +1,99 @@
+from typing import List, Tuple, Dict, Any, Callable
+import os
+import sys
+import json
+import gzip
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from writers import GeoJsonLinesWriter, CsvWriter, XlsxWriter
+from shp_writer import make_objects
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+
+def write(writer: Any, objects: List[Tuple[Dict[str, Any], Dict]], geometry: bool) -> float:
+    """
+    записывает объекты, возвращает время записи, с
+    """
+    start = time.perf_counter()
+    for record, polygons in objects:
+        if geometry:
+            writer.write(record, polygons)
+        else:
+            writer.write(record)
+    writer.close()
+    return time.perf_counter() - start
+
+
+def write_peak(make_writer: Callable[[], Any], objects: List[Tuple[Dict[str, Any], Dict]], geometry: bool) -> float:
+    """
+    записывает объекты повторно под наблюдением tracemalloc (оно замедляет запись, поэтому время измеряется отдельно),
+    возвращает наибольший объём памяти, выделенной при записи, МБ
+    """
+    tracemalloc.start()
+    write(make_writer(), objects, geometry)
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return peak
+
+
+def count_lines(path: str, compress: bool) -> int:
+    with (gzip.open(path, 'rt', encoding='utf-8') if compress else open(path, 'r', encoding='utf-8')) as f:
+        return sum(1 for _ in f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Построчная запись объектов в файлы GeoJSON Lines и CSV в сравнении '
+                                                 'с таблицей xlsx: скорость записи, память и размер файлов')
+    parser.add_argument('--objects', type=int, default=20000, help='количество объектов недвижимости')
+    parser.add_argument('--gzip', action='store_true', help='сжимать файлы GeoJSON Lines и CSV')
+    parser.add_argument('--no-xlsx', action='store_true', help='не сравнивать с таблицей xlsx')
+    parser.add_argument('--json', action='store_true', help='вывести результат в формате JSON')
+    args = parser.parse_args()
+    objects = make_objects(args.objects, 2, 12)
+    ext = '.gz' if args.gzip else ''
+    report = {}
+    failed = False
+    with tempfile.TemporaryDirectory() as folder:
+        formats = [('geojsonl', GeoJsonLinesWriter, True, args.objects), ('csv', CsvWriter, False, args.objects + 1)]
+        for name, writer_class, geometry, expected_lines in formats:
+            path = os.path.join(folder, 'objects.' + name + ext)
+            seconds = write(writer_class(path, compress=args.gzip), objects, geometry)
+            peak = write_peak(lambda: writer_class(path, compress=args.gzip), objects, geometry)
+            lines = count_lines(path, args.gzip)
+            failed = failed or lines != expected_lines
+            report[name] = {'write_s': round(seconds, 2), 'objects_per_s': round(args.objects / seconds),
+                            'write_peak_mb': round(peak, 1), 'file_mb': round(os.path.getsize(path) / 1024 / 1024, 1),
+                            'lines': lines}
+        if not args.no_xlsx:
+            path = os.path.join(folder, 'objects.xlsx')
+            seconds = write(XlsxWriter(path), objects, False)
+            peak = write_peak(lambda: XlsxWriter(path), objects, False)
+            report['xlsx'] = {'write_s': round(seconds, 2), 'objects_per_s': round(args.objects / seconds),
+                              'write_peak_mb': round(peak, 1),
+                              'file_mb': round(os.path.getsize(path) / 1024 / 1024, 1), 'lines': None}
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        for name, data in report.items():
+            print(f"{name}: запись {data['write_s']} с ({data['objects_per_s']} объектов/с, пик памяти "
+                  f"{data['write_peak_mb']} МБ), файл {data['file_mb']} МБ")
+        print('количество строк в файлах совпадает с количеством объектов' if not failed
+              else 'количество строк в файлах не совпадает с количеством объектов')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
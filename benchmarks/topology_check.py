@@ -0,0 +1,193 @@
+from typing import List, Tuple, Dict, Set
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from topology import ContourSpool, ContourSet, find_problems, intersection_area, boundary_distance, EPSILON
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# начало координат и размер ячейки сетки участков, м
+ORIGIN = (1300000.0, 400000.0)
+CELL = 50.0
+
+
+def make_parcels(columns: int, rows: int, points_per_side: int, defects: float, rnd: random.Random) \
+        -> Tuple[List[Tuple[str, List[List[List[float]]]]], Dict[str, str]]:
+    """
+    строит сетку земельных участков со смещёнными узлами: соседние участки имеют общие границы с одинаковыми точками.
+    Часть участков не на краю сетки (доля defects) сдвигается на 0,5 м по обеим осям (наложение на соседей) или
+    сжимается на 3 см к центру (зазор).
+    Возвращает список (кадастровый номер, кольца) и словарь: кадастровый номер испорченного участка -> вид нарушения
+    """
+    nodes = [[(ORIGIN[0] + i * CELL + rnd.uniform(-CELL / 5, CELL / 5),
+               ORIGIN[1] + j * CELL + rnd.uniform(-CELL / 5, CELL / 5)) for j in range(rows + 1)]
+             for i in range(columns + 1)]
+
+    def side(a: Tuple[int, int], b: Tuple[int, int]) -> List[Tuple[float, float]]:
+        # точки стороны вычисляются в одном направлении для обоих соседних участков
+        first, second = min(a, b), max(a, b)
+        (x1, y1), (x2, y2) = nodes[first[0]][first[1]], nodes[second[0]][second[1]]
+        points = [(x1 + (x2 - x1) * k / points_per_side, y1 + (y2 - y1) * k / points_per_side)
+                  for k in range(points_per_side)] + [(x2, y2)]
+        return points if first == a else points[::-1]
+
+    parcels = []
+    defective = {}
+    for i in range(columns):
+        for j in range(rows):
+            corners = [(i, j), (i, j + 1), (i + 1, j + 1), (i + 1, j)]
+            ring = []
+            for a, b in zip(corners, corners[1:] + corners[:1]):
+                ring.extend(side(a, b)[:-1])
+            ring.append(ring[0])
+            cad_number = '40:01:' + str(i).zfill(6) + ':' + str(j)
+            if 0 < i < columns - 1 and 0 < j < rows - 1 and rnd.random() < defects:
+                cx, cy = sum(x for x, _ in ring[:-1]) / (len(ring) - 1), sum(y for _, y in ring[:-1]) / (len(ring) - 1)
+                if rnd.random() < 0.5:
+                    ring = [(x + 0.5, y + 0.5) for x, y in ring]
+                    defective[cad_number] = 'overlap'
+                else:
+                    ring = [(x + (cx - x) * 0.03 / CELL * 2, y + (cy - y) * 0.03 / CELL * 2) for x, y in ring]
+                    defective[cad_number] = 'gap'
+            parcels.append((cad_number, [[list(point) for point in ring]]))
+    return parcels, defective
+
+
+def check_area() -> List[str]:
+    """
+    сравнивает площадь пересечения и расстояние между границами простых фигур с известными значениями
+    """
+    def square(x: float, y: float, size: float) -> List[Tuple[float, float]]:
+        return [(x, y), (x + size, y), (x + size, y + size), (x, y + size), (x, y)]
+
+    hole = square(2, 2, 2)[::-1]
+    shape_l = [(0, 0), (4, 0), (4, 1), (1, 1), (1, 4), (0, 4), (0, 0)]
+    cases = [('смещённые квадраты', [square(0, 0, 2)], [square(1, 1, 2)], 1.0, 0.0),
+             ('совпадающие квадраты', [square(0, 0, 2)], [square(0, 0, 2)], 4.0, 0.0),
+             ('соседние квадраты', [square(0, 0, 2)], [square(2, 0, 2)], 0.0, 0.0),
+             ('квадрат в отверстии', [square(0, 0, 6), hole], [square(2.5, 2.5, 1)], 0.0, 0.5),
+             ('квадрат на отверстии', [square(0, 0, 6), hole], [square(1, 1, 2)], 3.0, 0.0),
+             ('невыпуклый контур', [shape_l], [square(0.5, 0.5, 2)], 1.75, 0.0),
+             ('зазор', [square(0, 0, 2)], [square(2.05, 0, 2)], 0.0, 0.05)]
+    errors = []
+    for title, rings, other, area, distance in cases:
+        for first, second in ((rings, other), (other, rings)):
+            found = intersection_area(first, second)
+            if abs(found - area) > 1e-9:
+                errors.append(title + ': площадь пересечения ' + str(found) + ' вместо ' + str(area))
+        found = boundary_distance(rings, other, 1.0)
+        if abs(found - distance) > 1e-9:
+            errors.append(title + ': расстояние между границами ' + str(found) + ' вместо ' + str(distance))
+    return errors
+
+
+def naive_problems(contours: ContourSet, gap_tolerance: float, min_overlap: float) -> Set[Tuple[int, int, str]]:
+    """
+    находит нарушения проверкой всех пар контуров, O(n²)
+    """
+    found = set()
+    for i in range(len(contours)):
+        rings = contours.rings(i)
+        for j in range(i + 1, len(contours)):
+            other = contours.rings(j)
+            area = intersection_area(rings, other)
+            if area > min_overlap:
+                found.add((i, j, 'overlap'))
+            elif area <= EPSILON and EPSILON < boundary_distance(rings, other, gap_tolerance) < gap_tolerance:
+                found.add((i, j, 'gap'))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка топологии земельных участков: наложения и зазоры на '
+                                                 'сетке участков с внесёнными нарушениями, сравнение с полным '
+                                                 'перебором пар и время проверки')
+    parser.add_argument('--parcels', type=int, default=100000, help='количество земельных участков')
+    parser.add_argument('--points', type=int, default=4, help='количество точек на стороне участка')
+    parser.add_argument('--defects', type=float, default=0.01, help='доля участков с нарушениями')
+    parser.add_argument('--naive-parcels', type=int, default=400,
+                        help='количество участков для сравнения с полным перебором пар')
+    parser.add_argument('--gap-tolerance', type=float, default=0.1, help='допуск зазора, м')
+    parser.add_argument('--min-overlap', type=float, default=0.01, help='допуск наложения, кв. м')
+    parser.add_argument('--json', action='store_true', help='вывести результат в формате JSON')
+    args = parser.parse_args()
+    rnd = random.Random(5)
+    errors = check_area()
+    # сравнение с полным перебором на небольшой сетке
+    side = max(3, int(args.naive_parcels ** 0.5))
+    naive_count = side * side
+    parcels, _ = make_parcels(side, side, args.points, 0.05, rnd)
+    with tempfile.TemporaryDirectory() as folder:
+        spool = ContourSpool(os.path.join(folder, 'naive.contours'))
+        for cad_number, polys in parcels:
+            spool.add(cad_number, cad_number, polys)
+        spool.close()
+        contours = ContourSet(spool.path)
+    found = {(i, j, problem) for i, j, problem, _ in find_problems(contours, args.gap_tolerance, args.min_overlap)}
+    start = time.perf_counter()
+    expected = naive_problems(contours, args.gap_tolerance, args.min_overlap)
+    naive_seconds = time.perf_counter() - start
+    if found != expected:
+        errors.append('по STR-дереву найдено ' + str(len(found)) + ' нарушений, полным перебором ' +
+                      str(len(expected)))
+    # полная сетка
+    side = max(3, int(args.parcels ** 0.5))
+    parcels, defective = make_parcels(side, side, args.points, args.defects, rnd)
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        spool = ContourSpool(os.path.join(folder, 'parcels.contours'))
+        for cad_number, polys in parcels:
+            spool.add(cad_number, cad_number, polys)
+        spool.close()
+        spool_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        contours = ContourSet(spool.path)
+        problems = list(find_problems(contours, args.gap_tolerance, args.min_overlap))
+        check_seconds = time.perf_counter() - start
+    reported: Dict[str, Set[str]] = {}
+    for i, j, problem, _ in problems:
+        for index in (i, j):
+            reported.setdefault(contours.names[index][0], set()).add(problem)
+        if contours.names[i][0] not in defective and contours.names[j][0] not in defective:
+            errors.append('нарушение ' + problem + ' между исправными участками ' + contours.names[i][0] + ' и ' +
+                          contours.names[j][0])
+    for cad_number, problem in defective.items():
+        if problem not in reported.get(cad_number, ()):
+            errors.append('не найдено нарушение ' + problem + ' участка ' + cad_number)
+    count = len(contours)
+    report = {'contours': count, 'points': len(contours.coords) // 2, 'defective': len(defective),
+              'overlaps': sum(1 for problem in problems if problem[2] == 'overlap'),
+              'gaps': sum(1 for problem in problems if problem[2] == 'gap'),
+              'spool_s': round(spool_seconds, 2), 'check_s': round(check_seconds, 2),
+              'check_s_per_100k': round(check_seconds / count * 100000, 2),
+              'naive_contours': naive_count, 'naive_s': round(naive_seconds, 2),
+              'errors': errors}
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        print(f"контуров {report['contours']} ({report['points']} точек), с нарушениями {report['defective']}")
+        print(f"наложений {report['overlaps']}, зазоров {report['gaps']}")
+        print(f"запись контуров {report['spool_s']} с, проверка {report['check_s']} с "
+              f"({report['check_s_per_100k']} с на 100 тыс. контуров)")
+        print(f"полный перебор пар {report['naive_contours']} контуров: {report['naive_s']} с")
+        for error in errors[:20]:
+            print('    ' + error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
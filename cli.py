@@ -0,0 +1,289 @@
+from typing import Dict, Any
+import os
+import sys
+import argparse
+from logic import read_settings
+from converter import Converter
+from writers import FIELD_TITLES
+from shards import SHARD_KEYS
+from dedup import DEDUP_POLICIES
+from filters import OBJECT_KINDS
+from scanner import SCHEDULES
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+
+def parse_fields(value: str) -> Any:
+    """
+    разбирает значение параметра --fields: 'all' - все поля (возвращается как есть, т.к. None означает, что параметр
+    не задан), 'none' - только кадастровый номер (и геометрия), иначе - имена полей через запятую
+    """
+    if value == 'all':
+        return value
+    if value == 'none':
+        return []
+    return [field.strip() for field in value.split(',') if field.strip()]
+
+
+def parse_bbox(value: str) -> Any:
+    """
+    разбирает значение параметра --filter-bbox: 'none' - без отбора по охвату (пустой список), иначе - четыре числа
+    minx,miny,maxx,maxy через запятую
+    """
+    if value == 'none':
+        return []
+    try:
+        bbox = [float(part) for part in value.split(',')]
+    except ValueError:
+        bbox = []
+    if len(bbox) != 4:
+        raise argparse.ArgumentTypeError('охват задаётся четырьмя числами через запятую: minx,miny,maxx,maxy')
+    return bbox
+
+
+def parse_kinds(value: str) -> Any:
+    """
+    разбирает значение параметра --filter-kinds: 'all' - все виды объектов (пустой список), иначе - виды объектов
+    через запятую
+    """
+    if value == 'all':
+        return []
+    return [kind.strip() for kind in value.split(',') if kind.strip()]
+
+
+def parse_numbers(count: int):
+    """
+    возвращает функцию разбора значения параметра, состоящего из count чисел через запятую ('none' - пустой список)
+    """
+    def parse(value: str) -> Any:
+        if value == 'none':
+            return []
+        try:
+            numbers = [float(part) for part in value.split(',')]
+        except ValueError:
+            numbers = []
+        if len(numbers) != count:
+            raise argparse.ArgumentTypeError('ожидается ' + str(count) + ' чисел через запятую')
+        return numbers
+    return parse
+
+
+def get_cli_settings(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    возвращает параметры конвертирования: настройки из файла 'settings.json', дополненные параметрами командной строки
+    """
+    settings = read_settings() if os.path.exists('settings.json') else {}
+    options = {'folder_in_xml': args.folder_in, 'folder_out_xml': args.folder_out, 'file_type': args.file_type,
+               'create_esri_shape': args.shp, 'create_xlsx': args.xlsx, 'rename_files': args.rename,
+               'adm_district': args.adm_district, 'replace_long_names': args.replace_long_names,
+               'append_mode': args.append, 'append_shp_path': args.append_shp, 'append_xlsx_path': args.append_xlsx,
+               'replace_existing': args.replace_existing, 'output_fields': args.fields,
+               'quarantine_folder': args.quarantine, 'checkpoint_minutes': args.checkpoint_minutes,
+               'resume_interrupted': args.resume, 'xlsx_max_rows': args.xlsx_max_rows,
+               'xlsx_rollover': args.xlsx_rollover, 'xlsx_split_by_kind': args.xlsx_split_by_kind,
+               'shp_spatial_index': args.qix, 'shard_by': args.shard_by, 'shard_workers': args.shard_workers,
+               'parse_workers': args.parse_workers, 'prevalidate': args.prevalidate,
+               'prevalidate_workers': args.prevalidate_workers, 'scan_recursive': args.recursive,
+               'scan_include': args.include, 'scan_exclude': args.exclude, 'schedule': args.schedule,
+               'dedup_policy': args.dedup, 'create_fgb': args.fgb, 'fgb_sort_memory_mb': args.fgb_sort_memory_mb,
+               'create_parquet': args.parquet, 'parquet_geometry': args.parquet_geometry,
+               'parquet_row_group_rows': args.parquet_row_group_rows, 'create_geojsonl': args.geojsonl,
+               'create_csv': args.csv, 'stream_gzip': args.gzip, 'create_pgdump': args.pgdump,
+               'pgdump_table': args.pgdump_table, 'pgdump_srid': args.pgdump_srid, 'create_links': args.links,
+               'topology_check': args.topology, 'topology_gap_tolerance': args.topology_gap_tolerance,
+               'topology_min_overlap': args.topology_min_overlap, 'geometry_grid': args.geometry_grid,
+               'geometry_simplify_tolerance': args.simplify_tolerance, 'transform_swap_axes': args.swap_axes,
+               'transform_affine': args.affine, 'transform_helmert': args.helmert, 'output_prj': args.prj,
+               'filter_cad_prefix': args.filter_cad_prefix, 'filter_cad_regex': args.filter_cad_regex,
+               'filter_bbox': args.filter_bbox, 'filter_kinds': args.filter_kinds,
+               'filter_date_from': args.filter_date_from, 'filter_date_to': args.filter_date_to,
+               'ledger_folder': args.ledger, 'ledger_node_id': args.node_id,
+               'ledger_batch_size': args.ledger_batch_size, 'ledger_lease_seconds': args.ledger_lease_seconds}
+    settings.update({key: value for key, value in options.items() if value is not None})
+    if args.fields == 'all':
+        settings['output_fields'] = None
+    if args.shard_by == 'none':
+        settings['shard_by'] = ''
+    if args.schedule == 'folder':
+        settings['schedule'] = ''
+    if args.filter_bbox == []:
+        settings['filter_bbox'] = None
+    if args.filter_kinds == []:
+        settings['filter_kinds'] = None
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Конвертирование выписок из ЕГРН в форматы SHP и XLSX. Параметры, '
+                                                 'не указанные в командной строке, берутся из файла settings.json')
+    parser.add_argument('--in', dest='folder_in', help='папка с выписками из ЕГРН')
+    parser.add_argument('--out', dest='folder_out', help='папка для сохранения результата')
+    parser.add_argument('--file-type', choices=['xml', 'zip'], help='тип исходных файлов')
+    parser.add_argument('--shp', action=argparse.BooleanOptionalAction, help='создавать шейп-файл')
+    parser.add_argument('--xlsx', action=argparse.BooleanOptionalAction, help='создавать таблицу xlsx')
+    parser.add_argument('--geojsonl', action=argparse.BooleanOptionalAction,
+                        help='создавать файл GeoJSON Lines (.geojsonl, один объект GeoJSON в строке)')
+    parser.add_argument('--csv', action=argparse.BooleanOptionalAction,
+                        help='создавать файл CSV с теми же столбцами, что и таблица xlsx')
+    parser.add_argument('--gzip', action=argparse.BooleanOptionalAction,
+                        help='сжимать файлы GeoJSON Lines и CSV при записи (.gz)')
+    parser.add_argument('--rename', action=argparse.BooleanOptionalAction, help='переименовывать выписки')
+    parser.add_argument('--adm-district', action=argparse.BooleanOptionalAction,
+                        help='добавлять административный район в адрес')
+    parser.add_argument('--replace-long-names', action=argparse.BooleanOptionalAction,
+                        help='сокращать длинные названия')
+    parser.add_argument('--append', action=argparse.BooleanOptionalAction,
+                        help='дописывать результат в существующие файлы')
+    parser.add_argument('--append-shp', help='существующий шейп-файл для режима добавления')
+    parser.add_argument('--append-xlsx', help='существующая таблица xlsx для режима добавления')
+    parser.add_argument('--replace-existing', action=argparse.BooleanOptionalAction,
+                        help='заменять объекты с тем же кадастровым номером')
+    parser.add_argument('--fields', type=parse_fields,
+                        help="поля выходных файлов через запятую, 'all' - все поля, 'none' - только кадастровый номер "
+                             "и геометрия (см. --list-fields)")
+    parser.add_argument('--fgb', action=argparse.BooleanOptionalAction,
+                        help='создавать файл FlatGeobuf (.fgb) с пространственным индексом')
+    parser.add_argument('--fgb-sort-memory-mb', type=float,
+                        help='объём объектов FlatGeobuf, сортируемых в памяти, МБ (при превышении - внешняя сортировка)')
+    parser.add_argument('--parquet', action=argparse.BooleanOptionalAction,
+                        help='создавать файл Parquet для анализа данных (нужна библиотека pyarrow)')
+    parser.add_argument('--parquet-geometry', action=argparse.BooleanOptionalAction,
+                        help='записывать в файл Parquet контуры объектов (GeoParquet, WKB)')
+    parser.add_argument('--parquet-row-group-rows', type=int, help='количество строк в группе строк файла Parquet')
+    parser.add_argument('--pgdump', action=argparse.BooleanOptionalAction,
+                        help='создавать дамп для загрузки в PostGIS (.sql: CREATE TABLE и COPY, загрузка: psql -f)')
+    parser.add_argument('--pgdump-table', help='имя таблицы PostgreSQL в дампе (можно указать схему: схема.таблица)')
+    parser.add_argument('--pgdump-srid', type=int,
+                        help='код системы координат геометрии в дампе PostGIS (0 - не указывается)')
+    parser.add_argument('--links', action=argparse.BooleanOptionalAction,
+                        help='создавать таблицу связей объектов (участки - здания - помещения, единые '
+                             'землепользования)')
+    parser.add_argument('--topology', action=argparse.BooleanOptionalAction,
+                        help='проверять наложения и зазоры между контурами земельных участков (отчёт _topology.csv)')
+    parser.add_argument('--topology-gap-tolerance', type=float,
+                        help='наибольший зазор между соседними участками, который считается ошибкой, м (0 - зазоры '
+                             'не ищутся)')
+    parser.add_argument('--topology-min-overlap', type=float,
+                        help='наименьшая площадь наложения участков, которая считается ошибкой, кв. м')
+    parser.add_argument('--geometry-grid', type=float,
+                        help='привязывать координаты к сетке с указанным шагом и удалять лишние точки, м (0 - нет)')
+    parser.add_argument('--simplify-tolerance', type=float,
+                        help='упрощать контуры алгоритмом Дугласа - Пекера с указанным допуском, м (0 - нет)')
+    parser.add_argument('--swap-axes', action=argparse.BooleanOptionalAction,
+                        help='записывать координаты в порядке выписки: первой - X (север), второй - Y (восток)')
+    parser.add_argument('--affine', type=parse_numbers(6),
+                        help="аффинное преобразование координат a,b,c,d,e,f: x' = a*x + b*y + c, y' = d*x + e*y + f "
+                             "('none' - нет)")
+    parser.add_argument('--helmert', type=parse_numbers(7),
+                        help="преобразование Гельмерта dX,dY,dZ (м),wx,wy,wz (угловые секунды),m (млн^-1) "
+                             "('none' - нет)")
+    parser.add_argument('--prj', help='система координат выходных файлов: текст WKT или путь к файлу .prj')
+    parser.add_argument('--qix', action=argparse.BooleanOptionalAction,
+                        help='создавать пространственный индекс шейп-файла (.qix)')
+    parser.add_argument('--xlsx-max-rows', type=int, help='предельное количество строк на листе xlsx')
+    parser.add_argument('--xlsx-rollover', choices=['sheet', 'file'],
+                        help='продолжать таблицу xlsx при превышении лимита строк на новом листе или в новом файле')
+    parser.add_argument('--xlsx-split-by-kind', action=argparse.BooleanOptionalAction,
+                        help='записывать объекты разных видов на разные листы xlsx')
+    parser.add_argument('--shard-by', choices=['none', *SHARD_KEYS],
+                        help='разделять результат на части: по кадастровому округу, району, кварталу или по району '
+                             'из адреса (none - не разделять)')
+    parser.add_argument('--shard-workers', type=int, help='количество потоков записи частей результата')
+    parser.add_argument('--parse-workers', type=int,
+                        help='количество процессов разбора выписок (0 - разбор в основном процессе)')
+    parser.add_argument('--prevalidate', action=argparse.BooleanOptionalAction,
+                        help='проверять структуру выписок до разбора и исключать повреждённые выписки')
+    parser.add_argument('--prevalidate-workers', type=int,
+                        help='количество процессов предварительной проверки выписок (0 - в основном процессе)')
+    parser.add_argument('--recursive', action=argparse.BooleanOptionalAction,
+                        help='искать выписки во вложенных папках')
+    parser.add_argument('--include', help="маски имён выписок через запятую (по умолчанию '*.xml'; маска с '/' "
+                                          "сравнивается с путём относительно папки с выписками)")
+    parser.add_argument('--exclude', help='маски имён файлов и папок через запятую, которые не обрабатываются')
+    parser.add_argument('--schedule', choices=['folder', *SCHEDULES[1:]],
+                        help='порядок обработки выписок: как в папке, по именам, от больших файлов к меньшим или '
+                             'с чередованием по размеру между процессами разбора')
+    parser.add_argument('--dedup', choices=DEDUP_POLICIES,
+                        help='несколько выписок на один объект: записывать все, только самую новую или самую полную')
+    parser.add_argument('--filter-cad-prefix',
+                        help='конвертировать только выписки на объекты с кадастровыми номерами, начинающимися '
+                             'с указанных значений (через запятую, пустая строка - без отбора)')
+    parser.add_argument('--filter-cad-regex',
+                        help='конвертировать только выписки на объекты, в кадастровом номере которых находится '
+                             'регулярное выражение')
+    parser.add_argument('--filter-bbox', type=parse_bbox,
+                        help="конвертировать только объекты, охват контуров которых пересекается с охватом "
+                             "minx,miny,maxx,maxy в координатах шейп-файла ('none' - без отбора)")
+    parser.add_argument('--filter-kinds', type=parse_kinds,
+                        help="конвертировать только объекты указанных видов через запятую: " +
+                             ', '.join(OBJECT_KINDS) + " ('all' - все виды)")
+    parser.add_argument('--filter-date-from', help='конвертировать только выписки не ранее даты ДД.ММ.ГГГГ')
+    parser.add_argument('--filter-date-to', help='конвертировать только выписки не позднее даты ДД.ММ.ГГГГ')
+    parser.add_argument('--quarantine', help='папка для выписок, при обработке которых возникла ошибка')
+    parser.add_argument('--checkpoint-minutes', type=float,
+                        help='интервал сохранения промежуточных результатов, мин. (0 - не сохранять)')
+    parser.add_argument('--resume', action=argparse.BooleanOptionalAction,
+                        help='продолжать прерванное конвертирование с последнего сохранения')
+    parser.add_argument('--ledger',
+                        help='папка учёта работ распределённого конвертирования в общей папке: узлы, запущенные '
+                             'с одной папкой учёта, делят выписки пакетами (см. --merge)')
+    parser.add_argument('--node-id', help='имя узла распределённого конвертирования (по умолчанию - имя компьютера '
+                                          'и номер процесса)')
+    parser.add_argument('--ledger-batch-size', type=int, help='количество выписок в пакете распределённого '
+                                                              'конвертирования')
+    parser.add_argument('--ledger-lease-seconds', type=float,
+                        help='срок аренды пакета, сек.: пакет узла, который не продлевал аренду в течение этого '
+                             'срока, захватывается другим узлом')
+    parser.add_argument('--merge', action='store_true',
+                        help='объединить частичные результаты распределённого конвертирования (--ledger) в папке '
+                             'результата и выйти')
+    parser.add_argument('--list-fields', action='store_true', help='вывести список полей и выйти')
+    parser.add_argument('--rename-dry-run', action='store_true',
+                        help='вывести план переименования выписок и выйти, не изменяя файлы')
+    args = parser.parse_args()
+    if args.list_fields:
+        for key, title in FIELD_TITLES.items():
+            print(key + ' - ' + title)
+        return
+    # пути из командной строки задаются относительно текущей папки, а работа ведётся в папке скрипта
+    # (там находятся классификаторы *.csv и файл настроек)
+    for name in ('folder_in', 'folder_out', 'append_shp', 'append_xlsx', 'quarantine', 'ledger'):
+        if getattr(args, name):
+            setattr(args, name, os.path.realpath(getattr(args, name)))
+    if args.prj and os.path.isfile(args.prj):
+        args.prj = os.path.realpath(args.prj)  # --prj - путь к файлу .prj, а не текст WKT
+    os.chdir(os.path.split(os.path.realpath(__file__))[0])
+    settings = get_cli_settings(args)
+    if not settings.get('folder_in_xml') or not os.path.isdir(settings['folder_in_xml']):
+        parser.error('не найдена папка с выписками: ' + str(settings.get('folder_in_xml', '')))
+    if not settings.get('folder_out_xml'):
+        settings['folder_out_xml'] = settings['folder_in_xml']
+    try:
+        if args.rename_dry_run:
+            Converter(settings, print).rename_xml(dry_run=True)
+            return
+        if settings.get('ledger_folder'):
+            # распределённое конвертирование загружается только при его использовании
+            from ledger import run_node, merge_partials
+            if args.merge:
+                merge_partials(settings, print)
+            else:
+                run_node(settings, print)
+            return
+        if args.merge:
+            parser.error('--merge используется вместе с --ledger')
+        Converter(settings, print).run()
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
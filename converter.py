@@ -0,0 +1,1017 @@
+from typing import Callable, Dict, Any, Optional, Union, List, Tuple
+import os
+import re
+import datetime
+import time
+import json
+import shutil
+from traceback import format_exc
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from logic import DEFAULT_SETTINGS, extract_all_zipfiles
+from real_estate import AbstractRealEstateObject, RECORD_FIELDS
+from writers import ShapeWriter, FlatGeobufWriter, ParquetWriter, GeoJsonLinesWriter, CsvWriter, PostgisDumpWriter, \
+    XlsxWriter, select_fields, GEOJSONL_EXT, CSV_EXT, GZIP_EXT
+from fgb import FGB_EXT
+from pgdump import PGDUMP_EXT
+from shards import ShardedWriters, SHARD_KEYS, shard_key, shard_output_paths
+from prefetch import PrefetchReader
+from header_scan import scan_header
+from dedup import select_superseded, DEDUP_POLICIES
+from links import RelationIndex, LINKS_FILE_SUFFIX
+from filters import ExtractFilter, header_from_file_name
+from topology import ContourSpool, write_topology_report, TOPOLOGY_FILE_SUFFIX, SPOOL_EXT
+from simplify import GeometrySimplifier
+from transform import CoordinateTransformer, read_prj
+from scanner import InputFile, scan_inputs, schedule
+from validation import validate_extract, add_to_summary, format_summary
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# файл состояния конвертирования в папке результата, по которому продолжается прерванное конвертирование
+CHECKPOINT_FILE = 'conversion_checkpoint.json'
+
+# суффикс файлов частей таблицы xlsx и файлов FlatGeobuf и Parquet, записанных после сохранения состояния
+# конвертирования (см. Converter._open_writers): "<имя>.part<номер сохранения><расширение>"
+PART_SUFFIX = '.part'
+
+# настройки, от которых зависит содержимое выходных файлов: сохраняются в файле состояния, и прерванное
+# конвертирование продолжается, только если они не изменились
+RESUME_KEYS = ('create_xlsx', 'create_esri_shape', 'create_fgb', 'create_parquet', 'parquet_geometry',
+               'create_geojsonl', 'create_csv', 'stream_gzip', 'create_pgdump', 'pgdump_table', 'pgdump_srid',
+               'create_links', 'adm_district', 'replace_long_names', 'output_prj', 'prevalidate', 'topology_check',
+               'geometry_grid', 'geometry_simplify_tolerance', 'scan_recursive', 'scan_include', 'scan_exclude',
+               'transform_swap_axes', 'transform_affine', 'transform_helmert', 'output_fields', 'xlsx_max_rows',
+               'xlsx_rollover', 'xlsx_split_by_kind', 'shard_by', 'dedup_policy', 'filter_cad_prefix',
+               'filter_cad_regex', 'filter_bbox', 'filter_kinds', 'filter_date_from', 'filter_date_to')
+
+SEPARATOR = "---------------------------------------------------------------------------------------------------------------"
+
+
+class Converter:
+    """
+    Выполняет обработку набора выписок из ЕГРН (извлечение из архивов, переименование, конвертирование в выбранные
+    форматы файлов) без привязки к графическому интерфейсу. Параметры задаются словарём с теми же ключами, что и в
+    файле 'settings.json'. Сообщения о ходе работы и прогресс передаются в функции on_message(text) и
+    on_progress(done, total).
+    """
+    def __init__(self, settings: Dict[str, Union[str, bool]], on_message: Optional[Callable[[str], Any]] = None,
+                 on_progress: Optional[Callable[[int, int], Any]] = None) -> None:
+        self.settings = {**DEFAULT_SETTINGS, **settings}
+        self._on_message = on_message
+        self._on_progress = on_progress
+        self.links: Optional[RelationIndex] = None  # связи объектов последнего конвертирования (см. convert)
+        self._inputs: Optional[List[InputFile]] = None  # выписки папки 'folder_in_xml' (см. scan_inputs)
+        self.scan_seconds = 0.0
+
+    def message(self, text: str) -> None:
+        if self._on_message is not None:
+            self._on_message(text)
+
+    def progress(self, done: int, total: int) -> None:
+        if self._on_progress is not None:
+            self._on_progress(done, total)
+
+    def read_files(self, paths: List[str]) -> PrefetchReader:
+        """
+        возвращает объект, читающий файлы с упреждением в соответствии с настройками 'prefetch_window' (количество
+        файлов, читаемых заранее) и 'prefetch_max_mb' (предельный объём заранее прочитанных файлов, МБ)
+        """
+        return PrefetchReader(paths, int(self.settings['prefetch_window']),
+                              int(self.settings['prefetch_max_mb']) * 1024 * 1024)
+
+    def scan_inputs(self) -> List[InputFile]:
+        """
+        возвращает выписки папки 'folder_in_xml' - пути относительно неё и размеры файлов (см. scanner.scan_inputs).
+        Папка просматривается один раз: при извлечении выписок из архивов перечень сбрасывается, при переименовании -
+        обновляется по плану переименования. При 'scan_recursive' просматриваются вложенные папки, кроме папки
+        результата и папки карантина, файлы отбираются по маскам 'scan_include' и 'scan_exclude'
+        :return: list
+        """
+        if self._inputs is None:
+            start = time.perf_counter()
+            output_folder = self.settings['folder_out_xml']
+            self._inputs = scan_inputs(self.settings['folder_in_xml'], self.settings['scan_recursive'],
+                                       self.settings['scan_include'], self.settings['scan_exclude'],
+                                       (output_folder, self.settings['quarantine_folder'] or
+                                        (os.path.join(output_folder, 'quarantine') if output_folder else '')))
+            self.scan_seconds += time.perf_counter() - start
+        return self._inputs
+
+    def run(self) -> Optional[Dict[str, Any]]:
+        """
+        выполняет все включённые в настройках этапы обработки, возвращает итоги конвертирования (см. convert)
+        или None, если ни один выходной формат не выбран
+        """
+        if self.settings['file_type'] == 'zip':
+            self.extract_xml_from_zip()
+        if self.settings['rename_files']:
+            self.rename_xml()
+        if self.settings['create_xlsx'] or self.settings['create_esri_shape'] or self.settings['create_fgb'] \
+                or self.settings['create_parquet'] or self.settings['create_geojsonl'] or self.settings['create_csv'] \
+                or self.settings['create_pgdump']:
+            return self.convert()
+        return None
+
+    def extract_xml_from_zip(self) -> None:
+        """
+        извлекает выписки из ЕГРН из архива zip, сохраняя исходный архив, удаляя промежуточные
+        архивы и файлы ЭЦП
+        """
+        self.message("Идёт извлечение выписок xml из архивов...")
+        directory = self.settings['folder_in_xml']
+        files = os.listdir(directory)
+        zipfiles = list(filter(lambda x: x.endswith('.zip'), files))
+        extract_all_zipfiles(zipfiles, directory)
+        new_files = os.listdir(directory)
+        new_zipfiles = list(filter(lambda x: x.endswith('.zip'), new_files))
+        for i in new_zipfiles:
+            if i in zipfiles:
+                new_zipfiles.remove(i)
+        extract_all_zipfiles(new_zipfiles, directory)
+        result_files = os.listdir(directory)
+        sig_files = list(filter(lambda x: x.endswith('.sig'), result_files))
+        for sf in sig_files:
+            os.remove(os.path.join(directory, sf))
+        for zf in new_zipfiles:
+            if zf not in zipfiles:
+                os.remove(os.path.join(directory, zf))
+        self._inputs = None  # в папке появились новые выписки
+        self.message("Извлечение выписок xml из архивов завершено.")
+        self.message(SEPARATOR)
+
+    def _scan_header(self, xml_file_path: str) -> Optional[Tuple[str, str]]:
+        try:
+            return scan_header(xml_file_path)
+        except Exception:
+            # нечитаемая выписка не переименовывается и не считается дубликатом, при конвертировании она будет
+            # помещена в карантин
+            return None
+
+    def scan_headers(self, file_names: List[str]) -> Dict[str, Optional[Tuple[str, str]]]:
+        """
+        читает кадастровые номера и даты выписок из папки 'folder_in_xml' без полного разбора файлов
+        (см. header_scan.scan_header). Файлы просматриваются параллельно в 'scan_workers' потоках
+        :param file_names: list - имена файлов
+        :return: dict - имя файла -> (кадастровый номер, дата выписки) или None для нечитаемых файлов
+        """
+        directory = self.settings['folder_in_xml']
+        headers = {}
+        self.progress(0, len(file_names))
+        with ThreadPoolExecutor(max_workers=max(1, int(self.settings['scan_workers']))) as executor:
+            results = executor.map(self._scan_header, [os.path.join(directory, name) for name in file_names])
+            for pb, (file_name, header) in enumerate(zip(file_names, results), start=1):
+                headers[file_name] = header
+                self.progress(pb, len(file_names))
+        return headers
+
+    def plan_renames(self) -> Tuple[List[Tuple[str, str]], int]:
+        """
+        составляет план переименования выписок в папке 'folder_in_xml' в формате: кадастровый номер---дата получения
+        выписки. Кадастровый номер и дата читаются из начала (и, для старых схем, конца) файла без полного разбора
+        (см. scan_headers). Выписки, уже имеющие нужное имя (в том числе с номером дубликата " (N)"),
+        не переименовываются. Номера дубликатов подбираются по множеству имён файлов папки, включая исходные имена
+        переименовываемых файлов, поэтому все переименования независимы друг от друга.
+        Выписки во вложенных папках (см. scan_inputs) переименовываются в своей папке, пути в плане - относительно
+        папки 'folder_in_xml'. Возвращает список пар (текущее имя, новое имя) и количество нечитаемых файлов
+        :return: tuple
+        """
+        xmlfiles = [xml_file for xml_file, _ in self.scan_inputs()]
+        occupied: Dict[str, set] = {}  # папка -> имена всех её файлов (не только выписок)
+        plan = []
+        count_unsupported_files = 0
+        for xml_file, header in self.scan_headers(xmlfiles).items():
+            if header is None:
+                count_unsupported_files += 1
+                continue
+            folder, file_name = os.path.split(xml_file)
+            parcel_kn, extract_date = header
+            stem = re.sub(':', '-', parcel_kn) + '---' + re.sub(r'\.', '-', extract_date)
+            if file_name == stem + '.xml' or re.fullmatch(re.escape(stem) + r' \(\d+\)\.xml', file_name):
+                continue
+            if folder not in occupied:
+                occupied[folder] = {os.path.normcase(name) for name in
+                                    os.listdir(os.path.join(self.settings['folder_in_xml'], folder))}
+            new_name = stem + '.xml'
+            num = 1
+            while os.path.normcase(new_name) in occupied[folder]:
+                num += 1
+                new_name = stem + ' (' + str(num) + ')' + '.xml'
+            occupied[folder].add(os.path.normcase(new_name))
+            plan.append((xml_file, os.path.join(folder, new_name)))
+        return plan, count_unsupported_files
+
+    def _need_geometry(self) -> bool:
+        """
+        возвращает True, если контуры объектов нужны для выбранных выходных файлов или для проверки топологии
+        """
+        return bool(self.settings['create_esri_shape'] or self.settings['create_fgb'] or
+                    self.settings['create_geojsonl'] or self.settings['create_pgdump'] or
+                    (self.settings['create_parquet'] and self.settings['parquet_geometry']) or
+                    self.settings['topology_check'])
+
+    def _completeness(self, xml_file: str, record_fields: List[str]) -> Tuple[int, int]:
+        """
+        оценивает полноту выписки: количество заполненных полей записи об объекте недвижимости и количество контуров
+        (если контуры нужны для результата, см. _need_geometry). Выписка, которую не удалось разобрать, получает
+        наименьшую оценку
+        """
+        try:
+            real_estate_object = AbstractRealEstateObject.create_a_real_estate_object(
+                os.path.join(self.settings['folder_in_xml'], xml_file), self.settings)
+            if real_estate_object is None:
+                return -1, -1
+            record = real_estate_object.get_record(record_fields)
+            contours = len(real_estate_object.geometry) if self._need_geometry() else 0
+        except Exception:
+            return -1, -1
+        return sum(1 for value in record.values() if value not in ('', None, [], {})), contours
+
+    def plan_filter(self, xmlfiles: List[str], extract_filter: ExtractFilter) \
+            -> Tuple[List[str], List[str], Dict[str, Optional[Tuple[str, str]]]]:
+        """
+        отбирает выписки по кадастровому номеру и дате (см. filters.ExtractFilter) до их разбора: сначала по именам
+        переименованных файлов, затем по заголовкам остальных выписок (см. scan_headers). Нечитаемые выписки
+        не отсеиваются, при конвертировании они будут помещены в карантин. Возвращает отобранные выписки,
+        отсеянные выписки и прочитанные кадастровые номера и даты (для plan_dedup)
+        :param xmlfiles: list - имена файлов выписок
+        :param extract_filter: ExtractFilter
+        :return: tuple
+        """
+        headers = {}
+        to_scan = []
+        for xml_file in xmlfiles:
+            header = header_from_file_name(os.path.basename(xml_file))
+            if header is None:
+                to_scan.append(xml_file)
+            else:
+                headers[xml_file] = header
+        headers.update(self.scan_headers(to_scan))
+        selected, rejected = [], []
+        for xml_file in xmlfiles:
+            header = headers[xml_file]
+            if header is None or extract_filter.match_header(*header):
+                selected.append(xml_file)
+            else:
+                rejected.append(xml_file)
+        return selected, rejected, headers
+
+    def plan_dedup(self, xmlfiles: List[str], record_fields: List[str],
+                   headers: Optional[Dict[str, Optional[Tuple[str, str]]]] = None) -> Dict[str, str]:
+        """
+        находит выписки на один и тот же объект недвижимости (по кадастровому номеру parent_cad_number) и выбирает
+        из них одну в соответствии с настройкой 'dedup_policy' (см. dedup.DEDUP_POLICIES). Кадастровые номера
+        и даты читаются без полного разбора файлов (см. scan_headers), поэтому при правиле 'newest' лишние выписки
+        исключаются до разбора. При правиле 'most_complete' полностью разбираются только выписки, у которых есть
+        дубликаты. Возвращает словарь: пропускаемая выписка -> выписка, которая записывается вместо неё
+        :param xmlfiles: list - имена файлов выписок
+        :param record_fields: list - поля записи, по которым оценивается полнота выписки
+        :param headers: dict - уже прочитанные кадастровые номера и даты выписок (см. plan_filter), заголовки
+        остальных выписок читаются из файлов
+        :return: dict
+        """
+        policy = self.settings['dedup_policy']
+        if policy == 'all':
+            return {}
+        headers = headers or {}
+        known = {xml_file: headers[xml_file] for xml_file in xmlfiles if xml_file in headers}
+        known.update(self.scan_headers([xml_file for xml_file in xmlfiles if xml_file not in headers]))
+        return select_superseded(known, policy,
+                                 lambda xml_file: self._completeness(xml_file, record_fields))
+
+    def plan_validation(self, xmlfiles: List[str], record_fields: List[str]) -> List[Tuple[str, str, str, str]]:
+        """
+        проверяет структуру выписок до их разбора (см. validation.validate_extract): xml-файл не повреждён, схема
+        выписки известна, в выписке есть разделы, нужные для извлечения полей record_fields. Файлы просматриваются
+        в 'prevalidate_workers' процессах (0 - в основном процессе)
+        :param xmlfiles: list - имена файлов выписок
+        :param record_fields: list - поля записи об объекте недвижимости
+        :return: list - результаты проверки в порядке xmlfiles: класс выписки, тег корневого элемента, ошибка, текст
+        ошибки
+        """
+        directory = self.settings['folder_in_xml']
+        paths = [os.path.join(directory, xml_file) for xml_file in xmlfiles]
+        check = partial(validate_extract, fields=record_fields)
+        workers = int(self.settings['prevalidate_workers'])
+        results = []
+        self.progress(0, len(paths))
+        if workers > 0 and len(paths) > 1:
+            # модуль загружается только здесь, как и при разборе выписок в процессах (см. parse_pool.py)
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # файлы передаются процессам группами: проверка одной выписки занимает меньше, чем передача задания
+                for result in executor.map(check, paths, chunksize=max(1, min(64, len(paths) // (workers * 4)))):
+                    results.append(result)
+                    self.progress(len(results), len(paths))
+        else:
+            for path in paths:
+                results.append(check(path))
+                self.progress(len(results), len(paths))
+        return results
+
+    def _reject_invalid(self, xmlfiles: List[str], record_fields: List[str], checkpoint: Dict[str, Any]) -> List[str]:
+        """
+        исключает выписки, не прошедшие предварительную проверку (см. plan_validation), и возвращает остальные.
+        Выписки неизвестной схемы учитываются как не обработанные, остальные отклонённые выписки помещаются
+        в карантин - так же, как при ошибке их разбора. Результаты проверки добавляются в сводку
+        checkpoint['validation'] (см. validation.add_to_summary)
+        """
+        directory = self.settings['folder_in_xml']
+        summary = checkpoint.setdefault('validation', {})
+        valid = []
+        for xml_file, (schema, root_tag, problem, error) in zip(xmlfiles, self.plan_validation(xmlfiles,
+                                                                                               record_fields)):
+            add_to_summary(summary, schema, root_tag, problem)
+            if not problem:
+                valid.append(xml_file)
+                continue
+            xml_file_path = os.path.join(directory, xml_file)
+            if problem == 'unknown_schema':
+                checkpoint['errors'].append(xml_file_path)
+            else:
+                quarantine_path = self.quarantine(xml_file_path, 'Предварительная проверка выписки: ' + error)
+                checkpoint['quarantined'].append(xml_file_path)
+                self.message(f'Выписка {xml_file} не прошла предварительную проверку ({error}), файл помещён '
+                             f'в карантин: {quarantine_path}')
+            checkpoint['processed'].append(xml_file)
+        return valid
+
+    def rename_xml(self, dry_run: bool = False) -> List[Tuple[str, str]]:
+        """
+        переименовывает выписки из ЕГРН в формате: кадастровый номер---дата получения выписки (см. plan_renames).
+        Переименования выполняются параллельно функцией os.replace (атомарно). При dry_run=True файлы не
+        переименовываются, а выводится список предстоящих переименований. Возвращает план переименования
+        :param dry_run: bool
+        :return: list
+        """
+        self.message("Идёт переименование выписок xml..." if not dry_run else "План переименования выписок xml:")
+        directory = self.settings['folder_in_xml']
+        plan, count_unsupported_files = self.plan_renames()
+        xml_count = len(self.scan_inputs())
+        files_do_not_require_renaming = xml_count - len(plan) - count_unsupported_files
+        if dry_run:
+            for file_name, new_name in plan:
+                self.message(file_name + ' -> ' + new_name)
+            self.message("Будет переименовано " + str(len(plan)) + ' xml-файлов')
+        else:
+            failed = []
+            with ThreadPoolExecutor(max_workers=max(1, int(self.settings['scan_workers']))) as executor:
+                futures = [(file_name, executor.submit(os.replace, os.path.join(directory, file_name),
+                                                       os.path.join(directory, new_name)))
+                           for file_name, new_name in plan]
+                for file_name, future in futures:
+                    try:
+                        future.result()
+                    except OSError as e:
+                        failed.append((file_name, str(e)))
+            self.message("Готово!")
+            if files_do_not_require_renaming > 0:
+                self.message('Для ' + str(files_do_not_require_renaming) + ' xml-файлов переименование не требуется')
+            self.message("Переименовано " + str(len(plan) - len(failed)) + ' xml-файлов')
+            for file_name, error in failed:
+                self.message("Не удалось переименовать " + file_name + ': ' + error)
+            # перечень выписок обновляется без повторного просмотра папки
+            renamed = dict(plan)
+            for file_name, _ in failed:
+                del renamed[file_name]
+            self._inputs = [(renamed.get(xml_file, xml_file), size) for xml_file, size in self.scan_inputs()]
+        if count_unsupported_files > 0:
+            self.message("Не удалось прочитать " + str(count_unsupported_files) + ' xml-файлов')
+        self.message(SEPARATOR)
+        return plan
+
+    def quarantine(self, xml_file_path: str, error: str) -> str:
+        """
+        помещает выписку, при обработке которой возникла ошибка, в папку карантина (настройка 'quarantine_folder',
+        по умолчанию - папка quarantine в папке результата) и сохраняет рядом текст ошибки в файле <имя>.error.txt.
+        Исходный файл остаётся на месте: в карантин помещается жёсткая ссылка на него, а если её создать невозможно
+        (например, папки на разных дисках) - копия. Если исходный файл недоступен (удалён после поиска выписок или
+        не читается), в карантине сохраняется только текст ошибки
+        :param xml_file_path: str
+        :param error: str
+        :return: str - путь к файлу в карантине (к файлу с текстом ошибки, если выписку поместить не удалось)
+        """
+        folder = self.settings['quarantine_folder'] or os.path.join(self.settings['folder_out_xml'], 'quarantine')
+        os.makedirs(folder, exist_ok=True)
+        target = os.path.join(folder, os.path.basename(xml_file_path))
+        if os.path.exists(target):
+            os.remove(target)
+        try:
+            os.link(xml_file_path, target)
+        except OSError:
+            try:
+                shutil.copy2(xml_file_path, target)
+            except OSError as e:
+                error += '\nФайл выписки не помещён в карантин: ' + str(e) + '\n'
+                target = None
+        error_path = os.path.join(folder, os.path.basename(xml_file_path)) + '.error.txt'
+        with open(error_path, 'w', encoding='utf-8') as f:
+            f.write(error)
+        return target or error_path
+
+    def _checkpoint_path(self) -> str:
+        return os.path.join(self.settings['folder_out_xml'], CHECKPOINT_FILE)
+
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        """
+        возвращает сохранённое состояние прерванного конвертирования, если оно относится к той же папке с выписками,
+        тем же выходным форматам и полям, а выходные файлы на месте; иначе None
+        """
+        checkpoint_path = self._checkpoint_path()
+        if not os.path.exists(checkpoint_path):
+            return None
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        for key in RESUME_KEYS:
+            if checkpoint.get(key, '') != self.settings[key]:
+                return None
+        if checkpoint.get('folder_in_xml') != os.path.realpath(self.settings['folder_in_xml']):
+            return None
+        # файлы частей, записанные после сохранения состояния (см. _open_writers), тоже должны быть на месте
+        if self.settings['shard_by']:
+            shards = {key: state for key, state in checkpoint['shards'].items() if state['opened']}
+            paths = shard_output_paths(shards) + [path for state in shards.values()
+                                                  for part_paths in state['parts'].values() for path in part_paths]
+            if not all(os.path.exists(path) for path in paths):
+                return None
+            return checkpoint
+        if not all(os.path.exists(path) for part_paths in checkpoint['parts'].values() for path in part_paths):
+            return None
+        if self.settings['create_xlsx'] and not os.path.exists(checkpoint['xlsx_paths'][-1]):
+            return None
+        if self.settings['create_esri_shape'] and not os.path.exists(checkpoint['shp_path']):
+            return None
+        if self.settings['create_fgb'] and not os.path.exists(checkpoint['fgb_path']):
+            return None
+        if self.settings['create_parquet'] and not os.path.exists(checkpoint['parquet_path']):
+            return None
+        if self.settings['create_geojsonl'] and not os.path.exists(checkpoint['geojsonl_path']):
+            return None
+        if self.settings['create_csv'] and not os.path.exists(checkpoint['csv_path']):
+            return None
+        if self.settings['create_pgdump'] and not os.path.exists(checkpoint['pgdump_path']):
+            return None
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint: Dict[str, Any]) -> None:
+        """
+        сохраняет состояние конвертирования (запись во временный файл и замена, чтобы при сбое во время записи
+        не остался повреждённый файл состояния)
+        """
+        checkpoint_path = self._checkpoint_path()
+        with open(checkpoint_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+        os.replace(checkpoint_path + '.tmp', checkpoint_path)
+
+    def _open_writers(self, state: Dict[str, Any], segment: int, append_mode: bool = False) -> Dict[str, Any]:
+        """
+        открывает выходные файлы, пути к которым хранятся в state (состояние конвертирования или состояние части
+        результата, см. ShardedWriters), для записи объектов до следующего сохранения состояния; segment - количество
+        сохранений состояния. Файлы, открытые ранее (state['opened']), продолжаются: шейп-файл и файлы GeoJSONL, CSV
+        и дампа дописываются в режиме добавления, а новые объекты таблицы xlsx и файлов FlatGeobuf и Parquet, которые
+        нельзя дописать без перезаписи всего файла, записываются в отдельные файлы частей (state['parts']) и
+        дописываются в основные файлы один раз в конце конвертирования (см. _combine_parts). В режиме добавления
+        (append_mode) заменяются только объекты, которые были в файлах до начала конвертирования
+        """
+        writers = {}
+        prj_wkt = read_prj(self.settings['output_prj']) if self.settings['output_prj'] else None
+        opened = state['opened']
+        replace = append_mode and self.settings['replace_existing']
+        paths = {'xlsx': state['xlsx_paths'][0] if state['xlsx_paths'] else None, 'fgb': state['fgb_path'],
+                 'parquet': state['parquet_path']}
+        if opened:
+            for kind, path in paths.items():
+                if path is not None:
+                    stem, ext = os.path.splitext(path)
+                    paths[kind] = stem + PART_SUFFIX + str(segment) + ext
+                    state['parts'].setdefault(kind, []).append(paths[kind])
+        if paths['xlsx'] is not None:
+            # строки файлов частей оформляются при переносе в основную таблицу
+            writers['xlsx'] = XlsxWriter(paths['xlsx'], append_mode and not opened, replace and not opened,
+                                         self.settings['output_fields'], int(self.settings['xlsx_max_rows']),
+                                         self.settings['xlsx_rollover'], styled=not opened)
+        if state['shp_path'] is not None:
+            writers['shp'] = ShapeWriter(state['shp_path'], append_mode or opened, replace,
+                                         self.settings['output_fields'], self.settings['shp_writer'],
+                                         self.settings['shp_spatial_index'], prj_wkt,
+                                         state.get('shp_existing_records'))
+            state['shp_existing_records'] = writers['shp'].existing_records
+        if paths['fgb'] is not None:
+            writers['fgb'] = FlatGeobufWriter(paths['fgb'], append_mode and not opened, replace and not opened,
+                                              self.settings['output_fields'], self.settings['fgb_sort_memory_mb'],
+                                              prj_wkt)
+        if paths['parquet'] is not None:
+            writers['parquet'] = ParquetWriter(paths['parquet'], append_mode and not opened, replace and not opened,
+                                               self.settings['output_fields'], self.settings['parquet_geometry'],
+                                               self.settings['parquet_row_group_rows'])
+        if state['geojsonl_path'] is not None:
+            writers['geojsonl'] = GeoJsonLinesWriter(state['geojsonl_path'], append_mode or opened,
+                                                     self.settings['output_fields'], self.settings['stream_gzip'])
+        if state['csv_path'] is not None:
+            writers['csv'] = CsvWriter(state['csv_path'], append_mode or opened, self.settings['output_fields'],
+                                       self.settings['stream_gzip'])
+        if state['pgdump_path'] is not None:
+            writers['pgdump'] = PostgisDumpWriter(state['pgdump_path'], append_mode or opened,
+                                                  self.settings['output_fields'], self.settings['pgdump_table'],
+                                                  self.settings['pgdump_srid'])
+        state['opened'] = True
+        return writers
+
+    @staticmethod
+    def _close_writers(writers: Dict[str, Any], state: Dict[str, Any]) -> None:
+        """
+        закрывает выходные файлы (см. _open_writers) и добавляет в state новые файлы серии xlsx (см. XlsxWriter)
+        """
+        for writer in writers.values():
+            writer.close()
+        if 'xlsx' in writers:
+            xlsx = writers['xlsx']
+            if xlsx.path == state['xlsx_paths'][-1]:
+                state['xlsx_paths'][-1:] = xlsx.paths
+                # объекты, записанные до сохранения состояния, не заменяются при объединении с файлами частей
+                state['xlsx_replaced'] = sorted(xlsx.replaced)
+            else:
+                state['parts']['xlsx'][-1:] = xlsx.paths
+
+    def _combine_parts(self, state: Dict[str, Any], append_mode: bool = False) -> None:
+        """
+        дописывает файлы частей таблицы xlsx и файлов FlatGeobuf и Parquet (см. _open_writers) в основные файлы
+        и удаляет их. Каждый основной файл перезаписывается один раз, поэтому сохранения состояния во время
+        конвертирования не увеличивают время записи этих файлов
+        """
+        parts = state['parts']
+        prj_wkt = read_prj(self.settings['output_prj']) if self.settings['output_prj'] else None
+        if parts.get('xlsx'):
+            writer = XlsxWriter(state['xlsx_paths'][-1], True, append_mode and self.settings['replace_existing'],
+                                self.settings['output_fields'], int(self.settings['xlsx_max_rows']),
+                                self.settings['xlsx_rollover'], state.get('xlsx_replaced', ()))
+            for path in parts['xlsx']:
+                writer.append_table(path)
+            writer.close()
+            state['xlsx_paths'][-1:] = writer.paths
+        if parts.get('fgb'):
+            writer = FlatGeobufWriter(state['fgb_path'], True, False, self.settings['output_fields'],
+                                      self.settings['fgb_sort_memory_mb'], prj_wkt)
+            for path in parts['fgb']:
+                writer.append_file(path)
+            writer.close()
+        if parts.get('parquet'):
+            writer = ParquetWriter(state['parquet_path'], True, False, self.settings['output_fields'],
+                                   self.settings['parquet_geometry'], self.settings['parquet_row_group_rows'])
+            for path in parts['parquet']:
+                writer.append_file(path)
+            writer.close()
+        for paths in parts.values():
+            for path in paths:
+                os.remove(path)
+        state['parts'] = {}
+
+    def _record_shard_writes(self, sharded: ShardedWriters, checkpoint: Dict[str, Any]) -> None:
+        """
+        учитывает итоги записи объектов в файлы частей результата: выписка учитывается как успешно обработанная после
+        записи объекта во все файлы части, а при ошибке записи помещается в карантин (если объект до ошибки записан
+        в часть файлов, выписка перечисляется в checkpoint['partial'])
+        """
+        for xml_file_path, written, error in sharded.take_results():
+            if error is None:
+                checkpoint['successful'] += 1
+                continue
+            quarantine_path = self.quarantine(xml_file_path, error)
+            checkpoint['quarantined'].append(xml_file_path)
+            self.message(f'Ошибка при записи объекта из выписки {os.path.basename(xml_file_path)}, файл помещён '
+                         f'в карантин: {quarantine_path}')
+            if written:
+                checkpoint.setdefault('partial', []).append(xml_file_path)
+                self.message(f'Объект из выписки {os.path.basename(xml_file_path)} до ошибки записан только в часть '
+                             f'выходных файлов: ' + ', '.join(written))
+
+    def convert(self, xml_files: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        конвертирует набор выписок из формата xml в выбранные форматы файлов. Возвращает словарь с итогами: количество
+        успешно обработанных файлов ('successful'), список не обработанных файлов ('errors'), список файлов, при
+        обработке которых возникла ошибка и которые помещены в карантин ('quarantined'; из них объекты, записанные
+        до ошибки только в часть выходных файлов, - 'partial'), пропущенные дубликаты
+        выписок на те же объекты недвижимости (см. plan_dedup, 'superseded'), выписки, не соответствующие фильтру
+        выписок (см. filters.ExtractFilter, 'filtered'), список созданных или
+        дополненных файлов ('outputs'), время работы в секундах ('seconds') и статистику времени ожидания чтения
+        файлов и их обработки ('stats'). Из выписок извлекаются только поля, выбранные в настройке 'output_fields'.
+        Ошибка при обработке одной выписки не прерывает конвертирование. Каждые 'checkpoint_minutes' минут выходные
+        файлы сохраняются на диск вместе с перечнем обработанных выписок, поэтому прерванное конвертирование
+        при повторном запуске (если включена настройка 'resume_interrupted') продолжается с последнего сохранения.
+        При включённой настройке 'create_links' по всем выпискам набора строится индекс связей объектов (self.links,
+        см. links.RelationIndex), который сохраняется таблицей связей; кадастровые номера объектов, упомянутых
+        в выписках, но не имеющих выписок в наборе, возвращаются в 'unresolved_links'. При включённой настройке
+        'topology_check' контуры земельных участков проверяются на наложения и зазоры (см. topology.find_problems),
+        количество нарушений возвращается в 'topology_problems'. При включённой настройке 'prevalidate' выписки
+        до разбора проверяются на корректность структуры (см. plan_validation), сводка по схемам выписок и корневым
+        элементам возвращается в 'validation'
+        :param xml_files: list - имена файлов выписок папки 'folder_in_xml', которые нужно конвертировать (например,
+        пакет распределённого конвертирования, см. ledger.run_node); None - все выписки папки
+        :return: dict
+        """
+        directory = self.settings['folder_in_xml']
+        create_xlsx = self.settings['create_xlsx']
+        create_esri_shape = self.settings['create_esri_shape']
+        create_fgb = self.settings['create_fgb']
+        create_parquet = self.settings['create_parquet']
+        create_geojsonl = self.settings['create_geojsonl']
+        create_csv = self.settings['create_csv']
+        create_pgdump = self.settings['create_pgdump']
+        create_links = self.settings['create_links']
+        append_mode = self.settings['append_mode']
+        shard_by = self.settings['shard_by']
+        if shard_by and shard_by not in SHARD_KEYS:
+            raise ValueError('Неизвестный способ разделения результата на части: ' + str(shard_by))
+        if self.settings['dedup_policy'] not in DEDUP_POLICIES:
+            raise ValueError('Неизвестное правило обработки дубликатов выписок: ' + str(self.settings['dedup_policy']))
+        if shard_by and append_mode:
+            raise ValueError('Разделение результата на части не поддерживается в режиме добавления в существующие '
+                             'файлы')
+        if create_fgb and append_mode:
+            raise ValueError('Запись файла FlatGeobuf не поддерживается в режиме добавления в существующие файлы')
+        if create_parquet and append_mode:
+            raise ValueError('Запись файла Parquet не поддерживается в режиме добавления в существующие файлы')
+        if (create_geojsonl or create_csv) and append_mode:
+            raise ValueError('Запись файлов GeoJSONL и CSV не поддерживается в режиме добавления в существующие файлы')
+        if create_pgdump and append_mode:
+            raise ValueError('Запись дампа PostGIS не поддерживается в режиме добавления в существующие файлы')
+        extract_filter = ExtractFilter(self.settings)
+        transformer = CoordinateTransformer(self.settings['transform_swap_axes'], self.settings['transform_affine'],
+                                            self.settings['transform_helmert'])
+        simplifier = GeometrySimplifier(float(self.settings['geometry_grid']),
+                                        float(self.settings['geometry_simplify_tolerance']))
+        checkpoint_seconds = float(self.settings['checkpoint_minutes']) * 60
+        if xml_files is None:
+            inputs = self.scan_inputs()
+        else:
+            # пути могут быть заданы с разделителем '/' (см. ledger.WorkLedger.plan)
+            inputs = [(os.path.normpath(xml_file), 0) for xml_file in xml_files]
+            if self.settings['schedule'] in ('largest_first', 'balanced'):
+                inputs = [(xml_file, os.path.getsize(os.path.join(directory, xml_file))) for xml_file, _ in inputs]
+        # порядок обработки зависит только от путей и размеров файлов (см. scanner.schedule)
+        xmlfiles = [xml_file for xml_file, _ in schedule(inputs, self.settings['schedule'],
+                                                         int(self.settings['parse_workers']))]
+        self.message("Идёт получение данных из выписок XML и запись в выбранные форматы файлов...")
+        start_time = time.time()
+        now = datetime.datetime.now()
+        directory_out = self.settings['folder_out_xml']
+        checkpoint = self._load_checkpoint() if self.settings['resume_interrupted'] else None
+        if checkpoint is not None:
+            shp_path = checkpoint['shp_path']
+            fgb_path = checkpoint.get('fgb_path')
+            parquet_path = checkpoint.get('parquet_path')
+            geojsonl_path = checkpoint.get('geojsonl_path')
+            csv_path = checkpoint.get('csv_path')
+            pgdump_path = checkpoint.get('pgdump_path')
+            # объекты заменяются так же, как до прерывания, независимо от текущей настройки
+            append_mode = checkpoint['append_mode']
+            self.message("Продолжение прерванного конвертирования: ранее обработано " +
+                         str(len(checkpoint['processed'])) + " файлов (сохранено " + checkpoint['time'] + ")")
+        else:
+            xlsx_path = shp_path = fgb_path = parquet_path = geojsonl_path = csv_path = pgdump_path = None
+            if create_xlsx:
+                if append_mode:
+                    xlsx_path = self.settings['append_xlsx_path']
+                else:
+                    xlsx_path = os.path.join(directory_out, now.strftime("%d_%m_%Y  %H-%M") +
+                                             " real_estate_objects_EGRN.xlsx")
+            if create_esri_shape:
+                if append_mode:
+                    shp_path = self.settings['append_shp_path']
+                else:
+                    shp_path = os.path.join(directory_out,
+                                            'real_estate_objects_EGRN_' + now.strftime("%d_%m_%Y  %H-%M") + '.shp')
+            if create_fgb:
+                fgb_path = os.path.join(directory_out,
+                                        'real_estate_objects_EGRN_' + now.strftime("%d_%m_%Y  %H-%M") + FGB_EXT)
+            if create_parquet:
+                parquet_path = os.path.join(directory_out,
+                                            'real_estate_objects_EGRN_' + now.strftime("%d_%m_%Y  %H-%M") + '.parquet')
+            gzip_ext = GZIP_EXT if self.settings['stream_gzip'] else ''
+            if create_geojsonl:
+                geojsonl_path = os.path.join(directory_out, 'real_estate_objects_EGRN_' +
+                                             now.strftime("%d_%m_%Y  %H-%M") + GEOJSONL_EXT + gzip_ext)
+            if create_csv:
+                csv_path = os.path.join(directory_out, 'real_estate_objects_EGRN_' +
+                                        now.strftime("%d_%m_%Y  %H-%M") + CSV_EXT + gzip_ext)
+            if create_pgdump:
+                pgdump_path = os.path.join(directory_out, 'real_estate_objects_EGRN_' +
+                                           now.strftime("%d_%m_%Y  %H-%M") + PGDUMP_EXT)
+            if shard_by:
+                # части результата записываются в отдельную папку, пути к их файлам хранятся в 'shards'
+                xlsx_path = shp_path = fgb_path = parquet_path = geojsonl_path = csv_path = pgdump_path = None
+                directory_out = os.path.join(directory_out, 'real_estate_objects_EGRN_' +
+                                             now.strftime("%d_%m_%Y  %H-%M"))
+            checkpoint = {'folder_in_xml': os.path.realpath(directory),
+                          **{key: self.settings[key] for key in RESUME_KEYS},
+                          'links_path': os.path.join(directory_out, 'real_estate_objects_EGRN_' +
+                                                     now.strftime("%d_%m_%Y  %H-%M") + LINKS_FILE_SUFFIX)
+                          if create_links else None, 'links': {},
+                          'topology_path': os.path.join(directory_out, 'real_estate_objects_EGRN_' +
+                                                        now.strftime("%d_%m_%Y  %H-%M") + TOPOLOGY_FILE_SUFFIX)
+                          if self.settings['topology_check'] else None, 'topology_spool_size': 0,
+                          'shards_folder': directory_out if shard_by else None, 'shards': {},
+                          'xlsx_paths': [xlsx_path] if create_xlsx and not shard_by else [], 'shp_path': shp_path,
+                          'fgb_path': fgb_path, 'parquet_path': parquet_path, 'geojsonl_path': geojsonl_path,
+                          'csv_path': csv_path, 'pgdump_path': pgdump_path, 'append_mode': append_mode,
+                          'opened': False, 'segment': 0, 'parts': {}, 'processed': [], 'successful': 0,
+                          'errors': [], 'quarantined': [], 'partial': [], 'filtered': []}
+        xlsx_paths = checkpoint['xlsx_paths']  # при превышении лимита строк таблица продолжается в новых файлах
+        sharded = None
+        if shard_by:
+            directory_out = checkpoint['shards_folder']
+            writers = {}
+            sharded = ShardedWriters(directory_out, create_xlsx, create_esri_shape, create_fgb, create_parquet,
+                                     create_geojsonl, create_csv, self.settings['stream_gzip'], create_pgdump,
+                                     lambda state: self._open_writers(state, checkpoint['segment']),
+                                     self._close_writers, checkpoint['shards'], self.settings['shard_workers'])
+            needed_fields = set(select_fields(self.settings['output_fields']))
+            if create_xlsx or create_csv:
+                needed_fields.add('entry_parcels')  # по составу единого землепользования формируются строки таблицы
+        else:
+            writers = self._open_writers(checkpoint, checkpoint['segment'], append_mode)
+            if create_esri_shape:
+                shp_path = writers['shp'].path + '.shp'
+                checkpoint['shp_path'] = shp_path
+            # поля, которые нужны хотя бы одному из выходных файлов; остальные свойства объектов не вычисляются
+            needed_fields = set()
+            for writer in writers.values():
+                needed_fields.update(writer.record_fields)
+        if create_links:
+            needed_fields.update(('estate_objects', 'entry_parcels'))
+        # индекс связей строится по словарю из состояния конвертирования, поэтому продолжается после перезапуска
+        self.links = RelationIndex(checkpoint['links']) if create_links else None
+        # контуры земельных участков для проверки топологии дописываются во временный файл, который при продолжении
+        # конвертирования обрезается до сохранённого размера
+        contour_spool = None
+        if self.settings['topology_check']:
+            contour_spool = ContourSpool(checkpoint['topology_path'] + SPOOL_EXT, checkpoint['topology_spool_size'])
+        split_by_kind = self.settings['xlsx_split_by_kind']
+        record_fields = [key for key in RECORD_FIELDS if key in needed_fields]
+        # выписки, не соответствующие фильтру по кадастровому номеру и дате, исключаются до разбора
+        filtered, headers = [], {}
+        if extract_filter.header_active:
+            xmlfiles, filtered, headers = self.plan_filter(xmlfiles, extract_filter)
+        # из нескольких выписок на один объект недвижимости записывается одна (настройка 'dedup_policy'), лишние
+        # выписки исключаются до разбора
+        superseded = self.plan_dedup(xmlfiles, record_fields, headers)
+        if superseded:
+            self.message("Пропущено выписок на объекты, для которых есть более подходящие выписки: " +
+                         str(len(superseded)))
+            xmlfiles = [xml_file for xml_file in xmlfiles if xml_file not in superseded]
+        processed = set(checkpoint['processed'])
+        files_to_process = [xml_file for xml_file in xmlfiles if xml_file not in processed]
+        # выписки с повреждённой структурой исключаются до разбора (настройка 'prevalidate')
+        prevalidate_seconds = 0.0
+        if self.settings['prevalidate'] and files_to_process:
+            self.message("Предварительная проверка выписок...")
+            start = time.perf_counter()
+            # объекты, не соответствующие фильтру по виду и охвату, отсеиваются до извлечения полей, поэтому для них
+            # проверяется только корректность xml и схема выписки
+            files_to_process = self._reject_invalid(files_to_process, record_fields if extract_filter.kinds is None
+                                                    and extract_filter.bbox is None else [], checkpoint)
+            prevalidate_seconds = time.perf_counter() - start
+        pb = len(xmlfiles) - len(files_to_process)
+        self.progress(pb, len(xmlfiles))
+        processing_seconds = 0.0
+        last_checkpoint = time.time()
+        paths = [os.path.join(directory, xml_file) for xml_file in files_to_process]
+        need_geometry = self._need_geometry()
+        parse_pool = None
+        if int(self.settings['parse_workers']) > 0 and files_to_process:
+            # выписки читаются и разбираются в отдельных процессах, контуры передаются через общую память в блоках
+            # по размеру файлов; модуль загружается только здесь, т.к. вместе с ним загружаются multiprocessing
+            # и concurrent.futures.process
+            from parse_pool import ParsePool
+            parse_pool = ParsePool(self.settings['parse_workers'], self.settings, record_fields,
+                                   need_geometry or extract_filter.bbox is not None, extract_filter.kinds,
+                                   shard_by == 'district_name')
+            sizes = dict(inputs)
+            read_stats = parse_pool.stats
+            files = parse_pool.parse([(path, sizes.get(xml_file, 0))
+                                      for path, xml_file in zip(paths, files_to_process)])
+        else:
+            reader = self.read_files(paths)
+            read_stats = reader.stats
+            files = iter(reader)
+        # при разборе в отдельных процессах вместо содержимого файла выдаётся разобранный объект (ParsedObject);
+        # ошибка чтения или разбора выписки передаётся третьим элементом и приводит к её помещению в карантин
+        for xml_file_path, xml_data, parse_error in files:
+            processing_start = time.perf_counter()
+            xml_file = os.path.relpath(xml_file_path, directory)
+            written = []  # выходные файлы, в которые объект уже записан
+            try:
+                if parse_error is not None:
+                    raise parse_error
+                if parse_pool is not None:
+                    real_estate_object = xml_data
+                else:
+                    real_estate_object = AbstractRealEstateObject.create_a_real_estate_object(xml_file_path,
+                                                                                              self.settings, xml_data)
+                geometry = None
+                if real_estate_object is not None and extract_filter.bbox is not None:
+                    # контуры вычисляются один раз: для проверки охвата и для записи
+                    geometry = real_estate_object.geometry
+                    if transformer.active and geometry:
+                        geometry = transformer(geometry)
+                if real_estate_object is not None and not extract_filter.match_object(real_estate_object.kind,
+                                                                                      geometry):
+                    # вид объекта и охват проверяются до извлечения свойств объекта
+                    checkpoint['filtered'].append(xml_file)
+                elif real_estate_object is not None:
+                    # ошибка в данных выписки возникает при вычислении свойств объекта (до записи) или при
+                    # преобразовании значений в writers: файлы пишутся по очереди, поэтому объект может оказаться
+                    # записан только в часть файлов - такие выписки перечисляются в checkpoint['partial']
+                    record = real_estate_object.get_record(record_fields)
+                    if need_geometry:
+                        if geometry is None:
+                            geometry = real_estate_object.geometry
+                            if transformer.active and geometry:
+                                geometry = transformer(geometry)
+                        if geometry == {}:
+                            self.message(f'Выписка {xml_file} не содержит координат границ')
+                    else:
+                        geometry = {}
+                    # контуры облегчаются один раз для всех выходных файлов, топология проверяется по исходным
+                    source_geometry = geometry
+                    if simplifier.active and geometry:
+                        geometry = simplifier(geometry)
+                    group = real_estate_object.kind if split_by_kind else None
+                    if sharded is not None:
+                        # запись выполняется в потоках записи частей, выписка учитывается как успешно обработанная
+                        # после записи (см. _record_shard_writes)
+                        key = shard_key(shard_by, record['parent_cad_number'],
+                                        real_estate_object.district_name if shard_by == 'district_name' else '')
+                        sharded.write(key, xml_file_path, record, geometry, group)
+                    else:
+                        if geometry != {}:
+                            for kind in ('shp', 'fgb'):
+                                if kind in writers:
+                                    writers[kind].write(record, geometry)
+                                    written.append(kind)
+                        if create_xlsx:
+                            writers['xlsx'].write(record, group)
+                            written.append('xlsx')
+                        if create_parquet:
+                            writers['parquet'].write(record, geometry)
+                            written.append('parquet')
+                        if create_geojsonl:
+                            writers['geojsonl'].write(record, geometry)
+                            written.append('geojsonl')
+                        if create_pgdump:
+                            writers['pgdump'].write(record, geometry)
+                            written.append('pgdump')
+                        if create_csv:
+                            writers['csv'].write(record)
+                            written.append('csv')
+                    if self.links is not None:
+                        self.links.add(record['parent_cad_number'], real_estate_object.kind, record['estate_objects'],
+                                       record['entry_parcels'])
+                    if contour_spool is not None and real_estate_object.kind == 'Земельные участки':
+                        for contour, polys in source_geometry.items():
+                            contour_spool.add(record['parent_cad_number'], contour, polys)
+                    if sharded is None:
+                        checkpoint['successful'] += 1
+                else:
+                    checkpoint['errors'].append(xml_file_path)
+            except Exception:
+                quarantine_path = self.quarantine(xml_file_path, format_exc())
+                checkpoint['quarantined'].append(xml_file_path)
+                self.message(f'Ошибка при обработке выписки {xml_file}, файл помещён в карантин: {quarantine_path}')
+                if written:
+                    checkpoint.setdefault('partial', []).append(xml_file_path)
+                    self.message(f'Объект из выписки {xml_file} до ошибки записан только в часть выходных файлов: ' +
+                                 ', '.join(written))
+            checkpoint['processed'].append(xml_file)
+            processing_seconds += time.perf_counter() - processing_start
+            pb += 1
+            self.progress(pb, len(xmlfiles))
+            if sharded is not None:
+                self._record_shard_writes(sharded, checkpoint)
+            if checkpoint_seconds > 0 and time.time() - last_checkpoint >= checkpoint_seconds \
+                    and pb < len(xmlfiles):
+                if sharded is not None:
+                    sharded.close()
+                    self._record_shard_writes(sharded, checkpoint)
+                else:
+                    self._close_writers(writers, checkpoint)
+                if contour_spool is not None:
+                    checkpoint['topology_spool_size'] = contour_spool.flush()
+                checkpoint['segment'] += 1
+                checkpoint['time'] = datetime.datetime.now().strftime("%d.%m.%Y %H:%M:%S")
+                self._save_checkpoint(checkpoint)
+                if sharded is None:
+                    writers = self._open_writers(checkpoint, checkpoint['segment'], append_mode)
+                last_checkpoint = time.time()
+        if parse_pool is not None:
+            parse_pool.close()
+        if sharded is not None:
+            sharded.shutdown()
+            self._record_shard_writes(sharded, checkpoint)
+            states = list(checkpoint['shards'].values())
+        else:
+            self._close_writers(writers, checkpoint)
+            states = [checkpoint]
+        if any(state['parts'] for state in states):
+            # после объединения с файлами частей основные файлы уже нельзя продолжить по сохранённому состоянию
+            if os.path.exists(self._checkpoint_path()):
+                os.remove(self._checkpoint_path())
+            self.message("Объединение выходных файлов с файлами, записанными после сохранения состояния...")
+            for state in states:
+                self._combine_parts(state, append_mode)
+        if sharded is not None:
+            outputs = shard_output_paths(checkpoint['shards']) + [sharded.write_manifest(shard_by)]
+        else:
+            outputs = xlsx_paths + [path for path in (shp_path, fgb_path, parquet_path, geojsonl_path, csv_path,
+                                                      pgdump_path) if path is not None]
+        unresolved_links = []
+        if self.links is not None:
+            outputs.append(self.links.write_csv(checkpoint['links_path']))
+            unresolved_links = self.links.missing()
+        topology_problems = 0
+        if contour_spool is not None:
+            contour_spool.close()
+            self.message("Проверка наложений и зазоров между земельными участками...")
+            topology_problems = write_topology_report(contour_spool.path, checkpoint['topology_path'],
+                                                      float(self.settings['topology_gap_tolerance']),
+                                                      float(self.settings['topology_min_overlap']))
+            os.remove(contour_spool.path)
+            outputs.append(checkpoint['topology_path'])
+        if os.path.exists(self._checkpoint_path()):
+            os.remove(self._checkpoint_path())
+        count_successful_files = checkpoint['successful']
+        xml_errors = checkpoint['errors']
+        quarantined = checkpoint['quarantined']
+        partial = checkpoint.get('partial', [])
+        filtered += checkpoint['filtered']
+        if append_mode:
+            self.message("Получение данных из выписок XML завершено!" + chr(13) +
+                         "Результат дописан в существующие файлы")
+        else:
+            self.message("Получение данных из выписок XML завершено!" + chr(13) +
+                         "Результат сохранён в папке " + directory_out)
+        sec = round(float("%s" % (time.time() - start_time)))
+        if sec == 0:
+            sec = 1
+        self.message("Успешно обработано " + str(count_successful_files) + " файлов за " + str(sec) + " сек.")
+        validation = checkpoint.get('validation', {})
+        stats = {'scan_seconds': round(self.scan_seconds, 2), 'prevalidate_seconds': round(prevalidate_seconds, 2),
+                 'read_mb': round(read_stats['bytes'] / 1024 / 1024, 1),
+                 'read_seconds': round(read_stats['read_seconds'], 2),
+                 'io_wait_seconds': round(read_stats['wait_seconds'], 2),
+                 'processing_seconds': round(processing_seconds, 2)}
+        self.message("Ожидание чтения файлов: " + str(stats['io_wait_seconds']) + " сек., разбор и обработка: " +
+                     str(stats['processing_seconds']) + " сек. (прочитано " + str(stats['read_mb']) + " МБ)")
+        if transformer.active and transformer.stats['objects']:
+            stats['transform_seconds_per_1m_points'] = round(transformer.stats['seconds'] /
+                                                             max(1, transformer.stats['points']) * 1000000, 2)
+            self.message("Преобразование координат: точек " + str(transformer.stats['points']) + ", " +
+                         str(stats['transform_seconds_per_1m_points']) + " сек. на 1 млн точек")
+        if simplifier.active and simplifier.stats['polygons']:
+            points_in, points_out = simplifier.stats['points_in'], simplifier.stats['points_out']
+            stats.update({'simplify_points_in': points_in, 'simplify_points_out': points_out,
+                          'simplify_seconds_per_100k': round(simplifier.stats['seconds'] /
+                                                             simplifier.stats['polygons'] * 100000, 2)})
+            self.message("Облегчение геометрии: точек " + str(points_in) + " -> " + str(points_out) + " (-" +
+                         str(round(100 - points_out / max(1, points_in) * 100, 1)) + " %), " +
+                         str(stats['simplify_seconds_per_100k']) + " сек. на 100 тыс. контуров")
+        if validation:
+            checked = sum(sum(problems.values()) for problems in validation['schemas'].values())
+            rejected = checked - sum(problems.get('', 0) for problems in validation['schemas'].values())
+            self.message("Предварительная проверка выписок: проверено " + str(checked) + " файлов, отклонено " +
+                         str(rejected) + " (" + str(stats['prevalidate_seconds']) + " сек.)")
+            for line in format_summary(validation):
+                self.message(line)
+        if len(xml_errors) > 0:
+            self.message("Не обработано " + str(len(xml_errors)) + " файлов:")
+            for err_file in xml_errors:
+                self.message(err_file)
+        if len(quarantined) > 0:
+            self.message("Помещено в карантин из-за ошибок " + str(len(quarantined)) + " файлов:")
+            for err_file in quarantined:
+                self.message(err_file)
+        if partial:
+            self.message("Объекты из " + str(len(partial)) + " файлов записаны до ошибки только в часть выходных "
+                         "файлов:")
+            for err_file in partial:
+                self.message(err_file)
+        if filtered:
+            self.message("Пропущено выписок, не соответствующих фильтру выписок: " + str(len(filtered)))
+        if unresolved_links:
+            self.message("Объектов, которые упоминаются в выписках, но выписок на которые в наборе нет: " +
+                         str(len(unresolved_links)) + " (см. столбец linked_in_batch таблицы связей)")
+        if topology_problems:
+            self.message("Найдено наложений и зазоров между земельными участками: " + str(topology_problems) +
+                         " (см. " + os.path.basename(checkpoint['topology_path']) + ")")
+        self.message(SEPARATOR)
+        return {'successful': count_successful_files, 'errors': xml_errors, 'quarantined': quarantined,
+                'partial': partial, 'superseded': superseded, 'filtered': filtered,
+                'unresolved_links': unresolved_links, 'topology_problems': topology_problems, 'validation': validation,
+                'outputs': outputs, 'seconds': sec, 'stats': stats}
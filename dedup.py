@@ -0,0 +1,71 @@
+from typing import Dict, List, Tuple, Optional, Callable, Any
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# правила обработки нескольких выписок на один объект недвижимости (настройка 'dedup_policy'): записывать все,
+# только самую новую (по дате выписки) или самую полную (с наибольшим количеством заполненных полей и контуров)
+DEDUP_POLICIES = ('all', 'newest', 'most_complete')
+
+
+def date_key(extract_date: str) -> Tuple[int, int, int]:
+    """
+    возвращает ключ сортировки для даты выписки в формате "ДД.ММ.ГГГГ" (нераспознанная или пустая дата - самая ранняя)
+    :param extract_date: str
+    :return: tuple
+    """
+    try:
+        day, month, year = (int(part) for part in extract_date.split('.'))
+    except (ValueError, AttributeError):
+        return 0, 0, 0
+    return year, month, day
+
+
+def group_duplicates(headers: Dict[str, Optional[Tuple[str, str]]]) -> Dict[str, List[str]]:
+    """
+    группирует выписки по кадастровому номеру объекта недвижимости (хеш-таблица: кадастровый номер -> список выписок).
+    Возвращаются только группы из нескольких выписок; выписки без кадастрового номера и нечитаемые выписки (None)
+    в группы не включаются
+    :param headers: dict - имя файла -> (кадастровый номер, дата выписки) или None (см. header_scan.scan_header)
+    :return: dict
+    """
+    groups: Dict[str, List[str]] = {}
+    for file_name, header in headers.items():
+        if header is not None and header[0]:
+            groups.setdefault(header[0], []).append(file_name)
+    return {cad_number: files for cad_number, files in groups.items() if len(files) > 1}
+
+
+def select_superseded(headers: Dict[str, Optional[Tuple[str, str]]], policy: str,
+                      score: Optional[Callable[[str], Any]] = None) -> Dict[str, str]:
+    """
+    выбирает выписки, которые не нужно обрабатывать, т.к. на тот же объект недвижимости есть более подходящая выписка.
+    При policy='newest' остаётся выписка с самой поздней датой, при policy='most_complete' - с наибольшей оценкой
+    score(имя файла) (вызывается только для выписок, у которых есть дубликаты), при равенстве - более новая;
+    при одинаковых датах - файл, имя которого последнее по алфавиту
+    :param headers: dict - имя файла -> (кадастровый номер, дата выписки) или None
+    :param policy: str (см. DEDUP_POLICIES)
+    :param score: функция оценки полноты выписки (для policy='most_complete')
+    :return: dict - имя пропускаемого файла -> имя файла, который записывается вместо него
+    """
+    if policy not in DEDUP_POLICIES:
+        raise ValueError('Неизвестное правило обработки дубликатов выписок: ' + str(policy))
+    superseded = {}
+    if policy == 'all':
+        return superseded
+    for files in group_duplicates(headers).values():
+        if policy == 'most_complete':
+            keys = {file_name: (score(file_name), date_key(headers[file_name][1]), file_name) for file_name in files}
+        else:
+            keys = {file_name: (date_key(headers[file_name][1]), file_name) for file_name in files}
+        kept = max(files, key=keys.__getitem__)
+        for file_name in files:
+            if file_name != kept:
+                superseded[file_name] = kept
+    return superseded
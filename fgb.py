@@ -0,0 +1,631 @@
+from typing import List, Tuple, Any, Dict, Sequence, Iterator, Optional, BinaryIO
+import os
+import sys
+import heapq
+import struct
+import tempfile
+from array import array
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# Запись файлов FlatGeobuf (https://flatgeobuf.org) без сторонних библиотек. Файл состоит из сигнатуры, заголовка
+# (таблица FlatBuffers со структурой атрибутов и охватом слоя), упакованного R-дерева охватов объектов и объектов
+# (таблицы FlatBuffers с геометрией и атрибутами), отсортированных вдоль кривой Гильберта. Дерево позволяет ГИС
+# и веб-приложениям читать только объекты нужного участка (чтением частей файла по HTTP или из отображённого в память
+# файла), не загружая весь слой
+
+FGB_EXT = '.fgb'
+
+# сигнатура файла FlatGeobuf версии 3
+MAGIC = b'fgb\x03fgb\x00'
+
+# количество дочерних узлов узла R-дерева (значение по умолчанию в спецификации)
+NODE_SIZE = 16
+
+# типы геометрии и атрибутов в спецификации FlatGeobuf
+POLYGON = 3
+COLUMN_DOUBLE = 10
+COLUMN_STRING = 11
+COLUMN_DATETIME = 13
+
+# тип столбца FlatGeobuf для типа поля атрибутивной таблицы шейп-файла
+COLUMN_TYPES = {'C': COLUMN_STRING, 'N': COLUMN_DOUBLE, 'F': COLUMN_DOUBLE, 'D': COLUMN_DATETIME}
+
+# размер значений атрибутов фиксированной длины по типу столбца; значения остальных типов (строки, даты, JSON,
+# двоичные данные) хранятся с 32-битной длиной
+_VALUE_SIZES = {0: 1, 1: 1, 2: 1, 3: 2, 4: 2, 5: 4, 6: 4, 7: 8, 8: 8, 9: 4, 10: 8}
+
+# узел R-дерева: охват (minx, miny, maxx, maxy) и смещение объекта в разделе объектов (для листьев)
+# или номер первого дочернего узла
+_NODE = struct.Struct('<4dQ')
+
+# запись о полигоне во временных файлах сортировки: ключ сортировки, охват, размер объекта
+_SPOOL = struct.Struct('<Q4dI')
+
+_HILBERT_MAX = (1 << 16) - 1
+
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+
+def hilbert(x: int, y: int) -> int:
+    """
+    возвращает номер точки (x, y) с 16-битными координатами на кривой Гильберта (алгоритм из эталонной реализации
+    FlatGeobuf, без циклов по битам)
+    :param x: int
+    :param y: int
+    :return: int
+    """
+    a = x ^ y
+    b = 0xFFFF ^ a
+    c = 0xFFFF ^ (x | y)
+    d = x & (y ^ 0xFFFF)
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 2)) ^ (b & (b >> 2))
+    B = (a & (b >> 2)) ^ (b & ((a ^ b) >> 2))
+    C ^= (a & (c >> 2)) ^ (b & (d >> 2))
+    D ^= (b & (c >> 2)) ^ ((a ^ b) & (d >> 2))
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 4)) ^ (b & (b >> 4))
+    B = (a & (b >> 4)) ^ (b & ((a ^ b) >> 4))
+    C ^= (a & (c >> 4)) ^ (b & (d >> 4))
+    D ^= (b & (c >> 4)) ^ ((a ^ b) & (d >> 4))
+    a, b, c, d = A, B, C, D
+    C ^= (a & (c >> 8)) ^ (b & (d >> 8))
+    D ^= (b & (c >> 8)) ^ ((a ^ b) & (d >> 8))
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+    i0 = x ^ y
+    i1 = b | (0xFFFF ^ (i0 | a))
+    i0 = (i0 | (i0 << 8)) & 0x00FF00FF
+    i0 = (i0 | (i0 << 4)) & 0x0F0F0F0F
+    i0 = (i0 | (i0 << 2)) & 0x33333333
+    i0 = (i0 | (i0 << 1)) & 0x55555555
+    i1 = (i1 | (i1 << 8)) & 0x00FF00FF
+    i1 = (i1 | (i1 << 4)) & 0x0F0F0F0F
+    i1 = (i1 | (i1 << 2)) & 0x33333333
+    i1 = (i1 | (i1 << 1)) & 0x55555555
+    return ((i1 << 1) | i0) & 0xFFFFFFFF
+
+
+def tree_levels(num_items: int, node_size: int = NODE_SIZE) -> List[Tuple[int, int]]:
+    """
+    возвращает диапазоны номеров узлов упакованного R-дерева по уровням, начиная с листьев. В файле узлы хранятся
+    от корня к листьям: корень - узел 0, листья - последние num_items узлов
+    :param num_items: int - количество объектов
+    :param node_size: int
+    :return: list
+    """
+    if node_size < 2:
+        raise ValueError('Количество дочерних узлов R-дерева должно быть не меньше 2')
+    n = num_items
+    counts = [n]
+    while True:
+        n = (n + node_size - 1) // node_size
+        counts.append(n)
+        if n <= 1:
+            break
+    levels = []
+    end = sum(counts)
+    for count in counts:
+        levels.append((end - count, end))
+        end -= count
+    return levels
+
+
+def _pad(buf: bytearray, align: int, extra: int = 0) -> None:
+    buf.extend(bytes(-(len(buf) + extra) % align))
+
+
+def _is_scalar(kind: str) -> bool:
+    return kind not in ('s', 't') and kind[0] != 'v'
+
+
+def _put_table(buf: bytearray, fields: List[Tuple[int, str, Any]]) -> int:
+    """
+    дописывает в буфер таблицу FlatBuffers (таблица смещений полей, поля таблицы, затем строки, векторы и вложенные
+    таблицы) и возвращает положение таблицы. Поле задаётся номером, типом и значением: тип - формат struct
+    для скалярного значения, 's' - строка, 'v' + формат - вектор скалярных значений (значение - уже упакованные
+    байты), 't' - вложенная таблица, 'vt' - вектор таблиц (значения - списки полей)
+    """
+    inline = [(slot, kind, value, struct.calcsize('<' + kind) if _is_scalar(kind) else 4)
+              for slot, kind, value in fields]
+    inline.sort(key=lambda field: -field[3])
+    positions = {}
+    size = 4  # смещение таблицы смещений полей
+    for slot, _, _, field_size in inline:
+        size += -size % field_size
+        positions[slot] = size
+        size += field_size
+    num_slots = max(slot for slot, _, _ in fields) + 1
+    _pad(buf, 2)
+    vtable_pos = len(buf)
+    buf += struct.pack('<%dH' % (2 + num_slots), 4 + 2 * num_slots, size,
+                       *(positions.get(slot, 0) for slot in range(num_slots)))
+    _pad(buf, 8 if inline[0][3] == 8 else 4)
+    table_pos = len(buf)
+    buf += bytes(size)
+    struct.pack_into('<i', buf, table_pos, table_pos - vtable_pos)
+    for slot, kind, value, _ in inline:
+        if _is_scalar(kind):
+            struct.pack_into('<' + kind, buf, table_pos + positions[slot], value)
+    for slot, kind, value, _ in inline:
+        field_pos = table_pos + positions[slot]
+        if kind == 's':
+            _pad(buf, 4)
+            child_pos = len(buf)
+            data = value.encode('utf-8')
+            buf += struct.pack('<I', len(data)) + data + b'\x00'
+        elif kind == 't':
+            child_pos = _put_table(buf, value)
+        elif kind == 'vt':
+            _pad(buf, 4)
+            child_pos = len(buf)
+            buf += struct.pack('<I', len(value)) + bytes(4 * len(value))
+            for i, table in enumerate(value):
+                item_pos = child_pos + 4 + 4 * i
+                struct.pack_into('<I', buf, item_pos, _put_table(buf, table) - item_pos)
+        elif kind[0] == 'v':
+            item_size = struct.calcsize('<' + kind[1])
+            _pad(buf, max(4, item_size), 4)
+            child_pos = len(buf)
+            buf += struct.pack('<I', len(value) // item_size) + value
+        else:
+            continue
+        struct.pack_into('<I', buf, field_pos, child_pos - field_pos)
+    return table_pos
+
+
+def encode_header(name: str, columns: Sequence[Tuple[str, int]], features_count: int,
+                  envelope: Optional[Sequence[float]] = None, node_size: int = NODE_SIZE,
+                  crs_wkt: Optional[str] = None) -> bytes:
+    """
+    кодирует заголовок файла FlatGeobuf для слоя полигонов без координат z и m
+    :param name: str - название слоя
+    :param columns: список (имя столбца, тип столбца)
+    :param features_count: int - количество объектов
+    :param envelope: охват слоя (minx, miny, maxx, maxy) или None для пустого слоя
+    :param node_size: int - количество дочерних узлов R-дерева
+    :param crs_wkt: str - система координат слоя в формате WKT или None, если она не указывается
+    :return: bytes
+    """
+    fields = [(0, 's', name), (2, 'B', POLYGON), (8, 'Q', features_count), (9, 'H', node_size)]
+    if envelope is not None:
+        fields.append((1, 'vd', struct.pack('<4d', *envelope)))
+    if columns:
+        fields.append((7, 'vt', [[(0, 's', column_name), (1, 'B', column_type)]
+                                 for column_name, column_type in columns]))
+    if crs_wkt:
+        fields.append((10, 't', [(4, 's', crs_wkt)]))  # таблица Crs, поле wkt
+    buf = bytearray(4)
+    struct.pack_into('<I', buf, 0, _put_table(buf, fields))
+    return bytes(buf)
+
+
+def encode_feature(coords: array, parts: Sequence[int], properties: bytes) -> bytes:
+    """
+    кодирует объект FlatGeobuf (с 32-битным размером в начале, как он хранится в файле) с геометрией "полигон".
+    Расположение таблиц FlatBuffers объекта и его геометрии постоянно, поэтому они записываются готовыми заготовками
+    :param coords: array('d') - координаты x0, y0, x1, y1, ... всех контуров полигона (см. shp_native.flatten_polygon)
+    :param parts: номера первых точек контуров
+    :param properties: bytes - закодированные атрибуты (см. FgbWriter.encode_record)
+    :return: bytes
+    """
+    num_parts = len(parts)
+    ends_pos = 60
+    xy_pos = ends_pos + 4 + 4 * num_parts
+    xy_pos += -(xy_pos + 4) % 8
+    properties_pos = xy_pos + 4 + 8 * len(coords)
+    if _BIG_ENDIAN:
+        coords = array('d', coords)
+        coords.byteswap()
+    return b''.join((
+        # размер объекта, смещение таблицы объекта, таблица смещений полей объекта (геометрия, атрибуты)
+        struct.pack('<2I4H', properties_pos + 4 + len(properties), 12, 8, 12, 4, 8),
+        # таблица объекта и таблица смещений полей геометрии (ends, xy, z, m, t, tm, type)
+        struct.pack('<iII9H2x', 8, 28, properties_pos - 20, 18, 13, 4, 8, 0, 0, 0, 0, 12),
+        # таблица геометрии
+        struct.pack('<iIIB3x', 20, ends_pos - 48, xy_pos - 52, POLYGON),
+        struct.pack('<%dI' % (num_parts + 1), num_parts, *parts[1:], len(coords) // 2),
+        bytes(xy_pos - ends_pos - 4 - 4 * num_parts),
+        struct.pack('<I', len(coords)),
+        coords.tobytes(),
+        struct.pack('<I', len(properties)),
+        properties))
+
+
+def _field_pos(buf: bytes, table_pos: int, slot: int) -> Optional[int]:
+    vtable_pos = table_pos - struct.unpack_from('<i', buf, table_pos)[0]
+    vtable_size = struct.unpack_from('<H', buf, vtable_pos)[0]
+    if 4 + 2 * slot >= vtable_size:
+        return None
+    offset = struct.unpack_from('<H', buf, vtable_pos + 4 + 2 * slot)[0]
+    return table_pos + offset if offset else None
+
+
+def _deref(buf: bytes, pos: int) -> int:
+    return pos + struct.unpack_from('<I', buf, pos)[0]
+
+
+def _string(buf: bytes, pos: int) -> str:
+    pos = _deref(buf, pos)
+    length = struct.unpack_from('<I', buf, pos)[0]
+    return bytes(buf[pos + 4:pos + 4 + length]).decode('utf-8')
+
+
+def read_header(f: BinaryIO) -> Dict[str, Any]:
+    """
+    читает сигнатуру и заголовок файла FlatGeobuf из начала открытого файла. Возвращает название слоя ('name'),
+    тип геометрии ('geometry_type'), столбцы ('columns' - список (имя, тип)), количество объектов
+    ('features_count'), количество дочерних узлов R-дерева ('index_node_size'), охват ('envelope'), систему
+    координат в формате WKT ('crs_wkt', None - не указана) и смещение начала R-дерева ('index_offset')
+    :param f: файл, открытый на чтение в двоичном режиме
+    :return: dict
+    """
+    magic = f.read(8)
+    if magic[:7] != MAGIC[:7]:
+        raise ValueError('Файл не является файлом FlatGeobuf версии 3')
+    size = struct.unpack('<I', f.read(4))[0]
+    buf = f.read(size)
+    table = _deref(buf, 0)
+    header = {'name': '', 'geometry_type': 0, 'columns': [], 'features_count': 0, 'index_node_size': NODE_SIZE,
+              'envelope': None, 'crs_wkt': None, 'index_offset': 12 + size}
+    pos = _field_pos(buf, table, 0)
+    if pos is not None:
+        header['name'] = _string(buf, pos)
+    pos = _field_pos(buf, table, 1)
+    if pos is not None:
+        pos = _deref(buf, pos)
+        header['envelope'] = struct.unpack_from('<4d', buf, pos + 4)
+    pos = _field_pos(buf, table, 2)
+    if pos is not None:
+        header['geometry_type'] = buf[pos]
+    pos = _field_pos(buf, table, 7)
+    if pos is not None:
+        pos = _deref(buf, pos)
+        for i in range(struct.unpack_from('<I', buf, pos)[0]):
+            column = _deref(buf, pos + 4 + 4 * i)
+            type_pos = _field_pos(buf, column, 1)
+            header['columns'].append((_string(buf, _field_pos(buf, column, 0)),
+                                      buf[type_pos] if type_pos is not None else 0))
+    pos = _field_pos(buf, table, 8)
+    if pos is not None:
+        header['features_count'] = struct.unpack_from('<Q', buf, pos)[0]
+    pos = _field_pos(buf, table, 9)
+    if pos is not None:
+        header['index_node_size'] = struct.unpack_from('<H', buf, pos)[0]
+    pos = _field_pos(buf, table, 10)
+    if pos is not None:
+        wkt_pos = _field_pos(buf, _deref(buf, pos), 4)
+        if wkt_pos is not None:
+            header['crs_wkt'] = _string(buf, wkt_pos)
+    return header
+
+
+def index_size(header: Dict[str, Any]) -> int:
+    """
+    возвращает размер R-дерева в байтах (0, если в файле нет дерева или объектов)
+    :param header: dict (см. read_header)
+    :return: int
+    """
+    if not header['index_node_size'] or not header['features_count']:
+        return 0
+    return tree_levels(header['features_count'], header['index_node_size'])[0][1] * _NODE.size
+
+
+def iter_features(path: str) -> Iterator[Tuple[Tuple[float, float, float, float], bytes]]:
+    """
+    последовательно читает объекты файла FlatGeobuf с R-деревом: возвращает охват объекта из листа дерева и объект
+    вместе с его размером (как он хранится в файле, см. encode_feature)
+    :param path: str
+    :return: iterator
+    """
+    with open(path, 'rb') as f, open(path, 'rb') as nodes:
+        header = read_header(f)
+        if not header['features_count']:
+            return
+        if not header['index_node_size']:
+            raise ValueError('В файле ' + path + ' нет пространственного индекса')
+        levels = tree_levels(header['features_count'], header['index_node_size'])
+        nodes.seek(header['index_offset'] + levels[0][0] * _NODE.size)
+        features_offset = header['index_offset'] + index_size(header)
+        f.seek(features_offset)
+        position = 0
+        for _ in range(header['features_count']):
+            *bbox, offset = _NODE.unpack(nodes.read(_NODE.size))
+            if offset != position:
+                f.seek(features_offset + offset)
+            size = struct.unpack('<I', f.read(4))[0]
+            yield tuple(bbox), struct.pack('<I', size) + f.read(size)
+            position = offset + 4 + size
+
+
+def decode_properties(feature: bytes, columns: Sequence[Tuple[str, int]]) -> Dict[str, Any]:
+    """
+    декодирует атрибуты объекта FlatGeobuf (объект - вместе с размером, см. encode_feature). Строки, даты и JSON
+    возвращаются строками, числа - числами, двоичные данные - байтами; отсутствующие значения не включаются
+    :param feature: bytes
+    :param columns: список (имя, тип) столбцов (см. read_header)
+    :return: dict
+    """
+    buf = memoryview(feature)[4:]
+    pos = _field_pos(buf, _deref(buf, 0), 1)
+    values = {}
+    if pos is None:
+        return values
+    pos = _deref(buf, pos)
+    end = pos + 4 + struct.unpack_from('<I', buf, pos)[0]
+    pos += 4
+    formats = {0: 'b', 1: 'B', 2: '?', 3: 'h', 4: 'H', 5: 'i', 6: 'I', 7: 'q', 8: 'Q', 9: 'f', 10: 'd'}
+    while pos < end:
+        index = struct.unpack_from('<H', buf, pos)[0]
+        name, column_type = columns[index]
+        pos += 2
+        if column_type in _VALUE_SIZES:
+            values[name] = struct.unpack_from('<' + formats[column_type], buf, pos)[0]
+            pos += _VALUE_SIZES[column_type]
+        else:
+            length = struct.unpack_from('<I', buf, pos)[0]
+            data = bytes(buf[pos + 4:pos + 4 + length])
+            values[name] = data if column_type == 14 else data.decode('utf-8')
+            pos += 4 + length
+    return values
+
+
+def search_fgb(path: str, rect: Tuple[float, float, float, float]) -> List[int]:
+    """
+    возвращает номера объектов файла FlatGeobuf (в порядке записи), охваты которых пересекаются с прямоугольником
+    rect (minx, miny, maxx, maxy). Из файла читаются только узлы R-дерева, охваты которых пересекаются с rect, -
+    так же выполняют поиск ГИС при чтении файла частями
+    :param path: str
+    :param rect: tuple
+    :return: list
+    """
+    found = []
+    with open(path, 'rb') as f:
+        header = read_header(f)
+        if not header['features_count']:
+            return found
+        node_size = header['index_node_size']
+        levels = tree_levels(header['features_count'], node_size)
+        leaves_start = levels[0][0]
+        queue = [(0, len(levels) - 1)]
+        while queue:
+            first, level = queue.pop()
+            last = min(first + node_size, levels[level][1])
+            f.seek(header['index_offset'] + first * _NODE.size)
+            data = f.read((last - first) * _NODE.size)
+            for i, (minx, miny, maxx, maxy, offset) in enumerate(_NODE.iter_unpack(data)):
+                if minx > rect[2] or maxx < rect[0] or miny > rect[3] or maxy < rect[1]:
+                    continue
+                if first >= leaves_start:
+                    found.append(first + i - leaves_start)
+                else:
+                    queue.append((offset, level - 1))
+    return sorted(found)
+
+
+class FgbWriter:
+    """
+    Записывает слой полигонов в файл FlatGeobuf без сторонних библиотек. Атрибуты задаются как поля атрибутивной
+    таблицы шейп-файла (имя, тип, длина, количество знаков после запятой) и передаются уже закодированными (см.
+    encode_record), чтобы общие для нескольких контуров значения кодировались один раз.
+    Объекты накапливаются в памяти; когда их объём превышает sort_memory_mb МБ, они сбрасываются во временный файл.
+    При закрытии объекты сортируются вдоль кривой Гильберта по центрам охватов (для этого нужен охват всего слоя,
+    поэтому сортировка возможна только после записи последнего объекта): если все объекты поместились в памяти -
+    в памяти, иначе внешней сортировкой слиянием (временный файл читается частями по sort_memory_mb МБ, каждая часть
+    сортируется и сохраняется отдельно, затем части сливаются). Упакованное R-дерево строится по отсортированным
+    объектам за один проход: листья и объекты записываются на свои места в файле, верхние уровни дерева (в 16 раз
+    меньше листьев) - из памяти. Файл записывается под временным именем и заменяет path при закрытии.
+    crs_wkt - система координат слоя в формате WKT, записывается в заголовок файла
+    """
+    def __init__(self, path: str, fields: List[Tuple[str, str, int, int]], sort_memory_mb: float = 256,
+                 name: Optional[str] = None, crs_wkt: Optional[str] = None) -> None:
+        self.path = path
+        self.crs_wkt = crs_wkt
+        self.fields = fields
+        self.columns = [(field_name, COLUMN_TYPES[field_type]) for field_name, field_type, _, _ in fields]
+        self.name = name if name is not None else os.path.splitext(os.path.basename(path))[0]
+        self.count = 0
+        self._memory_limit = max(1, int(float(sort_memory_mb) * 1024 * 1024))
+        self._items: List[Tuple[Tuple[float, float, float, float], bytes]] = []
+        self._items_size = 0
+        self._spool = None
+        self._extent = None
+
+    def encode_record(self, values: Sequence[Any], start: int = 0) -> bytes:
+        """
+        кодирует значения атрибутов, начиная с поля с номером start. Значения None не записываются (в FlatGeobuf
+        отсутствующий атрибут означает пустое значение); даты передаются объектами datetime.date
+        :param values: список значений
+        :param start: int
+        :return: bytes
+        """
+        encoded = []
+        for index, value in enumerate(values, start):
+            if value is None:
+                continue
+            column_type = self.columns[index][1]
+            if column_type == COLUMN_DOUBLE:
+                encoded.append(struct.pack('<Hd', index, float(value)))
+                continue
+            if column_type == COLUMN_DATETIME:
+                value = value.isoformat()
+            data = str(value).encode('utf-8')
+            encoded.append(struct.pack('<HI', index, len(data)) + data)
+        return b''.join(encoded)
+
+    def write(self, coords: array, parts: Sequence[int], properties: bytes) -> None:
+        """
+        записывает полигон и его атрибуты
+        :param coords: array('d') - координаты x0, y0, x1, y1, ... всех контуров (см. shp_native.flatten_polygon)
+        :param parts: номера первых точек контуров
+        :param properties: bytes - закодированные значения атрибутов (см. encode_record)
+        """
+        if not coords:
+            raise ValueError('Полигон не содержит точек')
+        xs = coords[0::2]
+        ys = coords[1::2]
+        self.write_feature((min(xs), min(ys), max(xs), max(ys)), encode_feature(coords, parts, properties))
+
+    def write_feature(self, bbox: Tuple[float, float, float, float], feature: bytes) -> None:
+        """
+        записывает уже закодированный объект (например, прочитанный из другого файла, см. iter_features)
+        :param bbox: tuple - охват объекта
+        :param feature: bytes - объект вместе с размером
+        """
+        if self._extent is None:
+            self._extent = list(bbox)
+        else:
+            extent = self._extent
+            if bbox[0] < extent[0]:
+                extent[0] = bbox[0]
+            if bbox[1] < extent[1]:
+                extent[1] = bbox[1]
+            if bbox[2] > extent[2]:
+                extent[2] = bbox[2]
+            if bbox[3] > extent[3]:
+                extent[3] = bbox[3]
+        self._items.append((bbox, feature))
+        self._items_size += len(feature) + 100
+        self.count += 1
+        if self._items_size > self._memory_limit:
+            self._flush()
+
+    def _flush(self) -> None:
+        """
+        сбрасывает накопленные объекты во временный файл
+        """
+        if self._spool is None:
+            self._spool = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(self.path)))
+        self._spool.write(b''.join(_SPOOL.pack(0, *bbox, len(feature)) + feature for bbox, feature in self._items))
+        self._items = []
+        self._items_size = 0
+
+    def _sort_key(self):
+        minx, miny, maxx, maxy = self._extent
+        width, height = maxx - minx, maxy - miny
+        kx = _HILBERT_MAX / width if width else 0.0
+        ky = _HILBERT_MAX / height if height else 0.0
+
+        def key(bbox: Tuple[float, float, float, float]) -> int:
+            # объекты упорядочиваются по убыванию номера на кривой Гильберта, как в эталонной реализации FlatGeobuf
+            return 0xFFFFFFFF - hilbert(int(kx * ((bbox[0] + bbox[2]) / 2 - minx)),
+                                        int(ky * ((bbox[1] + bbox[3]) / 2 - miny)))
+        return key
+
+    @staticmethod
+    def _read_spool(f: BinaryIO) -> Iterator[Tuple[int, Tuple[float, ...], bytes]]:
+        while True:
+            head = f.read(_SPOOL.size)
+            if not head:
+                return
+            sort_key, *bbox, size = _SPOOL.unpack(head)
+            yield sort_key, tuple(bbox), f.read(size)
+
+    def _sorted_items(self, runs: List[BinaryIO]) -> Iterator[Tuple[Tuple[float, ...], bytes]]:
+        """
+        возвращает объекты в порядке кривой Гильберта. При равных номерах сохраняется порядок записи
+        """
+        key = self._sort_key()
+        if self._spool is None:
+            self._items.sort(key=lambda item: key(item[0]))
+            yield from self._items
+            return
+        self._flush()
+        self._spool.seek(0)
+        items = self._read_spool(self._spool)
+        while True:
+            chunk = []
+            size = 0
+            for item in items:
+                chunk.append((key(item[1]), *item[1:]))
+                size += len(item[2]) + 100
+                if size > self._memory_limit:
+                    break
+            if not chunk:
+                break
+            chunk.sort(key=lambda item: item[0])
+            run = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(self.path)))
+            run.write(b''.join(_SPOOL.pack(sort_key, *bbox, len(feature)) + feature
+                               for sort_key, bbox, feature in chunk))
+            run.seek(0)
+            runs.append(run)
+        self._spool.close()
+        self._spool = None
+        # части сортируются по порядку записи, поэтому при слиянии равные номера также остаются в порядке записи
+        for _, bbox, feature in heapq.merge(*(self._read_spool(run) for run in runs), key=lambda item: item[0]):
+            yield bbox, feature
+
+    def close(self) -> None:
+        tmp_path = self.path + '.tmp'
+        header = encode_header(self.name, self.columns, self.count, self._extent, crs_wkt=self.crs_wkt)
+        runs = []
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(MAGIC)
+                f.write(struct.pack('<I', len(header)))
+                f.write(header)
+                if self.count:
+                    self._write_index_and_features(f, runs)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            for run in runs:
+                run.close()
+            if self._spool is not None:
+                self._spool.close()
+                self._spool = None
+            self._items = []
+        os.replace(tmp_path, self.path)
+
+    def _write_index_and_features(self, f: BinaryIO, runs: List[BinaryIO]) -> None:
+        """
+        записывает R-дерево и объекты: объекты и листья дерева - по мере получения отсортированных объектов, узлы
+        верхних уровней - после них
+        """
+        levels = tree_levels(self.count)
+        index_offset = f.tell()
+        f.seek(index_offset + levels[0][1] * _NODE.size)
+        parents = array('d')  # охваты узлов уровня над листьями
+        offset = 0
+        with open(f.name, 'r+b') as leaves:
+            leaves.seek(index_offset + levels[0][0] * _NODE.size)
+            nodes = bytearray()
+            for i, (bbox, feature) in enumerate(self._sorted_items(runs)):
+                nodes += _NODE.pack(*bbox, offset)
+                f.write(feature)
+                offset += len(feature)
+                if i % NODE_SIZE:
+                    parent = parents[-4:]
+                    parents[-4:] = array('d', (min(parent[0], bbox[0]), min(parent[1], bbox[1]),
+                                               max(parent[2], bbox[2]), max(parent[3], bbox[3])))
+                else:
+                    parents.extend(bbox)
+                if len(nodes) >= 1 << 20:
+                    leaves.write(nodes)
+                    nodes.clear()
+            leaves.write(nodes)
+        # верхние уровни: охват узла - объединение охватов его дочерних узлов, смещение - номер первого из них
+        for level in range(1, len(levels)):
+            first_child = levels[level - 1][0]
+            f.seek(index_offset + levels[level][0] * _NODE.size)
+            f.write(b''.join(_NODE.pack(*parents[4 * i:4 * i + 4], first_child + NODE_SIZE * i)
+                             for i in range(len(parents) // 4)))
+            children = parents
+            parents = array('d')
+            for i in range(0, len(children), 4 * NODE_SIZE):
+                group = children[i:i + 4 * NODE_SIZE]
+                parents.extend((min(group[0::4]), min(group[1::4]), max(group[2::4]), max(group[3::4])))
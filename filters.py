@@ -0,0 +1,161 @@
+from typing import Dict, List, Tuple, Optional, Any
+import re
+import datetime
+from dedup import date_key
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# виды объектов недвижимости (см. AbstractRealEstateObject.kind), по которым можно отбирать выписки
+OBJECT_KINDS = ('Земельные участки', 'Здания', 'Сооружения', 'Помещения', 'Прочие ОКС')
+
+# имя файла, присвоенное при переименовании выписок (см. Converter.plan_renames): кадастровый номер (":" заменены
+# на "-")---дата выписки ДД-ММ-ГГГГ, при совпадении имён - с номером дубликата " (N)"
+_RENAMED_FILE = re.compile(r'(\d+(?:-\d+)+)---(\d{2})-(\d{2})-(\d{4})(?: \(\d+\))?\.xml')
+
+
+def header_from_file_name(file_name: str) -> Optional[Tuple[str, str]]:
+    """
+    возвращает кадастровый номер и дату выписки из имени файла, присвоенного при переименовании выписок, или None,
+    если имя файла имеет другой вид
+    :param file_name: str
+    :return: tuple (кадастровый номер, дата "ДД.ММ.ГГГГ") или None
+    """
+    match = _RENAMED_FILE.fullmatch(file_name)
+    if match is None:
+        return None
+    return match.group(1).replace('-', ':'), '.'.join(match.group(2, 3, 4))
+
+
+def polygons_bbox(geometry: Dict[Any, List[List[List[float]]]]) -> Optional[Tuple[float, float, float, float]]:
+    """
+    возвращает охват контуров объекта недвижимости (minx, miny, maxx, maxy) или None, если контуров нет
+    :param geometry: dict - номер контура -> список колец из точек [x, y] (см. AbstractRealEstateObject.geometry)
+    :return: tuple или None
+    """
+    xs = [point[0] for polys in geometry.values() for ring in polys for point in ring]
+    if not xs:
+        return None
+    ys = [point[1] for polys in geometry.values() for ring in polys for point in ring]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+class ExtractFilter:
+    """
+    Отбор выписок для конвертирования по настройкам 'filter_cad_prefix' (начала кадастровых номеров через запятую),
+    'filter_cad_regex' (регулярное выражение, которое должно находиться в кадастровом номере), 'filter_date_from'
+    и 'filter_date_to' (диапазон дат выписок "ДД.ММ.ГГГГ", включительно), 'filter_kinds' (список видов объектов,
+    см. OBJECT_KINDS) и 'filter_bbox' (охват [minx, miny, maxx, maxy] в координатах шейп-файла, с которым должен
+    пересекаться охват контуров объекта). Пустое значение (None) - без отбора по этому условию.
+    Условия проверяются как можно раньше: кадастровый номер и дата - по имени переименованного файла
+    (match_file_name) или по заголовку выписки (match_header), вид объекта и охват - после разбора выписки, но до
+    извлечения свойств объекта (match_object).
+    """
+    def __init__(self, settings: Dict[str, Any]) -> None:
+        self.prefixes = tuple(prefix.strip() for prefix in (settings['filter_cad_prefix'] or '').split(',')
+                              if prefix.strip())
+        try:
+            self.regex = re.compile(settings['filter_cad_regex']) if settings['filter_cad_regex'] else None
+        except re.error as e:
+            raise ValueError('Ошибка в регулярном выражении фильтра кадастровых номеров: ' + str(e))
+        self.date_from = self._date(settings['filter_date_from'])
+        self.date_to = self._date(settings['filter_date_to'])
+        self.kinds = tuple(settings['filter_kinds']) if settings['filter_kinds'] else None
+        if self.kinds is not None and any(kind not in OBJECT_KINDS for kind in self.kinds):
+            raise ValueError('Неизвестный вид объекта недвижимости в фильтре: ' +
+                             ', '.join(kind for kind in self.kinds if kind not in OBJECT_KINDS))
+        self.bbox = None
+        if settings['filter_bbox']:
+            try:
+                self.bbox = tuple(float(value) for value in settings['filter_bbox'])
+            except (TypeError, ValueError):
+                self.bbox = ()
+            if len(self.bbox) != 4 or self.bbox[0] > self.bbox[2] or self.bbox[1] > self.bbox[3]:
+                raise ValueError('Охват фильтра выписок должен состоять из четырёх чисел: minx, miny, maxx, maxy')
+
+    @staticmethod
+    def _date(value: str) -> Optional[Tuple[int, int, int]]:
+        if not value:
+            return None
+        try:
+            datetime.datetime.strptime(value, '%d.%m.%Y')
+        except ValueError:
+            raise ValueError('Дата фильтра выписок должна быть указана в формате ДД.ММ.ГГГГ: ' + str(value))
+        return date_key(value)
+
+    @property
+    def header_active(self) -> bool:
+        """
+        True, если заданы условия на кадастровый номер или дату выписки
+        """
+        return bool(self.prefixes) or self.regex is not None or self.date_from is not None or self.date_to is not None
+
+    @property
+    def object_active(self) -> bool:
+        """
+        True, если заданы условия на вид объекта или охват его контуров
+        """
+        return self.kinds is not None or self.bbox is not None
+
+    @property
+    def active(self) -> bool:
+        return self.header_active or self.object_active
+
+    def match_header(self, cad_number: str, extract_date: str) -> bool:
+        """
+        проверяет кадастровый номер и дату выписки. Если задан отбор по дате, выписка с нераспознанной датой
+        не отбирается
+        :param cad_number: str
+        :param extract_date: str - дата "ДД.ММ.ГГГГ"
+        :return: bool
+        """
+        if self.prefixes and not cad_number.startswith(self.prefixes):
+            return False
+        if self.regex is not None and self.regex.search(cad_number) is None:
+            return False
+        if self.date_from is not None or self.date_to is not None:
+            key = date_key(extract_date)
+            if key == (0, 0, 0):
+                return False
+            if self.date_from is not None and key < self.date_from:
+                return False
+            if self.date_to is not None and key > self.date_to:
+                return False
+        return True
+
+    def match_file_name(self, file_name: str) -> Optional[bool]:
+        """
+        проверяет кадастровый номер и дату выписки по имени переименованного файла (см. header_from_file_name);
+        возвращает None, если по имени файла это определить нельзя
+        :param file_name: str
+        :return: bool или None
+        """
+        header = header_from_file_name(file_name)
+        if header is None:
+            return None
+        return self.match_header(*header)
+
+    def match_object(self, kind: str, geometry: Optional[Dict[Any, List[List[List[float]]]]]) -> bool:
+        """
+        проверяет вид объекта недвижимости и пересечение охвата его контуров с охватом фильтра. Объект без контуров
+        при отборе по охвату не отбирается
+        :param kind: str (см. AbstractRealEstateObject.kind)
+        :param geometry: dict (см. AbstractRealEstateObject.geometry), нужен только при отборе по охвату
+        :return: bool
+        """
+        if self.kinds is not None and kind not in self.kinds:
+            return False
+        if self.bbox is not None:
+            bbox = polygons_bbox(geometry or {})
+            if bbox is None:
+                return False
+            minx, miny, maxx, maxy = self.bbox
+            if bbox[0] > maxx or bbox[2] < minx or bbox[1] > maxy or bbox[3] < miny:
+                return False
+        return True
@@ -11,7 +11,7 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
         MainWindow.setObjectName("MainWindow")
-        MainWindow.resize(559, 852)
+        MainWindow.resize(559, 898)
         palette = QtGui.QPalette()
         brush = QtGui.QBrush(QtGui.QColor(0, 0, 0))
         brush.setStyle(QtCore.Qt.SolidPattern)
@@ -153,11 +153,11 @@ class Ui_MainWindow(object):
         self.centralwidget.setAutoFillBackground(False)
         self.centralwidget.setObjectName("centralwidget")
         self.progressBar = QtWidgets.QProgressBar(self.centralwidget)
-        self.progressBar.setGeometry(QtCore.QRect(30, 495, 505, 23))
+        self.progressBar.setGeometry(QtCore.QRect(30, 541, 505, 23))
         self.progressBar.setProperty("value", 0)
         self.progressBar.setObjectName("progressBar")
         self.btnStart = QtWidgets.QPushButton(self.centralwidget)
-        self.btnStart.setGeometry(QtCore.QRect(166, 373, 219, 38))
+        self.btnStart.setGeometry(QtCore.QRect(166, 419, 219, 38))
         palette = QtGui.QPalette()
         brush = QtGui.QBrush(QtGui.QColor(0, 0, 0))
         brush.setStyle(QtCore.Qt.SolidPattern)
@@ -302,14 +302,14 @@ class Ui_MainWindow(object):
         self.btnStart.setFont(font)
         self.btnStart.setObjectName("btnStart")
         self.label_t1 = QtWidgets.QLabel(self.centralwidget)
-        self.label_t1.setGeometry(QtCore.QRect(30, 457, 151, 16))
+        self.label_t1.setGeometry(QtCore.QRect(30, 503, 151, 16))
         font = QtGui.QFont()
         font.setBold(True)
         font.setWeight(75)
         self.label_t1.setFont(font)
         self.label_t1.setObjectName("label_t1")
         self.label_out = QtWidgets.QLabel(self.centralwidget)
-        self.label_out.setGeometry(QtCore.QRect(179, 450, 369, 33))
+        self.label_out.setGeometry(QtCore.QRect(179, 496, 369, 33))
         font = QtGui.QFont()
         font.setBold(False)
         font.setItalic(True)
@@ -320,7 +320,7 @@ class Ui_MainWindow(object):
         self.label_out.setWordWrap(True)
         self.label_out.setObjectName("label_out")
         self.label_input = QtWidgets.QLabel(self.centralwidget)
-        self.label_input.setGeometry(QtCore.QRect(165, 414, 381, 31))
+        self.label_input.setGeometry(QtCore.QRect(165, 460, 381, 31))
         font = QtGui.QFont()
         font.setBold(False)
         font.setItalic(True)
@@ -331,7 +331,7 @@ class Ui_MainWindow(object):
         self.label_input.setWordWrap(True)
         self.label_input.setObjectName("label_input")
         self.label_t2 = QtWidgets.QLabel(self.centralwidget)
-        self.label_t2.setGeometry(QtCore.QRect(30, 421, 151, 16))
+        self.label_t2.setGeometry(QtCore.QRect(30, 467, 151, 16))
         font = QtGui.QFont()
         font.setBold(True)
         font.setWeight(75)
@@ -628,7 +628,7 @@ class Ui_MainWindow(object):
         self.btnBrowseOut.setFont(font)
         self.btnBrowseOut.setObjectName("btnBrowseOut")
         self.textBrowser = QtWidgets.QTextBrowser(self.centralwidget)
-        self.textBrowser.setGeometry(QtCore.QRect(30, 537, 470, 277))
+        self.textBrowser.setGeometry(QtCore.QRect(30, 583, 470, 277))
         self.textBrowser.setObjectName("textBrowser")
         self.radioButton_zip = QtWidgets.QRadioButton(self.centralwidget)
         self.radioButton_zip.setGeometry(QtCore.QRect(30, 124, 199, 17))
@@ -637,7 +637,7 @@ class Ui_MainWindow(object):
         self.radioButton_xml.setGeometry(QtCore.QRect(30, 145, 198, 18))
         self.radioButton_xml.setObjectName("radioButton_xml")
         self.checkBoxAdm = QtWidgets.QCheckBox(self.centralwidget)
-        self.checkBoxAdm.setGeometry(QtCore.QRect(30, 316, 515, 24))
+        self.checkBoxAdm.setGeometry(QtCore.QRect(30, 362, 515, 24))
         self.checkBoxAdm.setObjectName("checkBoxAdm")
         self.label_2 = QtWidgets.QLabel(self.centralwidget)
         self.label_2.setGeometry(QtCore.QRect(30, 170, 374, 35))
@@ -646,8 +646,14 @@ class Ui_MainWindow(object):
         self.checkBoxExcel = QtWidgets.QCheckBox(self.centralwidget)
         self.checkBoxExcel.setGeometry(QtCore.QRect(30, 233, 457, 17))
         self.checkBoxExcel.setObjectName("checkBoxExcel")
+        self.checkBoxGeoJsonl = QtWidgets.QCheckBox(self.centralwidget)
+        self.checkBoxGeoJsonl.setGeometry(QtCore.QRect(30, 256, 457, 17))
+        self.checkBoxGeoJsonl.setObjectName("checkBoxGeoJsonl")
+        self.checkBoxCsv = QtWidgets.QCheckBox(self.centralwidget)
+        self.checkBoxCsv.setGeometry(QtCore.QRect(30, 279, 457, 17))
+        self.checkBoxCsv.setObjectName("checkBoxCsv")
         self.label_3 = QtWidgets.QLabel(self.centralwidget)
-        self.label_3.setGeometry(QtCore.QRect(30, 258, 374, 35))
+        self.label_3.setGeometry(QtCore.QRect(30, 304, 374, 35))
         self.label_3.setTextFormat(QtCore.Qt.AutoText)
         self.label_3.setObjectName("label_3")
         self.label_4 = QtWidgets.QLabel(self.centralwidget)
@@ -659,13 +665,13 @@ class Ui_MainWindow(object):
         self.label_5.setTextFormat(QtCore.Qt.AutoText)
         self.label_5.setObjectName("label_5")
         self.checkBoxRename = QtWidgets.QCheckBox(self.centralwidget)
-        self.checkBoxRename.setGeometry(QtCore.QRect(30, 293, 515, 24))
+        self.checkBoxRename.setGeometry(QtCore.QRect(30, 339, 515, 24))
         self.checkBoxRename.setObjectName("checkBoxRename")
         self.label = QtWidgets.QLabel(self.centralwidget)
-        self.label.setGeometry(QtCore.QRect(420, 824, 130, 17))
+        self.label.setGeometry(QtCore.QRect(420, 870, 130, 17))
         self.label.setObjectName("label")
         self.checkBoxReplace = QtWidgets.QCheckBox(self.centralwidget)
-        self.checkBoxReplace.setGeometry(QtCore.QRect(30, 339, 515, 24))
+        self.checkBoxReplace.setGeometry(QtCore.QRect(30, 385, 515, 24))
         self.checkBoxReplace.setObjectName("checkBoxReplace")
         self.checkBoxShape = QtWidgets.QCheckBox(self.centralwidget)
         self.checkBoxShape.setGeometry(QtCore.QRect(30, 210, 457, 17))
@@ -694,6 +700,9 @@ class Ui_MainWindow(object):
                                         "<html><head/><body><p><span style=\" font-size:9pt; font-weight:600; color:#00007f;\">3. Выберите требуемые форматы выходных файлов:</span></p></body></html>"))
         self.checkBoxExcel.setText(_translate("MainWindow",
                                               "XLSX (таблица Microsoft Excel 2007 и более поздних версий)"))
+        self.checkBoxGeoJsonl.setText(_translate("MainWindow",
+                                                 "GeoJSONL (GeoJSON построчно, для загрузки в другие системы)"))
+        self.checkBoxCsv.setText(_translate("MainWindow", "CSV (текст с разделителями, для загрузки в другие системы)"))
         self.label_3.setText(_translate("MainWindow",
                                         "<html><head/><body><p><span style=\" font-size:9pt; font-weight:600; color:#00007f;\">4. Прочие настройки:</span></p></body></html>"))
         self.label_4.setText(_translate("MainWindow",
@@ -0,0 +1,135 @@
+from typing import Optional, Tuple, BinaryIO
+import os
+import re
+import xml.etree.ElementTree as ElT
+from real_estate import NS_KVZU, NS_KPZU, NS_KVOKS, NS_KPOKS
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# объём конца файла, в котором ищется блок FootContent с датой выписки КВЗУ, КПЗУ, КВОКС, КПОКС
+TAIL_SIZE = 64 * 1024
+
+# закрывающие теги, которыми должен заканчиваться файл после блока FootContent: только в этом случае блок точно
+# находится по пути <корень>/ReestrExtract/ExtractObjectRight/FootContent
+_FOOTER_END = re.compile(rb'</FootContent>\s*</ExtractObjectRight>\s*</ReestrExtract>\s*</(\w+)>\s*$')
+
+
+def _date_from_tail(f: BinaryIO, root_tag: str) -> Optional[str]:
+    """
+    возвращает дату выписки из блока FootContent в конце файла без разбора остальной части файла или None, если
+    структуру конца файла не удалось однозначно распознать (тогда файл просматривается полностью)
+    """
+    position = f.tell()
+    f.seek(0, os.SEEK_END)
+    f.seek(max(0, f.tell() - TAIL_SIZE))
+    tail = f.read()
+    f.seek(position)
+    start = tail.rfind(b'<FootContent')
+    if start < 0:
+        return None
+    match = _FOOTER_END.search(tail, start)
+    if match is None or match.group(1).decode('ascii') != root_tag.split('}')[-1]:
+        return None
+    try:
+        foot_content = ElT.fromstring(tail[start:match.start() + len(b'</FootContent>')])
+    except ElT.ParseError:
+        return None
+    extract_date = foot_content.find('ExtractDate')
+    return extract_date.text if extract_date is not None else None
+
+
+def scan_header(xml_file_path: str) -> Optional[Tuple[str, str]]:
+    """
+    возвращает кадастровый номер объекта недвижимости и дату выписки (в том же виде, что и свойства parent_cad_number
+    и extract_date объекта, созданного AbstractRealEstateObject.create_a_real_estate_object), просматривая файл
+    потоково и прекращая чтение, как только оба значения найдены. Выписки ЕГРН содержат оба значения в начале файла;
+    в выписках КВЗУ, КПЗУ, КВОКС, КПОКС дата находится в конце файла и читается из его последних TAIL_SIZE байт.
+    Возвращает None для неподдерживаемых и повреждённых файлов
+    :param xml_file_path: str
+    :return: tuple или None
+    """
+    with open(xml_file_path, 'rb') as f:
+        try:
+            return _scan(f)
+        except ElT.ParseError:
+            return None
+
+
+def _scan(f: BinaryIO) -> Optional[Tuple[str, str]]:
+    cad_number = None
+    extract_date = None
+    date_expected = False  # в файле есть блок, в котором должна находиться дата выписки
+    tail_checked = False
+    occ_objects = {}  # первые найденные здание, помещение, сооружение в Realty (КВОКС, КПОКС)
+    root_tag = ns = None
+    # стек открытых элементов: тег и признак того, что элемент и все его предки - первые дочерние элементы
+    # со своим тегом (именно такие элементы находит ElementTree.find)
+    stack = []
+    seen = []  # теги уже встреченных дочерних элементов для каждого открытого элемента
+    for event, elem in ElT.iterparse(f, events=('start', 'end')):
+        if event == 'start':
+            first = not stack or (stack[-1][1] and elem.tag not in seen[-1])
+            if seen:
+                seen[-1].add(elem.tag)
+            stack.append((elem.tag, first))
+            seen.append(set())
+            if not first:
+                continue
+            path = tuple(tag for tag, _ in stack)
+            depth = len(path)
+            if depth == 1:
+                root_tag = elem.tag
+                ns = root_tag[:root_tag.index('}') + 1] if root_tag.startswith('{') else ''
+                if ns not in ('', NS_KVZU, NS_KPZU, NS_KVOKS, NS_KPOKS):
+                    return None
+            elif ns == NS_KVZU and path[1:] == (ns + 'Parcels', ns + 'Parcel'):
+                cad_number = elem.get('CadastralNumber')
+            elif ns == NS_KPZU and path[1:] == (ns + 'Parcel',):
+                cad_number = elem.get('CadastralNumber')
+            elif ns in (NS_KVOKS, NS_KPOKS) and depth == 3 and path[1] == ns + 'Realty':
+                occ_objects.setdefault(elem.tag[len(ns):], elem.get('CadastralNumber'))
+            elif ns and path[1:] == (ns + 'ReestrExtract', ns + 'ExtractObjectRight'):
+                date_expected = True
+            elif not ns and path[1:] == ('details_statement',):
+                date_expected = True
+        else:
+            path = tuple(tag for tag, _ in stack)
+            _, first = stack.pop()
+            seen.pop()
+            if first:
+                depth = len(path)
+                if ns in (NS_KVOKS, NS_KPOKS) and path[1:] == (ns + 'Realty',):
+                    for tag in ('Building', 'Flat', 'Construction'):
+                        if tag in occ_objects:
+                            cad_number = occ_objects[tag]
+                            break
+                    else:
+                        cad_number = ''
+                elif ns and path[1:] == (ns + 'ReestrExtract', ns + 'ExtractObjectRight', ns + 'FootContent',
+                                         ns + 'ExtractDate'):
+                    extract_date = elem.text
+                elif not ns and depth == 5 and path[1] in ('land_record', 'build_record') and \
+                        path[2:] == ('object', 'common_data', 'cad_number'):
+                    cad_number = elem.text
+                elif not ns and path[1:] == ('details_statement', 'group_top_requisites', 'date_formation'):
+                    if elem.text is None:
+                        return None
+                    inverted_date = re.sub('-', '.', elem.text[:10])
+                    extract_date = ".".join(inverted_date.split(".")[::-1])
+            if stack:
+                elem.clear()  # разобранные элементы не нужны, память не расходуется на дерево всего документа
+        if ns and cad_number is not None and extract_date is None and not tail_checked:
+            tail_checked = True
+            extract_date = _date_from_tail(f, root_tag)
+        if cad_number is not None and extract_date is not None:
+            return cad_number, extract_date
+    if cad_number is None or date_expected:
+        return None
+    return cad_number, ''
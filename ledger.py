@@ -0,0 +1,425 @@
+from typing import Callable, Dict, List, Tuple, Optional, Any
+import os
+import re
+import json
+import gzip
+import time
+import uuid
+import shutil
+import socket
+import datetime
+import threading
+from logic import DEFAULT_SETTINGS
+from converter import Converter, SEPARATOR
+from writers import ShapeWriter, XlsxWriter, append_shapefile, CAD_INDEX_EXT, GEOJSONL_EXT, CSV_EXT, GZIP_EXT
+from qix import QIX_EXT, write_qix, read_shape_bboxes
+from transform import read_prj
+from scanner import InputFile, scan_inputs, schedule, size_batches
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# Распределённое конвертирование без брокера: узлы (компьютеры или процессы), которым доступна общая сетевая папка,
+# делят выписки через папку учёта работ ('ledger_folder'):
+#   plan.json - план: список пакетов (имён файлов выписок), создаётся первым запущенным узлом;
+#   leases/<пакет>.<поколение>.lease - аренда пакета узлом. Захват пакета - создание файла аренды следующего
+#       поколения, которое удаётся только одному узлу (см. _publish). Пока пакет обрабатывается, узел продлевает
+#       аренду, обновляя время изменения файла (см. LeaseRenewal). Если время изменения файла аренды не менялось
+#       'ledger_lease_seconds' секунд (узел завершился аварийно), пакет захватывается другим узлом. Срок отсчитывается
+#       по часам наблюдающего узла, поэтому расхождение часов узлов и файлового сервера не влияет на результат;
+#   partials/<пакет>.<поколение>/ - частичный результат обработки пакета (обычное конвертирование, см. Converter);
+#   done/<пакет>.json - итоги обработки пакета и пути к частичному результату относительно папки учёта работ.
+# После обработки всех пакетов частичные результаты объединяются в папке результата (см. merge_partials).
+
+PLAN_FILE = 'plan.json'
+LEASE_EXT = '.lease'
+
+# настройки, с которыми частичные результаты нельзя объединить, и их значения, при которых объединение возможно
+UNSUPPORTED_SETTINGS = {'append_mode': False, 'shard_by': '', 'create_fgb': False, 'create_parquet': False,
+                        'create_pgdump': False, 'create_links': False, 'topology_check': False, 'dedup_policy': 'all'}
+
+
+def default_node_id() -> str:
+    """
+    возвращает имя узла по умолчанию: имя компьютера и номер процесса
+    """
+    return socket.gethostname() + '-' + str(os.getpid())
+
+
+def _publish(path: str, data: Dict[str, Any]) -> bool:
+    """
+    атомарно создаёт файл path с содержимым data (JSON), если его ещё нет: содержимое записывается во временный файл,
+    который затем получает имя path жёсткой ссылкой (os.link, в отличие от os.replace, не заменяет существующий файл).
+    Если файловая система не поддерживает жёсткие ссылки, файл создаётся с флагом O_EXCL. Возвращает False, если файл
+    уже создан другим узлом
+    :param path: str
+    :param data: dict
+    :return: bool
+    """
+    payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    tmp_path = path + '.' + uuid.uuid4().hex + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    try:
+        os.link(tmp_path, path)
+        return True
+    except FileExistsError:
+        return False
+    except OSError:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        return True
+    finally:
+        os.remove(tmp_path)
+
+
+def _read_json(path: str, attempts: int = 20) -> Dict[str, Any]:
+    """
+    читает файл JSON, созданный другим узлом; если файл создан с флагом O_EXCL и ещё записывается, чтение повторяется
+    """
+    for attempt in range(attempts):
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        try:
+            return json.loads(text)
+        except ValueError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.1)
+
+
+def check_settings(settings: Dict[str, Any]) -> None:
+    """
+    проверяет, что частичные результаты конвертирования с настройками settings можно объединить (поддерживаются
+    шейп-файл, таблица xlsx, файлы GeoJSONL и CSV; дубликаты выписок, связи объектов и топология могут находиться
+    в разных пакетах, поэтому не обрабатываются)
+    """
+    unsupported = [key for key, value in UNSUPPORTED_SETTINGS.items() if settings[key] != value]
+    if unsupported:
+        raise ValueError('Распределённое конвертирование не поддерживает настройки: ' + ', '.join(unsupported))
+
+
+class WorkLedger:
+    """
+    Папка учёта работ распределённого конвертирования (см. описание модуля): план, аренда пакетов, итоги обработки
+    """
+    def __init__(self, folder: str, node_id: str = '', lease_seconds: float = 120) -> None:
+        if not folder:
+            raise ValueError('Не задана папка учёта работ распределённого конвертирования')
+        self.folder = folder
+        self.node_id = node_id or default_node_id()
+        self.lease_seconds = float(lease_seconds)
+        self.batches: List[List[str]] = []
+        # файл аренды другого узла -> (время изменения файла, время, когда оно наблюдалось впервые)
+        self._observed: Dict[str, Tuple[int, float]] = {}
+        for name in ('leases', 'partials', 'done'):
+            os.makedirs(os.path.join(folder, name), exist_ok=True)
+
+    @staticmethod
+    def batch_name(index: int) -> str:
+        return '%05d' % index
+
+    def _lease_path(self, batch: str, generation: int) -> str:
+        return os.path.join(self.folder, 'leases', batch + '.' + str(generation) + LEASE_EXT)
+
+    def _done_path(self, batch: str) -> str:
+        return os.path.join(self.folder, 'done', batch + '.json')
+
+    def partial_folder(self, batch: str, generation: int) -> str:
+        return os.path.join(self.folder, 'partials', batch + '.' + str(generation))
+
+    def batch_files(self, batch: str) -> List[str]:
+        return self.batches[int(batch)]
+
+    def plan(self, inputs: List[InputFile], batch_size: int, order: str = '') -> List[List[str]]:
+        """
+        загружает план из папки учёта работ; если плана ещё нет, составляет его: выписки (см. scanner.scan_inputs)
+        делятся на пакеты по batch_size файлов в порядке путей, при order='largest_first' - от больших файлов
+        к меньшим (пакеты с большими файлами обрабатываются первыми), при order='balanced' - на пакеты с близким
+        суммарным размером файлов. Все узлы работают по плану узла, создавшего его первым
+        :param inputs: list - выписки папки с выписками этого узла
+        :param batch_size: int
+        :param order: str - см. scanner.SCHEDULES
+        :return: list - пакеты (пути выписок относительно папки с выписками, разделитель - '/')
+        """
+        if batch_size < 1:
+            raise ValueError('Размер пакета распределённого конвертирования должен быть не меньше 1')
+        plan_path = os.path.join(self.folder, PLAN_FILE)
+        # узлы могут работать в разных ОС, поэтому пути в плане записываются с разделителем '/'
+        names = [(xml_file.replace(os.sep, '/'), size) for xml_file, size in inputs]
+        if not os.path.exists(plan_path):
+            if order == 'balanced':
+                batches = size_batches(names, -(-len(names) // batch_size))
+            else:
+                names = schedule(names, 'largest_first' if order == 'largest_first' else 'name')
+                batches = [names[i:i + batch_size] for i in range(0, len(names), batch_size)]
+            _publish(plan_path, {'node_id': self.node_id, 'time': datetime.datetime.now().strftime("%d.%m.%Y %H:%M:%S"),
+                                 'batches': [[name for name, _ in batch] for batch in batches]})
+        self.load_plan()
+        # узлы могут подключать общую папку по разным путям, поэтому сравниваются пути относительно папки с выписками
+        missing = set(name for batch in self.batches for name in batch).difference(name for name, _ in names)
+        if missing:
+            raise ValueError('В папке с выписками нет ' + str(len(missing)) + ' выписок из плана распределённого '
+                             'конвертирования, например: ' + sorted(missing)[0])
+        return self.batches
+
+    def load_plan(self) -> List[List[str]]:
+        plan_path = os.path.join(self.folder, PLAN_FILE)
+        if not os.path.exists(plan_path):
+            raise ValueError('В папке учёта работ нет плана распределённого конвертирования: ' + plan_path)
+        self.batches = _read_json(plan_path)['batches']
+        return self.batches
+
+    def pending(self) -> List[str]:
+        """
+        возвращает пакеты, итоги обработки которых ещё не сохранены
+        """
+        done = set(os.listdir(os.path.join(self.folder, 'done')))
+        return [self.batch_name(index) for index in range(len(self.batches))
+                if self.batch_name(index) + '.json' not in done]
+
+    def _latest_leases(self) -> Dict[str, int]:
+        """
+        возвращает последнее поколение аренды каждого арендованного пакета
+        """
+        leases = {}
+        for name in os.listdir(os.path.join(self.folder, 'leases')):
+            match = re.fullmatch(r'(\d+)\.(\d+)' + re.escape(LEASE_EXT), name)
+            if match:
+                leases[match.group(1)] = max(leases.get(match.group(1), 0), int(match.group(2)))
+        return leases
+
+    def claim(self) -> Optional[Tuple[str, int]]:
+        """
+        захватывает пакет для обработки: сначала незавершённый пакет этого же узла (после его перезапуска с тем же
+        именем обработка продолжается по сохранённому состоянию конвертирования, см. Converter.convert), затем
+        пакет без аренды, затем пакет с просроченной арендой. Возвращает пакет и поколение аренды или None, если
+        свободных пакетов нет (все обработаны или арендованы работающими узлами)
+        :return: tuple или None
+        """
+        leases = self._latest_leases()
+        now = time.monotonic()
+        candidates, stale = [], []
+        for batch in self.pending():
+            generation = leases.get(batch)
+            if generation is None:
+                candidates.append((batch, 0))
+                continue
+            lease_path = self._lease_path(batch, generation)
+            try:
+                lease = _read_json(lease_path)
+                mtime = os.stat(lease_path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if lease['node_id'] == self.node_id:
+                os.utime(lease_path)
+                return batch, generation
+            observed = self._observed.get(lease_path)
+            if observed is None or observed[0] != mtime:
+                self._observed[lease_path] = (mtime, now)
+            elif now - observed[1] >= self.lease_seconds:
+                stale.append((batch, generation))
+        for batch, generation in candidates + stale:
+            # следующее поколение аренды создаёт только один узел, остальные переходят к другим пакетам
+            if _publish(self._lease_path(batch, generation + 1),
+                        {'node_id': self.node_id, 'generation': generation + 1,
+                         'time': datetime.datetime.now().strftime("%d.%m.%Y %H:%M:%S")}):
+                return batch, generation + 1
+        return None
+
+    def renew(self, batch: str, generation: int) -> bool:
+        """
+        продлевает аренду пакета. Возвращает False, если пакет уже захвачен другим узлом (аренда была просрочена)
+        """
+        if os.path.exists(self._lease_path(batch, generation + 1)):
+            return False
+        os.utime(self._lease_path(batch, generation))
+        return True
+
+    def complete(self, batch: str, generation: int, result: Dict[str, Any]) -> bool:
+        """
+        сохраняет итоги обработки пакета (см. Converter.convert). Если пакет, аренда которого была просрочена,
+        одновременно обработан двумя узлами, сохраняются итоги того, кто завершил обработку первым; возвращает False
+        для второго
+        """
+        return _publish(self._done_path(batch), {
+            'node_id': self.node_id, 'generation': generation,
+            'time': datetime.datetime.now().strftime("%d.%m.%Y %H:%M:%S"),
+            'outputs': [os.path.relpath(path, self.folder) for path in result['outputs']],
+            **{key: result[key] for key in ('successful', 'errors', 'quarantined', 'filtered')}})
+
+    def done_record(self, batch: str) -> Dict[str, Any]:
+        record = _read_json(self._done_path(batch))
+        record['outputs'] = [os.path.join(self.folder, path) for path in record['outputs']]
+        return record
+
+
+class LeaseRenewal:
+    """
+    Продлевает аренду пакета в фоновом потоке каждые lease_seconds / 4 секунд, пока пакет обрабатывается
+    (используется в блоке with). Если аренда перехвачена другим узлом, устанавливается признак lost
+    """
+    def __init__(self, ledger: WorkLedger, batch: str, generation: int) -> None:
+        self.lost = False
+        self._ledger = ledger
+        self._batch = batch
+        self._generation = generation
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._ledger.lease_seconds / 4):
+            try:
+                if not self._ledger.renew(self._batch, self._generation):
+                    self.lost = True
+                    return
+            except OSError:
+                pass  # общая папка временно недоступна - аренда продлится при следующей попытке
+
+    def __enter__(self) -> 'LeaseRenewal':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def run_node(settings: Dict[str, Any], on_message: Optional[Callable[[str], Any]] = None,
+             on_progress: Optional[Callable[[int, int], Any]] = None) -> Dict[str, Any]:
+    """
+    выполняет работу узла распределённого конвертирования: захватывает пакеты выписок папки 'folder_in_xml'
+    и конвертирует их в частичные результаты, пока необработанных пакетов не останется. Если свободных пакетов нет,
+    а другие узлы ещё работают, узел ждёт: пакеты аварийно завершившихся узлов захватываются после истечения аренды.
+    Выписки не переименовываются и не извлекаются из архивов (это нужно сделать до запуска узлов).
+    Возвращает имя узла ('node_id') и обработанные им пакеты ('batches')
+    :param settings: dict - настройки конвертирования с настройками 'ledger_folder', 'ledger_node_id',
+    'ledger_batch_size', 'ledger_lease_seconds'
+    :return: dict
+    """
+    settings = {**DEFAULT_SETTINGS, **settings}
+    check_settings(settings)
+    ledger = WorkLedger(settings['ledger_folder'], settings['ledger_node_id'], settings['ledger_lease_seconds'])
+    # папка учёта работ и папка результата могут находиться внутри папки с выписками
+    inputs = scan_inputs(settings['folder_in_xml'], settings['scan_recursive'], settings['scan_include'],
+                         settings['scan_exclude'], (ledger.folder, settings['folder_out_xml'],
+                                                    settings['quarantine_folder']))
+    ledger.plan(inputs, int(settings['ledger_batch_size']), settings['schedule'])
+    message = on_message or (lambda text: None)
+    message('Узел ' + ledger.node_id + ': пакетов в плане ' + str(len(ledger.batches)))
+    processed = []
+    while True:
+        claimed = ledger.claim()
+        if claimed is None:
+            if not ledger.pending():
+                break
+            time.sleep(min(5.0, ledger.lease_seconds / 4))
+            continue
+        batch, generation = claimed
+        folder = ledger.partial_folder(batch, generation)
+        os.makedirs(folder, exist_ok=True)
+        message('Узел ' + ledger.node_id + ': пакет ' + batch + ' (' + str(len(ledger.batch_files(batch))) +
+                ' выписок)')
+        with LeaseRenewal(ledger, batch, generation) as renewal:
+            result = Converter({**settings, 'folder_out_xml': folder}, on_message,
+                               on_progress).convert(ledger.batch_files(batch))
+        if renewal.lost:
+            message('Аренда пакета ' + batch + ' просрочена и перехвачена другим узлом')
+        if ledger.complete(batch, generation, result):
+            processed.append(batch)
+    message('Узел ' + ledger.node_id + ': все пакеты обработаны, обработано этим узлом: ' + str(len(processed)))
+    return {'node_id': ledger.node_id, 'batches': processed}
+
+
+def _append_stream(part_path: str, path: str, skip_header: bool) -> None:
+    """
+    дописывает частичный файл GeoJSONL или CSV в конец файла path; у файлов CSV, кроме первого, пропускается
+    строка заголовка (сжатый файл дописывается новым блоком gzip)
+    """
+    if not skip_header:
+        with open(part_path, 'rb') as source, open(path, 'ab') as target:
+            shutil.copyfileobj(source, target)
+        return
+    opener = gzip.open if part_path.endswith(GZIP_EXT) else open
+    with opener(part_path, 'rb') as source, opener(path, 'ab') as target:
+        source.readline()
+        shutil.copyfileobj(source, target)
+
+
+def merge_partials(settings: Dict[str, Any], on_message: Optional[Callable[[str], Any]] = None) -> Dict[str, Any]:
+    """
+    объединяет частичные результаты всех пакетов распределённого конвертирования (в порядке пакетов в плане)
+    в папке 'folder_out_xml': шейп-файлы - переносом записей (см. writers.append_shapefile), таблицы xlsx - через
+    XlsxWriter с обычным ограничением строк на листе, файлы GeoJSONL и CSV - дописыванием. Частичные результаты
+    не изменяются. Возвращает итоги так же, как Converter.convert
+    :param settings: dict
+    :return: dict
+    """
+    settings = {**DEFAULT_SETTINGS, **settings}
+    check_settings(settings)
+    message = on_message or (lambda text: None)
+    start_time = time.time()
+    ledger = WorkLedger(settings['ledger_folder'], settings['ledger_node_id'], settings['ledger_lease_seconds'])
+    ledger.load_plan()
+    pending = ledger.pending()
+    if pending:
+        raise ValueError('Не обработано пакетов распределённого конвертирования: ' + str(len(pending)) +
+                         ' (например, ' + pending[0] + ')')
+    message("Идёт объединение частичных результатов распределённого конвертирования...")
+    records = [ledger.done_record(ledger.batch_name(index)) for index in range(len(ledger.batches))]
+    parts = [path for record in records for path in record['outputs']]
+    now = datetime.datetime.now()
+    directory_out = settings['folder_out_xml']
+    stem = os.path.join(directory_out, 'real_estate_objects_EGRN_' + now.strftime("%d_%m_%Y  %H-%M"))
+    outputs = []
+    if settings['create_xlsx']:
+        writer = XlsxWriter(os.path.join(directory_out, now.strftime("%d_%m_%Y  %H-%M") +
+                                         " real_estate_objects_EGRN.xlsx"), False, False, settings['output_fields'],
+                            int(settings['xlsx_max_rows']), settings['xlsx_rollover'])
+        for path in parts:
+            if path.endswith('.xlsx'):
+                writer.append_table(path)
+        writer.close()
+        outputs.extend(writer.paths)
+    if settings['create_esri_shape']:
+        prj_wkt = read_prj(settings['output_prj']) if settings['output_prj'] else None
+        ShapeWriter(stem, fields=settings['output_fields'], prj_wkt=prj_wkt).close()  # пустой шейп-файл
+        for path in parts:
+            if path.endswith('.shp'):
+                append_shapefile(stem, os.path.splitext(path)[0])
+        os.remove(stem + CAD_INDEX_EXT)  # индекс кадастровых номеров будет построен заново при добавлении объектов
+        if settings['shp_spatial_index']:
+            bboxes, skip = read_shape_bboxes(stem + '.shp')
+            write_qix(stem + QIX_EXT, bboxes, (os.path.getsize(stem + '.shx') - 100) // 8, skip)
+        outputs.append(stem + '.shp')
+    gzip_ext = GZIP_EXT if settings['stream_gzip'] else ''
+    for setting, ext in (('create_geojsonl', GEOJSONL_EXT), ('create_csv', CSV_EXT)):
+        if settings[setting]:
+            path = stem + ext + gzip_ext
+            open(path, 'wb').close()
+            for number, part_path in enumerate(part for part in parts if part.endswith(ext + gzip_ext)):
+                _append_stream(part_path, path, ext == CSV_EXT and number > 0)
+            outputs.append(path)
+    result = {'successful': sum(record['successful'] for record in records),
+              'errors': [path for record in records for path in record['errors']],
+              'quarantined': [path for record in records for path in record['quarantined']],
+              'filtered': [name for record in records for name in record['filtered']],
+              'outputs': outputs, 'seconds': max(1, round(time.time() - start_time))}
+    message("Объединено пакетов: " + str(len(records)) + ", успешно обработано " + str(result['successful']) +
+            " файлов. Результат сохранён в папке " + directory_out)
+    if result['quarantined']:
+        message("Помещено в карантин из-за ошибок " + str(len(result['quarantined'])) + " файлов:")
+        for err_file in result['quarantined']:
+            message(err_file)
+    message(SEPARATOR)
+    return result
@@ -0,0 +1,151 @@
+from typing import Dict, List, Iterator, Tuple, Optional, Iterable
+import os
+import csv
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# виды связей между объектами недвижимости: 'contains' - в пределах объекта расположен другой объект (здания,
+# сооружения на земельном участке, помещения в здании - свойство estate_objects), 'entry_parcel' - земельный участок
+# входит в состав единого землепользования (свойство entry_parcels)
+LINK_RELATIONS = ('contains', 'entry_parcel')
+
+# суффикс имени файла таблицы связей
+LINKS_FILE_SUFFIX = '_links.csv'
+
+# заголовок таблицы связей
+LINKS_COLUMNS = ('cad_number', 'kind', 'relation', 'linked_cad_number', 'linked_kind', 'linked_in_batch')
+
+
+def split_cad_numbers(value: str) -> List[str]:
+    """
+    разбирает список кадастровых номеров через запятую (см. AbstractRealEstateObject.estate_objects); пустые значения
+    и прочерк (нет данных) пропускаются
+    :param value: str
+    :return: list
+    """
+    return [cad_number for cad_number in (part.strip() for part in value.split(','))
+            if cad_number and cad_number != '-']
+
+
+class RelationIndex:
+    """
+    Индекс связей между объектами недвижимости всех обработанных выписок набора. Данные выписок хранятся в словаре
+    objects (кадастровый номер -> [вид объекта, список кадастровых номеров расположенных в нём объектов, список
+    земельных участков единого землепользования]), который сохраняется вместе с состоянием конвертирования;
+    по нему строятся хеш-таблицы прямых и обратных связей, поэтому поиск объектов, расположенных на участке
+    (contents), и участка, на котором расположен объект (containers), выполняется за O(1).
+    """
+    def __init__(self, objects: Optional[Dict[str, list]] = None) -> None:
+        self.objects = {} if objects is None else objects
+        self._children: Dict[Tuple[str, str], List[str]] = {}  # (КН, вид связи) -> связанные объекты
+        self._parents: Dict[Tuple[str, str], List[str]] = {}  # (КН связанного объекта, вид связи) -> объекты
+        for cad_number, (_, contents, entry_parcels) in self.objects.items():
+            self._index(cad_number, contents, entry_parcels)
+
+    def _index(self, cad_number: str, contents: Iterable[str], entry_parcels: Iterable[str]) -> None:
+        for relation, linked in (('contains', contents), ('entry_parcel', entry_parcels)):
+            for linked_cad_number in linked:
+                self._children.setdefault((cad_number, relation), []).append(linked_cad_number)
+                self._parents.setdefault((linked_cad_number, relation), []).append(cad_number)
+
+    def add(self, cad_number: str, kind: str, estate_objects: str, entry_parcels: Iterable[str]) -> None:
+        """
+        добавляет связи объекта недвижимости из его выписки. Повторная выписка на тот же объект заменяет связи,
+        добавленные по предыдущей
+        :param cad_number: str - кадастровый номер объекта (parent_cad_number)
+        :param kind: str - вид объекта (см. AbstractRealEstateObject.kind)
+        :param estate_objects: str - кадастровые номера расположенных в пределах объекта объектов через запятую
+        :param entry_parcels: list - кадастровые номера земельных участков единого землепользования
+        """
+        if not cad_number:
+            return
+        if cad_number in self.objects:
+            self._remove(cad_number)
+        contents = list(dict.fromkeys(split_cad_numbers(estate_objects)))
+        entry_parcels = list(dict.fromkeys(entry_parcel for entry_parcel in entry_parcels if entry_parcel))
+        self.objects[cad_number] = [kind, contents, entry_parcels]
+        self._index(cad_number, contents, entry_parcels)
+
+    def _remove(self, cad_number: str) -> None:
+        _, contents, entry_parcels = self.objects.pop(cad_number)
+        for relation, linked in (('contains', contents), ('entry_parcel', entry_parcels)):
+            self._children.pop((cad_number, relation), None)
+            for linked_cad_number in linked:
+                parents = self._parents[(linked_cad_number, relation)]
+                parents.remove(cad_number)
+                if not parents:
+                    del self._parents[(linked_cad_number, relation)]
+
+    def contents(self, cad_number: str, relation: str = 'contains') -> List[str]:
+        """
+        возвращает кадастровые номера объектов, связанных с объектом cad_number: по умолчанию - расположенных в его
+        пределах (здания на земельном участке, помещения в здании), при relation='entry_parcel' - земельных участков
+        единого землепользования
+        :param cad_number: str
+        :param relation: str (см. LINK_RELATIONS)
+        :return: list
+        """
+        return list(self._children.get((cad_number, relation), ()))
+
+    def containers(self, cad_number: str, relation: str = 'contains') -> List[str]:
+        """
+        возвращает кадастровые номера объектов, с которыми связан объект cad_number: по умолчанию - в пределах которых
+        он расположен (земельный участок здания, здание помещения), при relation='entry_parcel' - единых
+        землепользований, в состав которых входит земельный участок
+        :param cad_number: str
+        :param relation: str (см. LINK_RELATIONS)
+        :return: list
+        """
+        return list(self._parents.get((cad_number, relation), ()))
+
+    def kind(self, cad_number: str) -> Optional[str]:
+        """
+        возвращает вид объекта недвижимости или None, если выписки на объект в наборе нет
+        :param cad_number: str
+        :return: str или None
+        """
+        entry = self.objects.get(cad_number)
+        return None if entry is None else entry[0]
+
+    def links(self) -> Iterator[Tuple[str, str, str]]:
+        """
+        перебирает все связи: кадастровый номер объекта, вид связи, кадастровый номер связанного объекта
+        :return: iterator
+        """
+        for cad_number in sorted(self.objects):
+            _, contents, entry_parcels = self.objects[cad_number]
+            for relation, linked in (('contains', contents), ('entry_parcel', entry_parcels)):
+                for linked_cad_number in linked:
+                    yield cad_number, relation, linked_cad_number
+
+    def missing(self) -> List[str]:
+        """
+        возвращает кадастровые номера объектов, которые упоминаются в выписках набора, но выписок на которые
+        в наборе нет
+        :return: list
+        """
+        return sorted({linked_cad_number for _, _, linked_cad_number in self.links()} - set(self.objects))
+
+    def write_csv(self, path: str) -> str:
+        """
+        записывает нормализованную таблицу связей (одна строка на связь, столбцы - LINKS_COLUMNS, linked_in_batch -
+        1, если выписка на связанный объект есть в наборе, иначе 0) в файл CSV (UTF-8)
+        :param path: str
+        :return: str - путь к файлу
+        """
+        with open(path + '.tmp', 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(LINKS_COLUMNS)
+            for cad_number, relation, linked_cad_number in self.links():
+                linked_kind = self.kind(linked_cad_number)
+                writer.writerow([cad_number, self.objects[cad_number][0], relation, linked_cad_number,
+                                 linked_kind or '', 0 if linked_kind is None else 1])
+        os.replace(path + '.tmp', path)
+        return path
@@ -2,7 +2,6 @@ from typing import Dict, List, Union
 import re
 import json
 import csv
-from zipfile import is_zipfile, ZipFile
 
 __author__ = "Dmitry S. Korottsev"
 __copyright__ = "Copyright 2021"
@@ -13,6 +12,44 @@ __maintainer__ = "Dmitry S. Korottsev"
 __email__ = "dm-korottev@yandex.ru"
 __status__ = "Development"
 
+# значения настроек программы по умолчанию (используются, если в файле 'settings.json' нет нужного ключа)
+DEFAULT_SETTINGS = {'folder_in_xml': '', 'folder_out_xml': '', 'file_type': 'xml', 'create_esri_shape': False,
+                    'create_xlsx': True, 'rename_files': True, 'adm_district': False, 'replace_long_names': True,
+                    'append_mode': False, 'append_shp_path': '', 'append_xlsx_path': '', 'replace_existing': False,
+                    'prefetch_window': 8, 'prefetch_max_mb': 256,
+                    'output_fields': None,  # None - все поля, иначе список имён полей (см. writers.select_fields)
+                    'quarantine_folder': '', 'checkpoint_minutes': 10, 'resume_interrupted': True,
+                    'xlsx_max_rows': 1048576, 'xlsx_rollover': 'sheet', 'xlsx_split_by_kind': False,
+                    'scan_workers': 8,
+                    # поиск выписок (см. scanner.py): вложенные папки, маски имён файлов через запятую ('' - '*.xml'),
+                    # порядок обработки ('' - как в папке, 'name', 'largest_first', 'balanced')
+                    'scan_recursive': False, 'scan_include': '', 'scan_exclude': '', 'schedule': '',
+                    'parse_workers': 0,  # процессы разбора выписок (см. parse_pool.ParsePool), 0 - в основном процессе
+                    # предварительная проверка выписок (см. validation.py) в процессах, 0 - в основном процессе
+                    'prevalidate': False, 'prevalidate_workers': 4,
+                    'shp_writer': 'native',  # 'native' - shp_native.ShpWriter, 'pyshp' - shapefile.Writer
+                    'shp_spatial_index': False,
+                    'shard_by': '', 'shard_workers': 4,  # shard_by: '' - без разделения, иначе см. shards.SHARD_KEYS
+                    'dedup_policy': 'all',
+                    'create_fgb': False, 'fgb_sort_memory_mb': 256,
+                    'create_parquet': False, 'parquet_geometry': True, 'parquet_row_group_rows': 50000,
+                    'create_geojsonl': False, 'create_csv': False, 'stream_gzip': False,
+                    'create_pgdump': False, 'pgdump_table': 'real_estate_objects', 'pgdump_srid': 0,
+                    'create_links': False,
+                    'topology_check': False, 'topology_gap_tolerance': 0.1, 'topology_min_overlap': 0.01,
+                    'geometry_grid': 0.0, 'geometry_simplify_tolerance': 0.0,  # облегчение геометрии, 0 - выключено
+                    # преобразование координат (см. transform.CoordinateTransformer): отмена перестановки осей X и Y,
+                    # аффинное преобразование [a, b, c, d, e, f], преобразование Гельмерта [dX, dY, dZ, wx, wy, wz, m];
+                    # система координат выходных файлов - текст WKT или путь к файлу .prj
+                    'transform_swap_axes': False, 'transform_affine': None, 'transform_helmert': None, 'output_prj': '',
+                    # фильтр выписок (см. filters.ExtractFilter): начала кадастровых номеров через запятую, регулярное
+                    # выражение, охват [minx, miny, maxx, maxy], список видов объектов, даты выписок "ДД.ММ.ГГГГ"
+                    'filter_cad_prefix': '', 'filter_cad_regex': '', 'filter_bbox': None, 'filter_kinds': None,
+                    'filter_date_from': '', 'filter_date_to': '',
+                    # распределённое конвертирование (см. ledger.py): папка учёта работ ('' - выключено), имя узла
+                    # ('' - имя компьютера и номер процесса), количество выписок в пакете, срок аренды пакета, сек.
+                    'ledger_folder': '', 'ledger_node_id': '', 'ledger_batch_size': 200, 'ledger_lease_seconds': 120}
+
 
 def get_dict_from_csv(filepath: str) -> Dict[str, str]:
     """
@@ -37,14 +74,23 @@ def write_settings(key: str, value: Union[bool, str]):
         json.dump(sd, f, sort_keys=True, indent=4, ensure_ascii=False)
 
 
+def read_settings() -> Dict[str, Union[bool, str]]:
+    """
+    возвращает все настройки программы из файла 'settings.json', дополненные значениями по умолчанию для
+    отсутствующих в нём ключей
+    :return: dict
+    """
+    with open('settings.json', 'r') as f:
+        sd = json.load(f)
+    return {**DEFAULT_SETTINGS, **sd}
+
+
 def get_settings(key: str) -> Union[bool, str]:
     """
     возвращает значение параметра настройки программы по указанному ключу, сохранённое в файле 'settings.json'
     :param key: str
     """
-    with open('settings.json', 'r') as f:
-        sd = json.load(f)
-    return sd[key]
+    return read_settings()[key]
 
 
 def to_shorten_a_long_name(names: Union[List[str], str]) -> Union[List[str], str]:
@@ -87,6 +133,7 @@ def extract_all_zipfiles(names_of_zipfiles: List[str], folder: str):
     :param names_of_zipfiles: list
     :param folder: str
     """
+    from zipfile import is_zipfile, ZipFile  # нужен только при обработке архивов
     for zf in names_of_zipfiles:
         if is_zipfile(folder + '//' + zf):
             with ZipFile(folder + '//' + zf, 'r') as z:
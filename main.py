@@ -3,19 +3,23 @@ import os
 import sys
 from PyQt5 import QtCore, QtWidgets
 from PyQt5.QtWidgets import QMessageBox
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Border, Alignment, Font, Side
-import re
 import datetime
-import time
 import json
-import shapefile
 import functools
 from traceback import format_exc
-from logic import write_settings, get_settings, to_shorten_a_long_name, extract_all_zipfiles
-from real_estate import AbstractRealEstateObject
+from logic import write_settings, get_settings, read_settings, DEFAULT_SETTINGS
+from converter import Converter
+from writers import FIELD_TITLES
 import graphic_interface
 
+# способы разделения результата на части (см. shards.SHARD_KEYS) в меню "Настройки"
+SHARD_TITLES = {'': 'Не разделять', 'cad_region': 'По кадастровым округам', 'cad_district': 'По кадастровым районам',
+                'cad_quarter': 'По кадастровым кварталам', 'district_name': 'По районам (из адреса)'}
+
+# правила обработки нескольких выписок на один объект (см. dedup.DEDUP_POLICIES) в меню "Настройки"
+DEDUP_TITLES = {'all': 'Записывать все выписки', 'newest': 'Только самую новую выписку',
+                'most_complete': 'Только самую полную выписку'}
+
 # делаем текущей директорией для работы ту папку, в которой лежит файл скрипта
 path_to_current_file = os.path.realpath(__file__)
 os.chdir(os.path.split(path_to_current_file)[0])
@@ -59,12 +63,13 @@ class ConvXMLApp(QtWidgets.QMainWindow, graphic_interface.Ui_MainWindow):
         self.btnStart.clicked.connect(self.start_conv)
         self.checkBoxShape.stateChanged.connect(self.change_check_box_shape)
         self.checkBoxExcel.stateChanged.connect(self.change_check_box_xlsx)
+        self.checkBoxGeoJsonl.stateChanged.connect(self.change_check_box_geojsonl)
+        self.checkBoxCsv.stateChanged.connect(self.change_check_box_csv)
         self.checkBoxRename.stateChanged.connect(self.change_check_box_rename)
         self.checkBoxAdm.stateChanged.connect(self.change_check_box_adm)
         self.checkBoxReplace.stateChanged.connect(self.change_check_box_replace)
         #  используем ранее сохранённые настройки как значения по умолчанию
-        with open('settings.json', 'r') as f:
-            sd = json.load(f)
+        sd = read_settings()
         self.label_input.setText(sd['folder_in_xml'])
         self.label_out.setText(sd['folder_out_xml'])
 
@@ -78,6 +83,16 @@ class ConvXMLApp(QtWidgets.QMainWindow, graphic_interface.Ui_MainWindow):
         else:
             self.checkBoxExcel.setCheckState(QtCore.Qt.Unchecked)
 
+        if sd['create_geojsonl']:
+            self.checkBoxGeoJsonl.setCheckState(QtCore.Qt.Checked)
+        else:
+            self.checkBoxGeoJsonl.setCheckState(QtCore.Qt.Unchecked)
+
+        if sd['create_csv']:
+            self.checkBoxCsv.setCheckState(QtCore.Qt.Checked)
+        else:
+            self.checkBoxCsv.setCheckState(QtCore.Qt.Unchecked)
+
         if sd['rename_files']:
             self.checkBoxRename.setCheckState(QtCore.Qt.Checked)
         else:
@@ -92,6 +107,94 @@ class ConvXMLApp(QtWidgets.QMainWindow, graphic_interface.Ui_MainWindow):
             self.checkBoxReplace.setCheckState(QtCore.Qt.Checked)
         else:
             self.checkBoxReplace.setCheckState(QtCore.Qt.Unchecked)
+        self.create_settings_menu(sd)
+
+    def create_settings_menu(self, sd) -> None:
+        """
+        создаёт меню "Настройки" с дополнительными параметрами конвертирования, не вынесенными на главную форму
+        """
+        menu = self.menuBar().addMenu('Настройки')
+        self.actionAppend = menu.addAction('Дописывать результат в существующие файлы SHP и XLSX')
+        self.actionAppend.setCheckable(True)
+        self.actionAppend.setChecked(sd['append_mode'])
+        self.actionAppend.toggled.connect(self.change_action_append)
+        self.actionReplaceExisting = menu.addAction('Заменять в существующих файлах объекты с тем же кадастровым '
+                                                    'номером')
+        self.actionReplaceExisting.setCheckable(True)
+        self.actionReplaceExisting.setChecked(sd['replace_existing'])
+        self.actionReplaceExisting.toggled.connect(self.change_action_replace_existing)
+        menu.addAction('Выбрать существующий файл SHP...').triggered.connect(self.browse_append_shp)
+        menu.addAction('Выбрать существующий файл XLSX...').triggered.connect(self.browse_append_xlsx)
+        self.actionSpatialIndex = menu.addAction('Создавать пространственный индекс шейп-файла (.qix)')
+        self.actionSpatialIndex.setCheckable(True)
+        self.actionSpatialIndex.setChecked(sd['shp_spatial_index'])
+        self.actionSpatialIndex.toggled.connect(self.change_action_spatial_index)
+        self.actionFgb = menu.addAction('Создавать файл FlatGeobuf (.fgb) с пространственным индексом')
+        self.actionFgb.setCheckable(True)
+        self.actionFgb.setChecked(sd['create_fgb'])
+        self.actionFgb.toggled.connect(self.change_action_fgb)
+        self.actionParquet = menu.addAction('Создавать файл Parquet для анализа данных (нужна библиотека pyarrow)')
+        self.actionParquet.setCheckable(True)
+        self.actionParquet.setChecked(sd['create_parquet'])
+        self.actionParquet.toggled.connect(self.change_action_parquet)
+        self.actionPgdump = menu.addAction('Создавать дамп для загрузки в PostGIS (.sql)')
+        self.actionPgdump.setCheckable(True)
+        self.actionPgdump.setChecked(sd['create_pgdump'])
+        self.actionPgdump.toggled.connect(self.change_action_pgdump)
+        self.actionLinks = menu.addAction('Создавать таблицу связей объектов (участки - здания - помещения)')
+        self.actionLinks.setCheckable(True)
+        self.actionLinks.setChecked(sd['create_links'])
+        self.actionLinks.toggled.connect(self.change_action_links)
+        self.actionTopology = menu.addAction('Проверять наложения и зазоры между земельными участками')
+        self.actionTopology.setCheckable(True)
+        self.actionTopology.setChecked(sd['topology_check'])
+        self.actionTopology.toggled.connect(self.change_action_topology)
+        self.actionStreamGzip = menu.addAction('Сжимать файлы GeoJSONL и CSV при записи (gzip)')
+        self.actionStreamGzip.setCheckable(True)
+        self.actionStreamGzip.setChecked(sd['stream_gzip'])
+        self.actionStreamGzip.toggled.connect(self.change_action_stream_gzip)
+        menu.addAction('Показать план переименования выписок').triggered.connect(self.show_rename_plan)
+        self.actionSplitByKind = menu.addAction('Разделять таблицу XLSX по видам объектов (отдельные листы)')
+        self.actionSplitByKind.setCheckable(True)
+        self.actionSplitByKind.setChecked(sd['xlsx_split_by_kind'])
+        self.actionSplitByKind.toggled.connect(self.change_action_split_by_kind)
+        self.actionRolloverFile = menu.addAction('При превышении лимита строк продолжать таблицу XLSX в новом файле '
+                                                 '(а не на новом листе)')
+        self.actionRolloverFile.setCheckable(True)
+        self.actionRolloverFile.setChecked(sd['xlsx_rollover'] == 'file')
+        self.actionRolloverFile.toggled.connect(self.change_action_rollover_file)
+        self.actionResume = menu.addAction('Продолжать прерванное конвертирование с последнего сохранения')
+        self.actionResume.setCheckable(True)
+        self.actionResume.setChecked(sd['resume_interrupted'])
+        self.actionResume.toggled.connect(self.change_action_resume)
+        fields_menu = menu.addMenu('Поля выходных файлов')
+        fields_menu.addAction('Все поля').triggered.connect(functools.partial(self.set_output_fields, None))
+        fields_menu.addAction('Только кадастровый номер и геометрия').triggered.connect(
+            functools.partial(self.set_output_fields, []))
+        fields_menu.addSeparator()
+        self.field_actions = {}
+        for key, title in FIELD_TITLES.items():
+            action = fields_menu.addAction(title)
+            action.setCheckable(True)
+            action.setChecked(sd['output_fields'] is None or key in sd['output_fields'])
+            action.toggled.connect(self.change_output_fields)
+            self.field_actions[key] = action
+        shard_menu = menu.addMenu('Разделять результат на части')
+        shard_group = QtWidgets.QActionGroup(self)
+        for shard_by, title in SHARD_TITLES.items():
+            action = shard_menu.addAction(title)
+            action.setCheckable(True)
+            action.setChecked(sd['shard_by'] == shard_by)
+            action.triggered.connect(functools.partial(write_settings, 'shard_by', shard_by))
+            shard_group.addAction(action)
+        dedup_menu = menu.addMenu('Несколько выписок на один объект')
+        dedup_group = QtWidgets.QActionGroup(self)
+        for policy, title in DEDUP_TITLES.items():
+            action = dedup_menu.addAction(title)
+            action.setCheckable(True)
+            action.setChecked(sd['dedup_policy'] == policy)
+            action.triggered.connect(functools.partial(write_settings, 'dedup_policy', policy))
+            dedup_group.addAction(action)
 
     #  в случае изменения настроек записываем их в файл
     def change_check_box_shape(self) -> None:
@@ -106,6 +209,18 @@ class ConvXMLApp(QtWidgets.QMainWindow, graphic_interface.Ui_MainWindow):
         else:
             write_settings('create_xlsx', False)
 
+    def change_check_box_geojsonl(self) -> None:
+        if self.checkBoxGeoJsonl.isChecked():
+            write_settings('create_geojsonl', True)
+        else:
+            write_settings('create_geojsonl', False)
+
+    def change_check_box_csv(self) -> None:
+        if self.checkBoxCsv.isChecked():
+            write_settings('create_csv', True)
+        else:
+            write_settings('create_csv', False)
+
     def change_check_box_rename(self) -> None:
         if self.checkBoxRename.isChecked():
             write_settings('rename_files', True)
@@ -124,6 +239,68 @@ class ConvXMLApp(QtWidgets.QMainWindow, graphic_interface.Ui_MainWindow):
         else:
             write_settings('replace_long_names', False)
 
+    def change_action_append(self) -> None:
+        write_settings('append_mode', self.actionAppend.isChecked())
+
+    def change_action_replace_existing(self) -> None:
+        write_settings('replace_existing', self.actionReplaceExisting.isChecked())
+
+    def change_action_split_by_kind(self) -> None:
+        write_settings('xlsx_split_by_kind', self.actionSplitByKind.isChecked())
+
+    def change_action_rollover_file(self) -> None:
+        write_settings('xlsx_rollover', 'file' if self.actionRolloverFile.isChecked() else 'sheet')
+
+    def change_action_resume(self) -> None:
+        write_settings('resume_interrupted', self.actionResume.isChecked())
+
+    def change_action_spatial_index(self) -> None:
+        write_settings('shp_spatial_index', self.actionSpatialIndex.isChecked())
+
+    def change_action_fgb(self) -> None:
+        write_settings('create_fgb', self.actionFgb.isChecked())
+
+    def change_action_parquet(self) -> None:
+        write_settings('create_parquet', self.actionParquet.isChecked())
+
+    def change_action_pgdump(self) -> None:
+        write_settings('create_pgdump', self.actionPgdump.isChecked())
+
+    def change_action_links(self) -> None:
+        write_settings('create_links', self.actionLinks.isChecked())
+
+    def change_action_topology(self) -> None:
+        write_settings('topology_check', self.actionTopology.isChecked())
+
+    def change_action_stream_gzip(self) -> None:
+        write_settings('stream_gzip', self.actionStreamGzip.isChecked())
+
+    def change_output_fields(self) -> None:
+        fields = [key for key, action in self.field_actions.items() if action.isChecked()]
+        write_settings('output_fields', None if len(fields) == len(self.field_actions) else fields)
+
+    def set_output_fields(self, fields, *args) -> None:
+        """
+        отмечает в меню поля выходных файлов из списка fields (None - все поля) и сохраняет выбор в настройках
+        """
+        for key, action in self.field_actions.items():
+            action.blockSignals(True)
+            action.setChecked(fields is None or key in fields)
+            action.blockSignals(False)
+        write_settings('output_fields', fields)
+
+    def browse_append_shp(self) -> None:
+        file_path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Выберите шейп-файл, ранее созданный программой",
+                                                             get_settings('folder_out_xml'), "ESRI Shapefile (*.shp)")
+        if file_path:
+            write_settings('append_shp_path', file_path)
+
+    def browse_append_xlsx(self) -> None:
+        file_path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Выберите таблицу, ранее созданную программой",
+                                                             get_settings('folder_out_xml'), "Excel (*.xlsx)")
+        if file_path:
+            write_settings('append_xlsx_path', file_path)
+
     def browse_folder_in_xml(self) -> None:
         directory = QtWidgets.QFileDialog.getExistingDirectory(self, "Выберите папку с выписками из ЕГРН в формате XML")
         # открыть диалог выбора директории и установить значение переменной
@@ -146,356 +323,75 @@ class ConvXMLApp(QtWidgets.QMainWindow, graphic_interface.Ui_MainWindow):
             self.label_input_zip.setText(str(directory_in_zip))
             write_settings('folder_in_zip', str(directory_in_zip))
 
+    def get_converter(self) -> Converter:
+        """
+        возвращает объект, выполняющий обработку выписок с текущими настройками программы, сообщения о ходе работы
+        которого выводятся в окно программы
+        """
+        settings = read_settings()
+        settings['file_type'] = 'zip' if self.radioButton_zip.isChecked() else 'xml'
+        return Converter(settings, self.textBrowser.append, self.show_progress)
+
+    def show_progress(self, done: int, total: int) -> None:
+        if total:
+            self.progressBar.setValue(int((done / total) * 100))
+        else:
+            self.progressBar.setValue(0)
+
     @logger
     def extract_xml_from_zip(self) -> None:
         """
         извлекает выписки из ЕГРН из архива zip, сохраняя исходный архив, удаляя промежуточные
         архивы и файлы ЭЦП
         """
-        self.textBrowser.append("Идёт извлечение выписок xml из архивов...")
-        directory: str = get_settings('folder_in_xml')
-        files = os.listdir(directory)
-        zipfiles = list(filter(lambda x: x.endswith('.zip'), files))
-        extract_all_zipfiles(zipfiles, directory)
-        new_files = os.listdir(directory)
-        new_zipfiles = list(filter(lambda x: x.endswith('.zip'), new_files))
-        for i in new_zipfiles:
-            if i in zipfiles:
-                new_zipfiles.remove(i)
-        extract_all_zipfiles(new_zipfiles, directory)
-        result_files = os.listdir(directory)
-        sig_files = list(filter(lambda x: x.endswith('.sig'), result_files))
-        for sf in sig_files:
-            os.remove(os.path.join(directory, sf))
-        for zf in new_zipfiles:
-            if zf not in zipfiles:
-                os.remove(os.path.join(directory, zf))
-        self.textBrowser.append("Извлечение выписок xml из архивов завершено.")
-        self.textBrowser.append("------------------------------------------------------------------------------------"
-                                "---------------------------")
+        self.get_converter().extract_xml_from_zip()
 
     @logger
     def rename_xml(self) -> None:
         """
         переименовывает выписки из ЕГРН на земельные участки в формате: кадастровый номер---дата получения выписки
         """
-        self.textBrowser.append("Идёт переименование выписок xml...")
-        directory: str = get_settings('folder_in_xml')
-        result_files = os.listdir(directory)
-        pb = 0
-        self.progressBar.setValue(0)
-        count_successful_files = 0
-        count_unsupported_files = 0
-        xmlfiles = list(filter(lambda x: x.endswith('.xml'), result_files))
-        for file_name in xmlfiles:
-            xml_file_path = os.path.join(directory, file_name)
-            real_estate_object = None
-            if AbstractRealEstateObject.create_a_real_estate_object(xml_file_path):
-                real_estate_object = AbstractRealEstateObject.create_a_real_estate_object(xml_file_path)
-            if real_estate_object is not None:
-                parcel_kn = real_estate_object.parent_cad_number
-                extract_date = real_estate_object.extract_date
-                pkn = re.sub(':', '-', parcel_kn)
-                ed = re.sub('\.', '-', extract_date)
-                new_name = pkn + '---' + ed + '.xml'
-                new_path = os.path.join(directory, new_name)
-                if file_name != new_name:
-                    if not os.path.exists(new_path):
-                        os.rename(os.path.join(directory, file_name), new_path)
-                    else:
-                        for num in range(2, 100):
-                            new_path_double = os.path.join(directory, pkn + '---' + ed + ' (' + str(num) + ')' + '.xml')
-                            if not os.path.exists(new_path_double):
-                                os.rename(os.path.join(directory, file_name), new_path_double)
-                                break
-                    count_successful_files += 1
-            else:
-                count_unsupported_files += 1
-            pb += 1
-            self.progressBar.setValue(int((pb / len(xmlfiles)) * 100))
-        files_do_not_require_renaming = len(xmlfiles) - count_successful_files - count_unsupported_files
-        self.textBrowser.append("Готово!")
-        if files_do_not_require_renaming > 0:
-            self.textBrowser.append('Для ' + str(files_do_not_require_renaming) + ' xml-файлов переименование '
-                                    'не требуется')
-        self.textBrowser.append("Переименовано " + str(count_successful_files) + ' xml-файлов')
-        if count_unsupported_files > 0:
-            self.textBrowser.append("Не удалось прочитать " + str(count_unsupported_files) + ' xml-файлов')
-        self.textBrowser.append("------------------------------------------------------------------------------------"
-                                "---------------------------")
+        self.get_converter().rename_xml()
+
+    @logger
+    def show_rename_plan(self) -> None:
+        """
+        выводит список предстоящих переименований выписок, не изменяя файлы
+        """
+        self.get_converter().rename_xml(dry_run=True)
 
     @logger
     def start_conv(self):
         """
         запускает конвертирование набора выписок на земельные участки из формата xml в выбранные форматы файлов
         """
-        directory = get_settings('folder_in_xml')
-        starting_xmlfiles = list(filter(lambda x: x.endswith('.xml'), os.listdir(directory)))
+        # один объект на все этапы: папка с выписками просматривается один раз (см. Converter.scan_inputs)
+        converter = self.get_converter()
         if self.radioButton_zip.isChecked() is False and self.radioButton_xml.isChecked() is False:
             QMessageBox.warning(self, 'Ошибка', "Необходимо выбрать формат обрабатываемых файлов (xml или zip)")
             return False
-        elif self.radioButton_xml.isChecked() is True and len(starting_xmlfiles) == 0:
+        elif self.radioButton_xml.isChecked() is True and len(converter.scan_inputs()) == 0:
             QMessageBox.warning(self, 'Ошибка', "В указанной папке нет выписок из ЕГРН в формате XML")
             return False
-        elif self.radioButton_zip.isChecked():
-            self.extract_xml_from_zip()
-        if self.checkBoxRename.isChecked():
-            self.rename_xml()
-        if self.checkBoxExcel.isChecked() or self.checkBoxShape.isChecked():
-            xmlfiles = list(filter(lambda x: x.endswith('.xml'), os.listdir(directory)))
-            self.textBrowser.append("Идёт получение данных из выписок XML и запись в выбранные форматы файлов...")
-            start_time = time.time()
-            now = datetime.datetime.now()
-            directory_out = get_settings('folder_out_xml')
-            if self.checkBoxExcel.isChecked():
-                wb = Workbook()
-                ws = wb.active
-                fill_1 = PatternFill(fill_type='solid',
-                                     start_color='c1c1c1',
-                                     end_color='c2c2c2')
-                font_1 = Font(name='Calibri',
-                              size=11,
-                              bold=True,
-                              italic=False,
-                              vertAlign=None,
-                              underline='none',
-                              strike=False,
-                              color='FF000000')
-                #  описание стиля границы ячейки в таблице MS Excel
-                border_1 = Border(left=Side(border_style='thin',
-                                            color='FF000000'),
-                                  right=Side(border_style='thin',
-                                             color='FF000000'),
-                                  top=Side(border_style='thin',
-                                           color='FF000000'),
-                                  bottom=Side(border_style='thin',
-                                              color='FF000000'),
-                                  diagonal=Side(border_style='thin',
-                                                color='FF000000'),
-                                  diagonal_direction=0,
-                                  outline=Side(border_style='thin',
-                                               color='FF000000'),
-                                  vertical=Side(border_style='thin',
-                                                color='FF000000'),
-                                  horizontal=Side(border_style='thin',
-                                                  color='FF000000')
-                                  )
-                ws['A1'] = 'Кадастровый номер'
-                ws['B1'] = 'Кадастровый номер единого землепользования'
-                ws['C1'] = 'Площадь, м2'
-                ws['D1'] = 'Адрес'
-                ws['E1'] = 'Статус'
-                ws['F1'] = 'Категория земель'
-                ws['G1'] = 'Вид разрешенного использования (по документу)'
-                ws['H1'] = 'Правообладатель'
-                ws['I1'] = 'Вид права, номер и дата регистрации'
-                ws['J1'] = 'Ограничения прав и обременения'
-                ws['K1'] = 'Вид ограничения (обременения), номер и дата регистрации, срок действия'
-                ws['L1'] = 'Особые отметки'
-                ws['M1'] = 'Дата постановки на кад. учёт'
-                ws['N1'] = 'Дата получения сведений'
-                ws['O1'] = 'КН расположенных в пределах ЗУ или ОКС объектов недвижимости'
-                ws['P1'] = 'Кадастровая стоимость, руб.'
-                ws['Q1'] = 'Вид объекта недвижимости'
-                for cell_obj in ws['A1':'Q1']:
-                    for cell in cell_obj:
-                        cell.fill = fill_1
-                        cell.font = font_1
-                ws.column_dimensions['A'].width = 18
-                ws.column_dimensions['B'].width = 19
-                ws.column_dimensions['C'].width = 10
-                ws.column_dimensions['D'].width = 35
-                ws.column_dimensions['E'].width = 16
-                ws.column_dimensions['F'].width = 23
-                ws.column_dimensions['G'].width = 37
-                ws.column_dimensions['H'].width = 37
-                ws.column_dimensions['I'].width = 45
-                ws.column_dimensions['J'].width = 45
-                ws.column_dimensions['K'].width = 45
-                ws.column_dimensions['L'].width = 45
-                ws.column_dimensions['M'].width = 14
-                ws.column_dimensions['N'].width = 14
-                ws.column_dimensions['O'].width = 18
-                ws.column_dimensions['P'].width = 14
-                ws.column_dimensions['Q'].width = 20
-                row_numb = 1
-            if self.checkBoxShape.isChecked():
-                shp_wr = shapefile.Writer(os.path.join(directory_out, 'real_estate_objects_EGRN_' + now.strftime("%d_%m_%Y  %H-%M")),
-                                          shapeType=shapefile.POLYGON, encoding="cp1251")
-                shp_wr.field('CadNumber', 'C', size=20)
-                shp_wr.field('SnglUseCN', 'C', size=20)
-                shp_wr.field('NumOfCont', 'C', size=20)
-                shp_wr.field('Area', 'N', 20, 2)
-                shp_wr.field('Note', 'C', size=255)
-                shp_wr.field('Parcel_St', 'C', size=255)
-                shp_wr.field('Category', 'C', size=255)
-                shp_wr.field('ByDoc', 'C', size=255)
-                shp_wr.field('Owner', 'C', size=255)
-                shp_wr.field('OwnRightN', 'C', size=255)
-                shp_wr.field('Encumbr', 'C', size=255)
-                shp_wr.field('EncRightN', 'C', size=255)
-                shp_wr.field('Special', 'C', size=255)
-                shp_wr.field('DatOfCreat', 'D')
-                shp_wr.field('DateOfGet', 'D')
-                shp_wr.field('EstateObjs', 'C', size=255)
-                shp_wr.field('CadastCost', 'C', size=50)
-                shp_wr.field('Type', 'C', size=60)
-            xml_errors = []
-            pb = 0
-            count_successful_files = 0
-            self.progressBar.setValue(0)
-            for xml_file in xmlfiles:
-                xml_file_path = os.path.join(directory, xml_file)
-                real_estate_object = None
-                if AbstractRealEstateObject.create_a_real_estate_object(xml_file_path):
-                    real_estate_object = AbstractRealEstateObject.create_a_real_estate_object(xml_file_path)
-                if real_estate_object is not None:
-                    parent_cad_number = real_estate_object.parent_cad_number
-                    entry_parcels = real_estate_object.entry_parcels
-                    area = real_estate_object.area
-                    #  с помощью регулярных выражений удаляем из строк символы табуляции, новой строки
-                    #  и возврата каретки
-                    pattern = "^\s+|\n|\r|\s+$"
-                    address = re.sub(pattern, '', real_estate_object.address)
-                    status = re.sub(pattern, '', real_estate_object.status)
-                    category = real_estate_object.category
-                    permitted_use_by_doc = re.sub(pattern, '', real_estate_object.permitted_use_by_doc)
-                    owner = re.sub(pattern, '', real_estate_object.owner)
-                    own_name_reg_numb_date = real_estate_object.own_name_reg_numb_date
-                    encumbrances = re.sub(pattern, '', real_estate_object.encumbrances)
-                    encumbrances_name_reg_numb_date_duration = real_estate_object.encumbrances_name_reg_numb_date_duration
-                    special_notes = re.sub(pattern, '', real_estate_object.special_notes)
-                    date_of_cadastral_reg = real_estate_object.date_of_cadastral_reg
-                    extract_date = real_estate_object.extract_date
-                    estate_objects = real_estate_object.estate_objects
-                    cadastral_cost = real_estate_object.cadastral_cost
-                    real_estate_object_type = real_estate_object.type
-                    if self.checkBoxReplace.isChecked():
-                        address = to_shorten_a_long_name(address)
-                        permitted_use_by_doc = to_shorten_a_long_name(permitted_use_by_doc)
-                        owner = to_shorten_a_long_name(owner)
-                        encumbrances = to_shorten_a_long_name(encumbrances)
-                        special_notes = to_shorten_a_long_name(special_notes)
-                    if self.checkBoxShape.isChecked():
-                        geometry = real_estate_object.geometry
-                        if geometry != {}:
-                            for key, value in geometry.items():
-                                shp_wr.poly(value)
-                                inverted_date_of_cadastral_reg = date_of_cadastral_reg.split(".")[::-1]
-                                if inverted_date_of_cadastral_reg != ['']:
-                                    year1, month1, day1 = inverted_date_of_cadastral_reg
-                                else:
-                                    year1, month1, day1 = 1, 1, 1
-                                inverted_extract_date = extract_date.split(".")[::-1]
-                                if inverted_extract_date != ['']:
-                                    year2, month2, day2 = inverted_extract_date
-                                else:
-                                    year2, month2, day2 = 1, 1, 1
-                                if re.search(r'\(', key):
-                                    shp_cad_number = key[:key.index('(')]
-                                    num_of_cont = key[key.index('('):]
-                                elif not re.search(":", key):
-                                    shp_cad_number = parent_cad_number
-                                    num_of_cont = key
-                                else:
-                                    shp_cad_number = key
-                                    num_of_cont = ''
-                                if parent_cad_number == shp_cad_number:
-                                    shp_parent_cad_number = ''
-                                else:
-                                    shp_parent_cad_number = parent_cad_number
-                                shp_wr.record(shp_cad_number, shp_parent_cad_number, num_of_cont, float(area), address,
-                                              status, category, permitted_use_by_doc, owner, own_name_reg_numb_date,
-                                              encumbrances, encumbrances_name_reg_numb_date_duration, special_notes,
-                                              datetime.date(int(year1), int(month1), int(day1)),
-                                              datetime.date(int(year2), int(month2), int(day2)), estate_objects,
-                                              cadastral_cost, real_estate_object_type)
-                        else:
-                            self.textBrowser.append(f'Выписка {xml_file} не содержит координат границ')
-                    if self.checkBoxExcel.isChecked():
-                        if not entry_parcels:
-                            row_numb += 1
-                            ws['A' + str(row_numb)] = parent_cad_number
-                            ws['B' + str(row_numb)] = '-'
-                            ws['C' + str(row_numb)] = area
-                            ws['D' + str(row_numb)] = address
-                            ws['E' + str(row_numb)] = status
-                            ws['F' + str(row_numb)] = category
-                            ws['G' + str(row_numb)] = permitted_use_by_doc
-                            ws['H' + str(row_numb)] = owner
-                            ws['I' + str(row_numb)] = own_name_reg_numb_date
-                            ws['J' + str(row_numb)] = encumbrances
-                            ws['K' + str(row_numb)] = encumbrances_name_reg_numb_date_duration
-                            ws['L' + str(row_numb)] = special_notes
-                            ws['M' + str(row_numb)] = date_of_cadastral_reg
-                            ws['N' + str(row_numb)] = extract_date
-                            ws['O' + str(row_numb)] = estate_objects
-                            ws['P' + str(row_numb)] = cadastral_cost
-                            ws['Q' + str(row_numb)] = real_estate_object_type
-                        else:
-                            for parcel_cad_number in entry_parcels:
-                                row_numb += 1
-                                ws['A' + str(row_numb)] = parcel_cad_number
-                                ws['B' + str(row_numb)] = parent_cad_number
-                                ws['C' + str(row_numb)] = area
-                                ws['D' + str(row_numb)] = address
-                                ws['E' + str(row_numb)] = status
-                                ws['F' + str(row_numb)] = category
-                                ws['G' + str(row_numb)] = permitted_use_by_doc
-                                ws['H' + str(row_numb)] = owner
-                                ws['I' + str(row_numb)] = own_name_reg_numb_date
-                                ws['J' + str(row_numb)] = encumbrances
-                                ws['K' + str(row_numb)] = encumbrances_name_reg_numb_date_duration
-                                ws['L' + str(row_numb)] = special_notes
-                                ws['M' + str(row_numb)] = date_of_cadastral_reg
-                                ws['N' + str(row_numb)] = extract_date
-                                ws['O' + str(row_numb)] = estate_objects
-                                ws['P' + str(row_numb)] = cadastral_cost
-                                ws['Q' + str(row_numb)] = real_estate_object_type
-                    if self.checkBoxShape.isChecked():
-                        pass
-                    count_successful_files += 1
-                else:
-                    xml_errors.append(xml_file_path)
-                pb += 1
-                self.progressBar.setValue(int((pb / len(xmlfiles)) * 100))
-            if self.checkBoxExcel.isChecked():
-                for cell_obj in ws['A1':'Q' + str(row_numb)]:
-                    for cell in cell_obj:
-                        cell.border = border_1
-                        cell.alignment = Alignment(wrapText=True)  # задаёт выравнивание "перенос по словам"
-                wb.save(os.path.join(directory_out, now.strftime("%d_%m_%Y  %H-%M") +
-                        " real_estate_objects_EGRN.xlsx"))
-            if self.checkBoxShape.isChecked():
-                shp_wr.close()
-            self.textBrowser.append("Получение данных из выписок XML завершено!" + chr(13) +
-                                    "Результат сохранён в папке " + directory_out)
-            sec = round(float("%s" % (time.time() - start_time)))
-            if sec == 0:
-                sec = 1
-            self.textBrowser.append("Успешно обработано " + str(count_successful_files) + " файлов за " + str(sec) +
-                                    " сек.")
-            if len(xml_errors) > 0:
-                self.textBrowser.append("Не обработано " + str(len(xml_errors)) + " файлов:")
-                for err_file in xml_errors:
-                    self.textBrowser.append(err_file)
-            self.textBrowser.append("----------------------------------------------------------------------------------"
-                                    "-----------------------------")
+        try:
+            converter.run()
+        except ValueError as e:
+            QMessageBox.warning(self, 'Ошибка', str(e))
+            return False
 
 
 def main():
     if not os.path.exists('settings.json'):
-        s_dic = {'folder_in_xml': '', 'folder_out_xml': '', 'file_type': 'xml', 'create_esri_shape': False,
-                 'create_xlsx': True, 'rename_files': True, 'adm_district': False, 'replace_long_names': True}
         with open('settings.json', 'w') as f:
-            json.dump(s_dic, f, sort_keys=True, indent=4, ensure_ascii=False)
+            json.dump(DEFAULT_SETTINGS, f, sort_keys=True, indent=4, ensure_ascii=False)
 
     os.environ["QT_AUTO_SCREEN_SCALE_FACTOR"] = "1"
     app = QtWidgets.QApplication(sys.argv)  # новый экземпляр QApplication
     app.setAttribute(QtCore.Qt.AA_EnableHighDpiScaling)  # автоматически адаптирует интерфейс для 4K монитора
     window = ConvXMLApp()  # создаём объект класса ConvXMLApp
     window.show()  # показываем окно
-    window.setFixedSize(559, 852)  # устанавливаем фиксированный размер окна
+    # устанавливаем фиксированный размер окна (с учётом высоты строки меню)
+    window.setFixedSize(559, 898 + window.menuBar().sizeHint().height())
     app.exec_()  # запускаем приложение
 
 
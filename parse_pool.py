@@ -0,0 +1,169 @@
+from typing import Dict, List, Tuple, Optional, Iterator, Iterable, Any
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from real_estate import AbstractRealEstateObject
+from shared_geometry import BlockPool, pack_geometry
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# параметры разбора, общие для всех выписок, - передаются процессу разбора один раз при его запуске (см. _init_worker)
+_options: Dict[str, Any] = {}
+
+
+def _init_worker(options: Dict[str, Any]) -> None:
+    _options.update(options)
+
+
+def parse_extract(xml_file_path: str, block_name: str) -> Optional[Dict[str, Any]]:
+    """
+    читает и разбирает выписку в процессе разбора и возвращает свойства объекта, нужные для записи: вид объекта
+    ('kind'), запись об объекте ('record'), район из адреса ('district_name', если нужен), контуры ('descriptor' -
+    описание контуров в блоке общей памяти, или 'geometry' - списками, если они не поместились в блок). Для выписки
+    неизвестного вида возвращает None. Ошибка чтения или разбора передаётся в основной процесс вместе с текстом
+    исходной ошибки (см. concurrent.futures.ProcessPoolExecutor)
+    """
+    real_estate_object = AbstractRealEstateObject.create_a_real_estate_object(xml_file_path, _options['settings'])
+    if real_estate_object is None:
+        return None
+    result = {'kind': real_estate_object.kind, 'record': None, 'district_name': '', 'geometry': None,
+              'descriptor': None}
+    kinds = _options['kinds']
+    if kinds is not None and result['kind'] not in kinds:
+        return result  # объект не соответствует фильтру по виду, свойства не извлекаются
+    result['record'] = real_estate_object.get_record(_options['record_fields'])
+    if _options['district_name']:
+        result['district_name'] = real_estate_object.district_name
+    if _options['geometry']:
+        geometry = real_estate_object.geometry
+        result['descriptor'] = pack_geometry(geometry, block_name) if geometry else None
+        if result['descriptor'] is None:
+            result['geometry'] = geometry
+    return result
+
+
+class ParsedObject:
+    """
+    Объект недвижимости, разобранный в процессе разбора: предоставляет те же свойства, что и
+    AbstractRealEstateObject (kind, district_name, geometry, get_record), по значениям, полученным из процесса
+    разбора. Контуры читаются из блока общей памяти при первом обращении (в виде shp_native.FlatPolygon), после чего
+    блок возвращается в пул
+    """
+    def __init__(self, parsed: Dict[str, Any], blocks: BlockPool, block_name: str) -> None:
+        self.kind = parsed['kind']
+        self.district_name = parsed['district_name']
+        self._record = parsed['record']
+        self._geometry = parsed['geometry']
+        self._descriptor = parsed['descriptor']
+        self._blocks = blocks
+        self._block_name = block_name
+
+    @property
+    def geometry(self) -> Dict[str, Any]:
+        if self._geometry is None:
+            self._geometry = self._blocks.unpack(self._descriptor) if self._descriptor is not None else {}
+            self.release()
+        return self._geometry
+
+    def get_record(self, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        if self._record is None:
+            raise ValueError('Свойства объекта не извлечены: объект не соответствует фильтру по виду')
+        return self._record
+
+    def release(self) -> None:
+        """
+        возвращает блок общей памяти в пул (повторный вызов ничего не делает)
+        """
+        if self._block_name is not None:
+            self._blocks.release(self._block_name)
+            self._block_name = None
+
+
+class ParsePool:
+    """
+    Разбор выписок в workers процессах. Процессам разбора передаются только пути к файлам (файлы читаются в этих
+    процессах) с упреждением (не более 2 * workers выписок одновременно), результаты выдаются в исходном
+    порядке - так же, как при разборе в основном процессе, поэтому сохранение состояния конвертирования не меняется.
+    Каждой выписке выделяется блок общей памяти по размеру её файла для её контуров (см. shared_geometry).
+    В stats накапливается статистика с теми же ключами, что и у PrefetchReader: количество и объём разобранных
+    файлов, количество ошибок и время, в течение которого основной процесс ждал результатов ('wait_seconds')
+    """
+    def __init__(self, workers: int, settings: Dict[str, Any], record_fields: List[str], geometry: bool,
+                 kinds: Optional[Tuple[str, ...]] = None, district_name: bool = False) -> None:
+        self.workers = max(1, int(workers))
+        self.blocks = BlockPool()
+        self.stats: Dict[str, float] = {'files': 0, 'bytes': 0, 'read_seconds': 0.0, 'wait_seconds': 0.0,
+                                        'errors': 0}
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=({'settings': settings, 'record_fields': record_fields,
+                                                        'geometry': geometry, 'kinds': kinds,
+                                                        'district_name': district_name},))
+
+    def parse(self, files: Iterable[Tuple[str, int]]) \
+            -> Iterator[Tuple[str, Optional[ParsedObject], Optional[BaseException]]]:
+        """
+        выдаёт для каждой выписки путь к файлу, разобранный объект (None для выписки неизвестного вида) и ошибку
+        разбора (None, если разбор выполнен). Блок общей памяти предыдущей выписки возвращается в пул при переходе
+        к следующей, даже если её контуры не понадобились. По окончании (или если выдача результатов прервана)
+        процессы разбора завершаются, блоки общей памяти удаляются
+        :param files: пары (путь к файлу, размер файла в байтах; 0 - неизвестен, определяется по файлу)
+        """
+        pending = deque()
+        files = iter(files)
+        exhausted = False
+        previous = None
+        try:
+            while True:
+                if previous is not None:
+                    previous.release()
+                    previous = None
+                while not exhausted and len(pending) < 2 * self.workers:
+                    item = next(files, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    xml_file_path, size = item
+                    if not size:
+                        # размер не передан (например, при конвертировании заданного списка выписок, см.
+                        # Converter.convert): блок общей памяти и объём прочитанных файлов определяются по файлу
+                        try:
+                            size = os.path.getsize(xml_file_path)
+                        except OSError:
+                            pass  # ошибка чтения файла передаётся из процесса разбора
+                    block_name = self.blocks.acquire(size)
+                    pending.append((xml_file_path, size, block_name,
+                                    self._executor.submit(parse_extract, xml_file_path, block_name)))
+                if not pending:
+                    return
+                xml_file_path, size, block_name, future = pending.popleft()
+                start = time.perf_counter()
+                error = future.exception()
+                self.stats['wait_seconds'] += time.perf_counter() - start
+                if error is not None:
+                    self.stats['errors'] += 1
+                else:
+                    self.stats['files'] += 1
+                    self.stats['bytes'] += size
+                if error is not None or future.result() is None:
+                    self.blocks.release(block_name)
+                    yield xml_file_path, None, error
+                else:
+                    previous = ParsedObject(future.result(), self.blocks, block_name)
+                    yield xml_file_path, previous, None
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """
+        завершает процессы разбора и удаляет блоки общей памяти (повторный вызов ничего не делает)
+        """
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.blocks.close()
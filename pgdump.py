@@ -0,0 +1,215 @@
+from typing import List, Tuple, Sequence, Iterator, Optional, Dict, Any
+import re
+import struct
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# Дамп для загрузки в PostgreSQL/PostGIS одной командой psql -f <файл>: команда CREATE TABLE, команда
+# COPY ... FROM STDIN и строки данных в текстовом формате COPY (значения разделены табуляцией, NULL - \N, символы
+# табуляции, перевода строки и обратная косая черта экранируются), признак конца данных "\." и создание
+# пространственного индекса. Геометрия записывается в формате EWKB (WKB с необязательным кодом системы координат)
+# шестнадцатеричной строкой - так PostGIS выводит и принимает значения типа geometry.
+
+PGDUMP_EXT = '.sql'
+
+# признак конца данных команды COPY
+COPY_END = '\\.\n'
+
+# столбец геометрии и флаг наличия кода системы координат в типе геометрии EWKB
+GEOMETRY_COLUMN = 'geom'
+EWKB_SRID_FLAG = 0x20000000
+
+_ESCAPES = {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'}
+_UNESCAPES = {'\\': '\\', 't': '\t', 'n': '\n', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v'}
+
+
+def quote_identifier(name: str) -> str:
+    """
+    возвращает имя таблицы или столбца в двойных кавычках; имя вида "схема.таблица" заключается в кавычки по частям
+    :param name: str
+    :return: str
+    """
+    if not name or any(not part for part in name.split('.')):
+        raise ValueError('Недопустимое имя таблицы PostgreSQL: ' + str(name))
+    return '.'.join('"' + part.replace('"', '""') + '"' for part in name.split('.'))
+
+
+def copy_escape(value: Optional[str]) -> str:
+    """
+    кодирует значение для текстового формата COPY (None - \\N)
+    :param value: str или None
+    :return: str
+    """
+    if value is None:
+        return '\\N'
+    return re.sub(r'[\\\t\n\r]', lambda m: _ESCAPES[m.group()], value)
+
+
+def copy_unescape(field: str) -> Optional[str]:
+    """
+    декодирует значение из текстового формата COPY (\\N - None)
+    :param field: str
+    :return: str или None
+    """
+    if field == '\\N':
+        return None
+    return re.sub(r'\\(.)', lambda m: _UNESCAPES.get(m.group(1), m.group(1)), field)
+
+
+def array_literal(values: Sequence[str]) -> str:
+    """
+    возвращает значение массива text[] в текстовом виде PostgreSQL: элементы в двойных кавычках через запятую
+    :param values: список строк
+    :return: str
+    """
+    return '{' + ','.join('"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"' for value in values) + '}'
+
+
+def parse_array_literal(literal: str) -> List[str]:
+    """
+    разбирает значение массива text[], записанное array_literal (элементы в двойных кавычках)
+    :param literal: str
+    :return: list
+    """
+    return [re.sub(r'\\(.)', r'\1', value) for value in re.findall(r'"((?:[^"\\]|\\.)*)"', literal[1:-1])]
+
+
+def create_table_sql(table: str, columns: Sequence[Tuple[str, str]], srid: int = 0) -> str:
+    """
+    возвращает команды создания таблицы (если её нет) со столбцами columns и столбцом геометрии - мультиполигоном
+    в системе координат srid (0 - система координат не указывается)
+    :param table: str - имя таблицы
+    :param columns: list - имена и типы PostgreSQL столбцов атрибутов
+    :param srid: int
+    :return: str
+    """
+    geometry_type = 'geometry(MultiPolygon, ' + str(srid) + ')' if srid else 'geometry(MultiPolygon)'
+    lines = ['    ' + quote_identifier(name) + ' ' + sql_type for name, sql_type in columns]
+    lines.append('    ' + quote_identifier(GEOMETRY_COLUMN) + ' ' + geometry_type)
+    return ("SET client_encoding = 'UTF8';\n"
+            'CREATE EXTENSION IF NOT EXISTS postgis;\n'
+            'CREATE TABLE IF NOT EXISTS ' + quote_identifier(table) + ' (\n' + ',\n'.join(lines) + '\n);\n')
+
+
+def copy_sql(table: str, columns: Sequence[str]) -> str:
+    """
+    возвращает команду COPY ... FROM STDIN для загрузки строк дампа в таблицу
+    :param table: str
+    :param columns: list - имена столбцов атрибутов (столбец геометрии добавляется последним)
+    :return: str
+    """
+    names = ', '.join(quote_identifier(name) for name in [*columns, GEOMETRY_COLUMN])
+    return 'COPY ' + quote_identifier(table) + ' (' + names + ') FROM STDIN;\n'
+
+
+def index_sql(table: str) -> str:
+    """
+    возвращает команды, которые выполняются после загрузки строк: создание пространственного индекса и сбор
+    статистики таблицы
+    :param table: str
+    :return: str
+    """
+    index_name = quote_identifier(table.split('.')[-1] + '_' + GEOMETRY_COLUMN + '_idx')
+    return ('CREATE INDEX IF NOT EXISTS ' + index_name + ' ON ' + quote_identifier(table) + ' USING GIST (' +
+            quote_identifier(GEOMETRY_COLUMN) + ');\nANALYZE ' + quote_identifier(table) + ';\n')
+
+
+def read_dump(path: str) -> Tuple[List[str], Iterator[List[Optional[str]]]]:
+    """
+    читает строки данных дампа: возвращает имена столбцов из команды COPY и итератор по строкам (списки значений,
+    декодированных из текстового формата COPY). Используется для проверки дампа без базы данных
+    :param path: str
+    :return: tuple
+    """
+    f = open(path, 'r', encoding='utf-8', newline='\n')
+    for line in f:
+        match = re.match(r'COPY .* \((.*)\) FROM STDIN;$', line.rstrip('\n'))
+        if match:
+            columns = [name.strip()[1:-1].replace('""', '"') for name in match.group(1).split(', ')]
+            break
+    else:
+        f.close()
+        raise ValueError('В файле ' + path + ' нет команды COPY')
+
+    def rows() -> Iterator[List[Optional[str]]]:
+        with f:
+            for row in f:
+                if row == COPY_END:
+                    return
+                yield [copy_unescape(field) for field in row.rstrip('\n').split('\t')]
+            raise ValueError('В файле ' + path + ' нет признака конца данных команды COPY')
+
+    return columns, rows()
+
+
+def decode_ewkb(data: bytes) -> Tuple[int, List[List[List[Tuple[float, float]]]]]:
+    """
+    декодирует мультиполигон в формате EWKB: возвращает код системы координат (0 - не указан) и список полигонов
+    (списков контуров из точек (x, y))
+    :param data: bytes
+    :return: tuple
+    """
+    pos = 0
+
+    def read(fmt: str) -> Tuple[Any, ...]:
+        nonlocal pos
+        values = struct.unpack_from(fmt, data, pos)
+        pos += struct.calcsize(fmt)
+        return values
+
+    order = '<' if read('B')[0] == 1 else '>'
+    geometry_type = read(order + 'I')[0]
+    srid = read(order + 'I')[0] if geometry_type & EWKB_SRID_FLAG else 0
+    if geometry_type & 0xFFFF != 6:
+        raise ValueError('Геометрия EWKB не является мультиполигоном')
+    polygons = []
+    for _ in range(read(order + 'I')[0]):
+        polygon_order = '<' if read('B')[0] == 1 else '>'
+        read(polygon_order + 'I')
+        rings = []
+        for _ in range(read(polygon_order + 'I')[0]):
+            count = read(polygon_order + 'I')[0]
+            coords = read(polygon_order + str(2 * count) + 'd')
+            rings.append(list(zip(coords[::2], coords[1::2])))
+        polygons.append(rings)
+    return srid, polygons
+
+
+def parse_value(value: Optional[str], sql_type: str) -> Any:
+    """
+    преобразует текстовое значение столбца дампа в значение Python по типу столбца (см. create_table_sql)
+    :param value: str или None
+    :param sql_type: str
+    :return: значение
+    """
+    if value is None:
+        return None
+    if sql_type == 'double precision':
+        return float(value)
+    if sql_type == 'text[]':
+        return parse_array_literal(value)
+    return value
+
+
+def column_types(path: str) -> Dict[str, str]:
+    """
+    возвращает типы столбцов из команды CREATE TABLE дампа
+    :param path: str
+    :return: dict - имя столбца -> тип
+    """
+    types = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            match = re.match(r'    "((?:[^"]|"")*)" (.*?),?$', line.rstrip('\n'))
+            if match:
+                types[match.group(1).replace('""', '"')] = match.group(2)
+            elif line.startswith(')'):
+                break
+    return types
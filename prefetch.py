@@ -0,0 +1,127 @@
+from typing import List, Iterator, Tuple, Dict, Optional
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+
+class PrefetchReader:
+    """
+    Читает файлы с упреждением: пока обрабатывается текущий файл, содержимое следующих window файлов загружается
+    в память в фоновых потоках. Суммарный объём прочитанных, но ещё не обработанных файлов ограничен max_bytes
+    (один файл читается всегда, даже если он больше лимита). Файлы выдаются строго в исходном порядке тройками
+    (путь к файлу, содержимое, ошибка чтения): файл, который не удалось прочитать, выдаётся с содержимым None
+    и исключением, остальные файлы читаются дальше.
+    При window = 0 файлы читаются последовательно, без упреждения.
+    В stats накапливается статистика: количество и объём прочитанных файлов, суммарное время чтения в фоновых потоках
+    ('read_seconds'), время, в течение которого обработка ждала чтения ('wait_seconds'), и количество файлов,
+    которые не удалось прочитать ('errors').
+    """
+    def __init__(self, paths: List[str], window: int = 8, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.paths = paths
+        self.window = window
+        self.max_bytes = max_bytes
+        self.stats: Dict[str, float] = {'files': 0, 'bytes': 0, 'read_seconds': 0.0, 'wait_seconds': 0.0,
+                                          'errors': 0}
+        self._condition = threading.Condition()
+        self._in_flight = 0  # объём прочитанных, но ещё не выданных файлов
+        self._next_ticket = 0  # номер файла, который следующим может занять место в лимите объёма
+        self._closed = False
+
+    def _reserve(self, ticket: int, size: int) -> None:
+        """
+        занимает место в лимите объёма. Место занимается в порядке очереди, поэтому самый старый ожидающий файл
+        не может оказаться заблокирован более новыми, уже прочитанными файлами
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._closed or (self._next_ticket == ticket and (
+                self._in_flight == 0 or self._in_flight + size <= self.max_bytes)))
+            self._in_flight += size
+            self._next_ticket += 1
+            self._condition.notify_all()
+
+    def _read(self, ticket: int, path: str) -> Tuple[Optional[bytes], int, Optional[Exception]]:
+        """
+        читает файл в фоновом потоке; возвращает содержимое (None при ошибке), занятое в лимите место (его
+        освобождает __iter__ при выдаче файла, в том числе если чтение не удалось) и ошибку чтения
+        """
+        start = time.perf_counter()
+        reserved = None
+        data, error = None, None
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                self._reserve(ticket, size)
+                reserved = size
+                data = f.read()
+        except Exception as e:
+            error = e
+        finally:
+            if reserved is None:
+                self._reserve(ticket, 0)  # файл не удалось открыть - пропускаем его очередь
+        with self._condition:
+            self.stats['read_seconds'] += time.perf_counter() - start
+        return data, reserved or 0, error
+
+    def _release(self, size: int) -> None:
+        with self._condition:
+            self._in_flight -= size
+            self._condition.notify_all()
+
+    def _count(self, data: Optional[bytes]) -> None:
+        if data is None:
+            self.stats['errors'] += 1
+        else:
+            self.stats['files'] += 1
+            self.stats['bytes'] += len(data)
+
+    def __iter__(self) -> Iterator[Tuple[str, Optional[bytes], Optional[Exception]]]:
+        if self.window <= 0:
+            for path in self.paths:
+                start = time.perf_counter()
+                data, error = None, None
+                try:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                except Exception as e:
+                    error = e
+                elapsed = time.perf_counter() - start
+                self.stats['read_seconds'] += elapsed
+                self.stats['wait_seconds'] += elapsed
+                self._count(data)
+                yield path, data, error
+            return
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.window) as executor:
+            try:
+                i = 0
+                while True:
+                    while i < len(self.paths) and len(pending) < self.window:
+                        pending.append((self.paths[i], executor.submit(self._read, i, self.paths[i])))
+                        i += 1
+                    if not pending:
+                        break
+                    path, future = pending.popleft()
+                    start = time.perf_counter()
+                    data, reserved, error = future.result()
+                    self.stats['wait_seconds'] += time.perf_counter() - start
+                    self._count(data)
+                    self._release(reserved)
+                    yield path, data, error
+            finally:
+                # при досрочном завершении обхода освобождаем потоки, ожидающие места в лимите объёма
+                with self._condition:
+                    self._closed = True
+                    self._condition.notify_all()
+                for _, future in pending:
+                    future.cancel()
@@ -0,0 +1,181 @@
+from typing import List, Tuple, Sequence, BinaryIO, Iterator, Optional
+import struct
+from array import array
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# Пространственный индекс шейп-файла в формате .qix (квадродерево MapServer/shapelib, файл создаётся утилитой
+# shptree и читается QGIS, GDAL/OGR, MapServer). Заголовок: сигнатура "SQT", порядок байтов (1 - little-endian),
+# версия 1, три резервных байта, количество объектов шейп-файла и глубина дерева. Далее узлы в прямом порядке обхода:
+# размер всех вложенных узлов в байтах (чтобы читатель мог их пропустить), охват узла (minx, miny, maxx, maxy),
+# количество и номера (с нуля) объектов, целиком лежащих в узле, но не помещающихся ни в один из его квадрантов,
+# количество вложенных узлов.
+
+QIX_EXT = '.qix'
+
+# доля стороны узла, которую занимает каждая из половин при делении (половины перекрываются, как в shapelib)
+SPLIT_RATIO = 0.55
+
+Rect = Tuple[float, float, float, float]
+
+
+def default_max_depth(num_shapes: int) -> int:
+    """
+    возвращает глубину дерева, которую выбирает shptree: на листовой уровень в среднем приходится не более
+    четырёх объектов
+    :param num_shapes: int
+    :return: int
+    """
+    depth = 0
+    num_nodes = 1
+    while num_nodes * 4 < num_shapes:
+        depth += 1
+        num_nodes *= 2
+    return depth
+
+
+def _split(rect: Rect) -> Tuple[Rect, Rect]:
+    minx, miny, maxx, maxy = rect
+    if maxx - minx > maxy - miny:
+        size = (maxx - minx) * SPLIT_RATIO
+        return (minx, miny, minx + size, maxy), (maxx - size, miny, maxx, maxy)
+    size = (maxy - miny) * SPLIT_RATIO
+    return (minx, miny, maxx, miny + size), (minx, maxy - size, maxx, maxy)
+
+
+def _quadrants(rect: Rect) -> List[Rect]:
+    half1, half2 = _split(rect)
+    return [*_split(half1), *_split(half2)]
+
+
+class _Node:
+    __slots__ = ('rect', 'ids', 'subnodes', 'size')
+
+    def __init__(self, rect: Rect, ids: List[int]) -> None:
+        self.rect = rect
+        self.ids = ids
+        self.subnodes: List[_Node] = []
+        self.size = 0  # размер вложенных узлов в файле, байт
+
+
+def _build(rect: Rect, ids: List[int], bboxes: array, depth: int) -> _Node:
+    """
+    строит узел дерева и его поддеревья. Объект попадает в первый из квадрантов, в котором он целиком помещается,
+    иначе остаётся в узле, - так же, как при последовательной вставке объектов в shapelib/MapServer. Пустые
+    квадранты не создаются
+    """
+    node = _Node(rect, ids)
+    if depth <= 1 or not ids:
+        return node
+    quadrants = _quadrants(rect)
+    members: List[List[int]] = [[], [], [], []]
+    remaining = []
+    for i in ids:
+        minx, miny, maxx, maxy = bboxes[4 * i:4 * i + 4]
+        for q, (qminx, qminy, qmaxx, qmaxy) in enumerate(quadrants):
+            if minx >= qminx and maxx <= qmaxx and miny >= qminy and maxy <= qmaxy:
+                members[q].append(i)
+                break
+        else:
+            remaining.append(i)
+    node.ids = remaining
+    for quadrant, quadrant_ids in zip(quadrants, members):
+        if quadrant_ids:
+            subnode = _build(quadrant, quadrant_ids, bboxes, depth - 1)
+            node.subnodes.append(subnode)
+            node.size += 44 + 4 * len(subnode.ids) + subnode.size
+    return node
+
+
+def _write_node(node: _Node, out: bytearray) -> None:
+    out += struct.pack('<i4di', node.size, *node.rect, len(node.ids))
+    out += struct.pack('<%di' % len(node.ids), *node.ids)
+    out += struct.pack('<i', len(node.subnodes))
+    for subnode in node.subnodes:
+        _write_node(subnode, out)
+
+
+def write_qix(path: str, bboxes: Sequence[float], num_shapes: int, skip: Sequence[int] = (),
+              max_depth: int = 0) -> None:
+    """
+    создаёт пространственный индекс шейп-файла по охватам его объектов
+    :param path: str - путь к файлу .qix
+    :param bboxes: охваты объектов подряд (minx, miny, maxx, maxy для объекта 0, затем 1 и т.д.)
+    :param num_shapes: int - количество объектов шейп-файла
+    :param skip: номера объектов, не включаемых в индекс (пустые геометрии, удалённые записи)
+    :param max_depth: int - глубина дерева, 0 - выбирается по количеству объектов (см. default_max_depth)
+    """
+    bboxes = array('d', bboxes)
+    skipped = set(skip)
+    ids = [i for i in range(len(bboxes) // 4) if i not in skipped]
+    if ids:
+        rect = (min(bboxes[4 * i] for i in ids), min(bboxes[4 * i + 1] for i in ids),
+                max(bboxes[4 * i + 2] for i in ids), max(bboxes[4 * i + 3] for i in ids))
+    else:
+        rect = (0.0, 0.0, 0.0, 0.0)
+    depth = max_depth or default_max_depth(num_shapes)
+    out = bytearray(b'SQT\x01\x01\x00\x00\x00')
+    out += struct.pack('<2i', num_shapes, depth)
+    _write_node(_build(rect, ids, bboxes, depth), out)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def read_shape_bboxes(shp_path: str, count: Optional[int] = None) -> Tuple[array, List[int]]:
+    """
+    читает охваты объектов полигонального (линейного, мультиточечного) шейп-файла из заголовков записей .shp,
+    не читая координаты. Возвращает охваты подряд и номера объектов с пустой геометрией (Null Shape)
+    :param shp_path: str - путь к файлу .shp (рядом должен находиться .shx)
+    :param count: int - количество первых объектов, охваты которых нужно прочитать, None - все объекты
+    :return: tuple
+    """
+    base = shp_path[:-4]
+    with open(base + '.shx', 'rb') as shx:
+        shx.seek(100)
+        data = shx.read() if count is None else shx.read(8 * count)
+        offsets = [2 * offset for offset, _ in struct.iter_unpack('>2i', data)]
+    bboxes = array('d')
+    nulls = []
+    with open(base + '.shp', 'rb') as shp:
+        for i, offset in enumerate(offsets):
+            shp.seek(offset + 8)
+            shape_type, *bbox = struct.unpack('<i4d', shp.read(36).ljust(36, b'\x00'))
+            if shape_type == 0:
+                nulls.append(i)
+                bbox = (0.0, 0.0, 0.0, 0.0)
+            bboxes.extend(bbox)
+    return bboxes, nulls
+
+
+def _search(f: BinaryIO, rect: Rect) -> Iterator[int]:
+    size, minx, miny, maxx, maxy, num_ids = struct.unpack('<i4di', f.read(40))
+    ids = struct.unpack('<%di' % num_ids, f.read(4 * num_ids))
+    num_subnodes = struct.unpack('<i', f.read(4))[0]
+    if minx > rect[2] or maxx < rect[0] or miny > rect[3] or maxy < rect[1]:
+        f.seek(size, 1)
+        return
+    yield from ids
+    for _ in range(num_subnodes):
+        yield from _search(f, rect)
+
+
+def search_qix(path: str, rect: Rect) -> List[int]:
+    """
+    возвращает номера объектов, находящихся в узлах индекса, которые пересекаются с прямоугольником rect
+    (minx, miny, maxx, maxy). Это кандидаты: охват каждого из них нужно проверить на пересечение с rect
+    :param path: str - путь к файлу .qix
+    :param rect: tuple
+    :return: list
+    """
+    with open(path, 'rb') as f:
+        header = f.read(16)
+        if header[:3] != b'SQT' or header[3] != 1:
+            raise ValueError('Файл ' + path + ' не является пространственным индексом .qix (little-endian)')
+        return sorted(_search(f, rect))
@@ -1,9 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Union, TypeVar, Optional, List, Any
+from typing import Dict, Union, TypeVar, Optional, List, Any, Iterable
 import re
-import json
 import xml.etree.ElementTree as ElT
-from logic import get_dict_from_csv, gauss_area
+from logic import get_dict_from_csv, gauss_area, read_settings, to_shorten_a_long_name
 
 __author__ = "Dmitry S. Korottsev"
 __copyright__ = "Copyright 2023"
@@ -15,6 +14,21 @@ __email__ = "dm-korottev@yandex.ru"
 __status__ = "Development"
 
 
+# поля атрибутивных данных объекта недвижимости (имена свойств объекта), которые могут записываться в выходные файлы
+RECORD_FIELDS = ('parent_cad_number', 'entry_parcels', 'area', 'address', 'status', 'category', 'permitted_use_by_doc',
+                 'owner', 'own_name_reg_numb_date', 'encumbrances', 'encumbrances_name_reg_numb_date_duration',
+                 'special_notes', 'date_of_cadastral_reg', 'extract_date', 'estate_objects', 'cadastral_cost', 'type')
+# поля, из которых удаляются пробельные символы в начале и конце строки, символы новой строки и возврата каретки
+CLEANED_FIELDS = ('address', 'status', 'permitted_use_by_doc', 'owner', 'encumbrances', 'special_notes')
+# поля, в которых сокращаются длинные названия (настройка 'replace_long_names')
+SHORTENED_FIELDS = ('address', 'permitted_use_by_doc', 'owner', 'encumbrances', 'special_notes')
+
+# пространства имён xml-схем выписок КВЗУ, КПЗУ, КВОКС, КПОКС
+NS_KVZU = '{urn://x-artefacts-rosreestr-ru/outgoing/kvzu/7.0.1}'
+NS_KPZU = '{urn://x-artefacts-rosreestr-ru/outgoing/kpzu/6.0.1}'
+NS_KVOKS = '{urn://x-artefacts-rosreestr-ru/outgoing/kvoks/3.0.1}'
+NS_KPOKS = '{urn://x-artefacts-rosreestr-ru/outgoing/kpoks/4.0.1}'
+
 AbstractRealEstateObject = TypeVar("AbstractRealEstateObject")
 
 class AbstractRealEstateObject(ABC):
@@ -29,27 +43,65 @@ class AbstractRealEstateObject(ABC):
         self._adr = ''
         self._spat = ''
         self._settings = settings
-        self.codes_of_rf_regions = get_dict_from_csv('region.csv')  # коды регионов РФ
-        self.status_classifier = get_dict_from_csv('status.csv')  # коды статусов земельных участков
-        self.land_category_classifier = get_dict_from_csv('land_category.csv')  # коды категорий земель
-        self.permitted_use_classifier = get_dict_from_csv('utilization.csv')  # коды видов разрешённого использования
-        self.rights_classifier = get_dict_from_csv('right.csv')  # коды видов прав
-        self.encumbrance_classifier = get_dict_from_csv('encumbrance.csv')  # коды видов ограничений (обременений)
+        self._classifiers: Dict[str, Dict[str, str]] = {}  # классификаторы загружаются при первом обращении
+
+    def _classifier(self, file_name: str) -> Dict[str, str]:
+        """
+        возвращает классификатор из csv-файла, загружая его при первом обращении (классификаторы, не нужные для
+        выбранного набора полей, не читаются)
+        :param file_name: str
+        :return: dict
+        """
+        if file_name not in self._classifiers:
+            self._classifiers[file_name] = get_dict_from_csv(file_name)
+        return self._classifiers[file_name]
+
+    @property
+    def codes_of_rf_regions(self) -> Dict[str, str]:
+        # коды регионов РФ
+        return self._classifier('region.csv')
+
+    @property
+    def status_classifier(self) -> Dict[str, str]:
+        # коды статусов земельных участков
+        return self._classifier('status.csv')
+
+    @property
+    def land_category_classifier(self) -> Dict[str, str]:
+        # коды категорий земель
+        return self._classifier('land_category.csv')
+
+    @property
+    def permitted_use_classifier(self) -> Dict[str, str]:
+        # коды видов разрешённого использования
+        return self._classifier('utilization.csv')
+
+    @property
+    def rights_classifier(self) -> Dict[str, str]:
+        # коды видов прав
+        return self._classifier('right.csv')
+
+    @property
+    def encumbrance_classifier(self) -> Dict[str, str]:
+        # коды видов ограничений (обременений)
+        return self._classifier('encumbrance.csv')
 
     @staticmethod
-    def create_a_real_estate_object(xml_file_path: str) -> Optional[AbstractRealEstateObject]:
+    def create_a_real_estate_object(xml_file_path: str, settings: Optional[Dict[str, Union[str, bool]]] = None,
+                                    xml_data: Optional[bytes] = None) -> Optional[AbstractRealEstateObject]:
         """
         Определяет xml-схему выписки на земельный участок и возвращает экземпляр соответствующего ей класса.
         В случае, если xml-схема выписки из Росреестра неизвестна, возвращает None.
+        Если настройки программы не переданы, они читаются из файла 'settings.json'.
+        Если передано уже прочитанное содержимое файла (xml_data), файл повторно не читается.
         """
-        tree = ElT.parse(xml_file_path)
-        root = tree.getroot()
-        d1 = '{urn://x-artefacts-rosreestr-ru/outgoing/kvzu/7.0.1}'
-        d2 = '{urn://x-artefacts-rosreestr-ru/outgoing/kpzu/6.0.1}'
-        d3 = '{urn://x-artefacts-rosreestr-ru/outgoing/kvoks/3.0.1}'
-        d4 = '{urn://x-artefacts-rosreestr-ru/outgoing/kpoks/4.0.1}'
-        with open('settings.json', 'r') as f:
-            sd = json.load(f)
+        if xml_data is not None:
+            root = ElT.fromstring(xml_data)
+        else:
+            tree = ElT.parse(xml_file_path)
+            root = tree.getroot()
+        d1, d2, d3, d4 = NS_KVZU, NS_KPZU, NS_KVOKS, NS_KPOKS
+        sd = settings if settings is not None else read_settings()
         if root.find(d1 + 'Parcels/' + d1 + 'Parcel') is not None:
             return ParcelKVZU(xml_file_path, sd, root, d1)
         elif root.find(d2 + 'Parcel') is not None:
@@ -120,6 +172,15 @@ class AbstractRealEstateObject(ABC):
         """
         pass
 
+    @abstractmethod
+    def kind(self) -> str:
+        """
+        возвращает вид объекта недвижимости (используется как название листа таблицы xlsx при разделении объектов
+        по видам)
+        :return: str
+        """
+        pass
+
     @property
     def status(self) -> str:
         """
@@ -791,12 +852,37 @@ class AbstractRealEstateObject(ABC):
         """
         pass
 
+    def get_record(self, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        возвращает атрибутивные данные объекта недвижимости в виде словаря (ключ - имя свойства объекта) в том виде,
+        в котором они записываются в выходные файлы: без символов табуляции, новой строки и возврата каретки в начале и
+        конце строк, с сокращёнными длинными названиями (если включена соответствующая настройка).
+        Если задан набор полей fields (имена из RECORD_FIELDS), вычисляются только эти свойства объекта, остальные
+        данные выписки не разбираются
+        :param fields: iterable или None (все поля)
+        :return: dict
+        """
+        pattern = r"^\s+|\n|\r|\s+$"
+        record = {}
+        for key in (RECORD_FIELDS if fields is None else fields):
+            value = getattr(self, key)
+            if key in CLEANED_FIELDS:
+                value = re.sub(pattern, '', value)
+            if key in SHORTENED_FIELDS and self._settings['replace_long_names']:
+                value = to_shorten_a_long_name(value)
+            record[key] = value
+        return record
+
 
 class AbstractParcel(AbstractRealEstateObject):
     def __init__(self, xml_file_path: str, settings: Dict[str, Union[str, bool]], root: ElT.Element, dop: str):
         super().__init__(xml_file_path, settings, root, dop)
         self.type = "Земельный участок"
 
+    @property
+    def kind(self) -> str:
+        return "Земельные участки"
+
     @property
     def entry_parcels(self) -> List[Any]:
         """
@@ -1015,6 +1101,19 @@ class ObjectEGRN(ABC):
                 address = readable_address.text
         return address
 
+    @property
+    def district_name(self) -> str:
+        """
+        возвращает название района, в котором находится объект недвижимости
+        :return: str
+        """
+        district_name = ''
+        name_district = self._main_record.find('address_location/address/address_fias/level_settlement/district/'
+                                               'name_district')
+        if name_district is not None and name_district.text is not None:
+            district_name = name_district.text
+        return district_name
+
     @property
     def status(self) -> str:
         """
@@ -1656,6 +1755,18 @@ class AbstractOCC(AbstractRealEstateObject):
         self._spat = 'spa'
         self._param = 'param'
 
+    @property
+    def kind(self) -> str:
+        """
+        возвращает вид объекта капитального строительства (здания, помещения, сооружения), используется как название
+        листа таблицы xlsx при разделении объектов по видам
+        :return: str
+        """
+        for tag, kind in (('Building', "Здания"), ('Flat', "Помещения"), ('Construction', "Сооружения")):
+            if self._realty is not None and self._realty.find(self._dop + tag) is not None:
+                return kind
+        return "Прочие ОКС"
+
     @property
     def _real_estate_object(self):
         building = self._realty.find(self._dop + 'Building')
@@ -1879,6 +1990,10 @@ class BuildingEGRN(ObjectEGRN, AbstractOCC):
         self._restrict_records = self._root.find('restrict_records')
         ObjectEGRN.__init__(self, self._main_record, self._params, self._right_records, self._restrict_records)
 
+    @property
+    def kind(self) -> str:
+        return "Здания"
+
     @property
     def _real_estate_object(self) -> None:
         return None
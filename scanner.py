@@ -0,0 +1,144 @@
+from typing import List, Tuple, Iterable, Union
+import os
+import heapq
+from fnmatch import fnmatchcase
+from itertools import zip_longest
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# Поиск выписок в папке и порядок их обработки. Папка (и при 'scan_recursive' - вложенные папки) просматривается
+# одним проходом os.scandir: размер файла берётся из того же перечисления каталога, без отдельного обращения к каждому
+# файлу. Выписка задаётся путём относительно папки с выписками и размером файла.
+
+# входной файл: путь относительно папки с выписками, размер в байтах
+InputFile = Tuple[str, int]
+
+# маска имён выписок по умолчанию
+DEFAULT_INCLUDE = '*.xml'
+
+# порядок обработки выписок (настройка 'schedule'): '' - порядок перечисления файлов в папке, 'name' - по путям файлов,
+# 'largest_first' - от больших файлов к меньшим, 'balanced' - чередование файлов, распределённых по процессам разбора
+# с равным суммарным размером (см. schedule)
+SCHEDULES = ('', 'name', 'largest_first', 'balanced')
+
+
+def parse_patterns(value: Union[str, Iterable[str], None]) -> List[str]:
+    """
+    возвращает список масок из строки масок через запятую (или списка масок)
+    :param value: str или list
+    :return: list
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [pattern.strip() for pattern in value if pattern.strip()]
+
+
+def _matches(relative_path: str, patterns: List[str]) -> bool:
+    """
+    проверяет, подходит ли путь к одной из масок: маска без '/' сравнивается с именем файла или папки, маска с '/' -
+    с путём относительно папки с выписками (разделитель - '/'). Регистр букв учитывается, как и в прежнем отборе
+    файлов по окончанию '.xml'
+    """
+    name = relative_path.rsplit('/', 1)[-1]
+    return any(fnmatchcase(relative_path if '/' in pattern else name, pattern) for pattern in patterns)
+
+
+def scan_inputs(directory: str, recursive: bool = False, include: Union[str, Iterable[str], None] = DEFAULT_INCLUDE,
+                exclude: Union[str, Iterable[str], None] = None,
+                skip_folders: Iterable[str] = ()) -> List[InputFile]:
+    """
+    возвращает выписки папки directory: пути относительно неё и размеры файлов. Файлы отбираются по маскам include
+    (по умолчанию '*.xml') и exclude, папки, подходящие к маскам exclude, и папки skip_folders (например, папка
+    результата внутри папки с выписками) не просматриваются. Порядок - порядок перечисления файлов os.scandir
+    (для вложенных папок - после файлов родительской папки)
+    :param directory: str
+    :param recursive: bool - просматривать вложенные папки
+    :param include: str - маски через запятую или список масок
+    :param exclude: str - маски через запятую или список масок
+    :param skip_folders: пути к папкам, которые не просматриваются
+    :return: list
+    """
+    include = parse_patterns(include) or [DEFAULT_INCLUDE]
+    exclude = parse_patterns(exclude)
+    skip_folders = {os.path.normcase(os.path.realpath(folder)) for folder in skip_folders if folder}
+    visited = {os.path.normcase(os.path.realpath(directory))}  # защита от зацикливания символическими ссылками
+    result = []
+    folders = ['']
+    while folders:
+        relative_folder = folders.pop(0)
+        subfolders = []
+        with os.scandir(os.path.join(directory, relative_folder)) as entries:
+            for entry in entries:
+                relative_path = relative_folder + '/' + entry.name if relative_folder else entry.name
+                if entry.is_dir():
+                    if recursive and not _matches(relative_path, exclude):
+                        real_path = os.path.normcase(os.path.realpath(entry.path))
+                        if real_path not in skip_folders and real_path not in visited:
+                            visited.add(real_path)
+                            subfolders.append(relative_path)
+                elif _matches(relative_path, include) and not _matches(relative_path, exclude):
+                    result.append((relative_path.replace('/', os.sep), entry.stat().st_size))
+        folders.extend(sorted(subfolders))
+    return result
+
+
+def schedule(files: List[InputFile], order: str = '', workers: int = 1) -> List[InputFile]:
+    """
+    возвращает выписки в порядке обработки. Порядок зависит только от путей и размеров файлов, поэтому при повторном
+    конвертировании того же набора выходные файлы совпадают:
+    'largest_first' - большие файлы разбираются первыми, и к концу конвертирования не остаётся одного большого файла,
+    который разбирает один процесс, пока остальные простаивают;
+    'balanced' - файлы распределяются по workers очередям с равным суммарным размером (наибольший из оставшихся -
+    в наименее загруженную очередь) и выдаются поочерёдно из каждой очереди: каждые workers подряд идущих выписок,
+    которые разбираются одновременно, имеют близкий размер, и результаты, выдаваемые в исходном порядке
+    (см. parse_pool.ParsePool), не ждут одного большого файла
+    :param files: list - выписки (см. scan_inputs)
+    :param order: str - см. SCHEDULES
+    :param workers: int - количество процессов разбора
+    :return: list
+    """
+    if order not in SCHEDULES:
+        raise ValueError('Неизвестный порядок обработки выписок: ' + str(order))
+    if order == '':
+        return list(files)
+    if order == 'name':
+        return sorted(files)
+    largest_first = sorted(files, key=lambda item: (-item[1], item[0]))
+    if order == 'largest_first' or workers <= 1:
+        return largest_first
+    queues = _distribute(largest_first, workers)
+    return [item for group in zip_longest(*queues) for item in group if item is not None]
+
+
+def _distribute(largest_first: List[InputFile], count: int) -> List[List[InputFile]]:
+    """
+    распределяет выписки, упорядоченные от больших к меньшим, по count очередям: каждая следующая - в очередь
+    с наименьшим суммарным размером (при равенстве - в очередь с меньшим номером)
+    """
+    queues: List[List[InputFile]] = [[] for _ in range(count)]
+    loads = [(0, i) for i in range(count)]
+    for item in largest_first:
+        load, i = heapq.heappop(loads)
+        queues[i].append(item)
+        heapq.heappush(loads, (load + item[1], i))
+    return queues
+
+
+def size_batches(files: List[InputFile], count: int) -> List[List[InputFile]]:
+    """
+    делит выписки на count пакетов с близким суммарным размером; внутри пакета выписки упорядочены по путям
+    :param files: list
+    :param count: int
+    :return: list
+    """
+    queues = _distribute(sorted(files, key=lambda item: (-item[1], item[0])), max(1, count))
+    return [sorted(queue) for queue in queues if queue]
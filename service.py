@@ -0,0 +1,368 @@
+from typing import Dict, Any, List, Optional, Tuple, Union
+import os
+import json
+import uuid
+import hashlib
+import datetime
+import functools
+import threading
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qsl, unquote
+from traceback import format_exc
+from logic import DEFAULT_SETTINGS
+from converter import Converter
+from filters import ExtractFilter
+from transform import CoordinateTransformer
+
+# делаем текущей директорией для работы ту папку, в которой лежит файл скрипта (там находятся классификаторы *.csv)
+path_to_current_file = os.path.realpath(__file__)
+os.chdir(os.path.split(path_to_current_file)[0])
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# параметры, которые задаются списками (по умолчанию None), и тип их элементов: в строке запроса список задаётся
+# значениями через запятую
+LIST_OPTIONS = {'output_fields': str, 'filter_kinds': str, 'filter_bbox': float, 'transform_affine': float,
+                'transform_helmert': float}
+
+
+def run_job(job_id: str, settings: Dict[str, Union[str, bool]], events) -> Optional[Dict[str, Any]]:
+    """
+    выполняет задание на конвертирование в процессе из пула; сообщения и прогресс передаются в очередь events
+    в виде кортежей (номер задания, вид события, данные)
+    """
+    events.put((job_id, 'started', None))
+    converter = Converter(settings,
+                          lambda text: events.put((job_id, 'message', text)),
+                          lambda done, total: events.put((job_id, 'progress', (done, total))))
+    try:
+        return converter.run()
+    except Exception:
+        raise RuntimeError(format_exc())
+
+
+class Job:
+    """
+    Задание на конвертирование: параметры, состояние (queued, running, done, failed), прогресс и результат
+    """
+    def __init__(self, job_id: str, key: str, settings: Dict[str, Union[str, bool]], job_dir: str,
+                 folder: Optional[str] = None) -> None:
+        self.id = job_id
+        self.key = key
+        self.folder = folder
+        self.settings = settings
+        self.job_dir = job_dir
+        self.state = 'queued'
+        self.done = 0
+        self.total = 0
+        self.messages = []
+        self.result = None
+        self.error = None
+        self.created = datetime.datetime.now().isoformat(timespec='seconds')
+        self.started = None
+        self.finished = None
+
+    @property
+    def output_dir(self) -> str:
+        return os.path.join(self.job_dir, 'output')
+
+    def files(self) -> list:
+        """
+        возвращает имена файлов результата, доступных для скачивания через сервис
+        """
+        if self.state != 'done' or not os.path.isdir(self.output_dir):
+            return []
+        return sorted(os.listdir(self.output_dir))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'id': self.id, 'state': self.state, 'progress': int(self.done / self.total * 100) if self.total else 0,
+                'done': self.done, 'total': self.total, 'created': self.created, 'started': self.started,
+                'finished': self.finished, 'settings': self.settings, 'messages': self.messages,
+                'result': self.result, 'error': self.error, 'files': self.files()}
+
+
+class JobManager:
+    """
+    Очередь заданий на конвертирование, выполняемых общим пулом процессов. Одинаковые задания (те же параметры и та же
+    папка или тот же загруженный архив), поступившие, пока предыдущее такое задание ещё не завершено, не запускаются
+    повторно - вместо этого возвращается уже существующее задание. Задания по одной и той же папке с выписками
+    выполняются по очереди (конвертирование может переименовывать и распаковывать файлы в этой папке), задания
+    по разным папкам и загруженным архивам - параллельно.
+    """
+    def __init__(self, work_dir: str, workers: int = 2) -> None:
+        self.work_dir = work_dir
+        os.makedirs(work_dir, exist_ok=True)
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self._manager = multiprocessing.Manager()
+        self._events = self._manager.Queue()
+        self._jobs: Dict[str, Job] = {}
+        self._active: Dict[str, str] = {}  # ключ задания -> номер ещё не завершённого задания
+        self._folders: Dict[str, List[Job]] = {}  # папка с выписками -> её незавершённые задания в порядке очереди
+        self._closed = False
+        self._lock = threading.RLock()
+        self._collector = threading.Thread(target=self._collect_events, daemon=True)
+        self._collector.start()
+
+    @staticmethod
+    def parse_options(options: Dict[str, Any]) -> Dict[str, Union[str, bool]]:
+        """
+        проверяет параметры задания (допускаются только ключи файла 'settings.json') и приводит значения к типу
+        значения по умолчанию (например, строки из строки запроса - к bool или числу); списки (LIST_OPTIONS),
+        заданные строкой, разделяются по запятым, пустая строка - None. Значение, которое не удаётся привести к нужному
+        типу, вызывает ValueError (ответ сервиса 400)
+        """
+        if not isinstance(options, dict):
+            raise ValueError('Параметры задания должны быть заданы объектом JSON')
+        unknown = set(options) - set(DEFAULT_SETTINGS)
+        if unknown:
+            raise ValueError('Неизвестные параметры задания: ' + ', '.join(sorted(unknown)))
+        parsed = {}
+        for key, value in options.items():
+            default = DEFAULT_SETTINGS[key]
+            original = value
+            try:
+                if isinstance(default, bool):
+                    if isinstance(value, str):
+                        value = value.lower() in ('1', 'true', 'yes', 'on')
+                elif isinstance(default, (int, float)):
+                    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                        raise TypeError
+                    if isinstance(value, str):
+                        # целое число, если оно записано без дробной части (например, 'checkpoint_minutes' может
+                        # быть дробным)
+                        value = int(value) if value.strip().lstrip('+-').isdigit() else float(value)
+                elif key in LIST_OPTIONS:
+                    if isinstance(value, str):
+                        value = [item.strip() for item in value.split(',') if item.strip()] or None
+                    if value is not None:
+                        value = [LIST_OPTIONS[key](item) for item in value]
+                elif not isinstance(value, str):
+                    raise TypeError
+            except (TypeError, ValueError):
+                raise ValueError('Неверное значение параметра задания ' + key + ': ' + str(original))
+            parsed[key] = value
+        return parsed
+
+    def submit(self, options: Dict[str, Any], upload: Optional[bytes] = None) -> Tuple[Job, bool]:
+        """
+        ставит задание в очередь. options - параметры с ключами файла 'settings.json', upload - содержимое загруженного
+        zip-архива с выписками (если задан, папка folder_in_xml не используется). Возвращает задание и признак того,
+        что такое же задание уже выполняется. Для заданий по папке выписки по умолчанию не переименовываются
+        (rename_files), чтобы задание не изменяло общую папку без явного указания
+        """
+        options = self.parse_options(options)
+        if upload is None:
+            folder_in = options.get('folder_in_xml', '')
+            if not folder_in or not os.path.isdir(folder_in):
+                raise ValueError('Не найдена папка с выписками: ' + str(folder_in))
+            options['folder_in_xml'] = os.path.realpath(folder_in)
+            options.setdefault('rename_files', False)
+            source = options['folder_in_xml']
+        else:
+            source = hashlib.sha256(upload).hexdigest()
+        key = hashlib.sha256(json.dumps({'options': options, 'source': source}, sort_keys=True,
+                                        ensure_ascii=False).encode('utf-8')).hexdigest()
+        with self._lock:
+            if key in self._active:
+                return self._jobs[self._active[key]], True
+            job_id = uuid.uuid4().hex
+            job_dir = os.path.join(self.work_dir, job_id)
+            settings = {**DEFAULT_SETTINGS, **options}
+            # ошибки в фильтре выписок и преобразовании координат сообщаются при постановке задания, а не при его
+            # выполнении
+            ExtractFilter(settings)
+            CoordinateTransformer(settings['transform_swap_axes'], settings['transform_affine'],
+                                  settings['transform_helmert'])
+            if upload is not None:
+                settings['folder_in_xml'] = os.path.join(job_dir, 'input')
+                settings['file_type'] = 'zip'
+                os.makedirs(settings['folder_in_xml'])
+                with open(os.path.join(settings['folder_in_xml'], 'upload.zip'), 'wb') as f:
+                    f.write(upload)
+            job = Job(job_id, key, settings, job_dir, source if upload is None else None)
+            if not settings['folder_out_xml']:
+                settings['folder_out_xml'] = job.output_dir
+            os.makedirs(job.output_dir, exist_ok=True)
+            self._jobs[job_id] = job
+            self._active[key] = job_id
+            if job.folder is None:
+                self._start(job)
+            else:
+                queue = self._folders.setdefault(job.folder, [])
+                queue.append(job)
+                if len(queue) == 1:
+                    self._start(job)
+        return job, False
+
+    def _start(self, job: Job) -> None:
+        """
+        передаёт задание пулу процессов
+        """
+        future = self._executor.submit(run_job, job.id, job.settings, self._events)
+        future.add_done_callback(functools.partial(self._finish, job))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> list:
+        return list(self._jobs.values())
+
+    def _finish(self, job: Job, future: Future) -> None:
+        with self._lock:
+            self._active.pop(job.key, None)
+            job.finished = datetime.datetime.now().isoformat(timespec='seconds')
+            error = future.exception()
+            if error is not None:
+                job.state = 'failed'
+                job.error = str(error)
+            else:
+                job.state = 'done'
+                job.result = future.result()
+            queue = self._folders.get(job.folder, [])
+            if job in queue:
+                queue.remove(job)
+            if queue:
+                if self._closed:
+                    self._cancel(queue)
+                else:
+                    self._start(queue[0])
+            else:
+                self._folders.pop(job.folder, None)
+
+    def _cancel(self, queue: List[Job]) -> None:
+        """
+        отменяет задания, ожидающие своей очереди к папке, при остановке сервиса
+        """
+        finished = datetime.datetime.now().isoformat(timespec='seconds')
+        for job in queue:
+            self._active.pop(job.key, None)
+            job.state = 'failed'
+            job.error = 'Сервис остановлен до начала выполнения задания'
+            job.finished = finished
+        queue.clear()
+
+    def _collect_events(self) -> None:
+        while True:
+            job_id, kind, data = self._events.get()
+            if job_id is None:
+                break
+            job = self._jobs.get(job_id)
+            if job is None:
+                continue
+            if kind == 'started':
+                job.started = datetime.datetime.now().isoformat(timespec='seconds')
+                if job.state == 'queued':
+                    job.state = 'running'
+            elif kind == 'message':
+                job.messages.append(data)
+            elif kind == 'progress':
+                job.done, job.total = data
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            for queue in self._folders.values():
+                self._cancel(queue[1:])
+                del queue[1:]
+        self._executor.shutdown(wait=True)
+        self._events.put((None, None, None))
+        self._collector.join()
+        self._manager.shutdown()
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    Обработчик запросов к сервису:
+    POST /jobs - поставить задание (тело - JSON с параметрами или zip-архив с заголовком Content-Type: application/zip,
+                 в этом случае параметры передаются в строке запроса);
+    GET /jobs - список заданий;
+    GET /jobs/<номер> - состояние, прогресс и результат задания;
+    GET /jobs/<номер>/files/<имя файла> - скачать файл результата.
+    """
+    def _send_json(self, code: int, data: Any) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        parts = [unquote(part) for part in urlparse(self.path).path.split('/') if part]
+        job_manager = self.server.job_manager
+        if parts == ['jobs']:
+            self._send_json(200, [job.as_dict() for job in job_manager.jobs()])
+            return
+        job = job_manager.get(parts[1]) if len(parts) > 1 and parts[0] == 'jobs' else None
+        if job is None:
+            self._send_json(404, {'error': 'Задание не найдено'})
+        elif len(parts) == 2:
+            self._send_json(200, job.as_dict())
+        elif len(parts) == 4 and parts[2] == 'files' and parts[3] in job.files():
+            with open(os.path.join(job.output_dir, parts[3]), 'rb') as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {'error': 'Файл не найден'})
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        if url.path.rstrip('/') != '/jobs':
+            self._send_json(404, {'error': 'Неизвестный адрес'})
+            return
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            if self.headers.get('Content-Type', '').startswith('application/zip'):
+                job, duplicate = self.server.job_manager.submit(dict(parse_qsl(url.query)), body)
+            else:
+                job, duplicate = self.server.job_manager.submit(json.loads(body or b'{}'))
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        self._send_json(200 if duplicate else 202, {**job.as_dict(), 'duplicate': duplicate})
+
+
+def create_server(host: str, port: int, work_dir: str, workers: int = 2) -> ThreadingHTTPServer:
+    """
+    создаёт HTTP-сервер с очередью заданий (запуск - serve_forever(), остановка - shutdown() и
+    server.job_manager.shutdown())
+    """
+    server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    server.job_manager = JobManager(work_dir, workers)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальный сервис конвертирования выписок из ЕГРН')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2, help='количество процессов для выполнения заданий')
+    parser.add_argument('--work-dir', default='service_jobs', help='папка для загруженных архивов и результатов')
+    args = parser.parse_args()
+    server = create_server(args.host, args.port, os.path.realpath(args.work_dir), args.workers)
+    print(f'Сервис запущен: http://{args.host}:{args.port}/jobs')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.job_manager.shutdown()
+
+
+if __name__ == "__main__":
+    main()
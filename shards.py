@@ -0,0 +1,256 @@
+from typing import Dict, List, Any, Optional, Callable, Tuple
+import os
+import re
+import json
+import datetime
+import threading
+from collections import deque
+from traceback import format_exc
+from concurrent.futures import ThreadPoolExecutor
+from filters import polygons_bbox
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# способы разделения результата на части (настройка 'shard_by'): по кадастровому округу (регион), кадастровому району,
+# кадастровому кварталу - по началу кадастрового номера объекта недвижимости, или по названию района из адреса
+SHARD_KEYS = {'cad_region': 1, 'cad_district': 2, 'cad_quarter': 3, 'district_name': 0}
+
+# файл со списком частей результата, который сохраняется в папке с частями
+MANIFEST_FILE = 'manifest.json'
+
+# название части для объектов, у которых не удалось определить кадастровый номер или район
+UNKNOWN_SHARD = 'не определено'
+
+# количество объектов, переданных на запись, но ещё не записанных, на один поток записи
+_PENDING_PER_WORKER = 64
+
+
+def shard_key(shard_by: str, cad_number: str, district_name: str = '') -> str:
+    """
+    возвращает название части результата, в которую записывается объект недвижимости
+    :param shard_by: str - способ разделения (см. SHARD_KEYS)
+    :param cad_number: str - кадастровый номер объекта (parent_cad_number)
+    :param district_name: str - название района (для shard_by='district_name')
+    :return: str
+    """
+    if shard_by not in SHARD_KEYS:
+        raise ValueError('Неизвестный способ разделения результата на части: ' + str(shard_by))
+    if shard_by == 'district_name':
+        return district_name.strip() if district_name else UNKNOWN_SHARD
+    parts = (cad_number or '').split(':')
+    if len(parts) < SHARD_KEYS[shard_by] or not all(parts[:SHARD_KEYS[shard_by]]):
+        return UNKNOWN_SHARD
+    return ':'.join(parts[:SHARD_KEYS[shard_by]])
+
+
+def shard_file_name(key: str) -> str:
+    """
+    возвращает имя файла (без расширения) для части результата: двоеточия кадастрового номера заменяются дефисами,
+    недопустимые в именах файлов символы - подчёркиваниями
+    :param key: str
+    :return: str
+    """
+    return re.sub(r'[<>:"/\\|?*\x00-\x1f]', '_', key.replace(':', '-')).strip(' .') or '_'
+
+
+def shard_output_paths(shards: Dict[str, Dict[str, Any]]) -> List[str]:
+    """
+    возвращает пути ко всем выходным файлам частей результата (для шейп-файлов - к файлам .shp)
+    :param shards: dict - состояние частей (см. ShardedWriters)
+    :return: list
+    """
+    paths = []
+    for state in shards.values():
+        paths.extend(state['xlsx_paths'])
+        if state['shp_path']:
+            paths.append(state['shp_path'])
+        if state.get('fgb_path'):
+            paths.append(state['fgb_path'])
+        if state.get('parquet_path'):
+            paths.append(state['parquet_path'])
+        if state.get('geojsonl_path'):
+            paths.append(state['geojsonl_path'])
+        if state.get('csv_path'):
+            paths.append(state['csv_path'])
+        if state.get('pgdump_path'):
+            paths.append(state['pgdump_path'])
+    return paths
+
+
+class ShardedWriters:
+    """
+    Записывает объекты недвижимости в отдельные выходные файлы для каждой части результата (например, для каждого
+    кадастрового квартала или района) в папке folder. Файлы части открываются функцией open_writers (см.
+    Converter._open_writers) при записи первого объекта части и закрываются функцией close_writers (см.
+    Converter._close_writers). Каждая часть закреплена за одним из workers потоков
+    записи, поэтому объекты части записываются по порядку, а разные части - параллельно. Итоги записи объектов
+    (путь к выписке, файлы, в которые объект записан, текст ошибки) накапливаются и возвращаются методом
+    take_results: ошибка записи объекта не прерывает работу.
+    Состояние частей (пути к файлам, количество объектов и контуров, охват) хранится в словаре shards, который
+    сохраняется вместе с состоянием конвертирования и позволяет продолжить запись после перезапуска: ранее созданные
+    файлы продолжаются так же, как после сохранения состояния (см. Converter._open_writers).
+    """
+    def __init__(self, folder: str, create_xlsx: bool, create_esri_shape: bool, create_fgb: bool,
+                 create_parquet: bool, create_geojsonl: bool, create_csv: bool, stream_gzip: bool,
+                 create_pgdump: bool,
+                 open_writers: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 close_writers: Callable[[Dict[str, Any], Dict[str, Any]], None],
+                 shards: Dict[str, Dict[str, Any]], workers: int = 4) -> None:
+        self.folder = folder
+        self.shards = shards
+        self._create_xlsx = create_xlsx
+        self._create_esri_shape = create_esri_shape
+        self._create_fgb = create_fgb
+        self._create_parquet = create_parquet
+        self._create_geojsonl = create_geojsonl
+        self._create_csv = create_csv
+        self._gzip_ext = '.gz' if stream_gzip else ''
+        self._create_pgdump = create_pgdump
+        self._open_writers = open_writers
+        self._close_writers = close_writers
+        self._executors = [ThreadPoolExecutor(max_workers=1) for _ in range(max(1, int(workers)))]
+        self._assigned: Dict[str, ThreadPoolExecutor] = {}
+        self._writers: Dict[str, Dict[str, Any]] = {}  # открытые файлы частей
+        self._pending = deque()
+        self._results: List[Tuple[str, List[str], Optional[str]]] = []
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def _new_shard(self, key: str) -> Dict[str, Any]:
+        used = {os.path.normcase(os.path.splitext(path)[0]) for path in shard_output_paths(self.shards)}
+        stem = os.path.join(self.folder, shard_file_name(key))
+        num = 1
+        while os.path.normcase(stem) in used:
+            num += 1
+            stem = os.path.join(self.folder, shard_file_name(key) + ' (' + str(num) + ')')
+        return {'xlsx_paths': [stem + '.xlsx'] if self._create_xlsx else [],
+                'shp_path': stem + '.shp' if self._create_esri_shape else None,
+                'fgb_path': stem + '.fgb' if self._create_fgb else None,
+                'parquet_path': stem + '.parquet' if self._create_parquet else None,
+                'geojsonl_path': stem + '.geojsonl' + self._gzip_ext if self._create_geojsonl else None,
+                'csv_path': stem + '.csv' + self._gzip_ext if self._create_csv else None,
+                'pgdump_path': stem + '.sql' if self._create_pgdump else None, 'objects': 0, 'contours': 0,
+                'bbox': None, 'opened': False, 'parts': {}}
+
+    def write(self, key: str, xml_file_path: str, record: Dict[str, Any], geometry: Dict[str, Any],
+              group: Optional[str] = None) -> None:
+        """
+        передаёт объект недвижимости на запись в файлы части key
+        :param key: str - название части (см. shard_key)
+        :param xml_file_path: str - путь к выписке (для сообщения об ошибке)
+        :param record: dict (см. AbstractRealEstateObject.get_record)
+        :param geometry: dict - геометрия объекта, пустой словарь - объект не записывается в шейп-файл
+        :param group: str - вид объекта, если объекты разных видов записываются на разные листы xlsx
+        """
+        if key not in self.shards:
+            self.shards[key] = self._new_shard(key)
+        executor = self._assigned.get(key)
+        if executor is None:
+            executor = self._executors[len(self._assigned) % len(self._executors)]
+            self._assigned[key] = executor
+        self._pending.append(executor.submit(self._write, key, xml_file_path, record, geometry, group))
+        while self._pending and (self._pending[0].done() or
+                                 len(self._pending) > _PENDING_PER_WORKER * len(self._executors)):
+            self._pending.popleft().result()
+
+    def _write(self, key: str, xml_file_path: str, record: Dict[str, Any], geometry: Dict[str, Any],
+               group: Optional[str]) -> None:
+        written = []  # файлы части, в которые объект уже записан
+        try:
+            writers = self._writers.get(key)
+            if writers is None:
+                writers = self._open_writers(self.shards[key])
+                self._writers[key] = writers
+            for kind in ('shp', 'fgb'):
+                if kind in writers and geometry:
+                    writers[kind].write(record, geometry)
+                    written.append(kind)
+            if 'xlsx' in writers:
+                writers['xlsx'].write(record, group)
+                written.append('xlsx')
+            for kind in ('parquet', 'geojsonl', 'pgdump'):
+                if kind in writers:
+                    writers[kind].write(record, geometry)
+                    written.append(kind)
+            if 'csv' in writers:
+                writers['csv'].write(record)
+                written.append('csv')
+            if written:
+                self.shards[key]['objects'] += 1
+            result = (xml_file_path, written, None)
+        except Exception:
+            result = (xml_file_path, written, format_exc())
+        if written and geometry:
+            # охват и количество контуров части учитываются по записанной геометрии, в каком бы формате она ни
+            # записывалась
+            state = self.shards[key]
+            bbox = polygons_bbox(geometry)
+            if bbox is not None:
+                old_bbox = state['bbox'] or bbox
+                state['bbox'] = [min(old_bbox[0], bbox[0]), min(old_bbox[1], bbox[1]),
+                                 max(old_bbox[2], bbox[2]), max(old_bbox[3], bbox[3])]
+            state['contours'] += len(geometry)
+        with self._lock:
+            self._results.append(result)
+
+    def _close_shard(self, key: str) -> None:
+        self._close_writers(self._writers.pop(key), self.shards[key])
+
+    def take_results(self) -> List[Tuple[str, List[str], Optional[str]]]:
+        """
+        возвращает и очищает список итогов записи объектов, запись которых завершена: путь к выписке, файлы части,
+        в которые объект записан ('shp', 'xlsx' и т.д.), и текст ошибки (None, если объект записан во все файлы)
+        :return: list
+        """
+        with self._lock:
+            results, self._results = self._results, []
+        return results
+
+    def close(self) -> None:
+        """
+        дожидается записи всех переданных объектов и закрывает файлы всех частей (параллельно, в потоках записи).
+        После этого запись можно продолжить: файлы частей будут открыты заново (см. Converter._open_writers)
+        """
+        while self._pending:
+            self._pending.popleft().result()
+        futures = [self._assigned[key].submit(self._close_shard, key) for key in list(self._writers)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self) -> None:
+        """
+        закрывает файлы всех частей и завершает потоки записи
+        """
+        try:
+            self.close()
+        finally:
+            for executor in self._executors:
+                executor.shutdown()
+
+    def write_manifest(self, shard_by: str) -> str:
+        """
+        сохраняет в папке с частями список частей результата (MANIFEST_FILE): для каждой части - количество
+        объектов недвижимости, количество записанных контуров, охват контуров (minx, miny, maxx, maxy) и файлы.
+        Вызывается после закрытия файлов (см. close). Возвращает путь к файлу списка
+        :param shard_by: str - способ разделения (см. SHARD_KEYS)
+        :return: str
+        """
+        manifest = {'shard_by': shard_by, 'created': datetime.datetime.now().strftime("%d.%m.%Y %H:%M:%S"),
+                    'shards': []}
+        for key in sorted(self.shards):
+            state = self.shards[key]
+            entry = {'shard': key, 'objects': state['objects'], 'contours': state['contours'], 'bbox': state['bbox'],
+                     'files': [os.path.relpath(path, self.folder) for path in shard_output_paths({key: state})]}
+            manifest['shards'].append(entry)
+        path = os.path.join(self.folder, MANIFEST_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=4)
+        os.replace(path + '.tmp', path)
+        return path
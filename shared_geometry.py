@@ -0,0 +1,123 @@
+from typing import Dict, List, Tuple, Optional, Any
+from array import array
+from multiprocessing import shared_memory
+from shp_native import FlatPolygon, flatten_polygon
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# Передача контуров объектов из процессов разбора выписок в основной процесс через общую память
+# (multiprocessing.shared_memory): процесс разбора записывает координаты контуров объекта в выделенный ему блок
+# плоскими массивами double (так же, как их готовит к записи shp_native.flatten_polygon) и возвращает только
+# описание (имя блока, номера контуров, номера первых точек колец). Вложенные списки точек не сериализуются (pickle)
+# и не передаются через канал между процессами, а выходные файлы записываются из полученных массивов без обхода точек.
+
+# наименьший размер блока общей памяти, байт. Блок выделяется по размеру файла выписки: координата занимает в xml
+# больше 8 байт, поэтому контуры выписки помещаются в блок её размера; иначе они передаются списками
+MIN_BLOCK_SIZE = 64 * 1024
+
+# описание контуров в блоке: имя блока, номера контуров, номера первых точек колец, признаки замкнутости колец
+# и количество координат каждого контура
+Descriptor = Tuple[str, List[Any], List[List[int]], List[List[bool]], List[int]]
+
+
+def pack_geometry(geometry: Dict[Any, List[List[List[float]]]], block_name: str) -> Optional[Descriptor]:
+    """
+    записывает координаты контуров объекта в блок общей памяти (вызывается в процессе разбора). Возвращает
+    описание контуров или None, если координаты не помещаются в блок или точки контура не приводятся к двум
+    координатам (такие контуры передаются списками)
+    :param geometry: dict (см. AbstractRealEstateObject.geometry)
+    :param block_name: str - имя блока, выделенного основным процессом (см. BlockPool.acquire)
+    :return: tuple или None
+    """
+    try:
+        flat = [flatten_polygon(polys) for polys in geometry.values()]
+    except ValueError:
+        return None
+    sizes = [len(coords) for coords, _ in flat]
+    block = shared_memory.SharedMemory(block_name)
+    try:
+        if 8 * sum(sizes) > block.size:
+            return None
+        with memoryview(block.buf) as buf, buf[:8 * sum(sizes)] as part, part.cast('d') as view:
+            position = 0
+            for coords, _ in flat:
+                view[position:position + len(coords)] = coords
+                position += len(coords)
+    finally:
+        block.close()
+    closed = [[ring[0] == ring[-1] for ring in polys] for polys in geometry.values()]
+    return block_name, list(geometry), [parts for _, parts in flat], closed, sizes
+
+
+class BlockPool:
+    """
+    Блоки общей памяти основного процесса для передачи контуров из процессов разбора. Блок выделяется на время
+    разбора одной выписки (acquire) по размеру её файла и после чтения контуров возвращается в пул (release)
+    для следующих выписок. Новый блок создаётся, только если среди свободных нет блока нужного размера; при этом
+    наименьший свободный блок удаляется, поэтому блоков не больше, чем выписок, разбираемых одновременно. Блоки
+    удаляются при закрытии пула (close)
+    """
+    def __init__(self, min_size: int = MIN_BLOCK_SIZE) -> None:
+        self.min_size = min_size
+        self._blocks: Dict[str, shared_memory.SharedMemory] = {}
+        self._free: List[str] = []
+
+    def acquire(self, size: int = 0) -> str:
+        """
+        возвращает имя свободного блока размером не меньше size байт
+        """
+        fitting = [name for name in self._free if self._blocks[name].size >= size]
+        if fitting:
+            name = min(fitting, key=lambda name: self._blocks[name].size)
+            self._free.remove(name)
+            return name
+        if self._free:
+            self._remove(min(self._free, key=lambda name: self._blocks[name].size))
+        block = shared_memory.SharedMemory(create=True, size=max(size, self.min_size))
+        self._blocks[block.name] = block
+        return block.name
+
+    def release(self, name: str) -> None:
+        self._free.append(name)
+
+    def _remove(self, name: str) -> None:
+        self._free.remove(name)
+        block = self._blocks.pop(name)
+        block.close()
+        block.unlink()
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def unpack(self, descriptor: Descriptor) -> Dict[Any, FlatPolygon]:
+        """
+        возвращает контуры объекта из блока общей памяти (см. pack_geometry): координаты каждого контура копируются
+        из блока в массив одним вызовом frombytes, после чего блок можно вернуть в пул. Запись в выходные файлы
+        использует эти массивы без преобразования (см. shp_native.flatten_polygon)
+        :param descriptor: tuple
+        :return: dict
+        """
+        name, keys, parts, closed, sizes = descriptor
+        geometry = {}
+        position = 0
+        with memoryview(self._blocks[name].buf) as buf:
+            for key, starts, flags, size in zip(keys, parts, closed, sizes):
+                coords = array('d')
+                coords.frombytes(buf[8 * position:8 * (position + size)])
+                geometry[key] = FlatPolygon(coords, starts, flags)
+                position += size
+        return geometry
+
+    def close(self) -> None:
+        for block in self._blocks.values():
+            block.close()
+            block.unlink()
+        self._blocks = {}
+        self._free = []
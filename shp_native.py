@@ -0,0 +1,266 @@
+from typing import List, Tuple, Any, Sequence, Callable
+import sys
+import struct
+import time
+import datetime
+from array import array
+from itertools import chain
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# тип геометрии "полигон" в спецификации ESRI Shapefile
+POLYGON = 5
+
+# объём данных, накапливаемых в памяти перед записью в каждый из файлов .shp, .shx, .dbf
+BUFFER_SIZE = 4 * 1024 * 1024
+
+# предельное смещение записи в .shp, которое можно сохранить в .shx (32-битное целое в 16-битных словах)
+_MAX_OFFSET = 2 ** 31 - 1
+
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+
+class FlatPolygon:
+    """
+    Полигон, уже преобразованный в плоский массив координат (см. flatten_polygon), - например, полученный из процесса
+    разбора выписок (см. shared_geometry). flatten_polygon возвращает его массив без обхода точек; контуры в виде
+    списков точек (x, y) строятся только при обращении к ним (преобразование координат, облегчение геометрии,
+    проверка охвата), без точек, добавленных при замыкании контуров
+    """
+    def __init__(self, coords: array, parts: List[int], closed: List[bool]) -> None:
+        self.coords = coords
+        self.parts = parts
+        self.closed = closed
+
+    def __len__(self) -> int:
+        return len(self.parts)
+
+    def __getitem__(self, i: int) -> List[Tuple[float, float]]:
+        start = self.parts[i]
+        end = self.parts[i + 1] if i + 1 < len(self.parts) else len(self.coords) // 2
+        values = iter(self.coords[2 * start:2 * (end - (not self.closed[i]))].tolist())
+        return list(zip(values, values))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self.parts)))
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, (list, tuple, FlatPolygon)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    __hash__ = None
+
+
+def flatten_polygon(polys: List[List[List[float]]]) -> Tuple[array, List[int]]:
+    """
+    преобразует полигон из списка контуров (списков точек [x, y]) в плоский массив координат x0, y0, x1, y1, ...
+    и список номеров первых точек контуров. Незамкнутые контуры замыкаются (как это делает pyshp), исходные списки
+    не изменяются. Для FlatPolygon возвращается копия его массива (при записи массив может изменяться на месте)
+    :param polys: list или FlatPolygon
+    :return: tuple
+    """
+    if isinstance(polys, FlatPolygon):
+        return polys.coords[:], list(polys.parts)
+    coords = array('d')
+    parts = []
+    for part in polys:
+        parts.append(len(coords) // 2)
+        closed = part[0] == part[-1]
+        ring = part if closed else chain(part, (part[0],))
+        expected = 2 * (parts[-1] + len(part) + (not closed))
+        coords.extend(chain.from_iterable(ring))
+        if len(coords) != expected:
+            # в точках есть лишние измерения (z, m) - берутся только первые две координаты
+            del coords[2 * parts[-1]:]
+            ring = part if closed else chain(part, (part[0],))
+            coords.extend(chain.from_iterable(point[:2] for point in ring))
+            if len(coords) != expected:
+                raise ValueError('Точки контура должны содержать по две координаты')
+    return coords, parts
+
+
+def encode_value(value: Any, field: Tuple[str, str, int, int], encoding: str = 'cp1251') -> bytes:
+    """
+    кодирует значение поля атрибутивной таблицы (.dbf) так же, как pyshp: строки - в указанной кодировке с обрезкой
+    и дополнением пробелами до длины поля, числа - текстом, выровненным по правому краю, даты - в формате ГГГГММДД
+    :param value: значение поля
+    :param field: tuple - имя, тип, длина, количество знаков после запятой
+    :param encoding: str
+    :return: bytes
+    """
+    _, field_type, size, decimal = field
+    if field_type in ('N', 'F'):
+        if value is None or value == '':
+            return b'*' * size
+        if not decimal:
+            try:
+                value = int(value)
+            except ValueError:
+                value = int(float(value))
+            return format(value, 'd')[:size].rjust(size).encode('ascii')
+        return format(float(value), '.%sf' % decimal)[:size].rjust(size).encode('ascii')
+    if field_type == 'D':
+        if isinstance(value, datetime.date):
+            return ('%04d%02d%02d' % (value.year, value.month, value.day)).encode('ascii')
+        if value is None or value == '':
+            return b'0' * 8
+        if isinstance(value, str) and len(value) == 8:
+            return value.encode('ascii')
+        raise ValueError('Значение поля ' + field[0] + ' не является датой: ' + str(value))
+    if isinstance(value, bytes):
+        encoded = value
+    elif value is None:
+        encoded = b''
+    else:
+        encoded = str(value).encode(encoding)
+    return encoded[:size].ljust(size)
+
+
+def _field_encoder(field: Tuple[str, str, int, int], encoding: str) -> Callable[[Any], bytes]:
+    """
+    возвращает функцию кодирования значений поля. Для текстовых полей (основная часть атрибутивной таблицы) проверки
+    типа значения выполняются без обращения к encode_value
+    """
+    size = field[2]
+    if field[1] != 'C':
+        return lambda value: encode_value(value, field, encoding)
+
+    def encode_text(value: Any) -> bytes:
+        if value.__class__ is str:
+            return value.encode(encoding)[:size].ljust(size)
+        return encode_value(value, field, encoding)
+    return encode_text
+
+
+class ShpWriter:
+    """
+    Записывает полигональный шейп-файл (.shp, .shx, .dbf) без сторонних библиотек. Результат побайтно совпадает
+    с результатом shapefile.Writer из pyshp 2.3 для тех же данных, но запись выполняется быстрее: координаты
+    передаются плоским массивом и упаковываются одной операцией, атрибуты передаются уже закодированными (см.
+    encode_record), чтобы общие для нескольких контуров значения кодировались один раз, а данные копятся в памяти
+    и записываются в файлы блоками по BUFFER_SIZE байт.
+    При collect_bboxes=True охваты записанных полигонов накапливаются в bboxes (minx, miny, maxx, maxy подряд)
+    для построения пространственного индекса (см. qix.write_qix).
+    """
+    def __init__(self, path: str, fields: List[Tuple[str, str, int, int]], encoding: str = 'cp1251',
+                 collect_bboxes: bool = False) -> None:
+        if not fields:
+            raise ValueError('Атрибутивная таблица шейп-файла должна содержать хотя бы одно поле')
+        self.fields = [(name, field_type, 8 if field_type == 'D' else int(size), 0 if field_type == 'D' else decimal)
+                       for name, field_type, size, decimal in fields]
+        self.encoding = encoding
+        self._encoders = [_field_encoder(field, encoding) for field in self.fields]
+        self.record_length = sum(size for _, _, size, _ in self.fields) + 1
+        self.count = 0
+        self._bbox = None
+        self.bboxes = array('d') if collect_bboxes else None
+        self._shp_size = 100  # размер .shp в байтах
+        self._buffers = {ext: bytearray() for ext in ('.shp', '.shx', '.dbf')}
+        self._files = {}
+        try:
+            for ext in self._buffers:
+                self._files[ext] = open(path + ext, 'wb')
+        except OSError:
+            for f in self._files.values():
+                f.close()
+            raise
+        # заголовки записываются окончательно при закрытии, когда известны количество записей и охват
+        self._files['.shp'].write(bytes(100))
+        self._files['.shx'].write(bytes(100))
+        self._files['.dbf'].write(self._dbf_header())
+
+    def encode_record(self, values: Sequence[Any], start: int = 0) -> bytes:
+        """
+        кодирует значения полей атрибутивной таблицы, начиная с поля с номером start
+        :param values: список значений
+        :param start: int
+        :return: bytes
+        """
+        return b''.join([encode(value) for encode, value in zip(self._encoders[start:], values)])
+
+    def write(self, coords: array, parts: Sequence[int], record: bytes) -> None:
+        """
+        записывает полигон и его атрибуты
+        :param coords: array('d') - координаты x0, y0, x1, y1, ... всех контуров (см. flatten_polygon)
+        :param parts: номера первых точек контуров
+        :param record: bytes - закодированные значения всех полей (см. encode_record)
+        """
+        if len(record) != self.record_length - 1:
+            raise ValueError('Длина записи атрибутивной таблицы не совпадает со структурой шейп-файла')
+        num_points = len(coords) // 2
+        if not num_points:
+            raise ValueError('Полигон не содержит точек')
+        xs = coords[0::2]
+        ys = coords[1::2]
+        bbox = (min(xs), min(ys), max(xs), max(ys))
+        if self.bboxes is not None:
+            self.bboxes.extend(bbox)
+        if self._bbox is None:
+            self._bbox = bbox
+        else:
+            self._bbox = (min(bbox[0], self._bbox[0]), min(bbox[1], self._bbox[1]),
+                          max(bbox[2], self._bbox[2]), max(bbox[3], self._bbox[3]))
+        content_length = 44 + 4 * len(parts) + 16 * num_points
+        if self._shp_size // 2 > _MAX_OFFSET:
+            raise ValueError('Размер файла .shp превышает предельный (4 ГБ), разделите результат на несколько файлов')
+        self.count += 1
+        if _BIG_ENDIAN:
+            coords = array('d', coords)
+            coords.byteswap()
+        shp = self._buffers['.shp']
+        shp += struct.pack('>2i', self.count, content_length // 2)
+        shp += struct.pack('<i4d2i', POLYGON, *bbox, len(parts), num_points)
+        shp += struct.pack('<%di' % len(parts), *parts)
+        shp += coords.tobytes()
+        self._buffers['.shx'] += struct.pack('>2i', self._shp_size // 2, content_length // 2)
+        self._shp_size += 8 + content_length
+        dbf = self._buffers['.dbf']
+        dbf += b' '
+        dbf += record
+        for ext, buffer in self._buffers.items():
+            if len(buffer) >= BUFFER_SIZE:
+                self._files[ext].write(buffer)
+                buffer.clear()
+
+    def _dbf_header(self) -> bytes:
+        year, month, day = time.localtime()[:3]
+        header = [struct.pack('<BBBBLHH20x', 3, year - 1900, month, day, self.count, len(self.fields) * 32 + 33,
+                              self.record_length)]
+        for name, field_type, size, decimal in self.fields:
+            encoded_name = name.encode(self.encoding).replace(b' ', b'_')[:10].ljust(11, b'\x00')
+            header.append(struct.pack('<11sc4xBB14x', encoded_name, field_type.encode('ascii'), size, decimal))
+        header.append(b'\r')
+        return b''.join(header)
+
+    def _shape_file_header(self, file_length: int) -> bytes:
+        return struct.pack('>7i', 9994, 0, 0, 0, 0, 0, file_length) + \
+            struct.pack('<2i8d', 1000, POLYGON, *(self._bbox or (0, 0, 0, 0)), 0, 0, 0, 0)
+
+    def close(self) -> None:
+        """
+        записывает остаток данных и окончательные заголовки файлов
+        """
+        if not self._files:
+            return
+        try:
+            for ext, buffer in self._buffers.items():
+                self._files[ext].write(buffer)
+                buffer.clear()
+            headers = {'.shp': self._shape_file_header(self._shp_size // 2),
+                       '.shx': self._shape_file_header((100 + 8 * self.count) // 2),
+                       '.dbf': self._dbf_header()}
+            for ext, header in headers.items():
+                self._files[ext].seek(0)
+                self._files[ext].write(header)
+        finally:
+            for f in self._files.values():
+                f.close()
+            self._files = {}
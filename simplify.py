@@ -0,0 +1,263 @@
+from typing import Dict, List, Tuple, Any
+import time
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# Облегчение геометрии для обзорных и веб-слоёв: привязка координат к сетке (настройка 'geometry_grid', м), удаление
+# повторяющихся точек и точек, лежащих на прямой между соседними, и упрощение колец алгоритмом Дугласа - Пекера
+# ('geometry_simplify_tolerance', м) с сохранением топологии: если упрощённые кольца контура пересекают друг друга
+# или сами себя, допуск для контура уменьшается вдвое, пока результат не станет корректным.
+
+# количество попыток упрощения контура с уменьшением допуска, после которых контур остаётся без упрощения
+SIMPLIFY_ATTEMPTS = 4
+
+# расстояние от точки до прямой между соседними точками, при котором точка считается лежащей на этой прямой, м
+COLLINEAR_EPSILON = 1e-6
+
+# количество знаков после запятой, до которого округляются координаты, привязанные к сетке
+SNAP_DIGITS = 9
+
+Point = List[float]
+
+
+def snap_ring(ring: List[Point], grid: float) -> List[Point]:
+    """
+    привязывает точки кольца к узлам сетки с шагом grid (координаты округляются до кратных grid)
+    :param ring: list - точки [x, y]
+    :param grid: float
+    :return: list
+    """
+    steps = round(1 / grid)
+    if abs(steps * grid - 1) < 1e-12:
+        # шаг 1/N (0.01, 0.1, 0.5, 1): деление целого числа шагов на N даёт ближайшее к десятичному значению число без
+        # хвостов вида 0.30000000000000004
+        return [[round(point[0] * steps) / steps, round(point[1] * steps) / steps] for point in ring]
+    return [[round(round(point[0] / grid) * grid, SNAP_DIGITS), round(round(point[1] / grid) * grid, SNAP_DIGITS)]
+            for point in ring]
+
+
+def _between(a: Point, b: Point, c: Point) -> bool:
+    """
+    True, если точка b лежит на отрезке a-c (не дальше COLLINEAR_EPSILON от него)
+    """
+    x0, y0, x1, y1, x2, y2 = a[0], a[1], b[0], b[1], c[0], c[1]
+    cross = (x1 - x0) * (y2 - y0) - (y1 - y0) * (x2 - x0)
+    return cross * cross <= COLLINEAR_EPSILON * COLLINEAR_EPSILON * ((x2 - x0) ** 2 + (y2 - y0) ** 2) \
+        and (x1 - x0) * (x2 - x1) + (y1 - y0) * (y2 - y1) >= 0
+
+
+def remove_redundant(ring: List[Point]) -> List[Point]:
+    """
+    удаляет из кольца повторяющиеся подряд точки и точки, лежащие на отрезке между соседними точками. Замкнутое
+    кольцо (первая точка равна последней) остаётся замкнутым
+    :param ring: list
+    :return: list
+    """
+    closed = len(ring) > 1 and ring[0] == ring[-1]
+    points = []
+    for point in ring[:-1] if closed else ring:
+        if not points or point[:2] != points[-1][:2]:
+            points.append(point)
+    if closed and len(points) > 1 and points[0][:2] == points[-1][:2]:
+        points.pop()
+    result = []
+    for point in points:
+        while len(result) >= 2 and _between(result[-2], result[-1], point):
+            result.pop()
+        result.append(point)
+    if closed:
+        # в замкнутом кольце проверяются и точки на стыке конца и начала
+        while len(result) > 3 and _between(result[-2], result[-1], result[0]):
+            result.pop()
+        while len(result) > 3 and _between(result[-1], result[0], result[1]):
+            result.pop(0)
+        if result:
+            result.append(result[0])
+    return result
+
+
+def douglas_peucker(points: List[Point], tolerance: float) -> List[Point]:
+    """
+    упрощает ломаную алгоритмом Дугласа - Пекера: сохраняются концы ломаной и точки, отстоящие от упрощённой ломаной
+    больше чем на tolerance
+    :param points: list
+    :param tolerance: float
+    :return: list
+    """
+    count = len(points)
+    if count < 3:
+        return list(points)
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    tolerance2 = tolerance * tolerance
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = xs[first], ys[first]
+        dx, dy = xs[last] - x1, ys[last] - y1
+        length2 = dx * dx + dy * dy
+        farthest = -1
+        if length2 == 0:
+            distance2 = tolerance2
+            for k in range(first + 1, last):
+                d2 = (xs[k] - x1) ** 2 + (ys[k] - y1) ** 2
+                if d2 > distance2:
+                    farthest, distance2 = k, d2
+        else:
+            # сравниваются квадраты векторных произведений, без деления на длину отрезка
+            distance2 = tolerance2 * length2
+            for k in range(first + 1, last):
+                cross = (xs[k] - x1) * dy - (ys[k] - y1) * dx
+                if cross * cross > distance2:
+                    farthest, distance2 = k, cross * cross
+        if farthest >= 0:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def simplify_ring(ring: List[Point], tolerance: float) -> List[Point]:
+    """
+    упрощает кольцо алгоритмом Дугласа - Пекера. Кольцо делится на две ломаные первой точкой и самой удалённой от неё
+    точкой, которые сохраняются; замкнутое кольцо остаётся замкнутым
+    :param ring: list
+    :param tolerance: float
+    :return: list
+    """
+    closed = len(ring) > 1 and ring[0] == ring[-1]
+    points = ring[:-1] if closed else ring
+    if len(points) <= 3:
+        return list(ring)
+    x0, y0 = points[0][0], points[0][1]
+    split = max(range(len(points)), key=lambda k: (points[k][0] - x0) ** 2 + (points[k][1] - y0) ** 2)
+    result = douglas_peucker(points[:split + 1], tolerance)[:-1] + \
+        douglas_peucker(points[split:] + [points[0]], tolerance)[:-1]
+    if closed:
+        result.append(result[0])
+    return result
+
+
+def _edges(rings: List[List[Point]]) -> List[Tuple[float, ...]]:
+    """
+    возвращает рёбра колец: охват (minx, maxx, miny, maxy), концы (x1, y1, x2, y2), номер кольца и номер ребра
+    """
+    edges = []
+    for number, ring in enumerate(rings):
+        closed = ring[0] == ring[-1]
+        points = ring if closed else ring + [ring[0]]
+        for k in range(len(points) - 1):
+            (x1, y1), (x2, y2) = points[k][:2], points[k + 1][:2]
+            edges.append((min(x1, x2), max(x1, x2), min(y1, y2), max(y1, y2), x1, y1, x2, y2, number, k))
+    return edges
+
+
+def rings_valid(rings: List[List[Point]]) -> bool:
+    """
+    проверяет, что кольца контура не пересекают друг друга и сами себя (рёбра, кроме соседних рёбер одного кольца,
+    не имеют общих точек) и в каждом кольце не меньше трёх различных точек. Рёбра перебираются в порядке левых
+    концов, поэтому сравниваются только рёбра с перекрывающимися проекциями на ось x
+    :param rings: list
+    :return: bool
+    """
+    for ring in rings:
+        if len({tuple(point[:2]) for point in ring}) < 3:
+            return False
+    edges = sorted(_edges(rings))
+    count = len(edges)
+    sizes = [len(ring) - (ring[0] == ring[-1]) for ring in rings]
+    for index in range(count):
+        _, maxx, miny, maxy, x1, y1, x2, y2, ring, k = edges[index]
+        for other in range(index + 1, count):
+            other_minx, _, other_miny, other_maxy, x3, y3, x4, y4, other_ring, other_k = edges[other]
+            if other_minx > maxx:
+                break
+            if maxy < other_miny or other_maxy < miny:
+                continue
+            if ring == other_ring and (abs(k - other_k) == 1 or abs(k - other_k) == sizes[ring] - 1):
+                continue  # соседние рёбра кольца имеют общую точку
+            d1 = (x2 - x1) * (y3 - y1) - (y2 - y1) * (x3 - x1)
+            d2 = (x2 - x1) * (y4 - y1) - (y2 - y1) * (x4 - x1)
+            d3 = (x4 - x3) * (y1 - y3) - (y4 - y3) * (x1 - x3)
+            d4 = (x4 - x3) * (y2 - y3) - (y4 - y3) * (x2 - x3)
+            if (d1 > 0) != (d2 > 0) and (d3 > 0) != (d4 > 0) and d1 and d2 and d3 and d4:
+                return False
+            if (d1 == 0 and _on_segment(x3, y3, x1, y1, x2, y2)) or (d2 == 0 and _on_segment(x4, y4, x1, y1, x2, y2)) \
+                    or (d3 == 0 and _on_segment(x1, y1, x3, y3, x4, y4)) or \
+                    (d4 == 0 and _on_segment(x2, y2, x3, y3, x4, y4)):
+                return False
+    return True
+
+
+def _on_segment(x: float, y: float, x1: float, y1: float, x2: float, y2: float) -> bool:
+    return min(x1, x2) <= x <= max(x1, x2) and min(y1, y2) <= y <= max(y1, y2)
+
+
+class GeometrySimplifier:
+    """
+    Этап облегчения геометрии объектов перед записью в выходные файлы (см. описание модуля). Вызывается для словаря
+    контуров объекта (см. AbstractRealEstateObject.geometry) и возвращает новый словарь, исходные списки не
+    изменяются. Кольцо, которое после привязки к сетке вырождается (меньше трёх различных точек), - внешнее
+    кольцо остаётся без изменений, отверстие удаляется. В stats накапливаются количество контуров, точек до и после
+    обработки и время обработки
+    """
+    def __init__(self, grid: float = 0.0, tolerance: float = 0.0) -> None:
+        if grid < 0 or tolerance < 0:
+            raise ValueError('Шаг сетки и допуск упрощения геометрии не могут быть отрицательными')
+        self.grid = grid
+        self.tolerance = tolerance
+        self.stats = {'polygons': 0, 'points_in': 0, 'points_out': 0, 'seconds': 0.0}
+
+    @property
+    def active(self) -> bool:
+        return self.grid > 0 or self.tolerance > 0
+
+    def _prepare(self, polys: List[List[Point]]) -> List[List[Point]]:
+        rings = []
+        for number, ring in enumerate(polys):
+            prepared = remove_redundant(snap_ring(ring, self.grid) if self.grid > 0 else ring)
+            if len({tuple(point[:2]) for point in prepared}) >= 3:
+                rings.append(prepared)
+            elif number == 0:
+                rings.append(ring)
+        return rings
+
+    def simplify_polygon(self, polys: List[List[Point]]) -> List[List[Point]]:
+        """
+        обрабатывает кольца одного контура
+        :param polys: list - кольца из точек [x, y]
+        :return: list
+        """
+        rings = self._prepare(polys)
+        tolerance = self.tolerance
+        for _ in range(SIMPLIFY_ATTEMPTS if tolerance > 0 else 0):
+            simplified = [simplify_ring(ring, tolerance) for ring in rings]
+            if rings_valid(simplified):
+                return simplified
+            tolerance /= 2
+        return rings
+
+    def __call__(self, geometry: Dict[Any, List[List[Point]]]) -> Dict[Any, List[List[Point]]]:
+        """
+        обрабатывает все контуры объекта недвижимости
+        :param geometry: dict
+        :return: dict
+        """
+        start = time.perf_counter()
+        result = {}
+        for key, polys in geometry.items():
+            result[key] = self.simplify_polygon(polys)
+            self.stats['polygons'] += 1
+            self.stats['points_in'] += sum(len(ring) for ring in polys)
+            self.stats['points_out'] += sum(len(ring) for ring in result[key])
+        self.stats['seconds'] += time.perf_counter() - start
+        return result
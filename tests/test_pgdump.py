@@ -0,0 +1,79 @@
+from typing import Any, Dict, List
+from writers import PostgisDumpWriter
+from pgdump import read_dump, column_types, parse_value, decode_ewkb
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+FIELDS = ['parent_cad_number', 'area', 'extract_date', 'address', 'entry_parcels']
+
+# значения с символами, которые экранируются в текстовом формате COPY и в массивах text[]
+SPECIAL_TEXT = 'Табуляция\tперевод строки\nобратная косая черта \\N "кавычки" {скобки}, запятая'
+
+OUTER = [[0.0, 0.0], [10.0, 0.0], [10.0, 10.0], [0.0, 10.0], [0.0, 0.0]]
+HOLE = [[2.0, 2.0], [4.0, 2.0], [4.0, 4.0], [2.0, 2.0]]
+SECOND = [[20.5, 1.25], [30.5, 1.25], [25.5, 7.75], [20.5, 1.25]]
+
+
+def make_record(cad_number: str, area: str, extract_date: str, address: str, entry_parcels: List[str]) \
+        -> Dict[str, Any]:
+    return {'parent_cad_number': cad_number, 'area': area, 'extract_date': extract_date, 'address': address,
+            'entry_parcels': entry_parcels}
+
+
+def read_rows(path: str) -> List[Dict[str, Any]]:
+    """
+    читает строки дампа: значения столбцов по их типам, геометрию - декодированной из EWKB (код системы координат
+    и список полигонов)
+    """
+    types = column_types(path)
+    columns, rows = read_dump(path)
+    result = []
+    for row in rows:
+        values = {name: parse_value(value, types[name]) for name, value in zip(columns, row)}
+        values['geom'] = decode_ewkb(bytes.fromhex(values['geom'])) if values['geom'] is not None else None
+        result.append(values)
+    return result
+
+
+def test_dump_reads_back(tmp_path):
+    path = str(tmp_path / 'objects.sql')
+    writer = PostgisDumpWriter(path, fields=FIELDS, table='участки', srid=28404)
+    writer.write(make_record('40:01:000001:1', '1500', '03.04.2023', SPECIAL_TEXT, ['40:01:000001:2', SPECIAL_TEXT]),
+                 {'(1)': [OUTER, HOLE], '(2)': [SECOND]})
+    writer.write(make_record('40:01:000001:3', '', '', '', []), {})
+    writer.close()
+    assert column_types(path) == {'parent_cad_number': 'text', 'area': 'double precision', 'extract_date': 'date',
+                                  'address': 'text', 'entry_parcels': 'text[]',
+                                  'geom': 'geometry(MultiPolygon, 28404)'}
+    rows = read_rows(path)
+    assert len(rows) == 2
+    assert rows[0] == {'parent_cad_number': '40:01:000001:1', 'area': 1500.0, 'extract_date': '2023-04-03',
+                       'address': SPECIAL_TEXT, 'entry_parcels': ['40:01:000001:2', SPECIAL_TEXT],
+                       'geom': (28404, [[[tuple(point) for point in OUTER], [tuple(point) for point in HOLE]],
+                                        [[tuple(point) for point in SECOND]]])}
+    assert rows[1] == {'parent_cad_number': '40:01:000001:3', 'area': None, 'extract_date': None, 'address': '',
+                       'entry_parcels': [], 'geom': None}
+
+
+def test_append_keeps_existing_rows(tmp_path):
+    path = str(tmp_path / 'objects.sql')
+    writer = PostgisDumpWriter(path, fields=FIELDS)
+    writer.write(make_record('40:01:000001:1', '10.5', '01.02.2015', 'адрес', []), {'(1)': [OUTER]})
+    writer.close()
+    writer = PostgisDumpWriter(path, True, fields=FIELDS)
+    writer.write(make_record('40:01:000001:2', '20', '', 'адрес 2', []), {'(1)': [SECOND]})
+    writer.close()
+    rows = read_rows(path)
+    assert [row['parent_cad_number'] for row in rows] == ['40:01:000001:1', '40:01:000001:2']
+    assert [row['area'] for row in rows] == [10.5, 20.0]
+    assert rows[0]['geom'] == (0, [[[tuple(point) for point in OUTER]]])
+    assert rows[1]['geom'] == (0, [[[tuple(point) for point in SECOND]]])
+    with open(path, 'r', encoding='utf-8') as f:
+        assert f.read().count('COPY ') == 1
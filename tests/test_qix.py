@@ -0,0 +1,102 @@
+from typing import Any, Dict, List, Tuple
+import pytest
+from real_estate import RECORD_FIELDS
+from writers import ShapeWriter, SHP_BACKENDS
+from qix import QIX_EXT, search_qix
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# прямоугольники запросов: весь охват, середина, угол, касание границы объекта, точка, пустая область, узкая полоса
+# через ряд объектов, область объектов, записанных с заменой
+QUERIES = [(-1e9, -1e9, 1e9, 1e9), (150, 150, 350, 250), (0, 0, 5, 5), (110, 0, 200, 50), (230, 330, 230, 330),
+           (2000, 2000, 3000, 3000), (-50, 120, 620, 130), (1000, 1000, 1020, 1020)]
+
+
+def make_object(number: int, x: float, y: float, sizes: List[float]) -> Tuple[Dict[str, Any], Dict]:
+    """
+    возвращает запись и геометрию объекта недвижимости из квадратных контуров со стороной из sizes, начинающихся
+    в точке (x, y) и сдвинутых друг от друга на 30 по оси x
+    """
+    record = {key: '' for key in RECORD_FIELDS}
+    record.update({'parent_cad_number': '40:01:000001:' + str(number), 'area': '100', 'cadastral_cost': '1.5',
+                   'date_of_cadastral_reg': '01.02.2015', 'extract_date': '03.04.2023'})
+    geometry = {}
+    for c, size in enumerate(sizes):
+        x0 = x + 30 * c
+        geometry['(' + str(c + 1) + ')'] = [[[x0, y], [x0 + size, y], [x0 + size, y + size], [x0, y + size], [x0, y]]]
+    return record, geometry
+
+
+def contour_bboxes(geometry: Dict) -> List[Tuple[float, float, float, float]]:
+    bboxes = []
+    for polys in geometry.values():
+        xs = [point[0] for ring in polys for point in ring]
+        ys = [point[1] for ring in polys for point in ring]
+        bboxes.append((min(xs), min(ys), max(xs), max(ys)))
+    return bboxes
+
+
+def write(path: str, backend: str, objects: List[Tuple[Dict[str, Any], Dict]], append: bool) \
+        -> List[Tuple[float, float, float, float]]:
+    """
+    записывает объекты в шейп-файл с пространственным индексом и возвращает охваты записанных контуров по порядку
+    """
+    writer = ShapeWriter(path, append, replace_existing=append, backend=backend, spatial_index=True)
+    bboxes = []
+    for record, geometry in objects:
+        bboxes.extend(contour_bboxes(geometry))
+        # pyshp замыкает контуры, изменяя переданные списки
+        writer.write(record, {key: [[list(point) for point in ring] for ring in polys]
+                              for key, polys in geometry.items()})
+    writer.close()
+    return bboxes
+
+
+def brute_force(bboxes: List[Tuple[float, float, float, float]], valid: List[int],
+                rect: Tuple[float, float, float, float]) -> List[int]:
+    return [i for i in valid if bboxes[i][0] <= rect[2] and bboxes[i][2] >= rect[0] and bboxes[i][1] <= rect[3]
+            and bboxes[i][3] >= rect[1]]
+
+
+def check_index(path: str, bboxes: List[Tuple[float, float, float, float]], valid: List[int]) -> None:
+    for rect in QUERIES:
+        candidates = search_qix(path + QIX_EXT, rect)
+        assert len(candidates) == len(set(candidates))
+        assert set(candidates) <= set(valid)
+        assert [i for i in candidates if i in brute_force(bboxes, valid, rect)] == brute_force(bboxes, valid, rect)
+
+
+@pytest.mark.parametrize('backend', SHP_BACKENDS)
+def test_index_matches_brute_force(tmp_path, backend):
+    objects = [make_object(i, 100 * (i % 6), 100 * (i // 6), [10 + 2 * i] * (1 + i % 2)) for i in range(30)]
+    objects.append(make_object(30, -20, -20, [700]))  # объект, охват которого накрывает все остальные
+    path = str(tmp_path / 'objects')
+    bboxes = write(path, backend, objects, False)
+    valid = list(range(len(bboxes)))
+    assert search_qix(path + QIX_EXT, QUERIES[0]) == valid
+    check_index(path, bboxes, valid)
+
+
+def test_index_skips_replaced_objects(tmp_path):
+    objects = [make_object(i, 100 * (i % 6), 100 * (i // 6), [10 + 2 * i] * (1 + i % 2)) for i in range(30)]
+    path = str(tmp_path / 'objects')
+    bboxes = write(path, 'native', objects, False)
+    # объекты записываются повторно в другом месте: прежние контуры помечаются удалёнными и не индексируются
+    replaced = [make_object(i, 1000 + 50 * i, 1000, [20]) for i in range(0, 30, 3)]
+    deleted = set()
+    first = 0
+    for i, (_, geometry) in enumerate(objects):
+        if i % 3 == 0:
+            deleted.update(range(first, first + len(geometry)))
+        first += len(geometry)
+    bboxes += write(path, 'native', replaced, True)
+    valid = [i for i in range(len(bboxes)) if i not in deleted]
+    assert search_qix(path + QIX_EXT, QUERIES[0]) == valid
+    check_index(path, bboxes, valid)
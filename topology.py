@@ -0,0 +1,472 @@
+from typing import Dict, List, Tuple, Sequence, Iterator, Optional
+import os
+import csv
+import math
+import struct
+from array import array
+from shp_native import flatten_polygon
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# Проверка топологии земельных участков: наложения контуров (площадь пересечения больше допуска) и зазоры между
+# соседними контурами (границы ближе допуска, но не касаются). Контуры во время конвертирования дописываются во
+# временный файл (ContourSpool), по окончании их охваты загружаются в STR-дерево (sort-tile-recursive), и точная
+# проверка выполняется только для пар контуров с пересекающимися охватами, а не для всех пар.
+
+# суффикс имени файла отчёта о проверке топологии
+TOPOLOGY_FILE_SUFFIX = '_topology.csv'
+
+# расширение временного файла контуров
+SPOOL_EXT = '.contours'
+
+# заголовок отчёта: problem - 'overlap' (value - площадь наложения) или 'gap' (value - расстояние между границами)
+TOPOLOGY_COLUMNS = ('cad_number', 'contour', 'other_cad_number', 'other_contour', 'problem', 'value')
+
+# допуск совпадения точек и положения точки на границе, м
+EPSILON = 1e-6
+
+# количество дочерних элементов узла STR-дерева
+NODE_CAPACITY = 16
+
+# количество контуров, рёбра которых хранятся в памяти во время проверки
+EDGE_CACHE_SIZE = 4096
+
+_HEADER = struct.Struct('<HHI')
+
+Rect = Tuple[float, float, float, float]
+Ring = List[Tuple[float, float]]
+Edge = Tuple[float, float, float, float, float, float, float, float]
+
+
+def _ring_area2(coords: Sequence[float], start: int, end: int) -> float:
+    """
+    возвращает удвоенную ориентированную площадь замкнутого кольца из точек start..end-1 плоского массива координат
+    (положительная - обход против часовой стрелки)
+    """
+    total = 0.0
+    for k in range(start, end - 1):
+        total += coords[2 * k] * coords[2 * k + 3] - coords[2 * k + 2] * coords[2 * k + 1]
+    return total
+
+
+def _point_in_ring(x: float, y: float, ring: Sequence[Tuple[float, float]]) -> bool:
+    inside = False
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+
+class ContourSpool:
+    """
+    Временный файл контуров земельных участков для проверки топологии. Запись на контур: длины кадастрового номера
+    объекта и обозначения контура, количество колец, имена (UTF-8), количество точек колец и координаты (double).
+    Кольца замыкаются и ориентируются одинаково для всех контуров: внешние - против часовой стрелки, внутренние
+    (отверстия) - по часовой. Файл только дописывается; при продолжении прерванного конвертирования он обрезается до
+    размера, сохранённого вместе с состоянием конвертирования (см. flush)
+    """
+    def __init__(self, path: str, size: int = 0) -> None:
+        self.path = path
+        if size and os.path.exists(path):
+            self._file = open(path, 'r+b')
+            self._file.truncate(size)
+            self._file.seek(size)
+        else:
+            self._file = open(path, 'wb')
+
+    def add(self, cad_number: str, contour: str, polys: List[List[List[float]]]) -> None:
+        """
+        дописывает контур объекта недвижимости
+        :param cad_number: str - кадастровый номер объекта
+        :param contour: str - обозначение контура (ключ словаря AbstractRealEstateObject.geometry)
+        :param polys: list - кольца контура из точек [x, y]
+        """
+        coords, starts = flatten_polygon(polys)
+        ends = starts[1:] + [len(coords) // 2]
+        rings = []
+        for number, (start, end) in enumerate(zip(starts, ends)):
+            ring = list(zip(coords[2 * start:2 * end:2], coords[2 * start + 1:2 * end:2]))
+            # кольцо, первая точка которого лежит внутри нечётного количества других колец, - отверстие
+            depth = sum(1 for other, (other_start, other_end) in enumerate(zip(starts, ends)) if other != number
+                        and _point_in_ring(ring[0][0], ring[0][1],
+                                           list(zip(coords[2 * other_start:2 * other_end:2],
+                                                    coords[2 * other_start + 1:2 * other_end:2]))))
+            if (_ring_area2(coords, start, end) > 0) == (depth % 2 == 1):
+                ring.reverse()
+            rings.append(ring)
+        names = cad_number.encode('utf-8'), contour.encode('utf-8')
+        self._file.write(_HEADER.pack(len(names[0]), len(names[1]), len(rings)) + names[0] + names[1])
+        self._file.write(array('I', [len(ring) for ring in rings]).tobytes())
+        self._file.write(array('d', [value for ring in rings for point in ring for value in point]).tobytes())
+
+    def flush(self) -> int:
+        """
+        сохраняет записанные контуры на диск и возвращает размер файла
+        :return: int
+        """
+        self._file.flush()
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ContourSet:
+    """
+    Контуры, загруженные из временного файла (см. ContourSpool), в плоских массивах: names - (кадастровый номер,
+    контур), bboxes - охваты (minx, miny, maxx, maxy), coords - координаты x, y всех колец, ring_starts - номер
+    первой точки каждого кольца, contour_rings - номер первого кольца каждого контура (оба массива дополнены
+    конечным значением)
+    """
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.names: List[Tuple[str, str]] = []
+        self.bboxes = array('d')
+        self.coords = array('d')
+        self.ring_starts = array('q', [0])
+        self.contour_rings = array('q', [0])
+        if path is not None:
+            with open(path, 'rb') as f:
+                while True:
+                    header = f.read(_HEADER.size)
+                    if not header:
+                        break
+                    cad_length, contour_length, ring_count = _HEADER.unpack(header)
+                    names = f.read(cad_length + contour_length).decode('utf-8')
+                    counts = array('I')
+                    counts.frombytes(f.read(4 * ring_count))
+                    values = array('d')
+                    values.frombytes(f.read(16 * sum(counts)))
+                    self.add(names[:cad_length], names[cad_length:], counts, values)
+
+    def add(self, cad_number: str, contour: str, counts: Sequence[int], values: Sequence[float]) -> None:
+        """
+        добавляет контур: количество точек колец и их координаты x0, y0, x1, y1, ...
+        """
+        self.names.append((cad_number, contour))
+        xs = values[0::2]
+        ys = values[1::2]
+        self.bboxes.extend((min(xs), min(ys), max(xs), max(ys)))
+        self.coords.extend(values)
+        for count in counts:
+            self.ring_starts.append(self.ring_starts[-1] + count)
+        self.contour_rings.append(len(self.ring_starts) - 1)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def bbox(self, index: int) -> Rect:
+        return tuple(self.bboxes[4 * index:4 * index + 4])
+
+    def rings(self, index: int) -> List[Ring]:
+        """
+        возвращает кольца контура списками точек (x, y)
+        """
+        rings = []
+        for ring in range(self.contour_rings[index], self.contour_rings[index + 1]):
+            start, end = self.ring_starts[ring], self.ring_starts[ring + 1]
+            rings.append(list(zip(self.coords[2 * start:2 * end:2], self.coords[2 * start + 1:2 * end:2])))
+        return rings
+
+
+def _str_order(boxes: Sequence[float], count: int, capacity: int) -> List[int]:
+    """
+    упорядочивает прямоугольники по алгоритму sort-tile-recursive: по центру x они делятся на вертикальные полосы
+    по ceil(sqrt(P)) * capacity прямоугольников (P - количество узлов уровня), внутри полосы - сортируются по центру y
+    """
+    node_count = math.ceil(count / capacity)
+    slice_size = math.ceil(math.sqrt(node_count)) * capacity
+    order = sorted(range(count), key=lambda i: boxes[4 * i] + boxes[4 * i + 2])
+    result = []
+    for start in range(0, count, slice_size):
+        result.extend(sorted(order[start:start + slice_size], key=lambda i: boxes[4 * i + 1] + boxes[4 * i + 3]))
+    return result
+
+
+class STRtree:
+    """
+    R-дерево, построенное пакетной загрузкой по алгоритму sort-tile-recursive (Leutenegger et al., 1997): каждый
+    уровень упорядочивается _str_order, последовательные группы по capacity элементов становятся узлами следующего
+    уровня. Для каждого уровня хранятся охваты его элементов и порядок, в котором они сгруппированы в узлы
+    """
+    def __init__(self, bboxes: Sequence[float], capacity: int = NODE_CAPACITY) -> None:
+        self.capacity = capacity
+        self._levels: List[Tuple[array, List[int]]] = []
+        boxes = array('d', bboxes)
+        count = len(boxes) // 4
+        while count:
+            order = _str_order(boxes, count, capacity)
+            self._levels.append((boxes, order))
+            if count <= capacity:
+                break
+            node_boxes = array('d')
+            for start in range(0, count, capacity):
+                group = order[start:start + capacity]
+                node_boxes.extend((min(boxes[4 * i] for i in group), min(boxes[4 * i + 1] for i in group),
+                                   max(boxes[4 * i + 2] for i in group), max(boxes[4 * i + 3] for i in group)))
+            boxes = node_boxes
+            count = len(boxes) // 4
+
+    def leaf_order(self) -> List[int]:
+        """
+        возвращает номера прямоугольников в порядке листьев дерева (соседние по порядку прямоугольники близки
+        в пространстве)
+        :return: list
+        """
+        return list(self._levels[0][1]) if self._levels else []
+
+    def query(self, rect: Rect) -> List[int]:
+        """
+        возвращает номера прямоугольников, пересекающихся с rect (включая касание)
+        :param rect: tuple (minx, miny, maxx, maxy)
+        :return: list
+        """
+        minx, miny, maxx, maxy = rect
+        result = []
+        if not self._levels:
+            return result
+        capacity = self.capacity
+        stack = [(len(self._levels) - 1, 0)]
+        while stack:
+            level, node = stack.pop()
+            boxes, order = self._levels[level]
+            for i in order[node * capacity:(node + 1) * capacity]:
+                if boxes[4 * i] <= maxx and boxes[4 * i + 2] >= minx and boxes[4 * i + 1] <= maxy \
+                        and boxes[4 * i + 3] >= miny:
+                    if level:
+                        stack.append((level - 1, i))
+                    else:
+                        result.append(i)
+        return result
+
+
+def ring_edges(rings: List[Ring]) -> List[Edge]:
+    """
+    возвращает рёбра колец контура: координаты концов (x1, y1, x2, y2) и охват ребра (minx, miny, maxx, maxy)
+    :param rings: list - кольца из точек (x, y)
+    :return: list
+    """
+    return [(x1, y1, x2, y2, min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+            for ring in rings for (x1, y1), (x2, y2) in zip(ring, ring[1:])]
+
+
+def _edges_bbox(edges: List[Edge]) -> Rect:
+    return (min(edge[4] for edge in edges), min(edge[5] for edge in edges), max(edge[6] for edge in edges),
+            max(edge[7] for edge in edges))
+
+
+def _classify(x: float, y: float, edges: List[Edge]) -> Tuple[int, Optional[Tuple[float, float]]]:
+    """
+    определяет положение точки относительно контура: 1 - внутри, 0 - снаружи, 2 - на границе (вместе с
+    направлением ребра, на котором лежит точка)
+    """
+    inside = False
+    for x1, y1, x2, y2, minx, miny, maxx, maxy in edges:
+        if minx - EPSILON <= x <= maxx + EPSILON and miny - EPSILON <= y <= maxy + EPSILON:
+            dx, dy = x2 - x1, y2 - y1
+            if abs(dx * (y - y1) - dy * (x - x1)) <= EPSILON * math.hypot(dx, dy):
+                return 2, (dx, dy)
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return (1 if inside else 0), None
+
+
+def _split_params(edge: Edge, edges: List[Edge]) -> List[float]:
+    """
+    возвращает параметры t (0 < t < 1) точек ребра edge, в которых его пересекают или касаются рёбра edges
+    """
+    px, py, qx, qy, pminx, pminy, pmaxx, pmaxy = edge
+    pminx, pminy, pmaxx, pmaxy = pminx - EPSILON, pminy - EPSILON, pmaxx + EPSILON, pmaxy + EPSILON
+    ex, ey = qx - px, qy - py
+    length2 = ex * ex + ey * ey
+    params = []
+    for rx, ry, sx, sy, minx, miny, maxx, maxy in edges:
+        if maxx < pminx or minx > pmaxx or maxy < pminy or miny > pmaxy:
+            continue
+        fx, fy = sx - rx, sy - ry
+        denominator = ex * fy - ey * fx
+        wx, wy = rx - px, ry - py
+        if abs(denominator) > 1e-12 * math.sqrt(length2 * (fx * fx + fy * fy)):
+            t = (wx * fy - wy * fx) / denominator
+            u = (wx * ey - wy * ex) / denominator
+            if 0.0 < t < 1.0 and -1e-12 <= u <= 1.0 + 1e-12:
+                params.append(t)
+        elif abs(wx * ey - wy * ex) <= EPSILON * math.sqrt(length2):
+            # рёбра лежат на одной прямой: границы общего участка - концы другого ребра
+            for x, y in ((rx, ry), (sx, sy)):
+                t = ((x - px) * ex + (y - py) * ey) / length2
+                if 0.0 < t < 1.0:
+                    params.append(t)
+    return params
+
+
+def _boundary_inside(edges: List[Edge], other: List[Edge], other_bbox: Rect, shared: bool,
+                     origin: Tuple[float, float]) -> float:
+    """
+    возвращает сумму x0 * y1 - x1 * y0 (относительно точки origin) по частям границы контура, лежащим внутри контура
+    other. При shared=True учитываются и части, совпадающие с границей other при одинаковом направлении обхода
+    (контуры по одну сторону от общей границы); рёбра встречного направления - общая граница соседних контуров -
+    не учитываются
+    """
+    minx, miny, maxx, maxy = other_bbox
+    ox, oy = origin
+    total = 0.0
+    for edge in edges:
+        px, py, qx, qy, edge_minx, edge_miny, edge_maxx, edge_maxy = edge
+        if edge_maxx < minx or edge_minx > maxx or edge_maxy < miny or edge_miny > maxy:
+            continue  # ребро целиком вне охвата другого контура
+        ex, ey = qx - px, qy - py
+        length = math.hypot(ex, ey)
+        previous = 0.0
+        for t in sorted(set(_split_params(edge, other))) + [1.0]:
+            if (t - previous) * length > EPSILON:
+                x0, y0 = px + previous * ex, py + previous * ey
+                x1, y1 = px + t * ex, py + t * ey
+                position, direction = _classify((x0 + x1) / 2, (y0 + y1) / 2, other)
+                if position == 1 or (position == 2 and shared and direction[0] * ex + direction[1] * ey > 0):
+                    total += (x0 - ox) * (y1 - oy) - (x1 - ox) * (y0 - oy)
+            previous = t
+    return total
+
+
+def _intersection_area(edges: List[Edge], bbox: Rect, other: List[Edge], other_bbox: Rect) -> float:
+    origin = bbox[0], bbox[1]
+    total = _boundary_inside(edges, other, other_bbox, True, origin) + \
+        _boundary_inside(other, edges, bbox, False, origin)
+    return max(0.0, total / 2)
+
+
+def intersection_area(rings: List[Ring], other: List[Ring]) -> float:
+    """
+    возвращает площадь пересечения двух контуров. Граница пересечения состоит из частей границы каждого контура,
+    лежащих внутри другого, поэтому площадь вычисляется по формуле Гаусса (теореме Грина) по этим частям без
+    построения самого пересечения. Контуры должны быть ориентированы одинаково (см. ContourSpool)
+    :param rings: list - кольца первого контура из точек (x, y)
+    :param other: list - кольца второго контура
+    :return: float
+    """
+    edges, other_edges = ring_edges(rings), ring_edges(other)
+    return _intersection_area(edges, _edges_bbox(edges), other_edges, _edges_bbox(other_edges))
+
+
+def _point_segment_distance2(x: float, y: float, x1: float, y1: float, x2: float, y2: float) -> float:
+    dx, dy = x2 - x1, y2 - y1
+    length2 = dx * dx + dy * dy
+    t = 0.0 if length2 == 0 else max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / length2))
+    ex, ey = x1 + t * dx - x, y1 + t * dy - y
+    return ex * ex + ey * ey
+
+
+def _boundary_distance(edges: List[Edge], bbox: Rect, other: List[Edge], other_bbox: Rect, limit: float) -> float:
+    def near(source: List[Edge], rect: Rect) -> List[Edge]:
+        minx, miny, maxx, maxy = rect[0] - limit, rect[1] - limit, rect[2] + limit, rect[3] + limit
+        return [edge for edge in source if edge[6] >= minx and edge[4] <= maxx and edge[7] >= miny and edge[5] <= maxy]
+
+    best = limit * limit
+    other_edges = near(other, bbox)
+    for x1, y1, x2, y2, minx, miny, maxx, maxy in near(edges, other_bbox):
+        minx, miny, maxx, maxy = minx - limit, miny - limit, maxx + limit, maxy + limit
+        for x3, y3, x4, y4, other_minx, other_miny, other_maxx, other_maxy in other_edges:
+            if other_maxx < minx or other_minx > maxx or other_maxy < miny or other_miny > maxy:
+                continue
+            d1 = (x2 - x1) * (y3 - y1) - (y2 - y1) * (x3 - x1)
+            d2 = (x2 - x1) * (y4 - y1) - (y2 - y1) * (x4 - x1)
+            d3 = (x4 - x3) * (y1 - y3) - (y4 - y3) * (x1 - x3)
+            d4 = (x4 - x3) * (y2 - y3) - (y4 - y3) * (x2 - x3)
+            if ((d1 > 0) != (d2 > 0)) and ((d3 > 0) != (d4 > 0)) and d1 and d2 and d3 and d4:
+                return 0.0  # рёбра пересекаются
+            best = min(best, _point_segment_distance2(x1, y1, x3, y3, x4, y4),
+                       _point_segment_distance2(x2, y2, x3, y3, x4, y4),
+                       _point_segment_distance2(x3, y3, x1, y1, x2, y2),
+                       _point_segment_distance2(x4, y4, x1, y1, x2, y2))
+            if best <= EPSILON * EPSILON:
+                return 0.0
+    return math.sqrt(best)
+
+
+def boundary_distance(rings: List[Ring], other: List[Ring], limit: float) -> float:
+    """
+    возвращает наименьшее расстояние между границами двух контуров (0 - границы касаются или пересекаются), если оно
+    меньше limit, иначе limit. Рассматриваются только рёбра, лежащие не дальше limit от охвата другого контура
+    :param rings: list
+    :param other: list
+    :param limit: float
+    :return: float
+    """
+    edges, other_edges = ring_edges(rings), ring_edges(other)
+    return _boundary_distance(edges, _edges_bbox(edges), other_edges, _edges_bbox(other_edges), limit)
+
+
+def find_problems(contours: ContourSet, gap_tolerance: float = 0.1, min_overlap: float = 0.01) \
+        -> Iterator[Tuple[int, int, str, float]]:
+    """
+    находит наложения и зазоры между контурами: для каждого контура по STR-дереву выбираются контуры, охваты которых
+    пересекаются с его охватом, расширенным на gap_tolerance, и для каждой такой пары один раз выполняется точная
+    проверка. Наложение - площадь пересечения больше min_overlap; зазор - контуры не пересекаются, а расстояние между
+    их границами больше EPSILON и меньше gap_tolerance (0 - зазоры не ищутся). Пары контуров с одинаковыми
+    кадастровым номером и обозначением (повторные выписки на один объект) не проверяются. Контуры перебираются
+    в порядке листьев дерева, поэтому рёбра соседних контуров, вычисленные для одной пары, используются и для
+    следующих
+    :param contours: ContourSet
+    :param gap_tolerance: float, м
+    :param min_overlap: float, кв. м
+    :return: iterator - номера контуров, вид нарушения ('overlap' или 'gap') и его величина
+    """
+    tree = STRtree(contours.bboxes)
+    cache: Dict[int, List[Edge]] = {}
+
+    def edges(index: int) -> List[Edge]:
+        result = cache.get(index)
+        if result is None:
+            if len(cache) >= EDGE_CACHE_SIZE:
+                cache.clear()
+            result = cache[index] = ring_edges(contours.rings(index))
+        return result
+
+    for i in tree.leaf_order():
+        bbox = contours.bbox(i)
+        minx, miny, maxx, maxy = bbox
+        for j in sorted(tree.query((minx - gap_tolerance, miny - gap_tolerance, maxx + gap_tolerance,
+                                    maxy + gap_tolerance))):
+            if j <= i or contours.names[j] == contours.names[i]:
+                continue
+            other_bbox = contours.bbox(j)
+            area = 0.0
+            # при касании охватов только по линии или в точке внутренние области контуров не пересекаются
+            if other_bbox[0] < maxx and other_bbox[2] > minx and other_bbox[1] < maxy and other_bbox[3] > miny:
+                area = _intersection_area(edges(i), bbox, edges(j), other_bbox)
+            if area > min_overlap:
+                yield i, j, 'overlap', area
+            elif gap_tolerance > 0 and area <= EPSILON:
+                distance = _boundary_distance(edges(i), bbox, edges(j), other_bbox, gap_tolerance)
+                if EPSILON < distance < gap_tolerance:
+                    yield i, j, 'gap', distance
+
+
+def write_topology_report(spool_path: str, report_path: str, gap_tolerance: float = 0.1,
+                          min_overlap: float = 0.01) -> int:
+    """
+    проверяет топологию контуров из временного файла (см. ContourSpool, find_problems) и записывает отчёт
+    в файл CSV (UTF-8, столбцы - TOPOLOGY_COLUMNS). Возвращает количество найденных нарушений
+    :param spool_path: str
+    :param report_path: str
+    :param gap_tolerance: float, м
+    :param min_overlap: float, кв. м
+    :return: int
+    """
+    contours = ContourSet(spool_path)
+    count = 0
+    with open(report_path + '.tmp', 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(TOPOLOGY_COLUMNS)
+        for i, j, problem, value in find_problems(contours, gap_tolerance, min_overlap):
+            writer.writerow([*contours.names[i], *contours.names[j], problem, round(value, 4)])
+            count += 1
+    os.replace(report_path + '.tmp', report_path)
+    return count
@@ -0,0 +1,136 @@
+from typing import Dict, List, Tuple, Optional, Sequence, Any
+import os
+import math
+import time
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# Преобразование координат контуров из местной системы координат (МСК) выписок в систему координат выходных файлов.
+# В выписках X - северная координата, Y - восточная; в выходные файлы записываются точки [Y, X] (восточная
+# координата - первая, как принято в ГИС), перестановку можно отменить настройкой 'transform_swap_axes'. Затем
+# применяются аффинное преобразование ('transform_affine') и преобразование Гельмерта по 7 параметрам
+# ('transform_helmert'). Все этапы - аффинные преобразования плоскости, поэтому они объединяются в одну матрицу
+# и применяются к точкам объекта одним проходом. Контуры хранятся списками точек, и перенос их в массивы NumPy
+# и обратно обходится дороже самого вычисления, поэтому преобразование выполняется списковым включением.
+
+# угловая секунда, радиан
+ARC_SECOND = math.pi / 648000
+
+# начало текста WKT системы координат (WKT1 и WKT2)
+WKT_KEYWORDS = ('PROJCS', 'GEOGCS', 'GEOCCS', 'COMPD_CS', 'LOCAL_CS', 'PROJCRS', 'GEOGCRS', 'GEODCRS', 'BOUNDCRS',
+                'COMPOUNDCRS', 'ENGCRS', 'ENGINEERINGCRS')
+
+# матрица аффинного преобразования (a, b, c, d, e, f): x' = a * x + b * y + c, y' = d * x + e * y + f
+Matrix = Tuple[float, float, float, float, float, float]
+
+IDENTITY = (1.0, 0.0, 0.0, 0.0, 1.0, 0.0)
+SWAP_AXES = (0.0, 1.0, 0.0, 1.0, 0.0, 0.0)
+
+
+def compose(first: Matrix, second: Matrix) -> Matrix:
+    """
+    возвращает матрицу преобразования, равносильного последовательному применению first, затем second
+    :param first: tuple (a, b, c, d, e, f)
+    :param second: tuple (a, b, c, d, e, f)
+    :return: tuple
+    """
+    a1, b1, c1, d1, e1, f1 = first
+    a2, b2, c2, d2, e2, f2 = second
+    return (a2 * a1 + b2 * d1, a2 * b1 + b2 * e1, a2 * c1 + b2 * f1 + c2,
+            d2 * a1 + e2 * d1, d2 * b1 + e2 * e1, d2 * c1 + e2 * f1 + f2)
+
+
+def helmert_matrix(parameters: Sequence[float]) -> Matrix:
+    """
+    возвращает матрицу преобразования Гельмерта по 7 параметрам для точек плоскости (z = 0, z' не используется).
+    Формула ГОСТ 32453-2017 (поворот системы координат): X' = (1 + m)(X + wz Y - wy Z) + dX,
+    Y' = (1 + m)(-wz X + Y + wx Z) + dY; параметры dZ, wx, wy влияют только на z' и принимаются для совместимости
+    с опубликованными наборами параметров
+    :param parameters: dX, dY, dZ (м), wx, wy, wz (угловые секунды), m (млн^-1)
+    :return: tuple (a, b, c, d, e, f)
+    """
+    dx, dy, _, _, _, wz, m = (float(value) for value in parameters)
+    scale = 1 + m * 1e-6
+    wz *= ARC_SECOND
+    return scale, scale * wz, dx, -scale * wz, scale, dy
+
+
+def read_prj(value: str) -> str:
+    """
+    возвращает текст WKT системы координат выходных файлов: value - сам текст WKT или путь к файлу .prj
+    :param value: str
+    :return: str
+    """
+    value = value.strip()
+    if value.upper().startswith(WKT_KEYWORDS):
+        return value
+    if not os.path.isfile(value):
+        raise ValueError('Система координат выходных файлов должна быть задана текстом WKT или путём к файлу .prj: ' +
+                         value[:100])
+    with open(value, encoding='utf-8-sig') as f:
+        wkt = f.read().strip()
+    if not wkt.upper().startswith(WKT_KEYWORDS):
+        raise ValueError('Файл ' + value + ' не содержит описания системы координат в формате WKT')
+    return wkt
+
+
+class CoordinateTransformer:
+    """
+    Этап преобразования координат объектов перед записью в выходные файлы (см. описание модуля). Вызывается для
+    словаря контуров объекта (см. AbstractRealEstateObject.geometry) и возвращает новый словарь, исходные списки
+    не изменяются. Если преобразование меняет ориентацию плоскости (например, перестановка осей), порядок точек
+    колец обращается, чтобы внешние кольца остались направленными по часовой стрелке, а отверстия - против (как
+    требует формат шейп-файла). В stats накапливаются количество объектов, точек и время преобразования
+    """
+    def __init__(self, swap_axes: bool = False, affine: Optional[Sequence[float]] = None,
+                 helmert: Optional[Sequence[float]] = None) -> None:
+        matrix = IDENTITY
+        if swap_axes:
+            matrix = compose(matrix, SWAP_AXES)
+        if affine:
+            if len(affine) != 6:
+                raise ValueError('Аффинное преобразование координат задаётся шестью числами: a, b, c, d, e, f')
+            matrix = compose(matrix, tuple(float(value) for value in affine))
+        if helmert:
+            if len(helmert) != 7:
+                raise ValueError('Преобразование Гельмерта задаётся семью параметрами: dX, dY, dZ, wx, wy, wz, m')
+            matrix = compose(matrix, helmert_matrix(helmert))
+        a, b, _, d, e, _ = matrix
+        if a * e - b * d == 0:
+            raise ValueError('Преобразование координат вырождено (определитель матрицы равен 0)')
+        self.matrix = matrix
+        self.active = bool(swap_axes or affine or helmert)
+        self.reverse_rings = a * e - b * d < 0
+        self.stats = {'objects': 0, 'points': 0, 'seconds': 0.0}
+
+    def transform_ring(self, ring: List[List[float]]) -> List[List[float]]:
+        """
+        преобразует точки кольца
+        :param ring: list - точки [x, y]
+        :return: list
+        """
+        a, b, c, d, e, f = self.matrix
+        result = [[a * x + b * y + c, d * x + e * y + f] for x, y in ring]
+        if self.reverse_rings:
+            result.reverse()
+        return result
+
+    def __call__(self, geometry: Dict[Any, List[List[List[float]]]]) -> Dict[Any, List[List[List[float]]]]:
+        """
+        преобразует все контуры объекта недвижимости
+        :param geometry: dict
+        :return: dict
+        """
+        start = time.perf_counter()
+        result = {key: [self.transform_ring(ring) for ring in polys] for key, polys in geometry.items()}
+        self.stats['objects'] += 1
+        self.stats['points'] += sum(len(ring) for polys in geometry.values() for ring in polys)
+        self.stats['seconds'] += time.perf_counter() - start
+        return result
@@ -0,0 +1,228 @@
+from typing import Dict, List, Tuple, Optional, Iterable, Union
+import os
+import re
+import mmap
+from functools import lru_cache
+from xml.parsers import expat
+from real_estate import NS_KVZU, NS_KPZU, NS_KVOKS, NS_KPOKS
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# Предварительная проверка выписок: файл просматривается без построения дерева документа, проверяется,
+# что xml-файл не повреждён, что по корневому элементу и разделам выписки определяется класс, которым она
+# разбирается (см. AbstractRealEstateObject.create_a_real_estate_object), и что в выписке есть разделы, к которым
+# класс обращается без проверки их наличия при извлечении выбранных полей. Без таких разделов разбор выписки
+# завершается ошибкой (AttributeError, TypeError) уже после разбора всего файла.
+
+# классы выписок в порядке их выбора в create_a_real_estate_object и путь раздела, по наличию которого класс выбирается
+SCHEMAS = (('ParcelKVZU', NS_KVZU, 'Parcels/Parcel'), ('ParcelKPZU', NS_KPZU, 'Parcel'),
+           ('ParcelEGRN', '', 'land_record'), ('BuildingEGRN', '', 'build_record'),
+           ('ObjectOfCapitalConstructionKVOKS', NS_KVOKS, 'Realty'),
+           ('ObjectOfCapitalConstructionKPOKS', NS_KPOKS, 'Realty'))
+
+# обязательные разделы: поле объекта, раздел-условие (проверка выполняется, если он есть в выписке; '' - всегда),
+# обязательный раздел, признак того, что у элемента должен быть текст (значения полей, из которых удаляются лишние
+# символы, см. real_estate.CLEANED_FIELDS, не могут быть пустыми). Пути - относительно корневого элемента
+_FOOT_CONTENT = [('extract_date', 'ReestrExtract/ExtractObjectRight',
+                  'ReestrExtract/ExtractObjectRight/FootContent/ExtractDate', False)]
+
+
+def _egrn_rules(record: str) -> List[Tuple[str, str, str, bool]]:
+    return [('parent_cad_number', '', record + '/object/common_data/cad_number', False),
+            ('date_of_cadastral_reg', '', record + '/record_info/registration_date', True),
+            ('extract_date', 'details_statement', 'details_statement/group_top_requisites/date_formation', True),
+            ('status', '', 'status', True),
+            ('address', record + '/address_location', record + '/address_location/address', False),
+            ('address', record + '/address_location/address/readable_address',
+             record + '/address_location/address/readable_address', True),
+            ('special_notes', record + '/special_notes', record + '/special_notes', True),
+            ('cadastral_cost', record + '/cost', record + '/cost/value', False)]
+
+
+RULES = {'ParcelKVZU': [('area', '', 'Parcels/Parcel/Area/Area', False),
+                        ('permitted_use_by_doc', '', 'Parcels/Parcel/Utilization', False),
+                        ('special_notes', 'Parcels/Parcel/SpecialNote', 'Parcels/Parcel/SpecialNote', True)] +
+                       _FOOT_CONTENT,
+         'ParcelKPZU': [('area', '', 'Parcel/Area/Area', False),
+                        ('permitted_use_by_doc', '', 'Parcel/Utilization', False),
+                        ('special_notes', 'Parcel/SpecialNote', 'Parcel/SpecialNote', True)] + _FOOT_CONTENT,
+         'ParcelEGRN': _egrn_rules('land_record') +
+                       [('area', '', 'land_record/params/area/value', False),
+                        ('category', '', 'land_record/params', False),
+                        ('category', 'land_record/params/category', 'land_record/params/category/type/code', True),
+                        ('permitted_use_by_doc', '', 'land_record/params', False),
+                        ('permitted_use_by_doc', 'land_record/params/permitted_use',
+                         'land_record/params/permitted_use/permitted_use_established', False),
+                        ('permitted_use_by_doc', 'land_record/params/permitted_use/permitted_use_established/'
+                         'by_document', 'land_record/params/permitted_use/permitted_use_established/by_document',
+                         True)],
+         'BuildingEGRN': _egrn_rules('build_record') + [('area', '', 'build_record/params/area', False)],
+         'ObjectOfCapitalConstructionKVOKS': _FOOT_CONTENT,
+         'ObjectOfCapitalConstructionKPOKS': _FOOT_CONTENT}
+
+# описания ошибок проверки (первое слово результата validate_extract)
+PROBLEMS = {'malformed': 'повреждённый или незавершённый xml-файл', 'unreadable': 'файл не читается',
+            'unknown_schema': 'неизвестная схема выписки', 'missing': 'нет раздела', 'no_text': 'пустой элемент'}
+
+
+def _path(path: str) -> Tuple[str, ...]:
+    return tuple(path.split('/')) if path else ()
+
+
+def _tracked_paths() -> Tuple[set, set]:
+    """
+    возвращает пути (без корневого элемента), которые отслеживаются при просмотре файла: разделы, по которым
+    выбирается класс, разделы из RULES и все их родительские разделы, и пути элементов, у которых проверяется
+    наличие текста
+    """
+    tracked, text_paths = set(), set()
+    for schema, _, detect in SCHEMAS:
+        for path in [_path(detect)] + [_path(path) for rule in RULES[schema] for path in rule[1:3]]:
+            tracked.update(path[:i] for i in range(1, len(path) + 1))
+        text_paths.update(_path(rule[2]) for rule in RULES[schema] if rule[3])
+    return tracked, text_paths
+
+
+_TRACKED, _TEXT_PATHS = _tracked_paths()
+
+_ATTRIBUTES = rb'((?:[^>"\']|"[^"]*"|\'[^\']*\')*)'
+# начальный тег корневого элемента (объявление xml, комментарии и инструкции обработки перед ним пропускаются)
+_ROOT = re.compile(rb'<([A-Za-z_][\w.:-]*)' + _ATTRIBUTES + rb'>')
+_XMLNS = re.compile(rb'xmlns(?::([\w.-]+))?\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+_TRACKED_TAGS = sorted({tag.encode('ascii') for path in _TRACKED for tag in path})
+
+
+@lru_cache(maxsize=None)
+def _tag_pattern(prefix: bytes) -> re.Pattern:
+    """
+    возвращает регулярное выражение начальных и конечных тегов элементов с именами из отслеживаемых путей (без
+    префикса или с префиксом prefix пространства имён корневого элемента). Проверка первой буквы имени перед
+    перечнем имён отсеивает большую часть тегов, например теги точек контуров
+    """
+    first_letters = b''.join(sorted({tag[:1] for tag in _TRACKED_TAGS}))
+    return re.compile(rb'<(/?)' + (rb'(?:' + re.escape(prefix) + rb':)?' if prefix else b'') +
+                      rb'(?=[' + first_letters + rb'])(' + b'|'.join(re.escape(tag) for tag in _TRACKED_TAGS) +
+                      rb')(?=[\s/>])' + _ATTRIBUTES + rb'>')
+
+
+def _scan_sections(data: Union[bytes, mmap.mmap]) -> Tuple[str, str, set, set]:
+    """
+    находит в содержимом файла тег корневого элемента, пространство имён выписки (пространство имён корневого
+    элемента) и отслеживаемые разделы: пути найденных разделов и пути элементов, у которых есть текст. Просматриваются
+    только теги с именами из отслеживаемых путей, вложенность разделов определяется по ним же. Разделы всех схем
+    выписок находятся в пространстве имён корневого элемента
+    """
+    root = _ROOT.search(data)
+    if root is None:
+        return '', '', set(), set()
+    prefix, _, local_name = root.group(1).decode('utf-8').rpartition(':')
+    namespaces = {(m.group(1) or b'').decode('utf-8'): (m.group(2) if m.group(2) is not None else m.group(3))
+                  .decode('utf-8') for m in _XMLNS.finditer(root.group(2))}
+    ns = '{' + namespaces[prefix] + '}' if namespaces.get(prefix) else ''
+    found, texts = set(), set()
+    stack = [()]  # пути открытых элементов
+    for m in _tag_pattern(prefix.encode('utf-8')).finditer(data, root.end()):
+        tag = m.group(2).decode('ascii')
+        if m.group(1):
+            for i in range(len(stack) - 1, 0, -1):
+                if stack[i][-1] == tag:
+                    del stack[i:]
+                    break
+            continue
+        path = stack[-1] + (tag,)
+        if path in _TRACKED:
+            found.add(path)
+            # текст есть, если за начальным тегом не следует другой тег (комментарий и CDATA считаются текстом)
+            following = data[m.end():m.end() + 2]
+            if path in _TEXT_PATHS and not m.group(3).endswith(b'/') and \
+                    (following[:1] != b'<' or following == b'<!'):
+                texts.add(path)
+        if not m.group(3).endswith(b'/'):
+            stack.append(path)
+    return ns + local_name, ns, found, texts
+
+
+def validate_extract(xml_file_path: str, fields: Optional[Iterable[str]] = None) -> Tuple[str, str, str, str]:
+    """
+    проверяет выписку. Возвращает имя класса, которым разбирается выписка ('' - если класс не определён), тег
+    корневого элемента ('' - если его не удалось найти), ошибку ('' - выписка прошла проверку; иначе ключ из PROBLEMS
+    и путь раздела через пробел) и текст ошибки для сообщения. Проверяются только разделы, нужные полям fields
+    (None - всем полям). Наличие раздела проверяется в любом из одноимённых родительских разделов, поэтому
+    выписка, которая успешно конвертируется, проверку проходит всегда.
+    Файл не разбирается в дерево: корректность xml проверяется парсером expat без обработчиков элементов, разделы
+    ищутся регулярным выражением по тегам отслеживаемых разделов, а файл отображается в память (mmap). Поэлементный
+    просмотр (ElementTree.iterparse) выполняет код Python для каждой точки контуров и оказывается медленнее
+    полного разбора выписки
+    :param xml_file_path: str
+    :param fields: list - поля объекта (см. real_estate.RECORD_FIELDS)
+    :return: tuple
+    """
+    root_tag, ns, found, texts = '', '', set(), set()
+    try:
+        with open(xml_file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    root_tag, ns, found, texts = _scan_sections(data)
+            expat.ParserCreate().ParseFile(f)
+    except expat.ExpatError as e:
+        return _schema_of(ns, found), root_tag, 'malformed', PROBLEMS['malformed'] + ': ' + str(e)
+    except OSError as e:
+        return '', root_tag, 'unreadable', PROBLEMS['unreadable'] + ': ' + str(e)
+    schema = _schema_of(ns, found)
+    if not schema:
+        return '', root_tag, 'unknown_schema', PROBLEMS['unknown_schema']
+    fields = set(fields) if fields is not None else None
+    for field, condition, required, need_text in RULES[schema]:
+        if fields is not None and field not in fields:
+            continue
+        if condition and _path(condition) not in found:
+            continue
+        if _path(required) not in found:
+            return schema, root_tag, 'missing ' + required, PROBLEMS['missing'] + ' ' + required + \
+                ' (поле ' + field + ')'
+        if need_text and _path(required) not in texts:
+            return schema, root_tag, 'no_text ' + required, PROBLEMS['no_text'] + ' ' + required + \
+                ' (поле ' + field + ')'
+    return schema, root_tag, '', ''
+
+
+def _schema_of(ns: str, found: set) -> str:
+    for schema, schema_ns, detect in SCHEMAS:
+        if schema_ns == ns and _path(detect) in found:
+            return schema
+    return ''
+
+
+def add_to_summary(summary: Dict[str, Dict[str, Dict[str, int]]], schema: str, root_tag: str, problem: str) -> None:
+    """
+    учитывает результат проверки выписки в сводке: количество выписок по классам ('schemas') и по тегам корневого
+    элемента ('roots') с разбивкой по ошибкам ('' - выписки без ошибок). Сводка - словарь, который сохраняется
+    в файле состояния конвертирования
+    """
+    for group, key in (('schemas', schema), ('roots', root_tag)):
+        counts = summary.setdefault(group, {}).setdefault(key, {})
+        counts[problem] = counts.get(problem, 0) + 1
+
+
+def format_summary(summary: Dict[str, Dict[str, Dict[str, int]]]) -> List[str]:
+    """
+    возвращает строки сводки проверки выписок для вывода в сообщениях: по классам выписок и по тегам корневого элемента
+    количество выписок и количество выписок с каждой ошибкой
+    """
+    lines = []
+    for group, title, unknown in (('schemas', 'по схемам выписок:', 'схема не определена'),
+                                  ('roots', 'по корневым элементам:', 'корневой элемент не прочитан')):
+        lines.append(title)
+        for key, counts in sorted(summary.get(group, {}).items()):
+            problems = [PROBLEMS[problem.split(' ', 1)[0]] + problem[len(problem.split(' ', 1)[0]):] + ' - ' +
+                        str(count) for problem, count in sorted(counts.items()) if problem]
+            lines.append('    ' + (key or unknown) + ': ' + str(sum(counts.values())) +
+                         (' (' + '; '.join(problems) + ')' if problems else ''))
+    return lines
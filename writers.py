@@ -0,0 +1,1186 @@
+from typing import Dict, List, Any, Tuple, Optional, Iterable
+import os
+import json
+import struct
+import datetime
+import re
+import sys
+import csv
+import gzip
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from real_estate import RECORD_FIELDS
+from shp_native import ShpWriter, flatten_polygon
+from qix import QIX_EXT, write_qix, read_shape_bboxes
+from fgb import POLYGON as FGB_POLYGON, FgbWriter, read_header, iter_features, decode_properties
+from pgdump import EWKB_SRID_FLAG, COPY_END, create_table_sql, copy_sql, index_sql, copy_escape, array_literal
+
+__author__ = "Dmitry S. Korottsev"
+__copyright__ = "Copyright 2023"
+__credits__ = []
+__license__ = "GPL v3"
+__version__ = "1.12"
+__maintainer__ = "Dmitry S. Korottsev"
+__email__ = "dm-korottev@yandex.ru"
+__status__ = "Development"
+
+# библиотеки pyshp (shapefile) и openpyxl импортируются внутри методов writer'ов: они загружаются долго и нужны, только
+# если выбран соответствующий выходной формат
+
+
+# структура атрибутивной таблицы (.dbf) шейп-файла: имя поля, тип, длина, количество знаков после запятой
+SHP_FIELDS = [('CadNumber', 'C', 20, 0),
+              ('SnglUseCN', 'C', 20, 0),
+              ('NumOfCont', 'C', 20, 0),
+              ('Area', 'N', 20, 2),
+              ('Note', 'C', 255, 0),
+              ('Parcel_St', 'C', 255, 0),
+              ('Category', 'C', 255, 0),
+              ('ByDoc', 'C', 255, 0),
+              ('Owner', 'C', 255, 0),
+              ('OwnRightN', 'C', 255, 0),
+              ('Encumbr', 'C', 255, 0),
+              ('EncRightN', 'C', 255, 0),
+              ('Special', 'C', 255, 0),
+              ('DatOfCreat', 'D', 8, 0),
+              ('DateOfGet', 'D', 8, 0),
+              ('EstateObjs', 'C', 255, 0),
+              ('CadastCost', 'C', 50, 0),
+              ('Type', 'C', 60, 0)]
+
+# поле записи об объекте недвижимости (см. AbstractRealEstateObject.get_record), из которого заполняется каждое поле
+# атрибутивной таблицы шейп-файла
+SHP_FIELD_SOURCES = {'CadNumber': 'parent_cad_number',
+                     'SnglUseCN': 'parent_cad_number',
+                     'NumOfCont': 'parent_cad_number',
+                     'Area': 'area',
+                     'Note': 'address',
+                     'Parcel_St': 'status',
+                     'Category': 'category',
+                     'ByDoc': 'permitted_use_by_doc',
+                     'Owner': 'owner',
+                     'OwnRightN': 'own_name_reg_numb_date',
+                     'Encumbr': 'encumbrances',
+                     'EncRightN': 'encumbrances_name_reg_numb_date_duration',
+                     'Special': 'special_notes',
+                     'DatOfCreat': 'date_of_cadastral_reg',
+                     'DateOfGet': 'extract_date',
+                     'EstateObjs': 'estate_objects',
+                     'CadastCost': 'cadastral_cost',
+                     'Type': 'type'}
+
+# заголовки, ширина столбцов таблицы xlsx и поля записи об объекте недвижимости, из которых они заполняются
+XLSX_COLUMNS = [('Кадастровый номер', 18, 'parent_cad_number'),
+                ('Кадастровый номер единого землепользования', 19, 'parent_cad_number'),
+                ('Площадь, м2', 10, 'area'),
+                ('Адрес', 35, 'address'),
+                ('Статус', 16, 'status'),
+                ('Категория земель', 23, 'category'),
+                ('Вид разрешенного использования (по документу)', 37, 'permitted_use_by_doc'),
+                ('Правообладатель', 37, 'owner'),
+                ('Вид права, номер и дата регистрации', 45, 'own_name_reg_numb_date'),
+                ('Ограничения прав и обременения', 45, 'encumbrances'),
+                ('Вид ограничения (обременения), номер и дата регистрации, срок действия', 45,
+                 'encumbrances_name_reg_numb_date_duration'),
+                ('Особые отметки', 45, 'special_notes'),
+                ('Дата постановки на кад. учёт', 14, 'date_of_cadastral_reg'),
+                ('Дата получения сведений', 14, 'extract_date'),
+                ('КН расположенных в пределах ЗУ или ОКС объектов недвижимости', 18, 'estate_objects'),
+                ('Кадастровая стоимость, руб.', 14, 'cadastral_cost'),
+                ('Вид объекта недвижимости', 20, 'type')]
+
+# названия полей, которые можно исключить из выходных файлов (кадастровый номер записывается всегда)
+FIELD_TITLES = {key: name for name, _, key in XLSX_COLUMNS[2:]}
+
+# предельное количество строк на листе Excel и название листа таблицы, если объекты не разделяются по видам
+EXCEL_MAX_ROWS = 1048576
+DEFAULT_SHEET_TITLE = 'Sheet'
+
+# способы записи шейп-файла: собственный модуль shp_native или библиотека pyshp (результат одинаков)
+SHP_BACKENDS = ('native', 'pyshp')
+
+# расширение файла индекса кадастровых номеров, который сохраняется рядом с шейп-файлом
+CAD_INDEX_EXT = '.cnx'
+
+# расширение файла описания системы координат шейп-файла (WKT)
+PRJ_EXT = '.prj'
+
+# поля записи об объекте недвижимости, которые записываются в файл Parquet числами и датами (в таблице xlsx
+# и шейп-файле площадь и кадастровая стоимость - строки)
+PARQUET_NUMERIC_FIELDS = ('area', 'cadastral_cost')
+PARQUET_DATE_FIELDS = ('date_of_cadastral_reg', 'extract_date')
+
+# количество строк в группе строк файла Parquet по умолчанию
+PARQUET_ROW_GROUP_ROWS = 50000
+
+# расширения построчных текстовых файлов; при сжатии (gzip) к расширению добавляется GZIP_EXT
+GEOJSONL_EXT = '.geojsonl'
+CSV_EXT = '.csv'
+GZIP_EXT = '.gz'
+
+# имя таблицы PostgreSQL в дампе для PostGIS по умолчанию
+PGDUMP_TABLE = 'real_estate_objects'
+
+# наибольший код системы координат, допустимый в PostGIS
+PGDUMP_MAX_SRID = 999999
+
+
+def select_fields(fields: Optional[Iterable[str]] = None) -> Tuple[str, ...]:
+    """
+    проверяет набор полей, выбранных для записи в выходные файлы, и возвращает его в порядке RECORD_FIELDS.
+    Кадастровый номер объекта недвижимости включается всегда; None - все поля
+    :param fields: iterable или None
+    :return: tuple
+    """
+    if fields is None:
+        return RECORD_FIELDS
+    unknown = set(fields) - set(RECORD_FIELDS)
+    if unknown:
+        raise ValueError('Неизвестные поля выходных файлов: ' + ', '.join(sorted(unknown)))
+    selected = set(fields) | {'parent_cad_number'}
+    return tuple(key for key in RECORD_FIELDS if key in selected)
+
+
+def date_from_string(date: str) -> datetime.date:
+    """
+    преобразует дату в формате "ДД.ММ.ГГГГ" в объект datetime.date (для пустой строки возвращает 01.01.0001)
+    :param date: str
+    :return: datetime.date
+    """
+    inverted_date = date.split(".")[::-1]
+    if inverted_date != ['']:
+        year, month, day = inverted_date
+    else:
+        year, month, day = 1, 1, 1
+    return datetime.date(int(year), int(month), int(day))
+
+
+def split_contour_key(key: str, parent_cad_number: str) -> Tuple[str, str, str]:
+    """
+    разбирает ключ словаря геометрии объекта недвижимости и возвращает кадастровый номер контура, кадастровый номер
+    единого землепользования (пустая строка, если контур принадлежит самому объекту) и номер контура
+    :param key: str
+    :param parent_cad_number: str
+    :return: tuple
+    """
+    if re.search(r'\(', key):
+        shp_cad_number = key[:key.index('(')]
+        num_of_cont = key[key.index('('):]
+    elif not re.search(":", key):
+        shp_cad_number = parent_cad_number
+        num_of_cont = key
+    else:
+        shp_cad_number = key
+        num_of_cont = ''
+    if parent_cad_number == shp_cad_number:
+        shp_parent_cad_number = ''
+    else:
+        shp_parent_cad_number = parent_cad_number
+    return shp_cad_number, shp_parent_cad_number, num_of_cont
+
+
+def get_xlsx_rows(record: Dict[str, Any], columns: Optional[List[Tuple[str, int, str]]] = None) -> List[List[Any]]:
+    """
+    возвращает строки таблицы xlsx для объекта недвижимости (для единого землепользования - по одной строке на каждый
+    входящий в его состав земельный участок)
+    :param record: dict
+    :param columns: list - выбранные столбцы таблицы (см. XLSX_COLUMNS), по умолчанию все
+    :return: list
+    """
+    values = [record[key] for _, _, key in (XLSX_COLUMNS if columns is None else columns)[2:]]
+    if not record['entry_parcels']:
+        return [[record['parent_cad_number'], '-'] + values]
+    return [[parcel_cad_number, record['parent_cad_number']] + values
+            for parcel_cad_number in record['entry_parcels']]
+
+
+def number_from_string(value: str) -> Optional[float]:
+    """
+    преобразует число из выписки в float (допускаются запятая в качестве десятичного разделителя и пробелы между
+    разрядами), для пустой строки возвращает None
+    :param value: str
+    :return: float или None
+    """
+    value = value.replace(' ', '').replace('\xa0', '').replace(',', '.')
+    return float(value) if value else None
+
+
+def geometry_to_wkb(geometry: Dict[str, List[List[float]]], srid: int = 0) -> Optional[bytes]:
+    """
+    кодирует все контуры объекта недвижимости в мультиполигон в формате WKB (незамкнутые контуры замыкаются), при
+    srid, отличном от 0, - в формате EWKB с кодом системы координат (PostGIS); для объекта без координат возвращает None
+    :param geometry: dict (см. AbstractRealEstateObject.geometry)
+    :param srid: int
+    :return: bytes или None
+    """
+    if not geometry:
+        return None
+    byte_order = 1 if sys.byteorder == 'little' else 0  # координаты записываются в порядке байтов компьютера
+    if srid:
+        parts = [struct.pack('=BIII', byte_order, 6 | EWKB_SRID_FLAG, srid, len(geometry))]
+    else:
+        parts = [struct.pack('=BII', byte_order, 6, len(geometry))]
+    for polys in geometry.values():
+        coords, starts = flatten_polygon(polys)
+        parts.append(struct.pack('=BII', byte_order, 3, len(starts)))
+        for start, end in zip(starts, starts[1:] + [len(coords) // 2]):
+            parts.append(struct.pack('=I', end - start))
+            parts.append(coords[2 * start:2 * end].tobytes())
+    return b''.join(parts)
+
+
+def geometry_to_geojson(geometry: Dict[str, List[List[float]]]) -> Optional[Dict[str, Any]]:
+    """
+    возвращает все контуры объекта недвижимости в виде геометрии GeoJSON типа MultiPolygon (незамкнутые контуры
+    замыкаются); для объекта без координат возвращает None
+    :param geometry: dict (см. AbstractRealEstateObject.geometry)
+    :return: dict или None
+    """
+    if not geometry:
+        return None
+    polygons = []
+    for polys in geometry.values():
+        coords, starts = flatten_polygon(polys)
+        polygons.append([[[coords[i], coords[i + 1]] for i in range(2 * start, 2 * end, 2)]
+                         for start, end in zip(starts, starts[1:] + [len(coords) // 2])])
+    return {'type': 'MultiPolygon', 'coordinates': polygons}
+
+
+def open_text_stream(path: str, compress: bool = False) -> Any:
+    """
+    открывает новый текстовый файл (UTF-8) для построчной записи, при compress=True - со сжатием gzip
+    :param path: str
+    :param compress: bool
+    :return: файловый объект
+    """
+    if compress:
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def append_stream_part(part_path: str, path: str) -> None:
+    """
+    дописывает файл part_path в конец файла path и удаляет его (сжатые файлы gzip при этом остаются корректными:
+    формат допускает несколько последовательно записанных частей)
+    :param part_path: str
+    :param path: str
+    """
+    with open(part_path, 'rb') as source, open(path, 'ab') as target:
+        shutil.copyfileobj(source, target)
+    os.remove(part_path)
+
+
+def append_shapefile(path: str, source_path: str) -> int:
+    """
+    дописывает объекты шейп-файла source_path в конец шейп-файла path с той же структурой атрибутивной таблицы:
+    переносит записи .shp с новой нумерацией, смещает ссылки в .shx, копирует записи .dbf и обновляет заголовки
+    всех трёх файлов. Возвращает количество дописанных объектов
+    :param path: str - путь к шейп-файлу без расширения
+    :param source_path: str - путь к дописываемому шейп-файлу без расширения
+    :return: int
+    """
+    initial_count = (os.path.getsize(path + '.shx') - 100) // 8
+    new_count = (os.path.getsize(source_path + '.shx') - 100) // 8
+    if not new_count:
+        return 0
+    # атрибутивные таблицы должны иметь одинаковые поля (имя, тип, длина, точность): записи .dbf копируются
+    # без преобразования
+    fields = []
+    for dbf_path in (path + '.dbf', source_path + '.dbf'):
+        with open(dbf_path, 'rb') as dbf:
+            header_length = struct.unpack('<H', dbf.read(32)[8:10])[0]
+            descriptors = dbf.read(header_length - 32)
+        fields.append([descriptors[i:i + 12] + descriptors[i + 16:i + 18]
+                       for i in range(0, len(descriptors) - 31, 32)])
+    if fields[0] != fields[1]:
+        raise ValueError('Структура шейп-файла ' + source_path + '.shp не совпадает со структурой шейп-файла ' +
+                         path + '.shp')
+    with open(path + '.shp', 'r+b') as shp, open(source_path + '.shp', 'rb') as src:
+        header = bytearray(shp.read(100))
+        src_header = src.read(100)
+        shp.seek(0, 2)
+        offset_shift = (shp.tell() - 100) // 2  # смещение новых записей в 16-битных словах
+        rec_num = initial_count
+        for _ in range(new_count):
+            _, content_length = struct.unpack('>2i', src.read(8))
+            rec_num += 1
+            shp.write(struct.pack('>2i', rec_num, content_length))
+            shp.write(src.read(2 * content_length))
+        header[24:28] = struct.pack('>i', shp.tell() // 2)
+        new_bbox = struct.unpack('<4d', src_header[36:68])
+        if initial_count:
+            old_bbox = struct.unpack('<4d', header[36:68])
+            new_bbox = (min(old_bbox[0], new_bbox[0]), min(old_bbox[1], new_bbox[1]),
+                        max(old_bbox[2], new_bbox[2]), max(old_bbox[3], new_bbox[3]))
+        header[36:68] = struct.pack('<4d', *new_bbox)
+        shp.seek(0)
+        shp.write(header)
+    with open(path + '.shx', 'r+b') as shx, open(source_path + '.shx', 'rb') as src:
+        header = bytearray(shx.read(100))
+        src.seek(100)
+        shx.seek(0, 2)
+        shx.write(b''.join(struct.pack('>2i', offset + offset_shift, content_length)
+                           for offset, content_length in struct.iter_unpack('>2i', src.read())))
+        header[24:28] = struct.pack('>i', shx.tell() // 2)
+        header[36:68] = struct.pack('<4d', *new_bbox)
+        shx.seek(0)
+        shx.write(header)
+    with open(path + '.dbf', 'r+b') as dbf, open(source_path + '.dbf', 'rb') as src:
+        header = bytearray(dbf.read(32))
+        num_records, header_length, record_length = struct.unpack('<IHH', header[4:12])
+        src_header_length = struct.unpack('<H', src.read(32)[8:10])[0]
+        src.seek(src_header_length)
+        dbf.seek(header_length + num_records * record_length)
+        remaining = new_count * record_length
+        while remaining > 0:
+            chunk = src.read(min(remaining, 1 << 20))
+            dbf.write(chunk)
+            remaining -= len(chunk)
+        dbf.write(b'\x1a')
+        dbf.truncate()
+        today = datetime.date.today()
+        header[1:4] = bytes([today.year - 1900, today.month, today.day])
+        header[4:8] = struct.pack('<I', num_records + new_count)
+        dbf.seek(0)
+        dbf.write(header)
+    return new_count
+
+
+class ShapeWriter:
+    """
+    Записывает объекты недвижимости в полигональный шейп-файл (кодировка Windows-1251).
+    В режиме добавления (append=True) новые объекты дописываются в конец существующего шейп-файла, ранее созданного
+    программой, без перезаписи уже имеющихся в нём объектов. Если при этом указан replace_existing=True, объекты
+    с совпадающим кадастровым номером помечаются удалёнными. Поиск таких объектов выполняется по индексу кадастровых
+    номеров (файл .cnx рядом с шейп-файлом), а не полным перебором атрибутивной таблицы.
+    fields - набор полей записи об объекте недвижимости, которые записываются в атрибутивную таблицу (см. select_fields);
+    поля шейп-файла, заполняемые из невыбранных полей, не создаются.
+    backend - способ записи (см. SHP_BACKENDS): 'native' - shp_native.ShpWriter, атрибуты объекта кодируются один раз
+    для всех его контуров; 'pyshp' - shapefile.Writer.
+    При spatial_index=True при закрытии рядом с шейп-файлом создаётся пространственный индекс .qix (см. qix.py),
+    иначе устаревший индекс, если он есть, удаляется.
+    prj_wkt - система координат в формате WKT, при закрытии записывается рядом с шейп-файлом в файл .prj.
+    existing_records - количество первых записей шейп-файла, которые могут быть заменены (например, записей, которые
+    были в нём до начала конвертирования, продолжающего запись после сохранения состояния); None - все записи,
+    имеющиеся при открытии.
+    """
+    def __init__(self, path: str, append: bool = False, replace_existing: bool = False,
+                 fields: Optional[Iterable[str]] = None, backend: str = 'native', spatial_index: bool = False,
+                 prj_wkt: Optional[str] = None, existing_records: Optional[int] = None) -> None:
+        if backend not in SHP_BACKENDS:
+            raise ValueError('Неизвестный способ записи шейп-файла: ' + str(backend))
+        self.path = os.path.splitext(path)[0]
+        self.record_fields = select_fields(fields)  # поля записи, которые нужны для заполнения шейп-файла
+        self.fields = [field for field in SHP_FIELDS if SHP_FIELD_SOURCES[field[0]] in self.record_fields]
+        self._append = append
+        self._replace_existing = replace_existing
+        self._index: Dict[str, List[int]] = {}  # КН объекта недвижимости -> номера записей в шейп-файле
+        self._replaced = set()
+        self._deleted = []
+        self._initial_count = 0
+        self._native = backend == 'native'
+        self._spatial_index = spatial_index
+        self._prj_wkt = prj_wkt
+        if append:
+            self._validate_existing()
+            self._initial_count = self._count_existing()
+            self._index = self._load_index()
+            self._tmp_path = self.path + '_append_tmp'
+        self.existing_records = self._initial_count if existing_records is None else existing_records
+        target = self._tmp_path if append else self.path
+        if self._native:
+            self._writer = ShpWriter(target, self.fields, encoding="cp1251", collect_bboxes=spatial_index)
+        else:
+            import shapefile
+            self._writer = shapefile.Writer(target, shapeType=shapefile.POLYGON, encoding="cp1251")
+            for name, field_type, size, decimal in self.fields:
+                self._writer.field(name, field_type, size, decimal)
+        self._count = self._initial_count
+
+    def _validate_existing(self) -> None:
+        """
+        проверяет, что существующий шейп-файл имеет ту же структуру атрибутивной таблицы, что и формируемый программой
+        при выбранном наборе полей
+        """
+        if not os.path.exists(self.path + '.shp'):
+            raise ValueError('Не найден шейп-файл для добавления объектов: ' + self.path + '.shp')
+        import shapefile
+        with shapefile.Reader(self.path, encoding="cp1251") as reader:
+            fields = [tuple(field) for field in reader.fields[1:]]
+            shape_type = reader.shapeType
+        if shape_type != shapefile.POLYGON or fields != self.fields:
+            raise ValueError('Структура шейп-файла ' + self.path + '.shp не совпадает со структурой, '
+                             'формируемой программой')
+
+    def _count_existing(self) -> int:
+        """
+        возвращает количество записей в существующем шейп-файле (по размеру индексного файла .shx)
+        :return: int
+        """
+        return (os.path.getsize(self.path + '.shx') - 100) // 8
+
+    def _load_index(self) -> Dict[str, List[int]]:
+        """
+        загружает индекс кадастровых номеров существующего шейп-файла. Если файл индекса отсутствует или не
+        соответствует шейп-файлу, индекс строится заново по полям CadNumber и SnglUseCN атрибутивной таблицы
+        :return: dict
+        """
+        index_path = self.path + CAD_INDEX_EXT
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get('records') == self._initial_count:
+                return saved['index']
+        import shapefile
+        index = {}
+        with shapefile.Reader(self.path, encoding="cp1251") as reader:
+            for rec in reader.iterRecords(fields=['CadNumber', 'SnglUseCN']):
+                index.setdefault(rec['SnglUseCN'] or rec['CadNumber'], []).append(rec.oid)
+        return index
+
+    def _save_index(self) -> None:
+        with open(self.path + CAD_INDEX_EXT, 'w', encoding='utf-8') as f:
+            json.dump({'records': self._count, 'index': self._index}, f, ensure_ascii=False)
+
+    def write(self, record: Dict[str, Any], geometry: Dict[str, List[List[float]]]) -> None:
+        """
+        записывает в шейп-файл все контуры объекта недвижимости с его атрибутивными данными
+        :param record: dict (см. AbstractRealEstateObject.get_record)
+        :param geometry: dict (см. AbstractRealEstateObject.geometry)
+        """
+        parent_cad_number = record['parent_cad_number']
+        # значения преобразуются до каких-либо изменений, чтобы ошибка в данных не оставила объект записанным частично
+        attributes = []
+        for name, field_type, _, _ in self.fields[3:]:
+            value = record[SHP_FIELD_SOURCES[name]]
+            if field_type == 'N':
+                value = float(value)
+            elif field_type == 'D':
+                value = date_from_string(value)
+            attributes.append(value)
+        if self._native:
+            # общие атрибуты кодируются один раз для всех контуров объекта
+            encoded_attributes = self._writer.encode_record(attributes, start=3)
+            shapes = [(*flatten_polygon(value),
+                       self._writer.encode_record(split_contour_key(key, parent_cad_number)) + encoded_attributes)
+                      for key, value in geometry.items()]
+        if self._replace_existing and parent_cad_number not in self._replaced:
+            self._replaced.add(parent_cad_number)
+            old_records = self._index.pop(parent_cad_number, [])
+            self._deleted.extend(i for i in old_records if i < self.existing_records)
+            kept_records = [i for i in old_records if i >= self.existing_records]
+            if kept_records:
+                self._index[parent_cad_number] = kept_records
+        for i, (key, value) in enumerate(geometry.items()):
+            if self._native:
+                self._writer.write(*shapes[i])
+            else:
+                self._writer.poly(value)
+                self._writer.record(*split_contour_key(key, parent_cad_number), *attributes)
+            self._index.setdefault(parent_cad_number, []).append(self._count)
+            self._count += 1
+
+    def close(self) -> None:
+        self._writer.close()
+        if self._append:
+            self._merge_appended()
+            self._mark_deleted()
+        self._save_index()
+        if self._spatial_index:
+            self._write_spatial_index()
+        elif os.path.exists(self.path + QIX_EXT):
+            os.remove(self.path + QIX_EXT)  # индекс не соответствует изменённому шейп-файлу
+        if self._prj_wkt:
+            with open(self.path + PRJ_EXT, 'w', encoding='utf-8') as f:
+                f.write(self._prj_wkt)
+
+    def _write_spatial_index(self) -> None:
+        """
+        создаёт пространственный индекс шейп-файла. Охваты объектов, записанных shp_native, собраны при записи; охваты
+        объектов, ранее записанных в шейп-файл (режим добавления), и объектов, записанных через pyshp, читаются
+        из заголовков записей .shp без чтения координат. Заменённые (удалённые) объекты в индекс не включаются
+        """
+        if self._native:
+            bboxes, skip = read_shape_bboxes(self.path + '.shp', self._initial_count)
+            bboxes.extend(self._writer.bboxes)
+        else:
+            bboxes, skip = read_shape_bboxes(self.path + '.shp')
+        write_qix(self.path + QIX_EXT, bboxes, self._count, skip + self._deleted)
+
+    def _merge_appended(self) -> None:
+        """
+        дописывает объекты из временного шейп-файла в конец существующего (см. append_shapefile)
+        """
+        append_shapefile(self.path, self._tmp_path)
+        for ext in ('.shp', '.shx', '.dbf'):
+            os.remove(self._tmp_path + ext)
+
+    def _mark_deleted(self) -> None:
+        """
+        помечает заменённые записи удалёнными: в .dbf устанавливает признак удаления записи, в .shp заменяет тип
+        геометрии на пустой (Null Shape), чтобы контур не отображался в ГИС, не учитывающих признак удаления
+        """
+        if not self._deleted:
+            return
+        import shapefile
+        with open(self.path + '.dbf', 'r+b') as dbf, open(self.path + '.shx', 'rb') as shx, \
+                open(self.path + '.shp', 'r+b') as shp:
+            header_length, record_length = struct.unpack('<HH', dbf.read(12)[8:12])
+            for i in sorted(self._deleted):
+                dbf.seek(header_length + i * record_length)
+                dbf.write(b'*')
+                shx.seek(100 + 8 * i)
+                offset = struct.unpack('>i', shx.read(4))[0]
+                shp.seek(2 * offset + 8)
+                shp.write(struct.pack('<i', shapefile.NULL))
+
+
+class FlatGeobufWriter:
+    """
+    Записывает объекты недвижимости в файл FlatGeobuf (см. fgb.py) с теми же атрибутами, что и шейп-файл: каждый
+    контур - отдельный объект слоя. Строки хранятся в UTF-8 без обрезки по длине поля, пустые даты - пустыми
+    значениями. При закрытии объекты упорядочиваются вдоль кривой Гильберта и индексируются упакованным R-деревом,
+    поэтому дописать объекты в готовый файл можно только перезаписав его: в режиме добавления (append=True) объекты
+    существующего файла переносятся в новый и сортируются вместе с новыми объектами; если при этом указан
+    replace_existing=True, объекты существующего файла с совпадающим кадастровым номером не переносятся.
+    fields - набор полей записи об объекте недвижимости (см. select_fields); sort_memory_mb - объём объектов,
+    сортируемых в памяти, при его превышении применяется внешняя сортировка (см. fgb.FgbWriter); crs_wkt - система
+    координат в формате WKT для заголовка файла
+    """
+    def __init__(self, path: str, append: bool = False, replace_existing: bool = False,
+                 fields: Optional[Iterable[str]] = None, sort_memory_mb: float = 256,
+                 crs_wkt: Optional[str] = None) -> None:
+        self.path = path
+        self.record_fields = select_fields(fields)
+        self.fields = [field for field in SHP_FIELDS if SHP_FIELD_SOURCES[field[0]] in self.record_fields]
+        self._append = append
+        self._replace_existing = replace_existing
+        self._replaced = set()
+        self._writer = FgbWriter(path, self.fields, sort_memory_mb, crs_wkt=crs_wkt)
+        if append:
+            self._validate_existing()
+
+    def _validate_existing(self) -> None:
+        """
+        проверяет, что существующий файл содержит полигоны с теми же атрибутами, что и формируемый программой
+        при выбранном наборе полей
+        """
+        if not os.path.exists(self.path):
+            raise ValueError('Не найден файл FlatGeobuf для добавления объектов: ' + self.path)
+        with open(self.path, 'rb') as f:
+            header = read_header(f)
+        if header['geometry_type'] != FGB_POLYGON or header['columns'] != self._writer.columns:
+            raise ValueError('Структура файла ' + self.path + ' не совпадает со структурой, формируемой программой')
+
+    def write(self, record: Dict[str, Any], geometry: Dict[str, List[List[float]]]) -> None:
+        """
+        записывает все контуры объекта недвижимости с его атрибутивными данными
+        :param record: dict (см. AbstractRealEstateObject.get_record)
+        :param geometry: dict (см. AbstractRealEstateObject.geometry)
+        """
+        parent_cad_number = record['parent_cad_number']
+        # значения преобразуются до каких-либо изменений, чтобы ошибка в данных не оставила объект записанным частично
+        attributes = []
+        for name, field_type, _, _ in self.fields[3:]:
+            value = record[SHP_FIELD_SOURCES[name]]
+            if field_type == 'N':
+                value = float(value)
+            elif field_type == 'D':
+                value = date_from_string(value) if value else None
+            attributes.append(value)
+        encoded_attributes = self._writer.encode_record(attributes, start=3)
+        shapes = [(*flatten_polygon(value),
+                   self._writer.encode_record(split_contour_key(key, parent_cad_number)) + encoded_attributes)
+                  for key, value in geometry.items()]
+        if self._replace_existing:
+            self._replaced.add(parent_cad_number)
+        for shape in shapes:
+            self._writer.write(*shape)
+
+    def append_file(self, path: str) -> None:
+        """
+        дописывает объекты файла FlatGeobuf path с той же структурой (например, файла части результата, записанного
+        после сохранения состояния конвертирования, см. Converter._combine_parts)
+        :param path: str
+        """
+        with open(path, 'rb') as f:
+            header = read_header(f)
+        if header['geometry_type'] != FGB_POLYGON or header['columns'] != self._writer.columns:
+            raise ValueError('Структура файла ' + path + ' не совпадает со структурой, формируемой программой')
+        for bbox, feature in iter_features(path):
+            self._writer.write_feature(bbox, feature)
+
+    def close(self) -> None:
+        if self._append:
+            for bbox, feature in iter_features(self.path):
+                if self._replaced:
+                    values = decode_properties(feature, self._writer.columns)
+                    if (values.get('SnglUseCN') or values.get('CadNumber')) in self._replaced:
+                        continue
+                self._writer.write_feature(bbox, feature)
+        self._writer.close()
+
+
+class ParquetWriter:
+    """
+    Записывает объекты недвижимости в файл Apache Parquet для анализа данных (pandas, DuckDB, QGIS): одна строка на
+    объект, столбцы - выбранные поля записи (см. select_fields) с типами данных: площадь и кадастровая стоимость -
+    числа, даты - даты, состав единого землепользования - список кадастровых номеров, остальные поля - строки.
+    При geometry=True добавляется столбец geometry с контурами объекта в формате WKB (мультиполигон) и метаданные
+    GeoParquet (система координат не указывается - координаты записываются в системе координат выписки).
+    Строки накапливаются в памяти и записываются группами по row_group_rows строк, поэтому объём памяти не зависит
+    от количества объектов. Файл записывается под временным именем и заменяет path при закрытии.
+    Дописать строки в файл Parquet нельзя, поэтому в режиме добавления (append=True) группы строк существующего файла
+    переносятся в новый файл перед новыми строками; если при этом указан replace_existing=True, при закрытии
+    из перенесённых строк удаляются строки объектов с совпадающим кадастровым номером.
+    Для записи используется библиотека pyarrow, она не входит в обязательные зависимости программы.
+    """
+    def __init__(self, path: str, append: bool = False, replace_existing: bool = False,
+                 fields: Optional[Iterable[str]] = None, geometry: bool = True,
+                 row_group_rows: int = PARQUET_ROW_GROUP_ROWS) -> None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError('Для записи файла Parquet необходима библиотека pyarrow (pip install pyarrow)')
+        if int(row_group_rows) < 1:
+            raise ValueError('Количество строк в группе строк файла Parquet должно быть больше 0')
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.path = path
+        self.record_fields = select_fields(fields)
+        self._geometry = geometry
+        self._row_group_rows = int(row_group_rows)
+        self._replace_existing = replace_existing
+        self._replaced = set()
+        self._initial_groups = 0
+        self._tmp_path = path + '.tmp'
+        self.schema = self._schema()
+        self._columns = {name: [] for name in self.schema.names}
+        self._writer = self._pq.ParquetWriter(self._tmp_path, self.schema)
+        if append:
+            self._copy_existing()
+
+    def _schema(self):
+        """
+        возвращает схему таблицы (pyarrow.Schema) для выбранного набора полей
+        """
+        pa = self._pa
+        fields = []
+        for key in self.record_fields:
+            if key in PARQUET_NUMERIC_FIELDS:
+                fields.append(pa.field(key, pa.float64()))
+            elif key in PARQUET_DATE_FIELDS:
+                fields.append(pa.field(key, pa.date32()))
+            elif key == 'entry_parcels':
+                fields.append(pa.field(key, pa.list_(pa.string())))
+            else:
+                fields.append(pa.field(key, pa.string()))
+        if not self._geometry:
+            return pa.schema(fields)
+        fields.append(pa.field('geometry', pa.binary()))
+        geo = {'version': '1.0.0', 'primary_column': 'geometry',
+               'columns': {'geometry': {'encoding': 'WKB', 'geometry_types': ['MultiPolygon'], 'crs': None}}}
+        return pa.schema(fields, metadata={'geo': json.dumps(geo)})
+
+    def _copy_existing(self) -> None:
+        """
+        переносит группы строк существующего файла в новый файл, предварительно проверив, что столбцы совпадают
+        со столбцами, формируемыми программой при выбранном наборе полей
+        """
+        if not os.path.exists(self.path):
+            self._writer.close()
+            os.remove(self._tmp_path)
+            raise ValueError('Не найден файл Parquet для добавления объектов: ' + self.path)
+        with open(self.path, 'rb') as f:
+            existing = self._pq.ParquetFile(f)
+            if not existing.schema_arrow.equals(self.schema):
+                self._writer.close()
+                os.remove(self._tmp_path)
+                raise ValueError('Структура файла ' + self.path + ' не совпадает со структурой, формируемой '
+                                 'программой')
+            for i in range(existing.num_row_groups):
+                self._writer.write_table(existing.read_row_group(i))
+            self._initial_groups = existing.num_row_groups
+
+    def write(self, record: Dict[str, Any], geometry: Dict[str, List[List[float]]]) -> None:
+        """
+        записывает строку с данными объекта недвижимости
+        :param record: dict (см. AbstractRealEstateObject.get_record)
+        :param geometry: dict (см. AbstractRealEstateObject.geometry), пустой словарь - объект без координат
+        """
+        # значения преобразуются до каких-либо изменений, чтобы ошибка в данных не оставила объект записанным частично
+        values = []
+        for key in self.record_fields:
+            value = record[key]
+            if key in PARQUET_NUMERIC_FIELDS:
+                value = number_from_string(value)
+            elif key in PARQUET_DATE_FIELDS:
+                value = date_from_string(value) if value else None
+            elif key == 'entry_parcels':
+                value = list(value)
+            values.append(value)
+        if self._geometry:
+            values.append(geometry_to_wkb(geometry))
+        if self._replace_existing:
+            self._replaced.add(record['parent_cad_number'])
+        for column, value in zip(self._columns.values(), values):
+            column.append(value)
+        if len(self._columns['parent_cad_number']) >= self._row_group_rows:
+            self._flush()
+
+    def append_file(self, path: str) -> None:
+        """
+        дописывает группы строк файла Parquet path с той же структурой (например, файла части результата, записанного
+        после сохранения состояния конвертирования, см. Converter._combine_parts)
+        :param path: str
+        """
+        self._flush()
+        with open(path, 'rb') as f:
+            source = self._pq.ParquetFile(f)
+            if not source.schema_arrow.equals(self.schema):
+                raise ValueError('Структура файла ' + path + ' не совпадает со структурой, формируемой программой')
+            for i in range(source.num_row_groups):
+                self._writer.write_table(source.read_row_group(i))
+
+    def _flush(self) -> None:
+        """
+        записывает накопленные строки группой строк
+        """
+        if self._columns['parent_cad_number']:
+            self._writer.write_table(self._pa.Table.from_pydict(self._columns, schema=self.schema))
+            self._columns = {name: [] for name in self.schema.names}
+
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+        if self._initial_groups and self._replaced:
+            self._remove_replaced()
+        os.replace(self._tmp_path, self.path)
+
+    def _remove_replaced(self) -> None:
+        """
+        удаляет из групп строк, перенесённых из существующего файла, строки объектов, записанных заново
+        """
+        import pyarrow.compute as pc
+        replaced = self._pa.array(sorted(self._replaced), self._pa.string())
+        filtered_path = self.path + '.tmp2'
+        with open(self._tmp_path, 'rb') as f:
+            written = self._pq.ParquetFile(f)
+            writer = self._pq.ParquetWriter(filtered_path, self.schema)
+            try:
+                for i in range(written.num_row_groups):
+                    table = written.read_row_group(i)
+                    if i < self._initial_groups:
+                        table = table.filter(pc.invert(pc.is_in(table['parent_cad_number'], value_set=replaced)))
+                    writer.write_table(table)
+            finally:
+                writer.close()
+        os.replace(filtered_path, self._tmp_path)
+
+
+class GeoJsonLinesWriter:
+    """
+    Записывает объекты недвижимости в файл GeoJSON Lines (построчный GeoJSON) для загрузки в другие системы: каждая
+    строка - объект GeoJSON Feature со всеми контурами объекта (MultiPolygon, для объекта без координат - null)
+    и свойствами - выбранными полями записи (см. select_fields). Площадь и кадастровая стоимость записываются числами,
+    даты - в формате ГГГГ-ММ-ДД, состав единого землепользования - списком кадастровых номеров. Координаты
+    записываются в системе координат выписки.
+    Строка объекта записывается в файл сразу, поэтому объём памяти не зависит от количества объектов.
+    При compress=True файл сжимается gzip при записи. В режиме добавления (append=True) новые строки записываются
+    в отдельный файл и дописываются в конец существующего файла при закрытии, поэтому при сбое во время записи
+    существующий файл не изменяется.
+    """
+    def __init__(self, path: str, append: bool = False, fields: Optional[Iterable[str]] = None,
+                 compress: bool = False) -> None:
+        if append and not os.path.exists(path):
+            raise ValueError('Не найден файл GeoJSONL для добавления объектов: ' + path)
+        self.path = path
+        self.record_fields = select_fields(fields)
+        self._part_path = path + '.tmp' if append else None
+        self._file = open_text_stream(self._part_path or path, compress)
+
+    def write(self, record: Dict[str, Any], geometry: Dict[str, List[List[float]]]) -> None:
+        """
+        записывает строку с данными объекта недвижимости
+        :param record: dict (см. AbstractRealEstateObject.get_record)
+        :param geometry: dict (см. AbstractRealEstateObject.geometry), пустой словарь - объект без координат
+        """
+        properties = {}
+        for key in self.record_fields:
+            value = record[key]
+            if key in PARQUET_NUMERIC_FIELDS:
+                value = number_from_string(value)
+            elif key in PARQUET_DATE_FIELDS:
+                value = date_from_string(value).isoformat() if value else None
+            elif key == 'entry_parcels':
+                value = list(value)
+            properties[key] = value
+        feature = {'type': 'Feature', 'properties': properties, 'geometry': geometry_to_geojson(geometry)}
+        self._file.write(json.dumps(feature, ensure_ascii=False) + '\n')
+
+    def close(self) -> None:
+        self._file.close()
+        if self._part_path is not None:
+            append_stream_part(self._part_path, self.path)
+
+
+class CsvWriter:
+    """
+    Записывает объекты недвижимости в текстовый файл CSV (UTF-8, разделитель - запятая) с теми же столбцами
+    и строками, что и таблица xlsx (см. XLSX_COLUMNS, get_xlsx_rows), но без оформления: строки объекта записываются
+    в файл сразу, поэтому объём памяти не зависит от количества объектов.
+    При compress=True файл сжимается gzip при записи. В режиме добавления (append=True) новые строки (без заголовка)
+    записываются в отдельный файл и дописываются в конец существующего файла при закрытии.
+    """
+    def __init__(self, path: str, append: bool = False, fields: Optional[Iterable[str]] = None,
+                 compress: bool = False) -> None:
+        if append and not os.path.exists(path):
+            raise ValueError('Не найден файл CSV для добавления объектов: ' + path)
+        self.path = path
+        # состав единого землепользования нужен всегда - по нему формируются строки таблицы
+        self.record_fields = select_fields([*select_fields(fields), 'entry_parcels'])
+        self.columns = [column for column in XLSX_COLUMNS if column[2] in self.record_fields]
+        self._part_path = path + '.tmp' if append else None
+        self._file = open_text_stream(self._part_path or path, compress)
+        self._writer = csv.writer(self._file)
+        if not append:
+            self._writer.writerow([name for name, _, _ in self.columns])
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """
+        записывает строки объекта недвижимости
+        :param record: dict (см. AbstractRealEstateObject.get_record)
+        """
+        self._writer.writerows(get_xlsx_rows(record, self.columns))
+
+    def close(self) -> None:
+        self._file.close()
+        if self._part_path is not None:
+            append_stream_part(self._part_path, self.path)
+
+
+class PostgisDumpWriter:
+    """
+    Записывает объекты недвижимости в дамп для загрузки в PostgreSQL/PostGIS одной командой COPY (см. pgdump.py):
+    psql -f <файл>. Одна строка на объект, столбцы - выбранные поля записи (см. select_fields) полной длины:
+    площадь и кадастровая стоимость - double precision, даты - date, состав единого землепользования - text[],
+    остальные поля - text; контуры объекта - столбец geom (мультиполигон EWKB в системе координат srid,
+    0 - система координат не указывается). Строки записываются в файл сразу, поэтому объём памяти не зависит
+    от количества объектов. В режиме добавления (append=True) новые строки записываются в отдельный файл и при
+    закрытии вставляются перед признаком конца данных существующего дампа.
+    """
+    def __init__(self, path: str, append: bool = False, fields: Optional[Iterable[str]] = None,
+                 table: str = PGDUMP_TABLE, srid: int = 0) -> None:
+        self.path = path
+        self.record_fields = select_fields(fields)
+        self.columns = []  # имена и типы столбцов таблицы
+        for key in self.record_fields:
+            if key in PARQUET_NUMERIC_FIELDS:
+                self.columns.append((key, 'double precision'))
+            elif key in PARQUET_DATE_FIELDS:
+                self.columns.append((key, 'date'))
+            elif key == 'entry_parcels':
+                self.columns.append((key, 'text[]'))
+            else:
+                self.columns.append((key, 'text'))
+        if not 0 <= int(srid) <= PGDUMP_MAX_SRID:
+            raise ValueError('Код системы координат PostGIS должен быть от 0 до ' + str(PGDUMP_MAX_SRID))
+        self._srid = int(srid)
+        self._trailer = (COPY_END + index_sql(table)).encode('utf-8')
+        self._part_path = path + '.tmp' if append else None
+        if append:
+            self._validate_existing()
+        self._file = open(self._part_path or path, 'w', encoding='utf-8', newline='\n')
+        if not append:
+            self._file.write(create_table_sql(table, self.columns, self._srid) + '\n' +
+                             copy_sql(table, self.record_fields))
+
+    def _validate_existing(self) -> None:
+        """
+        проверяет, что существующий дамп заканчивается командами, которые записывает программа для той же таблицы
+        """
+        if not os.path.exists(self.path):
+            raise ValueError('Не найден дамп PostGIS для добавления объектов: ' + self.path)
+        with open(self.path, 'rb') as f:
+            f.seek(max(0, os.path.getsize(self.path) - len(self._trailer)))
+            if f.read() != self._trailer:
+                raise ValueError('Структура файла ' + self.path + ' не совпадает со структурой, формируемой '
+                                 'программой')
+
+    def write(self, record: Dict[str, Any], geometry: Dict[str, List[List[float]]]) -> None:
+        """
+        записывает строку с данными объекта недвижимости
+        :param record: dict (см. AbstractRealEstateObject.get_record)
+        :param geometry: dict (см. AbstractRealEstateObject.geometry), пустой словарь - объект без координат
+        """
+        values = []
+        for key in self.record_fields:
+            value = record[key]
+            if key in PARQUET_NUMERIC_FIELDS:
+                value = number_from_string(value)
+                value = None if value is None else repr(value)
+            elif key in PARQUET_DATE_FIELDS:
+                value = date_from_string(value).isoformat() if value else None
+            elif key == 'entry_parcels':
+                value = array_literal(value)
+            values.append(copy_escape(value))
+        wkb = geometry_to_wkb(geometry, self._srid)
+        values.append(copy_escape(None if wkb is None else wkb.hex().upper()))
+        self._file.write('\t'.join(values) + '\n')
+
+    def close(self) -> None:
+        if self._part_path is None:
+            self._file.write(self._trailer.decode('utf-8'))
+            self._file.close()
+            return
+        self._file.close()
+        with open(self.path, 'r+b') as target, open(self._part_path, 'rb') as source:
+            target.seek(os.path.getsize(self.path) - len(self._trailer))
+            target.truncate()
+            shutil.copyfileobj(source, target)
+            target.write(self._trailer)
+        os.remove(self._part_path)
+
+
+class XlsxWriter:
+    """
+    Записывает объекты недвижимости в таблицу xlsx.
+    В режиме добавления (append=True) открывает существующую таблицу, ранее созданную программой, и дописывает строки
+    в конец её листов. Если при этом указан replace_existing=True, строки объектов с совпадающим кадастровым номером
+    перезаписываются на месте; поиск таких строк выполняется по словарю, построенному при открытии таблицы.
+    fields - набор полей записи об объекте недвижимости, для которых создаются столбцы таблицы (см. select_fields).
+    Количество строк на листе (вместе с заголовком) ограничено max_rows: при его превышении строки продолжают
+    записываться на новый лист (rollover='sheet') или в новый файл с номером в имени (rollover='file'). Строки одного
+    объекта недвижимости всегда остаются на одном листе. Заполненный файл сохраняется в фоновом потоке, пока
+    заполняется следующий. Замена объектов выполняется только в пределах текущего файла.
+    Если при записи указан вид объекта (group), объекты разных видов записываются на разные листы с названием вида.
+    replaced - кадастровые номера объектов, уже записанных в таблицу при этом конвертировании (до сохранения его
+    состояния): их строки не заменяются, как и строки объектов, записанных после открытия таблицы (атрибут replaced).
+    При styled=False строки не оформляются (промежуточная таблица, строки которой переносятся в другую таблицу
+    методом append_table).
+    """
+    def __init__(self, path: str, append: bool = False, replace_existing: bool = False,
+                 fields: Optional[Iterable[str]] = None, max_rows: int = EXCEL_MAX_ROWS,
+                 rollover: str = 'sheet', replaced: Iterable[str] = (), styled: bool = True) -> None:
+        from openpyxl import Workbook, load_workbook
+        from openpyxl.styles import Border, Alignment, Side
+        if not 2 <= max_rows <= EXCEL_MAX_ROWS:
+            raise ValueError('Предельное количество строк на листе xlsx должно быть от 2 до ' + str(EXCEL_MAX_ROWS))
+        if rollover not in ('sheet', 'file'):
+            raise ValueError('Неизвестный способ разделения таблицы xlsx: ' + str(rollover))
+        self.path = path
+        self.paths = [path]  # все файлы, в которые записывались строки
+        # состав единого землепользования нужен всегда - по нему формируются строки таблицы
+        self.record_fields = select_fields([*select_fields(fields), 'entry_parcels'])
+        self.columns = [column for column in XLSX_COLUMNS if column[2] in self.record_fields]
+        self._replace_existing = replace_existing
+        self._max_rows = max_rows
+        self._rollover = rollover
+        self.replaced = set(replaced)
+        self._styled = styled
+        self._executor = None
+        self._saving = []
+        self._border = Border(left=Side(border_style='thin', color='FF000000'),
+                              right=Side(border_style='thin', color='FF000000'),
+                              top=Side(border_style='thin', color='FF000000'),
+                              bottom=Side(border_style='thin', color='FF000000'),
+                              diagonal=Side(border_style='thin', color='FF000000'),
+                              diagonal_direction=0,
+                              outline=Side(border_style='thin', color='FF000000'),
+                              vertical=Side(border_style='thin', color='FF000000'),
+                              horizontal=Side(border_style='thin', color='FF000000'))
+        self._alignment = Alignment(wrapText=True)  # задаёт выравнивание "перенос по словам"
+        if append:
+            if not os.path.exists(path):
+                raise ValueError('Не найдена таблица для добавления объектов: ' + path)
+            self._open_workbook(load_workbook(path), False)
+            # openpyxl ищет стиль ячейки в наборе стилей книги по словарю: для стиля, загруженного из файла, это
+            # равный, но другой объект, и каждое присваивание стиля сравнивает объекты по всем свойствам, поэтому
+            # строки оформляются объектами стиля из книги
+            for attr, collection in (('_border', self._wb._borders), ('_alignment', self._wb._alignments)):
+                style = getattr(self, attr)
+                if style in collection:
+                    setattr(self, attr, collection[collection.index(style)])
+            header = [name for name, _, _ in self.columns]
+            for ws in self._wb.worksheets:
+                if ws.max_row == 1 and not any(cell.value for cell in ws[1]):
+                    # пустой лист таблицы, сохранённой до записи первого объекта, - как пустой лист новой книги
+                    self._default_sheet = ws
+                    continue
+                if [cell.value for cell in ws[1]] != header:
+                    raise ValueError('Структура таблицы ' + path + ' не совпадает со структурой, формируемой '
+                                     'программой')
+                # листы одного вида называются "<вид>", "<вид> (2)", ...; строки дописываются на последний из них
+                match = re.fullmatch(r'(.*) \((\d+)\)', ws.title)
+                title, number = (match.group(1), int(match.group(2))) if match else (ws.title, 1)
+                self._sheets[title] = ws
+                self._sheet_numbers[title] = max(self._sheet_numbers.get(title, 0), number)
+                self._row_numb[ws] = ws.max_row
+                for row_numb, (cad_number, single_use_cad_number) in enumerate(
+                        ws.iter_rows(min_row=2, max_col=2, values_only=True), start=2):
+                    if single_use_cad_number and single_use_cad_number != '-':
+                        cad_number = single_use_cad_number
+                    self._index.setdefault(cad_number, []).append((ws, row_numb))
+        else:
+            self._open_workbook(Workbook(), True)
+
+    def _open_workbook(self, wb: Any, new: bool) -> None:
+        self._wb = wb
+        self._default_sheet = wb.active if new else None  # пустой лист новой книги становится первым листом таблицы
+        self._sheets: Dict[str, Any] = {}  # название листа без номера -> лист, на который записываются строки
+        self._sheet_numbers: Dict[str, int] = {}  # название листа без номера -> количество листов с этим названием
+        self._row_numb: Dict[Any, int] = {}  # лист -> номер последней заполненной строки
+        self._index: Dict[str, List[Tuple[Any, int]]] = {}  # КН объекта недвижимости -> (лист, номер строки)
+        self._rows_to_style: List[Tuple[Any, int]] = []
+        self._rows_to_delete: List[Tuple[Any, int]] = []
+
+    def _new_sheet(self, title: str) -> Any:
+        """
+        создаёт лист с заголовком таблицы для объектов вида title (при повторном создании к названию добавляется номер)
+        """
+        number = self._sheet_numbers.get(title, 0) + 1
+        self._sheet_numbers[title] = number
+        sheet_title = title if number == 1 else title + ' (' + str(number) + ')'
+        if self._default_sheet is not None:
+            ws = self._default_sheet
+            ws.title = sheet_title
+            self._default_sheet = None
+        else:
+            ws = self._wb.create_sheet(sheet_title)
+        self._sheets[title] = ws
+        self._create_header(ws)
+        self._row_numb[ws] = 1
+        return ws
+
+    def _create_header(self, ws: Any) -> None:
+        from openpyxl.styles import PatternFill, Font
+        fill = PatternFill(fill_type='solid', start_color='c1c1c1', end_color='c2c2c2')
+        font = Font(name='Calibri', size=11, bold=True, italic=False, vertAlign=None, underline='none', strike=False,
+                    color='FF000000')
+        for col, (name, width, _) in enumerate(self.columns, start=1):
+            cell = ws.cell(row=1, column=col, value=name)
+            cell.fill = fill
+            cell.font = font
+            ws.column_dimensions[cell.column_letter].width = width
+        self._rows_to_style.append((ws, 1))
+
+    def _next_file(self) -> None:
+        """
+        завершает текущий файл (сохраняется в фоновом потоке) и начинает следующий файл серии
+        """
+        from openpyxl import Workbook
+        wb, path = self._finish_workbook(), self.paths[-1]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        self._saving.append(self._executor.submit(wb.save, path))
+        # файлы серии называются "<имя>.xlsx", "<имя> (2).xlsx", ...
+        stem, ext = os.path.splitext(self.paths[-1])
+        match = re.fullmatch(r'(.*) \((\d+)\)', stem)
+        stem, number = (match.group(1), int(match.group(2)) + 1) if match else (stem, 2)
+        while os.path.exists(stem + ' (' + str(number) + ')' + ext):
+            number += 1
+        self.paths.append(stem + ' (' + str(number) + ')' + ext)
+        self._open_workbook(Workbook(), True)
+
+    def write(self, record: Dict[str, Any], group: Optional[str] = None) -> None:
+        """
+        записывает в таблицу строки объекта недвижимости
+        :param record: dict (см. AbstractRealEstateObject.get_record)
+        :param group: str - вид объекта недвижимости (название листа) или None, если объекты не разделяются по видам
+        """
+        self._write_rows(record['parent_cad_number'], get_xlsx_rows(record, self.columns),
+                         DEFAULT_SHEET_TITLE if group is None else group[:31])
+
+    def _write_rows(self, parent_cad_number: str, rows: List[List[Any]], title: str) -> None:
+        """
+        записывает строки объекта недвижимости на лист title (при превышении лимита строк - на новый лист или в новый
+        файл)
+        """
+        ws = self._sheets.get(title)
+        if ws is None:
+            ws = self._new_sheet(title)
+        free_rows = []
+        if self._replace_existing and parent_cad_number not in self.replaced:
+            self.replaced.add(parent_cad_number)
+            free_rows = self._index.pop(parent_cad_number, [])
+        new_rows = len(rows) - len(free_rows)
+        if new_rows > 0 and 1 < self._row_numb[ws] and self._row_numb[ws] + new_rows > self._max_rows:
+            if self._rollover == 'file':
+                # освободившиеся строки остались в завершённом файле
+                self._next_file()
+                free_rows = []
+                new_rows = len(rows)
+            ws = self._new_sheet(title)
+        for values in rows:
+            if free_rows:
+                row_ws, row_numb = free_rows.pop(0)
+            else:
+                self._row_numb[ws] += 1
+                row_ws, row_numb = ws, self._row_numb[ws]
+            for col, value in enumerate(values, start=1):
+                row_ws.cell(row=row_numb, column=col, value=value)
+            self._index.setdefault(parent_cad_number, []).append((row_ws, row_numb))
+            if self._styled:
+                self._rows_to_style.append((row_ws, row_numb))
+        self._rows_to_delete.extend(free_rows)
+
+    def append_table(self, path: str) -> None:
+        """
+        дописывает строки таблицы path, созданной программой с тем же набором полей (например, частичного результата
+        распределённого конвертирования, см. ledger.merge_partials). Строки листа "<вид>" или "<вид> (N)" дописываются
+        на лист того же вида; строки одного объекта недвижимости (подряд идущие строки с тем же кадастровым номером
+        или номером единого землепользования) остаются на одном листе
+        :param path: str
+        """
+        from openpyxl import load_workbook
+        header = [name for name, _, _ in self.columns]
+        wb = load_workbook(path, read_only=True)
+        try:
+            for ws in wb.worksheets:
+                rows = ws.iter_rows(values_only=True)
+                first_row = next(rows, None)
+                if first_row is None or not any(first_row):
+                    continue  # пустой лист таблицы, в которую не записано ни одного объекта
+                if list(first_row)[:len(header)] != header:
+                    raise ValueError('Структура таблицы ' + path + ' не совпадает со структурой, формируемой '
+                                     'программой')
+                match = re.fullmatch(r'(.*) \((\d+)\)', ws.title)
+                title = match.group(1) if match else ws.title
+                object_rows, object_key = [], None
+                for values in rows:
+                    if not any(values):
+                        continue
+                    cad_number, single_use_cad_number = values[0], values[1]
+                    key = single_use_cad_number if single_use_cad_number and single_use_cad_number != '-' \
+                        else cad_number
+                    if object_rows and key != object_key:
+                        self._write_rows(object_key, object_rows, title)
+                        object_rows = []
+                    object_key = key
+                    object_rows.append(list(values[:len(header)]))
+                if object_rows:
+                    self._write_rows(object_key, object_rows, title)
+        finally:
+            wb.close()
+
+    def _finish_workbook(self) -> Any:
+        """
+        оформляет новые строки текущей книги и удаляет строки заменённых объектов, для которых не хватило новых данных
+        """
+        for ws, row_numb in self._rows_to_style:
+            for col in range(1, len(self.columns) + 1):
+                cell = ws.cell(row=row_numb, column=col)
+                cell.border = self._border
+                cell.alignment = self._alignment
+        # удаляем строки снизу вверх, чтобы не сдвигались номера ещё не удалённых строк
+        for ws, row_numb in sorted(self._rows_to_delete, key=lambda item: item[1], reverse=True):
+            ws.delete_rows(row_numb)
+        return self._wb
+
+    def close(self) -> None:
+        self._finish_workbook().save(self.paths[-1])
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            for future in self._saving:
+                future.result()